@@ -0,0 +1,318 @@
+"""
+Node-local disk cache of iRODS data objects that are read again and again (readme files shown
+on landing pages, files metadata is extracted from, bags assembled on the fly), so that each
+version of a data object is copied from iRODS once per node instead of once per read.
+
+Cache entries are named by the iRODS path of a data object and its version - its checksum (if
+iRODS has one for it), modified time and size - so a data object that changed in iRODS is never
+served from an older entry, even if its checksum was not recomputed when it changed. Every read
+asks iRODS for the version of the data object (one catalog query), which is much cheaper than
+copying the data object.
+
+Only one copy of a data object is made at a time on a node, however many threads or processes
+ask for it: the copy is made while holding an exclusive lock on a lock file of the data object,
+and whoever waited for the lock finds the entry made. Copies are checked against the iRODS
+checksum and renamed into place, so a partly written or corrupt copy is never served. Lock files
+are removed when the entries of their data object are evicted.
+
+The cache is bounded by IRODS_CACHE_SIZE bytes. Entries are touched whenever they are read,
+and the least recently read entries are removed when the cache grows larger than that. Data
+objects larger than IRODS_CACHE_MAX_OBJECT_SIZE bytes are not cached.
+"""
+
+import base64
+import errno
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# the cache is trimmed to this fraction of its size limit when it grows larger than the limit,
+# so that not every copy made into a full cache needs to remove entries
+LOW_WATERMARK = 0.9
+_TEMP_SUFFIX = '.tmp'
+_LOCK_SUFFIX = '.lock'
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+class ChecksumMismatch(Exception):
+    """The copy of a data object does not match the checksum of the data object in iRODS."""
+
+
+def _file_checksum(path, irods_checksum):
+    """Return the checksum of a local file in the format of irods_checksum: a hex md5 digest,
+    or 'sha2:' followed by a base64 sha256 digest"""
+    is_sha2 = irods_checksum.startswith('sha2:')
+    digest = hashlib.sha256() if is_sha2 else hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    if is_sha2:
+        return 'sha2:' + base64.b64encode(digest.digest()).decode()
+    return digest.hexdigest()
+
+
+class IrodsObjectCache(object):
+    """A size bounded, least recently used disk cache of iRODS data objects."""
+
+    def __init__(self, root, max_size, max_object_size=None):
+        """
+        :param root: local directory of the cache entries
+        :param max_size: size limit of the cache in bytes; 0 disables caching
+        :param max_object_size: (optional) size of the largest data object to cache in bytes;
+        a quarter of max_size by default
+        """
+        self.root = root
+        self.max_size = max_size
+        self.max_object_size = max_size // 4 if max_object_size is None else max_object_size
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'waits': 0, 'evictions': 0, 'bypasses': 0,
+                       'checksum_mismatches': 0}
+
+    def _count(self, name, count=1):
+        with self._stats_lock:
+            self._stats[name] += count
+
+    def stats(self):
+        """
+        Return the counts, since the cache was created in this process, of reads of entries
+        (hits), copies from iRODS (misses), reads that waited for a copy made by another thread
+        or process (waits), entries removed to keep the cache within its size (evictions), reads
+        of data objects that are not cached (bypasses) and copies that didn't match the iRODS
+        checksum (checksum_mismatches)
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def usage(self):
+        """Return the number of entries and their total size in bytes"""
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def _entry_prefix(self, istorage, name):
+        path_key = hashlib.sha1(istorage.get_absolute_path(name).encode()).hexdigest()
+        return os.path.join(self.root, path_key[:2], path_key)
+
+    @staticmethod
+    def _version(stat):
+        version = '{}-{}-{}'.format(stat['checksum'], stat['modified_time'].timestamp(),
+                                    stat['size'])
+        return hashlib.sha1(version.encode()).hexdigest()
+
+    def get(self, istorage, name):
+        """
+        Return the path of the cache entry of the current version of a data object, copying
+        the data object from iRODS if there is no entry of it yet
+        Note: the entry may be removed to make room for other entries at any time - open it
+        right away, or use open or copy instead
+        :param istorage: IrodsStorage to copy the data object from
+        :param name: path of the data object in iRODS
+        :return: path of the entry, or None if the data object is not cached because caching
+        is disabled, the data object is too large or its copy didn't match its checksum
+        :raises ValidationError: if the data object does not exist in iRODS
+        """
+        stat = istorage.stat(name)
+        if not self.max_size or stat['size'] > self.max_object_size:
+            self._count('bypasses')
+            return None
+
+        prefix = self._entry_prefix(istorage, name)
+        entry = '{}-{}'.format(prefix, self._version(stat))
+        if self._touch(entry):
+            self._count('hits')
+            return entry
+
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        with open(prefix + _LOCK_SUFFIX, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self._touch(entry):
+                # copied by another thread or process while waiting for the lock
+                self._count('waits')
+                return entry
+            try:
+                self._fill(istorage, name, stat, entry)
+            except ChecksumMismatch as ex:
+                # the data object may have changed while it was copied
+                logger.warning("not caching {}: {}".format(name, str(ex)))
+                return None
+            self._remove_other_versions(prefix, entry)
+        self._count('misses')
+        self._evict()
+        return entry
+
+    @staticmethod
+    def _touch(entry):
+        """mark an entry as just read; return False if there is no such entry"""
+        try:
+            os.utime(entry)
+            return True
+        except OSError as ex:
+            if ex.errno == errno.ENOENT:
+                return False
+            raise
+
+    def _fill(self, istorage, name, stat, entry):
+        temp_path = '{}.{}{}'.format(entry, uuid4().hex, _TEMP_SUFFIX)
+        try:
+            istorage.getFile(name, temp_path)
+            if stat['checksum']:
+                checksum = _file_checksum(temp_path, stat['checksum'])
+                if checksum != stat['checksum']:
+                    self._count('checksum_mismatches')
+                    raise ChecksumMismatch("copy of {} has checksum {} instead of {}".format(
+                        name, checksum, stat['checksum']))
+            elif os.path.getsize(temp_path) != stat['size']:
+                self._count('checksum_mismatches')
+                raise ChecksumMismatch("copy of {} has {} bytes instead of {}".format(
+                    name, os.path.getsize(temp_path), stat['size']))
+            os.rename(temp_path, entry)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def _remove_other_versions(prefix, entry):
+        directory, path_key = os.path.split(prefix)
+        for file_name in os.listdir(directory):
+            path = os.path.join(directory, file_name)
+            if file_name.startswith(path_key + '-') and path != entry and \
+                    not file_name.endswith(_TEMP_SUFFIX):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _entries(self):
+        """Return list of (last read time, size, path) of the entries"""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(_TEMP_SUFFIX) or entry.name.endswith(_LOCK_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        """remove the least recently read entries if the cache is larger than its size limit"""
+        entries = self._entries()
+        total_size = sum(size for _, size, _ in entries)
+        if total_size <= self.max_size:
+            return
+        evictions = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size * LOW_WATERMARK:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another process
+                pass
+            else:
+                evictions += 1
+                self._remove_lock(path.rsplit('-', 1)[0])
+            total_size -= size
+        self._count('evictions', evictions)
+        logger.debug("evicted {} iRODS cache entries, {} bytes left".format(evictions,
+                                                                             total_size))
+
+    @staticmethod
+    def _remove_lock(prefix):
+        """remove the lock file of a data object that has no entry and is not being copied"""
+        directory, path_key = os.path.split(prefix)
+        try:
+            fd = os.open(prefix + _LOCK_SUFFIX, os.O_RDWR)
+        except OSError as ex:
+            if ex.errno == errno.ENOENT:
+                return
+            raise
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as ex:
+            if ex.errno in (errno.EAGAIN, errno.EACCES):
+                # held by whoever is copying the data object
+                os.close(fd)
+                return
+            os.close(fd)
+            raise
+        try:
+            if not any(file_name.startswith(path_key + '-')
+                       for file_name in os.listdir(directory)):
+                os.remove(prefix + _LOCK_SUFFIX)
+        finally:
+            os.close(fd)
+
+    def open(self, istorage, name):
+        """
+        Open a data object for reading from the cache
+        :param istorage: IrodsStorage to copy the data object from if it is not cached
+        :param name: path of the data object in iRODS
+        :return: a binary file object; data objects that are not cached are copied to a temp
+        file that is removed when the file object is closed
+        """
+        entry = self.get(istorage, name)
+        if entry is not None:
+            try:
+                return open(entry, 'rb')
+            except IOError as ex:
+                # evicted since get returned it
+                if ex.errno != errno.ENOENT:
+                    raise
+        temp_dir = os.path.join(settings.TEMP_FILE_DIR, uuid4().hex)
+        os.makedirs(temp_dir)
+        try:
+            temp_path = os.path.join(temp_dir, os.path.basename(name))
+            istorage.getFile(name, temp_path)
+            # the file stays readable through the file object after it is removed
+            return open(temp_path, 'rb')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def copy(self, istorage, name, dest_name):
+        """
+        Copy a data object to a local file through the cache
+        :param istorage: IrodsStorage to copy the data object from if it is not cached
+        :param name: path of the data object in iRODS
+        :param dest_name: path of the local file to write
+        """
+        entry = self.get(istorage, name)
+        if entry is not None:
+            try:
+                shutil.copyfile(entry, dest_name)
+                return
+            except IOError as ex:
+                if ex.errno != errno.ENOENT:
+                    raise
+        istorage.getFile(name, dest_name)
+
+
+_object_cache = None
+_object_cache_lock = threading.Lock()
+
+
+def get_object_cache():
+    """Return the IrodsObjectCache of this process, configured by the IRODS_CACHE_* settings"""
+    global _object_cache
+    with _object_cache_lock:
+        if _object_cache is None:
+            _object_cache = IrodsObjectCache(
+                getattr(settings, 'IRODS_CACHE_DIR',
+                        os.path.join(settings.TEMP_FILE_DIR, 'irods_cache')),
+                getattr(settings, 'IRODS_CACHE_SIZE', 1024 ** 3),
+                getattr(settings, 'IRODS_CACHE_MAX_OBJECT_SIZE', None))
+        return _object_cache
@@ -257,8 +257,16 @@ class Session(object):
             return stdout, stderr
 
 
+def get_session_class():
+    """Returns the session class selected by settings.IRODS_SESSION_BACKEND, which defaults
+    to running icommands in a subprocess per call.
+    """
+    from django.utils.module_loading import import_string
+    return import_string(getattr(settings, 'IRODS_SESSION_BACKEND', 'django_irods.icommands.Session'))
+
+
 if getattr(settings, 'IRODS_GLOBAL_SESSION', False) and getattr(settings, 'USE_IRODS', False):
-    GLOBAL_SESSION = Session()
+    GLOBAL_SESSION = get_session_class()()
     GLOBAL_ENVIRONMENT = GLOBAL_SESSION.create_environment()
     GLOBAL_SESSION.run('iinit', None, GLOBAL_ENVIRONMENT.auth)
 else:
@@ -0,0 +1,532 @@
+"""Pooled iRODS session backend.
+
+PooledSession serves the same ``run(icommand, data, *args)`` interface as the icommands
+Session, but answers the icommands that IrodsStorage uses on its hot paths (iquest, ils,
+imeta, imkdir, irm, imv, icp, iput, iget, ichksum) over a persistent, authenticated
+protocol connection instead of forking a new icommand process for each call. Connections
+are kept per worker process and per (host, port, zone, user), so every IrodsStorage
+instance in a worker shares them. Any icommand or option that is not handled natively
+falls back to the icommand subprocess, as does every command if python-irodsclient is
+not installed.
+
+Enable it in settings with::
+
+    IRODS_SESSION_BACKEND = 'django_irods.pool.PooledSession'
+"""
+
+import calendar
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+import pytz
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .icommands import Session, SessionException, IRodsEnv
+
+logger = logging.getLogger(__name__)
+
+NO_ROWS_FOUND = "CAT_NO_ROWS_FOUND: Nothing was found matching your query\n"
+
+# exit codes reported through SessionException for errors raised by the client
+NOT_FOUND_EXIT_CODE = 4
+CLIENT_ERROR_EXIT_CODE = 3
+
+_CONDITION_RE = re.compile(r"([A-Z_]+)\s*(not like|like|!=|<>|<=|>=|=|<|>)\s*'([^']*)'",
+                           re.IGNORECASE)
+_SELECT_RE = re.compile(r"^\s*select\s+(.*?)(?:\s+where\s+(.*))?\s*$", re.IGNORECASE | re.DOTALL)
+
+
+class ClientError(Exception):
+    """An iRODS request that reached the server but failed there."""
+    exitcode = CLIENT_ERROR_EXIT_CODE
+
+
+class NotFound(ClientError):
+    """The data object or collection a request refers to does not exist."""
+    exitcode = NOT_FOUND_EXIT_CODE
+
+
+class ConnectionLost(Exception):
+    """The pooled connection to the server went away and the request can be retried."""
+
+
+def parse_genquery(qrystr):
+    """
+    Parse the restricted GenQuery strings that IrodsStorage passes to iquest
+    :param qrystr: query string in the form "select A, B where C = 'x' AND D like 'y'"
+    :return: (list of selected column names, list of (column name, operator, value)) tuples
+    or None if the query cannot be parsed
+    """
+    match = _SELECT_RE.match(qrystr)
+    if not match:
+        return None
+    columns = [col.strip().upper() for col in match.group(1).split(',')]
+    if not all(re.match(r"^[A-Z_]+$", col) for col in columns):
+        # aggregations such as count(DATA_ID) are left to iquest
+        return None
+    conditions = []
+    where = match.group(2)
+    if where:
+        conditions = [(col.upper(), op.lower(), val) for col, op, val in
+                      _CONDITION_RE.findall(where)]
+        if not re.match(r"^(\s*and\s*)*$", _CONDITION_RE.sub('', where), re.IGNORECASE):
+            # a condition did not fit the supported grammar
+            return None
+    return columns, conditions
+
+
+def format_value(value):
+    """Format a query result value the way iquest prints it"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(pytz.utc)
+        return "{:011d}".format(calendar.timegm(value.utctimetuple()))
+    return str(value)
+
+
+class IrodsClient(object):
+    """Adapter from python-irodsclient to the small set of operations PooledSession needs.
+
+    One IrodsClient wraps one iRODSSession, which holds its own pool of authenticated
+    connections and is safe to share between threads.
+    """
+
+    def __init__(self, host, port, zone, username, password):
+        from irods.session import iRODSSession
+        self._session = iRODSSession(host=host, port=int(port), zone=zone, user=username,
+                                     password=password)
+
+    def close(self):
+        self._session.cleanup()
+
+    def _call(self, func, *args, **kwargs):
+        from irods import exception as ex
+        try:
+            return func(*args, **kwargs)
+        except (ex.DataObjectDoesNotExist, ex.CollectionDoesNotExist,
+                ex.CAT_NO_ROWS_FOUND) as e:
+            raise NotFound(str(e))
+        except ex.NetworkException as e:
+            raise ConnectionLost(str(e))
+        except ex.iRODSException as e:
+            raise ClientError(str(e) or e.__class__.__name__)
+
+    @staticmethod
+    def _columns():
+        from irods.models import ModelBase
+        return dict((col.icat_key, col) for _, col in ModelBase.column_items)
+
+    def query(self, columns, conditions):
+        from irods.column import Criterion
+        col_map = self._columns()
+        try:
+            select = [col_map[col] for col in columns]
+            criteria = []
+            for col, op, val in conditions:
+                criteria.append(Criterion('<>' if op == '!=' else op, col_map[col], val))
+        except KeyError as e:
+            raise ClientError("unknown query column {}".format(e))
+
+        def run_query():
+            results = self._session.query(*select).filter(*criteria)
+            return [tuple(row[col] for col in select) for row in results]
+        return self._call(run_query)
+
+    def is_collection(self, path):
+        return self._call(self._session.collections.exists, path)
+
+    def exists(self, path):
+        return self.is_collection(path) or self._call(self._session.data_objects.exists, path)
+
+    def mkdir(self, path):
+        self._call(self._session.collections.create, path, recurse=True)
+
+    def remove(self, path):
+        if self.is_collection(path):
+            self._call(self._session.collections.remove, path, recurse=True, force=True)
+        else:
+            self._call(self._session.data_objects.unlink, path, force=True)
+
+    def move(self, src, dest):
+        if self.is_collection(src):
+            self._call(self._session.collections.move, src, dest)
+        else:
+            self._call(self._session.data_objects.move, src, dest)
+
+    def copy(self, src, dest, resource=None):
+        from irods import keywords as kw
+        options = {kw.FORCE_FLAG_KW: ''}
+        if resource:
+            options[kw.DEST_RESC_NAME_KW] = resource
+        self._call(self._session.data_objects.copy, src, dest, **options)
+
+    def put(self, local_path, path, data_type=None):
+        from irods import keywords as kw
+        options = {kw.FORCE_FLAG_KW: ''}
+        if data_type:
+            options[kw.DATA_TYPE_KW] = data_type
+        self._call(self._session.data_objects.put, local_path, path, **options)
+
+    def get(self, path, local_path):
+        from irods import keywords as kw
+        self._call(self._session.data_objects.get, path, local_path, **{kw.FORCE_FLAG_KW: ''})
+
+    def read(self, path, offset, length):
+        def read_range():
+            with self._session.data_objects.open(path, 'r') as data_object:
+                data_object.seek(offset)
+                return data_object.read(length)
+        return self._call(read_range)
+
+    def write(self, path, ranges):
+        def write_ranges():
+            with self._session.data_objects.open(path, 'r+') as data_object:
+                for offset, data in ranges:
+                    data_object.seek(offset)
+                    data_object.write(data)
+        return self._call(write_ranges)
+
+    def checksum(self, path, force=False):
+        from irods import keywords as kw
+        options = {kw.FORCE_CHKSUM_KW: ''} if force else {}
+        return self._call(self._session.data_objects.chksum, path, **options)
+
+    def get_avu(self, path, name):
+        from irods.models import Collection
+        avus = self._call(self._session.metadata.get, Collection, path)
+        for avu in avus:
+            if avu.name == name:
+                return avu.value, avu.units
+        return None
+
+    def set_avu(self, path, name, value, units=None):
+        from irods.meta import iRODSMeta
+        from irods.models import Collection
+        self._call(self._session.metadata.set, Collection, path, iRODSMeta(name, value, units))
+
+    def remove_avu(self, path, name, value):
+        from irods.meta import iRODSMeta
+        from irods.models import Collection
+        self._call(self._session.metadata.remove, Collection, path, iRODSMeta(name, value))
+
+
+class ConnectionPool(object):
+    """Per-process registry of iRODS clients keyed by (host, port, zone, user).
+
+    Clients are never shared across a fork: a worker that inherits the registry from its
+    parent process starts over with fresh connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._clients = {}
+
+    def get(self, key, factory):
+        with self._lock:
+            if self._pid != os.getpid():
+                # sockets opened by the parent process must not be reused by a forked worker
+                self._clients = {}
+                self._pid = os.getpid()
+            client = self._clients.get(key)
+            if client is None:
+                client = factory()
+                self._clients[key] = client
+            return client
+
+    def discard(self, key):
+        with self._lock:
+            client = self._clients.pop(key, None)
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._clients.keys())
+        for key in keys:
+            self.discard(key)
+
+
+POOL = ConnectionPool()
+
+
+def default_client_factory(env, password):
+    factory_path = getattr(settings, 'IRODS_POOL_CLIENT', 'django_irods.pool.IrodsClient')
+    return import_string(factory_path)(env.host, env.port, env.zone, env.username, password)
+
+
+class PooledSession(Session):
+    """iRODS session that runs the common icommands over pooled protocol connections."""
+
+    def __init__(self, root=None, icommands_path=None, session_id='default_session',
+                 client_factory=None, pool=None):
+        super(PooledSession, self).__init__(root=root, icommands_path=icommands_path,
+                                            session_id=session_id)
+        self._client_factory = client_factory or default_client_factory
+        self._pool = pool or POOL
+        self._env = None
+        self._auth = None
+
+    def create_environment(self, myEnv=None):
+        self._env = super(PooledSession, self).create_environment(myEnv=myEnv)
+        return self._env
+
+    def _environment(self):
+        if self._env is None and self.session_file_exists():
+            # the session directory was created by an earlier process using the same id
+            with open(os.path.join(self.session_path, "irods_environment.json")) as env_file:
+                env = json.load(env_file)
+            self._env = IRodsEnv(pk=-1, host=env['irods_host'], port=env['irods_port'],
+                                 def_res=env['irods_default_resource'],
+                                 home_coll=env['irods_home'], cwd=env['irods_cwd'],
+                                 username=env['irods_user_name'], zone=env['irods_zone_name'],
+                                 auth=self._auth, irods_default_hash_scheme='MD5')
+        return self._env
+
+    @property
+    def _pool_key(self):
+        env = self._environment()
+        return env.host, str(env.port), env.zone, env.username
+
+    def client(self):
+        """Return the pooled client for this session's environment, connecting if needed"""
+        env = self._environment()
+        password = self._auth if self._auth is not None else env.auth
+        return self._pool.get(self._pool_key, lambda: self._client_factory(env, password))
+
+    def _abspath(self, path):
+        if os.path.isabs(path):
+            return path
+        return os.path.join(self._environment().cwd, path)
+
+    def run(self, icommand, data=None, *args):
+        handler = getattr(self, '_run_' + icommand, None)
+        if handler is None or data or self._environment() is None:
+            return super(PooledSession, self).run(icommand, data, *args)
+        args = [str(arg) for arg in args]
+        for attempt in (1, 2):
+            try:
+                result = handler(*args)
+            except ImportError:
+                # python-irodsclient is not installed
+                result = None
+            except ConnectionLost:
+                self._pool.discard(self._pool_key)
+                if attempt == 1:
+                    continue
+                raise SessionException(CLIENT_ERROR_EXIT_CODE, '',
+                                       'lost connection to iRODS running {}'.format(icommand))
+            except ClientError as e:
+                raise SessionException(e.exitcode, '', str(e))
+            if result is None:
+                # arguments not supported natively
+                logger.debug("running {} {} as an icommand".format(icommand, ' '.join(args)))
+                return super(PooledSession, self).run(icommand, data, *args)
+            return result
+
+    def supports_range_reads(self):
+        """Return True if byte ranges of data objects can be read with read_range"""
+        if self._environment() is None:
+            return False
+        try:
+            self.client()
+        except ImportError:
+            # python-irodsclient is not installed
+            return False
+        return True
+
+    def read_range(self, path, offset, length):
+        """
+        Read a byte range of a data object without copying the whole data object
+        :param path: path of the data object
+        :param offset: position of the first byte to read
+        :param length: number of bytes to read
+        :return: the bytes read, fewer than length at the end of the data object
+        """
+        for attempt in (1, 2):
+            try:
+                return self.client().read(self._abspath(path), offset, length)
+            except ConnectionLost:
+                self._pool.discard(self._pool_key)
+                if attempt == 1:
+                    continue
+                raise SessionException(CLIENT_ERROR_EXIT_CODE, '',
+                                       'lost connection to iRODS reading {}'.format(path))
+            except ClientError as e:
+                raise SessionException(e.exitcode, '', str(e))
+
+    def supports_range_writes(self):
+        """Return True if byte ranges of data objects can be written with write_ranges"""
+        return self.supports_range_reads()
+
+    def write_ranges(self, path, ranges):
+        """
+        Write byte ranges of a data object without copying the whole data object; the data
+        object is extended by ranges that end past its end
+        :param path: path of the data object
+        :param ranges: list of (offset, bytes) to write
+        """
+        for attempt in (1, 2):
+            try:
+                # writing the same bytes again is harmless, so a write that lost its
+                # connection is retried as a whole
+                return self.client().write(self._abspath(path), ranges)
+            except ConnectionLost:
+                self._pool.discard(self._pool_key)
+                if attempt == 1:
+                    continue
+                raise SessionException(CLIENT_ERROR_EXIT_CODE, '',
+                                       'lost connection to iRODS writing {}'.format(path))
+            except ClientError as e:
+                raise SessionException(e.exitcode, '', str(e))
+
+    @staticmethod
+    def _split_options(args, flags, valued=()):
+        """
+        split icommand arguments into options and positional arguments
+        :return: (options dict, positional list) or None if an unsupported option is given
+        """
+        options = {}
+        positional = []
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if arg in valued and args:
+                options[arg] = args.pop(0)
+            elif arg.startswith('-') and len(arg) > 1:
+                if not all('-' + f in flags for f in arg[1:]):
+                    return None
+                for f in arg[1:]:
+                    options['-' + f] = True
+            else:
+                positional.append(arg)
+        return options, positional
+
+    def _run_iinit(self, *args):
+        if args:
+            self._auth = args[0]
+            self._pool.discard(self._pool_key)
+        # icommands that are not run over the pool (ibun, irule, iquest count(), ...) read the
+        # credentials iinit stores in the session directory
+        return super(PooledSession, self).run('iinit', None, *args)
+
+    def _run_iquest(self, *args):
+        positional = [arg for arg in args if arg != '--no-page']
+        if len(positional) != 2 or positional[0].startswith('-'):
+            return None
+        fmt, qrystr = positional
+        query = parse_genquery(qrystr)
+        if query is None:
+            return None
+        columns, conditions = query
+        rows = self.client().query(columns, conditions)
+        if not rows:
+            return NO_ROWS_FOUND, ''
+        lines = [fmt % tuple(format_value(v) for v in row) for row in rows]
+        return '\n'.join(lines) + '\n', ''
+
+    def _run_ils(self, *args):
+        if len(args) != 1 or args[0].startswith('-'):
+            return None
+        path = self._abspath(args[0])
+        if not self.client().exists(path):
+            raise NotFound("{} does not exist or user lacks access permission".format(path))
+        return path + '\n', ''
+
+    def _run_imeta(self, *args):
+        if len(args) < 4 or args[1] != '-C':
+            return None
+        cmd, path, name = args[0], self._abspath(args[2]), args[3]
+        client = self.client()
+        if cmd == 'set' and len(args) in (5, 6):
+            client.set_avu(path, name, args[4], args[5] if len(args) == 6 else None)
+            return '', ''
+        if cmd == 'rm' and len(args) == 5:
+            client.remove_avu(path, name, args[4])
+            return '', ''
+        if cmd == 'ls' and len(args) == 4:
+            avu = client.get_avu(path, name)
+            header = "AVUs defined for collection {}:\n".format(path)
+            if avu is None:
+                return header + "None\n", ''
+            value, units = avu
+            return header + "attribute: {}\nvalue: {}\nunits: {}\n".format(
+                name, value, units or ''), ''
+        return None
+
+    def _run_imkdir(self, *args):
+        parsed = self._split_options(args, ('-p',))
+        if parsed is None or not parsed[1]:
+            return None
+        client = self.client()
+        for path in parsed[1]:
+            client.mkdir(self._abspath(path))
+        return '', ''
+
+    def _run_irm(self, *args):
+        parsed = self._split_options(args, ('-r', '-f'))
+        if parsed is None or not parsed[1]:
+            return None
+        client = self.client()
+        for path in parsed[1]:
+            client.remove(self._abspath(path))
+        return '', ''
+
+    def _run_imv(self, *args):
+        if len(args) < 2 or any(arg.startswith('-') for arg in args):
+            return None
+        client = self.client()
+        if len(args) == 2:
+            client.move(self._abspath(args[0]), self._abspath(args[1]))
+        else:
+            # many sources are moved into the target collection
+            dest = self._abspath(args[-1])
+            for src in args[:-1]:
+                src = self._abspath(src)
+                client.move(src, os.path.join(dest, os.path.basename(src.rstrip('/'))))
+        return '', ''
+
+    def _run_icp(self, *args):
+        parsed = self._split_options(args, ('-r', '-f'), valued=('-R',))
+        if parsed is None or len(parsed[1]) != 2:
+            return None
+        options, (src, dest) = parsed
+        src, dest = self._abspath(src), self._abspath(dest)
+        client = self.client()
+        if client.is_collection(src):
+            # recursive collection copies are left to icp
+            return None
+        client.copy(src, dest, resource=options.get('-R'))
+        return '', ''
+
+    def _run_iput(self, *args):
+        parsed = self._split_options(args, ('-f',), valued=('-D',))
+        if parsed is None or len(parsed[1]) != 2:
+            return None
+        options, (local_path, path) = parsed
+        self.client().put(local_path, self._abspath(path), data_type=options.get('-D'))
+        return '', ''
+
+    def _run_iget(self, *args):
+        parsed = self._split_options(args, ('-f',))
+        if parsed is None or len(parsed[1]) != 2:
+            return None
+        path, local_path = parsed[1]
+        self.client().get(self._abspath(path), local_path)
+        return '', ''
+
+    def _run_ichksum(self, *args):
+        parsed = self._split_options(args, ('-f',))
+        if parsed is None or len(parsed[1]) != 1:
+            return None
+        options, (path,) = parsed
+        checksum = self.client().checksum(self._abspath(path), force='-f' in options)
+        return "    {}    {}\n".format(os.path.basename(path), checksum), ''
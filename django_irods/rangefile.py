@@ -0,0 +1,128 @@
+"""Byte-range reads of iRODS data objects.
+
+IrodsRangeFile is a read-only, seekable file object over a data object in iRODS that fetches
+only the bytes that are read from it, a block at a time, and keeps the most recently used
+blocks in memory. Libraries that accept file objects can read file headers through it
+without the whole data object being copied out of iRODS first::
+
+    range_file = istorage.open_range('res_id/data/contents/file.nc')
+    if range_file is not None:
+        with range_file:
+            magic = range_file.read(4)
+
+Range reads are served by the pooled session backend (django_irods.pool.PooledSession);
+IrodsStorage.open_range returns None for sessions that can't read byte ranges.
+"""
+
+import io
+from collections import OrderedDict
+
+from django.conf import settings
+
+# size of the blocks in which data objects are fetched and cached
+DEFAULT_BLOCK_SIZE = 64 * 1024
+# number of most recently used blocks kept in memory per file
+DEFAULT_MAX_BLOCKS = 256
+
+
+class IrodsRangeFile(io.RawIOBase):
+    """Read-only, seekable file object that reads a data object in iRODS by byte ranges."""
+
+    def __init__(self, storage, name, size=None, block_size=None, max_blocks=None):
+        """
+        :param storage: IrodsStorage whose session supports range reads
+        :param name: path of the data object
+        :param size: (optional) size of the data object, read from iRODS when not provided
+        :param block_size: (optional) number of bytes fetched from iRODS at a time
+        :param max_blocks: (optional) number of fetched blocks to keep in memory
+        """
+        super(IrodsRangeFile, self).__init__()
+        self.storage = storage
+        self.name = name
+        self.size = storage.size(name) if size is None else size
+        self.block_size = block_size or getattr(settings, 'IRODS_RANGE_READ_BLOCK_SIZE',
+                                                DEFAULT_BLOCK_SIZE)
+        self.max_blocks = max_blocks or getattr(settings, 'IRODS_RANGE_READ_MAX_BLOCKS',
+                                                DEFAULT_MAX_BLOCKS)
+        self._blocks = OrderedDict()
+        self._position = 0
+        # number of bytes read from iRODS and number of range requests made to read them
+        self.bytes_fetched = 0
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError("invalid whence ({})".format(whence))
+        if position < 0:
+            raise ValueError("negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        data = self.read_at(self._position, len(buffer))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def read_at(self, offset, length):
+        """
+        Read bytes at a given offset without moving the file position
+        :param offset: position of the first byte to read
+        :param length: number of bytes to read
+        :return: the bytes read, fewer than length at the end of the data object
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        length = max(0, min(length, self.size - offset))
+        if length == 0:
+            return b''
+        first = offset // self.block_size
+        last = (offset + length - 1) // self.block_size
+        self._fetch([index for index in range(first, last + 1) if index not in self._blocks])
+
+        data = b''.join(self._block(index) for index in range(first, last + 1))
+        while len(self._blocks) > self.max_blocks:
+            # drop the least recently used blocks
+            self._blocks.popitem(last=False)
+        start = offset - first * self.block_size
+        return data[start:start + length]
+
+    def _block(self, index):
+        block = self._blocks.pop(index)
+        self._blocks[index] = block
+        return block
+
+    def _fetch(self, indexes):
+        """fetch missing blocks, reading each run of adjacent blocks with one request"""
+        runs = []
+        for index in indexes:
+            if runs and runs[-1][-1] == index - 1:
+                runs[-1].append(index)
+            else:
+                runs.append([index])
+        for run in runs:
+            offset = run[0] * self.block_size
+            data = self.storage.read_range(self.name, offset, len(run) * self.block_size)
+            self.requests += 1
+            self.bytes_fetched += len(data)
+            for i, index in enumerate(run):
+                self._blocks[index] = data[i * self.block_size:(i + 1) * self.block_size]
+
+    def close(self):
+        self._blocks.clear()
+        super(IrodsRangeFile, self).close()
@@ -13,7 +13,13 @@ from django.core.urlresolvers import reverse
 from django.core.exceptions import ValidationError
 
 from django_irods import icommands
-from .icommands import Session, GLOBAL_SESSION, GLOBAL_ENVIRONMENT, SessionException, IRodsEnv
+from .icommands import GLOBAL_SESSION, GLOBAL_ENVIRONMENT, SessionException, IRodsEnv, \
+    get_session_class
+from .rangefile import IrodsRangeFile
+from .cache import get_object_cache
+
+# separates columns in iquest output; unlike commas it is not expected in file or folder names
+_FIELD_SEPARATOR = '\x1f'
 
 
 @deconstructible
@@ -54,6 +60,17 @@ class IrodsStorage(Storage):
             return qry_str.format(path)
         return qry_str.format(os.path.join(settings.IRODS_HOME_COLLECTION, path))
 
+    @staticmethod
+    def get_absolute_path(path):
+        """
+        Get the logical path of the input path for the HydroShare iRODS data zone
+        :param path: path relative to the iRODS home collection, or an absolute federated path
+        :return: absolute iRODS logical path
+        """
+        if os.path.isabs(path):
+            return path
+        return os.path.join(settings.IRODS_HOME_COLLECTION, path)
+
     def set_user_session(self, username=None, password=None, host=settings.IRODS_HOST,
                          port=settings.IRODS_PORT, def_res=None, zone=settings.IRODS_ZONE,
                          userid=0, sess_id=None):
@@ -70,11 +87,12 @@ class IrodsStorage(Storage):
             auth=password,
             irods_default_hash_scheme='MD5'
         )
+        session_class = get_session_class()
         if sess_id is None:
-            self.session = Session(session_id=uuid4())
+            self.session = session_class(session_id=uuid4())
             self.environment = self.session.create_environment(myEnv=userEnv)
         else:
-            self.session = Session(session_id=sess_id)
+            self.session = session_class(session_id=sess_id)
             if self.session.session_file_exists():
                 self.environment = userEnv
             else:
@@ -105,6 +123,85 @@ class IrodsStorage(Storage):
     def getFile(self, src_name, dest_name):
         self.session.run("iget", None, '-f', src_name, dest_name)
 
+    def open_cached(self, name):
+        """
+        Open a data object for reading through the node-local cache of iRODS data objects (see
+        django_irods.cache), which copies each version of a data object from iRODS only once
+        :param name: the data object path in iRODS
+        :return: a binary file object, which the caller must close
+        """
+        return get_object_cache().open(self, name)
+
+    def get_file_cached(self, src_name, dest_name):
+        """
+        Copy a data object to a local file like getFile, through the node-local cache of iRODS
+        data objects (see open_cached)
+        :param src_name: the data object path in iRODS
+        :param dest_name: path of the local file to write
+        """
+        get_object_cache().copy(self, src_name, dest_name)
+
+    def stream(self, name, chunk_size=1024 * 1024):
+        """
+        Read a data object from iRODS in chunks without staging it on local disk
+        :param name: the data object path in iRODS
+        :param chunk_size: maximum number of bytes of each chunk
+        :return: generator of bytes chunks; SessionException is raised at the end of the
+        stream if the data object cannot be read completely
+        """
+        proc = self.session.run_safe("iget", None, name, '-')
+        try:
+            for chunk in iter(lambda: proc.stdout.read(chunk_size), b''):
+                yield chunk
+            stderr = proc.stderr.read()
+            if proc.wait():
+                raise SessionException(proc.returncode, '', stderr.decode(errors='replace'))
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.stderr.close()
+
+    def read_range(self, name, offset, length):
+        """
+        Read a byte range of a data object from iRODS
+        :param name: the data object path in iRODS
+        :param offset: position of the first byte to read
+        :param length: number of bytes to read
+        :return: the bytes read, fewer than length at the end of the data object
+        """
+        return self.session.read_range(name, offset, length)
+
+    def supports_range_writes(self):
+        """Return True if byte ranges of data objects can be written with write_ranges"""
+        supports_range_writes = getattr(self.session, 'supports_range_writes', None)
+        return supports_range_writes is not None and supports_range_writes()
+
+    def write_ranges(self, name, ranges):
+        """
+        Write byte ranges of a data object in iRODS in place (see supports_range_writes)
+        :param name: the data object path in iRODS
+        :param ranges: list of (offset, bytes) to write; ranges that end past the end of the
+        data object extend it
+        """
+        self.session.write_ranges(name, ranges)
+
+    def open_range(self, name, size=None, block_size=None, max_blocks=None):
+        """
+        Open a data object for reading by byte ranges so that reading parts of it (e.g., file
+        headers) does not copy the whole data object from iRODS
+        :param name: the data object path in iRODS
+        :param size: (optional) size of the data object if already known
+        :param block_size: (optional) number of bytes fetched from iRODS at a time
+        :param max_blocks: (optional) number of fetched blocks to keep in memory
+        :return: a seekable IrodsRangeFile, or None if the session can't read byte ranges
+        """
+        supports_range_reads = getattr(self.session, 'supports_range_reads', None)
+        if supports_range_reads is None or not supports_range_reads():
+            return None
+        return IrodsRangeFile(self, name, size=size, block_size=block_size,
+                              max_blocks=max_blocks)
+
     def runBagitRule(self, rule_name, input_path, input_resource):
         """
         run iRODS bagit rule which generated bag-releated files without bundling
@@ -239,6 +336,19 @@ class IrodsStorage(Storage):
             self.session.run("imv", None, src_name, dest_name)
         return
 
+    def move_many(self, src_names, dest_collection, batch_size=100):
+        """
+        Move many data objects and collections into an existing collection, keeping their
+        names, with one imv call per batch_size names rather than one per name
+        :param src_names: the iRODS data-object or collection names to be moved
+        :param dest_collection: the iRODS collection to move them into; it must exist
+        :param batch_size: the number of names moved by each imv call
+        """
+        src_names = list(src_names)
+        for start in range(0, len(src_names), batch_size):
+            self.session.run("imv", None, *(src_names[start:start + batch_size] +
+                                             [dest_collection]))
+
     def saveFile(self, from_name, to_name, create_directory=False, data_type_str=''):
         """
         Parameters:
@@ -293,6 +403,24 @@ class IrodsStorage(Storage):
     def delete(self, name):
         self.session.run("irm", None, "-rf", name)
 
+    def delete_many(self, names, batch_size=100):
+        """
+        Delete many data objects and collections with one irm call per batch_size names.
+        Names that don't exist (any more) are skipped.
+        :param names: the iRODS data-object or collection names to be deleted
+        :param batch_size: the number of names deleted by each irm call
+        """
+        names = list(names)
+        for start in range(0, len(names), batch_size):
+            batch = names[start:start + batch_size]
+            try:
+                self.session.run("irm", None, "-rf", *batch)
+            except SessionException:
+                # irm fails as a whole if any name doesn't exist; delete the others one by one
+                for name in batch:
+                    if self.exists(name):
+                        self.session.run("irm", None, "-rf", name)
+
     def exists(self, name):
         try:
             stdout = self.session.run("ils", None, name)[0]
@@ -433,6 +561,130 @@ class IrodsStorage(Storage):
             return self.checksum(full_name, force_compute=True)
         return checksum
 
+    def _query_data_objects(self, root):
+        """
+        internal method to read name, size, checksum and modified time of all data objects in
+        the collection subtree rooted at root with a single iquest call
+        :param root: absolute iRODS collection path
+        :return: generator of (collection name, data object name, stat dict) tuples, with the
+        stat dict holding 'size', 'checksum' and 'modified_time' (datetime in UTC timezone).
+        Collections that share the prefix of root are included and must be filtered by callers.
+        """
+        # single quotes can't be passed to iquest, see get_absolute_path_query
+        qrystr = "select COLL_NAME, DATA_NAME, DATA_SIZE, DATA_CHECKSUM, DATA_MODIFY_TIME " \
+                 "where DATA_REPL_STATUS != '0' AND COLL_NAME like '{}%'".format(root.replace("'", "%"))
+        fmt = _FIELD_SEPARATOR.join(["%s"] * 5)
+        stdout = self.session.run("iquest", None, "--no-page", fmt, qrystr)[0].split("\n")
+        for line in stdout:
+            if not line or "CAT_NO_ROWS_FOUND" in line:
+                continue
+            coll_name, data_name, size, checksum, modify_time = line.split(_FIELD_SEPARATOR)
+            yield coll_name, data_name, {
+                'size': int(float(size)),
+                'checksum': checksum.strip(),
+                'modified_time': datetime.fromtimestamp(float(modify_time), pytz.utc)}
+
+    def stat(self, name):
+        """
+        Return size, checksum and last modified time of a data object with a single iquest call
+        :param name: data object name with full collection path
+        :return: dict holding 'size', 'checksum' and 'modified_time' (datetime in UTC timezone)
+        """
+        coll_name, obj_name = self.get_absolute_path(name).rsplit('/', 1)
+        qrystr = "select DATA_SIZE, DATA_CHECKSUM, DATA_MODIFY_TIME where " \
+                 "DATA_REPL_STATUS != '0' AND {} AND DATA_NAME = '{}'".format(
+                     IrodsStorage.get_absolute_path_query(coll_name), obj_name)
+        fmt = _FIELD_SEPARATOR.join(["%s"] * 3)
+        stdout = self.session.run("iquest", None, fmt, qrystr)[0]
+        if "CAT_NO_ROWS_FOUND" in stdout:
+            raise ValidationError("{} cannot be found in iRODS".format(name))
+        # replicas of the data object give a line each
+        size, checksum, modify_time = stdout.split("\n", 1)[0].split(_FIELD_SEPARATOR)
+        return {'size': int(float(size)),
+                'checksum': checksum.strip(),
+                'modified_time': datetime.fromtimestamp(float(modify_time), pytz.utc)}
+
+    def stat_many(self, paths, compute_checksums=False):
+        """
+        Return size, checksum and last modified time of many data objects with a single iquest
+        call over the smallest collection subtree that holds all of them
+        :param paths: data object names with full collection paths, e.g., ResourceFile.storage_path
+        :param compute_checksums: compute checksums that have not been computed in iRODS yet
+        :return: dict keyed by input path with dict values holding 'size', 'checksum' and
+        'modified_time' (datetime in UTC timezone); paths not found in iRODS are left out
+        """
+        paths = [p for p in paths if p]
+        if not paths:
+            return {}
+        abs_paths = dict((self.get_absolute_path(p), p) for p in paths)
+        if len(abs_paths) == 1:
+            root = os.path.dirname(next(iter(abs_paths)))
+        else:
+            root = os.path.commonpath([os.path.dirname(p) for p in abs_paths])
+
+        stats = {}
+        for coll_name, data_name, stat in self._query_data_objects(root):
+            path = abs_paths.get(coll_name + '/' + data_name)
+            if path is not None and path not in stats:
+                stats[path] = stat
+
+        if compute_checksums:
+            for path, stat in stats.items():
+                if not stat['checksum']:
+                    stat['checksum'] = self.checksum(path, force_compute=True)
+        return stats
+
+    def walk(self, path):
+        """
+        Return all sub-collections and data objects under a collection, at any depth, with one
+        query for collections and one for data objects regardless of how deep the tree is
+        :param path: iRODS collection/directory path
+        :return: (folder_list, file_list) where folder_list holds the paths of all
+        sub-collections and file_list holds a dict for each data object with keys 'path',
+        'size', 'checksum' and 'modified_time'. Paths are joined to the input path, parents
+        are listed before their children. Data objects with several replicas are listed once.
+        """
+        path = path.strip()
+        while path.endswith('/'):
+            path = path[:-1]
+        root = self.get_absolute_path(path)
+
+        # a single LIKE query both checks that path is a collection and lists all sub-collections
+        qrystr = "select COLL_NAME where COLL_NAME like '{}%'".format(root.replace("'", "%"))
+        stdout = self.session.run("iquest", None, "--no-page", "%s", qrystr)[0].split("\n")
+        colls = [c for c in stdout if c and "CAT_NO_ROWS_FOUND" not in c]
+        if root not in colls:
+            raise SessionException(-1, '', 'folder {} does not exist'.format(path))
+        folder_list = sorted(path + c[len(root):] for c in colls if c.startswith(root + '/'))
+
+        files = {}
+        for coll_name, data_name, stat in self._query_data_objects(root):
+            if coll_name != root and not coll_name.startswith(root + '/'):
+                continue
+            stat['path'] = path + coll_name[len(root):] + '/' + data_name
+            # replicas of a data object give a row each
+            files.setdefault(stat['path'], stat)
+        file_list = sorted(files.values(), key=lambda f: f['path'])
+        return folder_list, file_list
+
+    def sizes(self, paths):
+        """
+        Return the sizes of many data objects with a single iquest call
+        :param paths: data object names with full collection paths
+        :return: dict of sizes keyed by input path; paths not found in iRODS are left out
+        """
+        return dict((path, stat['size']) for path, stat in self.stat_many(paths).items())
+
+    def checksums(self, paths):
+        """
+        Return the checksums of many data objects with a single iquest call, computing only
+        those checksums that have not been computed in iRODS yet
+        :param paths: data object names with full collection paths
+        :return: dict of checksums keyed by input path; paths not found in iRODS are left out
+        """
+        stats = self.stat_many(paths, compute_checksums=True)
+        return dict((path, stat['checksum']) for path, stat in stats.items())
+
     def url(self, name, url_download=False, zipped=False, aggregation=False):
         reverse_url = reverse('django_irods_download', kwargs={'path': name})
         query_params = {'url_download': url_download, "zipped": zipped, 'aggregation': aggregation}
@@ -0,0 +1,289 @@
+"""Test utilities for django_irods.
+
+FakeIrodsServer is an in-memory iRODS zone that speaks the client interface used by
+django_irods.pool.PooledSession, so that IrodsStorage can be exercised without an iRODS
+server or icommands installed::
+
+    server = FakeIrodsServer()
+    istorage = get_fake_irods_storage(server, session_root)
+"""
+
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime
+
+import pytz
+from django.conf import settings
+
+from .icommands import IRodsEnv
+from .pool import ClientError, ConnectionPool, NotFound, PooledSession
+from .storage import IrodsStorage
+
+
+class FakeDataObject(object):
+    def __init__(self, data, data_type=''):
+        self.data = data
+        self.data_type = data_type
+        self.checksum = ''
+        self.modified = datetime.now(pytz.utc).replace(microsecond=0)
+
+
+def _like_to_regex(pattern):
+    """convert a GenQuery LIKE pattern into an anchored regular expression"""
+    regex = ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern)
+    return re.compile('^' + regex + '$', re.DOTALL)
+
+
+def _match(value, op, operand):
+    if op in ('like', 'not like'):
+        matched = _like_to_regex(operand).match(str(value)) is not None
+        return matched if op == 'like' else not matched
+    if isinstance(value, (int, datetime)):
+        if isinstance(value, datetime):
+            value = int((value - datetime(1970, 1, 1, tzinfo=pytz.utc)).total_seconds())
+        operand = int(float(operand))
+    else:
+        value = str(value)
+    return {'=': value == operand,
+            '!=': value != operand,
+            '<>': value != operand,
+            '<': value < operand,
+            '>': value > operand,
+            '<=': value <= operand,
+            '>=': value >= operand}[op]
+
+
+class FakeIrodsServer(object):
+    """In-memory iRODS catalog and storage shared by all clients connected to it."""
+
+    def __init__(self, zone='hydroshareZone'):
+        self.zone = zone
+        self.collections = set(['/', '/' + zone, '/{}/home'.format(zone)])
+        self.data_objects = {}
+        self.avus = {}
+        # number of clients (connections) handed out, for pooling assertions
+        self.connections = 0
+        # number of requests served, for round trip assertions
+        self.requests = 0
+
+    def client(self, env=None, password=None):
+        """client factory compatible with PooledSession(client_factory=...)"""
+        self.connections += 1
+        return FakeIrodsClient(self)
+
+
+class FakeIrodsClient(object):
+    """Serves the IrodsClient interface from a FakeIrodsServer."""
+
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def _request(self):
+        if self.closed:
+            raise ClientError('connection is closed')
+        self.server.requests += 1
+
+    def _rows(self, data_rows):
+        server = self.server
+        if data_rows:
+            for path, obj in server.data_objects.items():
+                coll, name = path.rsplit('/', 1)
+                yield {'COLL_NAME': coll or '/',
+                       'COLL_PARENT_NAME': os.path.dirname(coll) or '/',
+                       'DATA_NAME': name,
+                       'DATA_SIZE': len(obj.data),
+                       'DATA_CHECKSUM': obj.checksum,
+                       'DATA_MODIFY_TIME': obj.modified,
+                       'DATA_TYPE_NAME': obj.data_type,
+                       'DATA_REPL_STATUS': 1}
+        else:
+            for coll in server.collections:
+                yield {'COLL_NAME': coll,
+                       'COLL_PARENT_NAME': os.path.dirname(coll) if coll != '/' else ''}
+
+    def query(self, columns, conditions):
+        self._request()
+        keys = list(columns) + [col for col, _, _ in conditions]
+        data_rows = any(key.startswith('DATA_') for key in keys)
+        results = OrderedDict()
+        for row in self._rows(data_rows):
+            try:
+                if all(_match(row[col], op, val) for col, op, val in conditions):
+                    results[tuple(row[col] for col in columns)] = None
+            except KeyError as e:
+                raise ClientError("unknown query column {}".format(e))
+        return sorted(results.keys(), key=lambda r: [str(v) for v in r])
+
+    def is_collection(self, path):
+        self._request()
+        return path.rstrip('/') in self.server.collections or path == '/'
+
+    def exists(self, path):
+        return self.is_collection(path) or path in self.server.data_objects
+
+    def mkdir(self, path):
+        self._request()
+        path = path.rstrip('/')
+        while path and path not in self.server.collections:
+            if path in self.server.data_objects:
+                raise ClientError("{} is a data object".format(path))
+            self.server.collections.add(path)
+            path = os.path.dirname(path)
+
+    def _check_parent(self, path):
+        if os.path.dirname(path) not in self.server.collections:
+            raise NotFound("collection {} does not exist".format(os.path.dirname(path)))
+
+    def _subtree(self, path):
+        prefix = path.rstrip('/') + '/'
+        colls = [c for c in self.server.collections if c == path or c.startswith(prefix)]
+        objs = [o for o in self.server.data_objects if o.startswith(prefix)]
+        return colls, objs
+
+    def remove(self, path):
+        self._request()
+        path = path.rstrip('/')
+        if path in self.server.data_objects:
+            del self.server.data_objects[path]
+        elif path in self.server.collections:
+            colls, objs = self._subtree(path)
+            for coll in colls:
+                self.server.collections.discard(coll)
+                self.server.avus.pop(coll, None)
+            for obj in objs:
+                del self.server.data_objects[obj]
+        else:
+            raise NotFound("{} does not exist".format(path))
+
+    def move(self, src, dest):
+        self._request()
+        src, dest = src.rstrip('/'), dest.rstrip('/')
+        if dest in self.server.collections:
+            dest = os.path.join(dest, os.path.basename(src))
+        self._check_parent(dest)
+        if src in self.server.data_objects:
+            self.server.data_objects[dest] = self.server.data_objects.pop(src)
+        elif src in self.server.collections:
+            colls, objs = self._subtree(src)
+            for coll in colls:
+                self.server.collections.discard(coll)
+                self.server.collections.add(dest + coll[len(src):])
+                if coll in self.server.avus:
+                    self.server.avus[dest + coll[len(src):]] = self.server.avus.pop(coll)
+            for obj in objs:
+                self.server.data_objects[dest + obj[len(src):]] = self.server.data_objects.pop(obj)
+        else:
+            raise NotFound("{} does not exist".format(src))
+
+    def copy(self, src, dest, resource=None):
+        self._request()
+        if src not in self.server.data_objects:
+            raise NotFound("{} does not exist".format(src))
+        self._check_parent(dest)
+        obj = self.server.data_objects[src]
+        self.server.data_objects[dest] = FakeDataObject(obj.data, obj.data_type)
+
+    def put(self, local_path, path, data_type=None):
+        self._request()
+        self._check_parent(path)
+        with open(local_path, 'rb') as f:
+            self.server.data_objects[path] = FakeDataObject(f.read(), data_type or '')
+
+    def get(self, path, local_path):
+        self._request()
+        if path not in self.server.data_objects:
+            raise NotFound("{} does not exist".format(path))
+        with open(local_path, 'wb') as f:
+            f.write(self.server.data_objects[path].data)
+
+    def read(self, path, offset, length):
+        self._request()
+        if path not in self.server.data_objects:
+            raise NotFound("{} does not exist".format(path))
+        return self.server.data_objects[path].data[offset:offset + length]
+
+    def write(self, path, ranges):
+        self._request()
+        if path not in self.server.data_objects:
+            raise NotFound("{} does not exist".format(path))
+        obj = self.server.data_objects[path]
+        data = bytearray(obj.data)
+        for offset, chunk in ranges:
+            if offset > len(data):
+                data.extend(b'\x00' * (offset - len(data)))
+            data[offset:offset + len(chunk)] = chunk
+        obj.data = bytes(data)
+        obj.checksum = ''
+        obj.modified = datetime.now(pytz.utc).replace(microsecond=0)
+
+    def checksum(self, path, force=False):
+        self._request()
+        if path not in self.server.data_objects:
+            raise NotFound("{} does not exist".format(path))
+        obj = self.server.data_objects[path]
+        if force or not obj.checksum:
+            obj.checksum = hashlib.md5(obj.data).hexdigest()
+        return obj.checksum
+
+    def get_avu(self, path, name):
+        self._request()
+        if path not in self.server.collections:
+            raise NotFound("collection {} does not exist".format(path))
+        return self.server.avus.get(path, {}).get(name)
+
+    def set_avu(self, path, name, value, units=None):
+        self._request()
+        if path not in self.server.collections:
+            raise NotFound("collection {} does not exist".format(path))
+        self.server.avus.setdefault(path, {})[name] = (value, units)
+
+    def remove_avu(self, path, name, value):
+        self._request()
+        avus = self.server.avus.get(path, {})
+        if name in avus and avus[name][0] == value:
+            del avus[name]
+
+
+def make_fake_icommands(directory):
+    """
+    Write stand-ins for the icommands that are not run over the pool into directory: iinit
+    stores its argument as the credentials of the session and ienv prints them
+    :param directory: local directory to use as the icommands path of sessions
+    """
+    os.makedirs(directory, exist_ok=True)
+    for icommand, script in (('iinit', 'printf %s "$1" > "$IRODS_AUTHENTICATION_FILE"'),
+                             ('ienv', 'cat "$IRODS_AUTHENTICATION_FILE"')):
+        script_path = os.path.join(directory, icommand)
+        with open(script_path, 'w') as f:
+            f.write('#!/bin/sh\n' + script + '\n')
+        os.chmod(script_path, 0o755)
+    return directory
+
+
+def get_fake_irods_storage(server, session_root):
+    """
+    Return an IrodsStorage whose session is served by server
+    :param server: FakeIrodsServer
+    :param session_root: local directory in which to keep the session environment file
+    """
+    env = IRodsEnv(pk=-1, host='data.local.org', port=1247, def_res='hydroshareReplResc',
+                   home_coll=settings.IRODS_HOME_COLLECTION, cwd=settings.IRODS_HOME_COLLECTION,
+                   username='wwwHydroProxy', zone=server.zone, auth='wwwHydroProxy',
+                   irods_default_hash_scheme='MD5')
+    icommands_path = make_fake_icommands(os.path.join(session_root, 'icommands'))
+    session = PooledSession(root=session_root, icommands_path=icommands_path,
+                            client_factory=server.client, pool=ConnectionPool())
+    session.create_environment(env)
+    session.run('iinit', None, env.auth)
+    FakeIrodsClient(server).mkdir(settings.IRODS_HOME_COLLECTION)
+
+    istorage = IrodsStorage()
+    istorage.session = session
+    istorage.environment = env
+    return istorage
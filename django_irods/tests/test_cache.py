@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+
+from django_irods.cache import IrodsObjectCache
+from django_irods.testing import FakeIrodsServer, get_fake_irods_storage
+
+
+class TestIrodsObjectCache(SimpleTestCase):
+
+    def setUp(self):
+        super(TestIrodsObjectCache, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeIrodsServer()
+        self.istorage = get_fake_irods_storage(self.server, self.tmp_dir)
+        self.cache = IrodsObjectCache(os.path.join(self.tmp_dir, 'cache'), max_size=1000,
+                                      max_object_size=400)
+        self.copies = []
+        get_file = self.istorage.getFile
+
+        def count_copies(src_name, dest_name):
+            self.copies.append(src_name)
+            get_file(src_name, dest_name)
+        self.istorage.getFile = count_copies
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestIrodsObjectCache, self).tearDown()
+
+    def _save(self, path, content):
+        local_file = os.path.join(self.tmp_dir, os.path.basename(path))
+        with open(local_file, 'w') as f:
+            f.write(content)
+        self.istorage.saveFile(local_file, path, create_directory=True)
+
+    def _read(self, path):
+        with self.cache.open(self.istorage, path) as f:
+            return f.read().decode()
+
+    def test_hits_and_versions(self):
+        self._save('res1/data/contents/readme.md', 'first')
+        self.istorage.checksum('res1/data/contents/readme.md')
+        self.assertEqual(self._read('res1/data/contents/readme.md'), 'first')
+        self.assertEqual(self._read('res1/data/contents/readme.md'), 'first')
+        self.assertEqual(self.copies, ['res1/data/contents/readme.md'])
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+        # a changed data object is copied again, replacing the entry of the old version
+        self.istorage.write_ranges('res1/data/contents/readme.md', [(0, b'FIRST')])
+        self.assertEqual(self._read('res1/data/contents/readme.md'), 'FIRST')
+        self.assertEqual(len(self.copies), 2)
+        self.assertEqual(self.cache.usage(), (1, 5))
+
+        # copies are checked against the iRODS checksum and are not cached if they don't match
+        self.istorage.checksum('res1/data/contents/readme.md')
+        self.server.data_objects[self.istorage.get_absolute_path(
+            'res1/data/contents/readme.md')].checksum = 'sha2:bm90IHRoZSBjaGVja3N1bQ=='
+        self.assertEqual(self._read('res1/data/contents/readme.md'), 'FIRST')
+        self.assertEqual(self.cache.stats()['checksum_mismatches'], 1)
+
+        local_copy = os.path.join(self.tmp_dir, 'copy.md')
+        self._save('res1/data/contents/large.txt', 'x' * 500)
+        self.cache.copy(self.istorage, 'res1/data/contents/large.txt', local_copy)
+        with open(local_copy) as f:
+            self.assertEqual(f.read(), 'x' * 500)
+        self.assertEqual(self.cache.stats()['bypasses'], 1)
+        self.assertEqual(self.cache.usage(), (1, 5))
+
+    def test_stale_checksum(self):
+        """ a data object whose checksum was not recomputed when it changed is copied again """
+        self._save('res1/data/contents/readme.md', 'first')
+        checksum = self.istorage.checksum('res1/data/contents/readme.md')
+        self.assertEqual(self._read('res1/data/contents/readme.md'), 'first')
+
+        self.istorage.write_ranges('res1/data/contents/readme.md', [(5, b' and second')])
+        self.server.data_objects[self.istorage.get_absolute_path(
+            'res1/data/contents/readme.md')].checksum = checksum
+        # the copy doesn't match the stale checksum, so it is read from iRODS uncached
+        self.assertEqual(self._read('res1/data/contents/readme.md'), 'first and second')
+        self.assertEqual(self.cache.stats()['checksum_mismatches'], 1)
+        self.assertEqual(self.cache.stats()['hits'], 0)
+
+    def test_eviction(self):
+        for i in range(5):
+            self._save('res1/data/contents/{}.txt'.format(i), str(i) * 300)
+        for i in range(3):
+            self._read('res1/data/contents/{}.txt'.format(i))
+        # reading 0.txt again makes 1.txt the least recently read entry
+        entry = self.cache.get(self.istorage, 'res1/data/contents/0.txt')
+        os.utime(entry, (1, 1))
+        for i in range(1, 3):
+            entry = self.cache.get(self.istorage, 'res1/data/contents/{}.txt'.format(i))
+            os.utime(entry, (i + 1, i + 1))
+        self._read('res1/data/contents/0.txt')
+        self._read('res1/data/contents/3.txt')
+        # the cache is trimmed to 90% of its size
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertEqual(self.cache.usage(), (3, 900))
+        # the lock file of the evicted entry is removed with it
+        lock_files = [name for _, _, names in os.walk(self.cache.root) for name in names
+                      if name.endswith('.lock')]
+        self.assertEqual(len(lock_files), 3)
+        copies = len(self.copies)
+        for i in (0, 2, 3):
+            self._read('res1/data/contents/{}.txt'.format(i))
+        self.assertEqual(len(self.copies), copies)
+        self._read('res1/data/contents/1.txt')
+        self.assertEqual(len(self.copies), copies + 1)
+
+    def test_concurrent_reads(self):
+        self._save('res1/data/contents/data.csv', 'a,b\n1,2\n')
+        contents = []
+
+        def read():
+            contents.append(self._read('res1/data/contents/data.csv'))
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(contents, ['a,b\n1,2\n'] * 8)
+        self.assertEqual(self.copies, ['res1/data/contents/data.csv'])
@@ -0,0 +1,186 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+from mock import patch
+
+from django_irods.icommands import IRodsEnv, Session, SessionException
+from django_irods.pool import ConnectionPool, PooledSession, parse_genquery
+from django_irods.storage import IrodsStorage
+from django_irods.testing import FakeIrodsServer, make_fake_icommands
+
+
+class TestPooledSession(SimpleTestCase):
+
+    def setUp(self):
+        super(TestPooledSession, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.icommands_path = make_fake_icommands(os.path.join(self.tmp_dir, 'icommands'))
+        self.server = FakeIrodsServer()
+        self.pool = ConnectionPool()
+        self.env = IRodsEnv(pk=-1, host='data.local.org', port=1247, def_res='hydroshareReplResc',
+                            home_coll=settings.IRODS_HOME_COLLECTION,
+                            cwd=settings.IRODS_HOME_COLLECTION, username='wwwHydroProxy',
+                            zone='hydroshareZone', auth='secret', irods_default_hash_scheme='MD5')
+        self.session = self._new_session()
+        self.server.collections.add(settings.IRODS_HOME_COLLECTION)
+        self.storage = IrodsStorage()
+        self.storage.session = self.session
+        self.storage.environment = self.env
+
+        self.local_file = os.path.join(self.tmp_dir, 'test.txt')
+        with open(self.local_file, 'w') as f:
+            f.write('hello pooled irods')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestPooledSession, self).tearDown()
+
+    def _new_session(self):
+        session = PooledSession(root=self.tmp_dir, icommands_path=self.icommands_path,
+                                client_factory=self.server.client, pool=self.pool)
+        session.create_environment(self.env)
+        session.run('iinit', None, self.env.auth)
+        return session
+
+    def test_parse_genquery(self):
+        self.assertEqual(parse_genquery("select DATA_NAME, DATA_SIZE where DATA_REPL_STATUS != '0' "
+                                        "AND COLL_NAME = '/zone/a and b'"),
+                         (['DATA_NAME', 'DATA_SIZE'],
+                          [('DATA_REPL_STATUS', '!=', '0'), ('COLL_NAME', '=', '/zone/a and b')]))
+        self.assertEqual(parse_genquery("SELECT COLL_NAME WHERE COLL_PARENT_NAME like '/zone/%'"),
+                         (['COLL_NAME'], [('COLL_PARENT_NAME', 'like', '/zone/%')]))
+        # unsupported constructs are left to iquest
+        self.assertIsNone(parse_genquery("select count(DATA_ID) where COLL_NAME = '/zone'"))
+        self.assertIsNone(parse_genquery("select DATA_NAME where COLL_NAME in ('/a', '/b')"))
+
+    def test_storage_operations(self):
+        self.storage.saveFile(self.local_file, 'res1/data/contents/test.txt', create_directory=True)
+        self.assertTrue(self.storage.exists('res1/data/contents/test.txt'))
+        self.assertFalse(self.storage.exists('res1/data/contents/missing.txt'))
+        self.assertEqual(self.storage.size('res1/data/contents/test.txt'), 18)
+        self.assertEqual(self.storage.listdir('res1/data'), (['contents'], [], []))
+        self.assertEqual(self.storage.listdir('res1/data/contents'), ([], ['test.txt'], ['18']))
+        self.assertEqual(len(self.storage.checksum('res1/data/contents/test.txt')), 32)
+        self.assertIsNotNone(self.storage.get_modified_time('res1/data/contents/test.txt'))
+
+        self.storage.moveFile('res1/data/contents/test.txt', 'res1/data/contents/sub/moved.txt')
+        self.assertFalse(self.storage.exists('res1/data/contents/test.txt'))
+        self.assertTrue(self.storage.exists('res1/data/contents/sub/moved.txt'))
+
+        downloaded = os.path.join(self.tmp_dir, 'downloaded.txt')
+        self.storage.getFile('res1/data/contents/sub/moved.txt', downloaded)
+        with open(downloaded) as f:
+            self.assertEqual(f.read(), 'hello pooled irods')
+
+        self.storage.delete('res1')
+        self.assertFalse(self.storage.exists('res1'))
+        with self.assertRaises(SessionException):
+            self.storage.listdir('res1/data')
+        with self.assertRaises(ValidationError):
+            self.storage.size('res1/data/contents/sub/moved.txt')
+
+    def test_move_many_and_delete_many(self):
+        for name in ('a.txt', 'b.txt', 'sub/c.txt'):
+            self.storage.saveFile(self.local_file, 'res1/data/contents/' + name,
+                                  create_directory=True)
+        self.storage.saveFile('', 'res1/data/contents/dest/', create_directory=True)
+
+        self.storage.move_many(['res1/data/contents/a.txt', 'res1/data/contents/b.txt',
+                                'res1/data/contents/sub'], 'res1/data/contents/dest',
+                               batch_size=2)
+        folders, files = self.storage.walk('res1/data/contents')
+        self.assertEqual(folders, ['res1/data/contents/dest', 'res1/data/contents/dest/sub'])
+        self.assertEqual([f['path'] for f in files],
+                         ['res1/data/contents/dest/a.txt', 'res1/data/contents/dest/b.txt',
+                          'res1/data/contents/dest/sub/c.txt'])
+
+        self.storage.delete_many(['res1/data/contents/dest/a.txt',
+                                  'res1/data/contents/dest/sub'])
+        folders, files = self.storage.walk('res1/data/contents')
+        self.assertEqual(folders, ['res1/data/contents/dest'])
+        self.assertEqual([f['path'] for f in files], ['res1/data/contents/dest/b.txt'])
+
+        # names that don't exist any more are skipped
+        self.storage.delete_many(['res1/data/contents/dest/a.txt',
+                                  'res1/data/contents/dest/b.txt'])
+        self.assertEqual(self.storage.walk('res1/data/contents')[1], [])
+
+    def test_avus(self):
+        self.storage.saveFile('', 'res1/', create_directory=True)
+        self.assertIsNone(self.storage.getAVU('res1', 'bag_modified'))
+        self.storage.setAVU('res1', 'bag_modified', 'true')
+        self.assertEqual(self.storage.getAVU('res1', 'bag_modified'), 'true')
+        self.storage.setAVU('res1', 'bag_modified', 'false')
+        self.assertEqual(self.storage.getAVU('res1', 'bag_modified'), 'false')
+
+    def test_connections_are_pooled(self):
+        other_session = self._new_session()
+        for session in (self.session, other_session):
+            session.run('imkdir', None, '-p', 'res1/data')
+            session.run('ils', None, 'res1/data')
+        # sessions for the same user and zone share one connection
+        self.assertEqual(self.server.connections, 1)
+
+        # a forked worker does not reuse the parent's connections
+        with patch('django_irods.pool.os.getpid', return_value=-1):
+            self.session.run('ils', None, 'res1/data')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_unsupported_commands_fall_back_to_icommands(self):
+        with patch.object(Session, 'run', return_value=('out', '')) as icommand:
+            self.assertEqual(self.session.run('iticket', None, 'ls', 'abc'), ('out', ''))
+            icommand.assert_called_once_with('iticket', None, 'ls', 'abc')
+
+            self.session.run('ils', None, '-l', 'res1')
+            icommand.assert_called_with('ils', None, '-l', 'res1')
+
+    def test_icommands_are_authenticated(self):
+        # iinit authenticates the pooled connections and the icommands run as subprocesses
+        self.assertEqual(self.session.run('ienv', None), ('secret', ''))
+        self.session.run('iinit', None, 'changed')
+        self.assertEqual(self.session.run('ienv', None), ('changed', ''))
+
+    def test_range_reads(self):
+        with open(self.local_file, 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        self.storage.saveFile(self.local_file, 'res1/data/contents/test.bin',
+                              create_directory=True)
+
+        range_file = self.storage.open_range('res1/data/contents/test.bin', block_size=64,
+                                             max_blocks=8)
+        self.assertEqual(range_file.size, 1024)
+        self.assertEqual(range_file.read(4), bytes(range(4)))
+        range_file.seek(-2, io.SEEK_END)
+        self.assertEqual(range_file.read(10), bytes([254, 255]))
+        self.assertEqual(range_file.read(10), b'')
+        # a read spanning several blocks fetches the missing adjacent blocks with one request
+        self.assertEqual(range_file.read_at(100, 200), (bytes(range(256)) * 2)[100:300])
+        self.assertEqual(range_file.requests, 3)
+        # only the blocks read are fetched and recently used blocks are cached
+        self.assertEqual(range_file.read_at(0, 4), bytes(range(4)))
+        self.assertEqual(range_file.requests, 3)
+        self.assertEqual(range_file.bytes_fetched, 6 * 64)
+        range_file.close()
+
+        # sessions that can't read byte ranges fall back to copying whole files
+        with patch.object(PooledSession, 'supports_range_reads', return_value=False):
+            self.assertIsNone(self.storage.open_range('res1/data/contents/test.bin'))
+
+    def test_range_writes(self):
+        with open(self.local_file, 'wb') as f:
+            f.write(bytes(range(256)))
+        self.storage.saveFile(self.local_file, 'res1/data/contents/test.bin',
+                              create_directory=True)
+        self.assertTrue(self.storage.supports_range_writes())
+        self.storage.write_ranges('res1/data/contents/test.bin',
+                                  [(0, b'ab'), (100, b'cd'), (258, b'ef')])
+        data = self.storage.read_range('res1/data/contents/test.bin', 0, 1024)
+        self.assertEqual(data, b'ab' + bytes(range(2, 100)) + b'cd' + bytes(range(102, 256)) +
+                         b'\x00\x00ef')
+        with self.assertRaises(SessionException):
+            self.storage.write_ranges('res1/data/contents/missing.bin', [(0, b'ab')])
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+from mock import patch
+
+from django_irods.icommands import SessionException
+from django_irods.testing import FakeIrodsServer, get_fake_irods_storage
+
+
+class TestIrodsStorageBulkQueries(SimpleTestCase):
+
+    def setUp(self):
+        super(TestIrodsStorageBulkQueries, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeIrodsServer()
+        self.istorage = get_fake_irods_storage(self.server, self.tmp_dir)
+        self.paths = ['res1/data/contents/a.txt',
+                      'res1/data/contents/folder/b.txt',
+                      'res1/data/contents/folder/sub/c.txt']
+        for i, path in enumerate(self.paths):
+            self._save(path, 'x' * (i + 1))
+        # a sibling collection sharing the prefix of the queried subtree
+        self._save('res1/data/contents2/a.txt', 'sibling')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestIrodsStorageBulkQueries, self).tearDown()
+
+    def _save(self, path, content):
+        local_file = os.path.join(self.tmp_dir, os.path.basename(path))
+        with open(local_file, 'w') as f:
+            f.write(content)
+        self.istorage.saveFile(local_file, path, create_directory=True)
+
+    def test_stat_many_is_one_query(self):
+        requests = self.server.requests
+        stats = self.istorage.stat_many(self.paths + ['res1/data/contents/missing.txt'])
+        self.assertEqual(self.server.requests - requests, 1)
+        self.assertEqual(sorted(stats.keys()), sorted(self.paths))
+        for path, stat in stats.items():
+            self.assertEqual(stat['size'], self.istorage.size(path))
+            self.assertEqual(stat['modified_time'], self.istorage.get_modified_time(path))
+            # checksums are not computed unless asked for
+            self.assertEqual(stat['checksum'], '')
+
+    def test_stat(self):
+        self.istorage.checksum(self.paths[1])
+        self.assertEqual(self.istorage.stat(self.paths[1]),
+                         self.istorage.stat_many([self.paths[1]])[self.paths[1]])
+        self.assertTrue(self.istorage.stat(self.paths[1])['checksum'])
+        with self.assertRaises(ValidationError):
+            self.istorage.stat('res1/data/contents/missing.txt')
+
+    def test_sizes_and_checksums(self):
+        self.assertEqual(self.istorage.sizes(self.paths),
+                         dict((path, i + 1) for i, path in enumerate(self.paths)))
+        checksums = self.istorage.checksums(self.paths)
+        for path in self.paths:
+            self.assertEqual(checksums[path], self.istorage.checksum(path, force_compute=False))
+
+    def test_absolute_paths(self):
+        abs_path = os.path.join(settings.IRODS_HOME_COLLECTION, self.paths[1])
+        self.assertEqual(self.istorage.sizes([abs_path]), {abs_path: 2})
+        self.assertEqual(self.istorage.stat_many([]), {})
+
+    def test_walk(self):
+        self.istorage.saveFile('', 'res1/data/contents/empty/', create_directory=True)
+        requests = self.server.requests
+        folders, files = self.istorage.walk('res1/data/contents/')
+        # one query for collections and one for data objects, however deep the tree
+        self.assertEqual(self.server.requests - requests, 2)
+        self.assertEqual(folders, ['res1/data/contents/empty',
+                                   'res1/data/contents/folder',
+                                   'res1/data/contents/folder/sub'])
+        self.assertEqual([f['path'] for f in files], self.paths)
+        self.assertEqual([f['size'] for f in files], [1, 2, 3])
+
+        self.assertEqual(self.istorage.walk('res1/data/contents/empty'), ([], []))
+
+        # replicas of a data object give a row each but the data object is listed once
+        query_data_objects = self.istorage._query_data_objects
+
+        def with_replicas(root):
+            for coll_name, data_name, stat in query_data_objects(root):
+                yield coll_name, data_name, stat
+                yield coll_name, data_name, dict(stat)
+        with patch.object(self.istorage, '_query_data_objects', with_replicas):
+            self.assertEqual([f['path'] for f in self.istorage.walk('res1/data/contents')[1]],
+                             self.paths)
+        with self.assertRaises(SessionException):
+            self.istorage.walk('res1/data/missing')
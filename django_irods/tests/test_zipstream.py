@@ -0,0 +1,66 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.test import SimpleTestCase
+from mock import patch
+
+from django_irods.testing import FakeIrodsServer, get_fake_irods_storage
+from django_irods.zipstream import ZipMember, zip_stream
+
+
+class TestZipStream(SimpleTestCase):
+
+    def setUp(self):
+        super(TestZipStream, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeIrodsServer()
+        self.istorage = get_fake_irods_storage(self.server, self.tmp_dir)
+        self.contents = {'res1/data/contents/folder/a.txt': b'a' * 3000,
+                         'res1/data/contents/folder/sub/b.zip': os.urandom(5000),
+                         'res1/data/contents/folder/empty.txt': b''}
+        for path, content in self.contents.items():
+            local_file = os.path.join(self.tmp_dir, 'upload')
+            with open(local_file, 'wb') as f:
+                f.write(content)
+            self.istorage.saveFile(local_file, path, create_directory=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestZipStream, self).tearDown()
+
+    def _stream(self, path, chunk_size):
+        """serve data objects of the fake iRODS server in chunks like IrodsStorage.stream"""
+        data = self.server.data_objects[self.istorage.get_absolute_path(path)].data
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
+
+    def test_zip_stream(self):
+        _, files = self.istorage.walk('res1/data/contents/folder')
+        members = [ZipMember(os.path.relpath(f['path'], 'res1/data/contents'), f['path'],
+                             f['size'], f['modified_time']) for f in files]
+        with patch.object(self.istorage, 'stream', side_effect=self._stream):
+            chunks = list(zip_stream(self.istorage, members, chunk_size=1000))
+        # the archive is sent in pieces as the members are read
+        self.assertGreater(len(chunks), len(members))
+        self.assertLessEqual(max(len(chunk) for chunk in chunks), 6000)
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(sorted(zf.namelist()), ['folder/a.txt', 'folder/empty.txt',
+                                                     'folder/sub/b.zip'])
+            for path, content in self.contents.items():
+                self.assertEqual(zf.read(os.path.relpath(path, 'res1/data/contents')), content)
+            # compressed content is stored rather than deflated again
+            self.assertEqual(zf.getinfo('folder/sub/b.zip').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.getinfo('folder/a.txt').compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_zip_stream_without_sizes(self):
+        # members of unknown size are written with ZIP64 extensions
+        members = [ZipMember('a.txt', 'res1/data/contents/folder/a.txt')]
+        with patch.object(self.istorage, 'stream', side_effect=self._stream):
+            data = b''.join(zip_stream(self.istorage, members))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertEqual(zf.read('a.txt'), b'a' * 3000)
@@ -7,11 +7,13 @@ from celery.result import AsyncResult
 
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse, FileResponse, HttpResponseRedirect, JsonResponse
+from django.http import HttpResponse, FileResponse, HttpResponseRedirect, JsonResponse, \
+    StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework import status
 
 from django_irods import icommands
+from django_irods.zipstream import ZipMember, zip_stream
 from hs_core.hydroshare import check_resource_type
 from hs_core.hydroshare.hs_bagit import create_bag_files
 from hs_core.task_utils import get_resource_bag_task
@@ -173,6 +175,11 @@ def download(request, path, rest_call=False, use_async=True, use_reverse_proxy=T
 
     if is_zip_request:
 
+        if getattr(settings, 'IRODS_STREAM_ZIP_DOWNLOADS', False) and not rest_call:
+            # build the zip on the fly instead of creating it in iRODS first; REST API clients
+            # are answered with the task to poll, as documented
+            return _stream_zip(res, irods_path, output_path, aggregation_name, is_sf_request)
+
         if use_async:
             task = create_temp_zip.apply_async((res_id, irods_path, irods_output_path,
                                                 aggregation_name, is_sf_request))
@@ -352,6 +359,77 @@ def download(request, path, rest_call=False, use_async=True, use_reverse_proxy=T
     return response
 
 
+def _get_zip_members(res, istorage, input_path, aggregation=None, sf_zip=False):
+    """
+    Return the files to be zipped for a download, laid out in the zip file the same way as
+    create_temp_zip() lays them out
+    :param res: the resource the files belong to
+    :param istorage: IrodsStorage object of the resource
+    :param input_path: full irods path of the file or folder to zip starting with federation path
+    :param aggregation: the aggregation to zip along with its metadata files
+    :param sf_zip: signals a single file to zip
+    :return: list of ZipMember
+    """
+    if aggregation or sf_zip:
+        # foo.zip holds foo/foo together with the aggregation files and metadata
+        folder = os.path.basename(input_path)
+        paths = [(os.path.join(folder, folder), input_path)]
+        if aggregation:
+            paths.append((None, aggregation.map_file_path))
+            paths.append((None, aggregation.metadata_file_path))
+            paths.extend((None, f.storage_path) for f in aggregation.files.all())
+        stats = istorage.stat_many([path for _, path in paths])
+        members = []
+        arcnames = set()
+        for arcname, path in paths:
+            arcname = arcname or os.path.join(folder, os.path.basename(path))
+            if path not in stats:
+                logger.error("cannot zip {}".format(path))
+            elif arcname not in arcnames:
+                arcnames.add(arcname)
+                members.append(ZipMember(arcname, path, stats[path]['size'],
+                                         stats[path]['modified_time']))
+        return members
+
+    # regular folder to zip; paths in the zip file start with the folder name
+    parent = os.path.dirname(input_path)
+    _, files = istorage.walk(input_path)
+    return [ZipMember(os.path.relpath(f['path'], parent), f['path'], f['size'],
+                      f['modified_time']) for f in files]
+
+
+def _stream_zip(res, input_path, output_path, aggregation_name=None, sf_zip=False):
+    """
+    Stream a zip file of a file, folder or aggregation that is built while it is being sent,
+    without creating it in iRODS
+    :param res: the resource to download from
+    :param input_path: full irods path of input starting with federation path
+    :param output_path: public path of the zip file; its name is used for the download
+    :param aggregation_name: The name of the aggregation to zip
+    :param sf_zip: signals a single file to zip
+    """
+    aggregation = None
+    if aggregation_name:
+        aggregation = res.get_aggregation_by_aggregation_name(aggregation_name)
+    istorage = res.get_irods_storage()
+
+    if res.resource_type == "CompositeResource":
+        if '/data/contents/' in input_path:
+            short_path = input_path.split('/data/contents/')[1]  # strip /data/contents/
+            res.create_aggregation_xml_documents(path=short_path)
+        else:  # all metadata included, e.g., /data/*
+            res.create_aggregation_xml_documents()
+
+    members = _get_zip_members(res, istorage, input_path, aggregation, sf_zip)
+    # track download count
+    res.update_download_count()
+    response = StreamingHttpResponse(zip_stream(istorage, members),
+                                     content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="{name}"'.format(
+        name=output_path.split('/')[-1])
+    return response
+
+
 @swagger_auto_schema(method='get', auto_schema=None)
 @api_view(['GET'])
 def rest_download(request, path, *args, **kwargs):
@@ -362,7 +440,8 @@ def rest_download(request, path, *args, **kwargs):
 def check_task_status(request, task_id=None, *args, **kwargs):
     '''
     A view function to tell the client if the asynchronous create_bag_by_irods()
-    task is done and the bag file is ready for download.
+    task is done and the bag file is ready for download. While a task that reports its
+    progress is running, the progress it last reported is returned as well.
     Args:
         request: an ajax request to check for download status
     Returns:
@@ -381,6 +460,8 @@ def check_task_status(request, task_id=None, *args, **kwargs):
             # logging exception will log the full stack trace and prepend a line with the message str input argument
             logger.exception('An exception is raised from task {}'.format(task_id))
             return JsonResponse({"status": 'false'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    elif result.state == 'PROGRESS':
+        return JsonResponse({"status": None, 'progress': result.info})
     else:
         return JsonResponse({"status": None})
 
@@ -0,0 +1,95 @@
+"""Build zip archives of iRODS data objects on the fly.
+
+zip_stream() yields the bytes of a zip archive while the archive members are read from iRODS,
+so that a download can be sent to the client with a StreamingHttpResponse without first
+materializing the zip file in iRODS or on local disk. Memory use is bounded by the size of the
+chunks read from iRODS. Members are written with data descriptors (sizes and CRC follow the
+member data) and ZIP64 extensions where needed, so that no seeking is required.
+"""
+
+import os
+import zipfile
+from datetime import datetime
+
+# members with these extensions are already compressed and are stored rather than deflated
+STORED_EXTENSIONS = ('.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.jpg', '.jpeg',
+                     '.png', '.gif', '.mp3', '.mp4', '.avi', '.mov')
+
+
+class ZipMember(object):
+    """A data object to be added to a streamed zip archive."""
+
+    def __init__(self, arcname, path, size=None, modified_time=None):
+        """
+        :param arcname: name of the member in the zip archive
+        :param path: the data object path in iRODS
+        :param size: size of the data object if known; used to decide whether the member
+        needs ZIP64 extensions
+        :param modified_time: datetime the data object was last modified, if known
+        """
+        self.arcname = arcname
+        self.path = path
+        self.size = size
+        self.modified_time = modified_time
+
+    @property
+    def zip_info(self):
+        modified_time = self.modified_time or datetime.now()
+        zinfo = zipfile.ZipInfo(self.arcname, date_time=modified_time.timetuple()[:6])
+        if os.path.splitext(self.arcname)[1].lower() in STORED_EXTENSIONS:
+            zinfo.compress_type = zipfile.ZIP_STORED
+        else:
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.external_attr = 0o644 << 16
+        if self.size is not None:
+            zinfo.file_size = self.size
+        return zinfo
+
+
+class _StreamBuffer(object):
+    """
+    Write-only, unseekable file object for zipfile.ZipFile to write to; what has been written
+    is taken out with pop() to be yielded to the client
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_stream(istorage, members, chunk_size=1024 * 1024):
+    """
+    Generate a zip archive of iRODS data objects
+    :param istorage: IrodsStorage object to read the data objects with
+    :param members: iterable of ZipMember
+    :param chunk_size: maximum number of bytes read from iRODS at a time
+    :return: generator of bytes chunks of the zip archive
+    """
+    buf = _StreamBuffer()
+    with zipfile.ZipFile(buf, 'w', allowZip64=True) as zf:
+        for member in members:
+            zinfo = member.zip_info
+            with zf.open(zinfo, 'w', force_zip64=member.size is None) as dest:
+                for chunk in istorage.stream(member.path, chunk_size=chunk_size):
+                    dest.write(chunk)
+                    data = buf.pop()
+                    if data:
+                        yield data
+            yield buf.pop()
+    yield buf.pop()
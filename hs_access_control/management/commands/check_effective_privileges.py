@@ -0,0 +1,116 @@
+"""
+This checks the EffectiveResourcePrivilege table against the privilege tables.
+
+For each user, the resources viewable and editable according to the table are compared with
+those selected by the query expressions over user, group and community privileges that the
+table replaces, and the recorded privileges are compared with freshly computed ones.
+
+* Optional arguments: usernames of users to check (default: all users).
+* Optional argument --fix: recompute the privileges of users with discrepancies.
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from hs_core.models import BaseResource
+from hs_access_control.models import PrivilegeCodes, EffectiveResourcePrivilege
+
+
+def legacy_view_resources(user):
+    """ resources viewable by user according to the privilege tables """
+    return set(BaseResource.objects.filter(
+        # direct access
+        Q(r2urp__user=user) |
+        # access via a group
+        Q(r2grp__group__gaccess__active=True,
+          r2grp__group__g2ugp__user=user) |
+        # access via an unprivileged peer group in a community
+        Q(r2grp__group__gaccess__active=True,
+          r2grp__group__g2gcp__community__c2gcp__group__gaccess__active=True,
+          r2grp__group__g2gcp__community__c2gcp__group__g2ugp__user=user))
+        .values_list('id', flat=True))
+
+
+def legacy_edit_resources(user):
+    """ resources editable by user according to the privilege tables """
+    return set(BaseResource.objects.filter(
+        # user has direct access
+        Q(raccess__immutable=False,
+          r2urp__user=user,
+          r2urp__privilege__lte=PrivilegeCodes.CHANGE) |
+        # user has direct access through being a member of a group
+        Q(raccess__immutable=False,
+          r2grp__group__gaccess__active=True,
+          r2grp__group__g2ugp__user=user,
+          r2grp__privilege=PrivilegeCodes.CHANGE))
+        .values_list('id', flat=True))
+
+
+def check_user(user):
+    """
+    Check the effective privileges of a user
+
+    :param user: User to check
+    :return: list of descriptions of discrepancies
+    """
+    problems = []
+    recorded = dict(EffectiveResourcePrivilege.objects.filter(user=user)
+                    .values_list('resource_id', 'privilege'))
+    editable = set(BaseResource.objects.filter(raccess__immutable=False,
+                                               r2erp__user=user,
+                                               r2erp__privilege__lte=PrivilegeCodes.CHANGE)
+                   .values_list('id', flat=True))
+
+    view = legacy_view_resources(user)
+    for resource_id in sorted(view - set(recorded)):
+        problems.append("resource {} is viewable but not recorded".format(resource_id))
+    for resource_id in sorted(set(recorded) - view):
+        problems.append("resource {} is recorded but not viewable".format(resource_id))
+
+    edit = legacy_edit_resources(user)
+    for resource_id in sorted(edit - editable):
+        problems.append("resource {} is editable but not recorded as such".format(resource_id))
+    for resource_id in sorted(editable - edit):
+        problems.append("resource {} is recorded as editable but not editable"
+                        .format(resource_id))
+
+    computed = {resource_id: privilege for (_, resource_id), privilege
+                in EffectiveResourcePrivilege.compute(users=[user.id]).items()}
+    for resource_id in sorted(set(recorded) & set(computed)):
+        if recorded[resource_id] != computed[resource_id]:
+            problems.append("resource {} is recorded with privilege {} rather than {}"
+                            .format(resource_id,
+                                    PrivilegeCodes.NAMES[recorded[resource_id]],
+                                    PrivilegeCodes.NAMES[computed[resource_id]]))
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Check effective resource privileges against the privilege tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', type=str)
+        parser.add_argument('--fix', action='store_true', dest='fix', default=False,
+                            help='recompute the privileges of users with discrepancies')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        checked = 0
+        inconsistent = 0
+        for user in users.order_by('id').iterator():
+            checked += 1
+            problems = check_user(user)
+            if problems:
+                inconsistent += 1
+                print("user {} (id={}):".format(user.username, user.id))
+                for problem in problems:
+                    print("  {}".format(problem))
+                if options['fix']:
+                    EffectiveResourcePrivilege.refresh(users=[user.id])
+                    print("  fixed")
+
+        print("{} users checked, {} inconsistent".format(checked, inconsistent))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# privilege codes at the time of this migration
+VIEW = 3
+NONE = 4
+
+
+def populate_effective_privileges(apps, schema_editor):
+    """
+    Compute the effective privilege of every user over every resource
+
+    This mirrors EffectiveResourcePrivilege.compute, which is not available to historical models.
+    """
+    UserResourcePrivilege = apps.get_model("hs_access_control", "UserResourcePrivilege")
+    GroupResourcePrivilege = apps.get_model("hs_access_control", "GroupResourcePrivilege")
+    EffectiveResourcePrivilege = apps.get_model("hs_access_control",
+                                                "EffectiveResourcePrivilege")
+
+    privileges = {}
+
+    def combine(user_id, resource_id, privilege):
+        if user_id is not None:
+            key = (user_id, resource_id)
+            privileges[key] = min(privilege, privileges.get(key, NONE))
+
+    for user_id, resource_id, privilege in UserResourcePrivilege.objects\
+            .values_list('user_id', 'resource_id', 'privilege'):
+        combine(user_id, resource_id, privilege)
+    for user_id, resource_id, privilege in GroupResourcePrivilege.objects\
+            .filter(group__gaccess__active=True)\
+            .values_list('group__g2ugp__user_id', 'resource_id', 'privilege'):
+        combine(user_id, resource_id, privilege)
+    for user_id, resource_id in GroupResourcePrivilege.objects\
+            .filter(group__gaccess__active=True,
+                    group__g2gcp__community__c2gcp__group__gaccess__active=True)\
+            .values_list('group__g2gcp__community__c2gcp__group__g2ugp__user_id', 'resource_id'):
+        combine(user_id, resource_id, VIEW)
+
+    EffectiveResourcePrivilege.objects.bulk_create(
+        [EffectiveResourcePrivilege(user_id=user_id, resource_id=resource_id,
+                                    privilege=privilege)
+         for (user_id, resource_id), privilege in privileges.items()],
+        batch_size=10000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hs_access_control', '0027_groupmembershiprequest_redeemed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveResourcePrivilege',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('privilege', models.IntegerField(choices=[(1, 'Owner'), (2, 'Change'), (3, 'View')], default=3, editable=False)),
+                ('resource', models.ForeignKey(editable=False, help_text='resource to which privilege applies', on_delete=django.db.models.deletion.CASCADE, related_name='r2erp', to='hs_core.BaseResource')),
+                ('user', models.ForeignKey(editable=False, help_text='user holding privilege', on_delete=django.db.models.deletion.CASCADE, related_name='u2erp', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='effectiveresourceprivilege',
+            unique_together=set([('user', 'resource')]),
+        ),
+        migrations.RunPython(populate_effective_privileges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,221 @@
+from django.contrib.auth.models import User, Group
+from django.db import models
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import pre_delete, post_delete
+from django.dispatch import receiver
+
+from hs_core.models import BaseResource
+from hs_access_control.models.privilege import PrivilegeCodes, UserResourcePrivilege, \
+    GroupResourcePrivilege, UserGroupPrivilege, GroupCommunityPrivilege
+from hs_access_control.models.community import Community
+
+#############################################
+# Effective privilege of users over resources
+#
+# This denormalizes the privilege a user holds over a resource through any combination of
+# user, group and community sharing, so that resource access checks are single indexed
+# lookups rather than joins across the privilege tables. It is maintained incrementally
+# by PrivilegeBase.update, which every share, unshare and undo_share goes through, and by
+# changes of group activity and deletion of groups and communities.
+#############################################
+
+
+class EffectiveResourcePrivilege(models.Model):
+    """
+    Combined privilege of a user over a resource
+
+    The privilege is the highest (numerically lowest) of
+
+        * the privilege of the user over the resource (UserResourcePrivilege),
+        * the privilege over the resource of an active group of which the user is a member
+          (GroupResourcePrivilege and UserGroupPrivilege),
+        * VIEW if the resource is shared with an active group that is in a community with an
+          active group of which the user is a member (GroupCommunityPrivilege).
+
+    This is declared privilege: resource flags such as 'immutable' are not accounted for
+    and must be checked when reading. There is no record for PrivilegeCodes.NONE.
+
+    **This is a system table** that is only to be updated through refresh().
+    """
+
+    privilege = models.IntegerField(choices=PrivilegeCodes.CHOICES,
+                                    editable=False,
+                                    default=PrivilegeCodes.VIEW)
+
+    user = models.ForeignKey(User,
+                             null=False,
+                             editable=False,
+                             related_name='u2erp',
+                             help_text='user holding privilege')
+
+    resource = models.ForeignKey(BaseResource,
+                                 null=False,
+                                 editable=False,
+                                 related_name='r2erp',
+                                 help_text='resource to which privilege applies')
+
+    class Meta:
+        unique_together = ('user', 'resource')
+
+    def __str__(self):
+        """ Return printed depiction for debugging """
+        return str.format("<user '{}' (id={}) effectively holds {} ({})" +
+                          " over resource '{}' (id={})>",
+                          str(self.user.username), str(self.user.id),
+                          PrivilegeCodes.NAMES[self.privilege],
+                          str(self.privilege),
+                          str(self.resource.title),
+                          str(self.resource.short_id))
+
+    @classmethod
+    def compute(cls, users=None, resources=None):
+        """
+        Compute effective privileges from the privilege tables
+
+        :param users: ids of users to compute privileges for; None for all users
+        :param resources: ids of resources to compute privileges for; None for all resources
+        :return: dict of privilege keyed by (user id, resource id)
+        """
+        privileges = {}
+
+        def combine(user_id, resource_id, privilege):
+            if user_id is not None:
+                key = (user_id, resource_id)
+                privileges[key] = min(privilege, privileges.get(key, PrivilegeCodes.NONE))
+
+        # conditions over multi-valued relations must be given in a single filter() call to
+        # apply to the same related records
+        user_filter = {}
+        group_filter = {'group__gaccess__active': True}
+        community_filter = {'group__gaccess__active': True,
+                            'group__g2gcp__community__c2gcp__group__gaccess__active': True}
+        if users is not None:
+            user_filter['user__in'] = users
+            group_filter['group__g2ugp__user__in'] = users
+            community_filter['group__g2gcp__community__c2gcp__group__g2ugp__user__in'] = users
+        if resources is not None:
+            for query_filter in (user_filter, group_filter, community_filter):
+                query_filter['resource__in'] = resources
+        user_privileges = UserResourcePrivilege.objects.filter(**user_filter)
+        group_privileges = GroupResourcePrivilege.objects.filter(**group_filter)
+        community_privileges = GroupResourcePrivilege.objects.filter(**community_filter)
+
+        for user_id, resource_id, privilege in \
+                user_privileges.values_list('user_id', 'resource_id', 'privilege'):
+            combine(user_id, resource_id, privilege)
+        for user_id, resource_id, privilege in \
+                group_privileges.values_list('group__g2ugp__user_id', 'resource_id',
+                                             'privilege'):
+            combine(user_id, resource_id, privilege)
+        for user_id, resource_id in community_privileges.values_list(
+                'group__g2gcp__community__c2gcp__group__g2ugp__user_id', 'resource_id'):
+            combine(user_id, resource_id, PrivilegeCodes.VIEW)
+        return privileges
+
+    @classmethod
+    def refresh(cls, users=None, resources=None):
+        """
+        Recompute the effective privileges of users over resources
+
+        :param users: ids of users whose privileges may have changed; None for all users
+        :param resources: ids of resources over which privileges may have changed; None for
+            all resources
+
+        All pairs of the given users and resources are recomputed.
+        """
+        if users is not None:
+            users = list(set(users))
+            if not users:
+                return
+        if resources is not None:
+            resources = list(set(resources))
+            if not resources:
+                return
+        with transaction.atomic():
+            records = cls.objects.all()
+            if users is not None:
+                records = records.filter(user__in=users)
+            if resources is not None:
+                records = records.filter(resource__in=resources)
+            records.delete()
+            cls.objects.bulk_create([cls(user_id=user_id, resource_id=resource_id,
+                                         privilege=privilege)
+                                     for (user_id, resource_id), privilege
+                                     in cls.compute(users, resources).items()])
+
+    @staticmethod
+    def get_peer_groups(groups):
+        """
+        Get ids of the given groups and of all groups sharing a community with them
+
+        :param groups: ids of groups
+        :return: list of group ids
+        """
+        return list(Group.objects.filter(Q(id__in=groups) |
+                                         Q(g2gcp__community__c2gcp__group__in=groups))
+                    .values_list('id', flat=True).distinct())
+
+    @staticmethod
+    def get_group_members(groups):
+        """ Get ids of users who are members of the given groups """
+        return list(UserGroupPrivilege.objects.filter(group__in=groups)
+                    .values_list('user_id', flat=True).distinct())
+
+    @staticmethod
+    def get_group_resources(groups):
+        """ Get ids of resources shared with the given groups """
+        return list(GroupResourcePrivilege.objects.filter(group__in=groups)
+                    .values_list('resource_id', flat=True).distinct())
+
+    @classmethod
+    def get_group_scope(cls, groups):
+        """
+        Get the users and resources whose effective privileges depend upon the given groups,
+        i.e., members and resources of the groups and of their community peers.
+
+        :param groups: ids of groups
+        :return: (list of user ids, list of resource ids)
+        """
+        peers = cls.get_peer_groups(groups)
+        return cls.get_group_members(peers), cls.get_group_resources(peers)
+
+    @classmethod
+    def refresh_groups(cls, groups):
+        """ Recompute the effective privileges that depend upon the given groups """
+        users, resources = cls.get_group_scope(groups)
+        cls.refresh(users, resources)
+
+
+#############################################
+# Deletion of groups and communities cascades to privileges without going through
+# PrivilegeBase.update, so the effective privileges that depend upon them are recomputed
+# once the deletion is complete.
+#############################################
+
+
+@receiver(pre_delete, sender=Group)
+def _group_pre_delete(sender, instance, **kwargs):
+    instance._effective_privilege_scope = \
+        EffectiveResourcePrivilege.get_group_scope([instance.id])
+
+
+@receiver(post_delete, sender=Group)
+def _group_post_delete(sender, instance, **kwargs):
+    scope = getattr(instance, '_effective_privilege_scope', None)
+    if scope is not None:
+        EffectiveResourcePrivilege.refresh(*scope)
+
+
+@receiver(pre_delete, sender=Community)
+def _community_pre_delete(sender, instance, **kwargs):
+    groups = GroupCommunityPrivilege.objects.filter(community=instance)\
+        .values_list('group_id', flat=True)
+    instance._effective_privilege_scope = EffectiveResourcePrivilege.get_group_scope(groups)
+
+
+@receiver(post_delete, sender=Community)
+def _community_post_delete(sender, instance, **kwargs):
+    scope = getattr(instance, '_effective_privilege_scope', None)
+    if scope is not None:
+        EffectiveResourcePrivilege.refresh(*scope)
@@ -81,6 +81,19 @@ class GroupAccess(models.Model):
     date_created = models.DateTimeField(editable=False, auto_now_add=True)
     picture = models.ImageField(upload_to='group', null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        """
+        Save the group profile, recomputing effective resource privileges if the group has
+        been activated or deactivated.
+        """
+        # prevent import loops
+        from hs_access_control.models.effective import EffectiveResourcePrivilege
+        active_changed = self.pk is not None and \
+            GroupAccess.objects.filter(pk=self.pk).exclude(active=self.active).exists()
+        super(GroupAccess, self).save(*args, **kwargs)
+        if active_changed:
+            EffectiveResourcePrivilege.refresh_groups([self.group.id])
+
     ####################################
     # group membership: owners, edit_users, view_users are parallel to those in resources
     ####################################
@@ -110,13 +110,17 @@ class PrivilegeBase(models.Model):
         Only use this routine if you wish to completely bypass access control.
         Note also that using this routine directly breaks provenance and disables undo.
         """
+        # prevent import loops
+        from hs_access_control.models.effective import EffectiveResourcePrivilege
         grantor = kwargs['grantor']
         privilege = kwargs.get('privilege', None)
-        if privilege is not None and privilege < PrivilegeCodes.NONE:
-            if 'privilege' in kwargs:
-                del kwargs['privilege']
-            del kwargs['grantor']
-            with transaction.atomic():
+        if 'privilege' in kwargs:
+            del kwargs['privilege']
+        del kwargs['grantor']
+        with transaction.atomic():
+            # determined before the change, as the change may remove users or resources from it
+            scope = cls.get_effective_privilege_scope(**kwargs)
+            if privilege is not None and privilege < PrivilegeCodes.NONE:
                 record, create = cls.objects.get_or_create(defaults={'privilege': privilege,
                                                                      'grantor': grantor},
                                                            **kwargs)
@@ -124,12 +128,24 @@ class PrivilegeBase(models.Model):
                     record.privilege = privilege
                     record.grantor = grantor
                     record.save()
-        else:
-            if 'privilege' in kwargs:
-                del kwargs['privilege']
-            del kwargs['grantor']
-            cls.objects.filter(**kwargs) \
-               .delete()
+            else:
+                cls.objects.filter(**kwargs) \
+                   .delete()
+            if scope is not None:
+                EffectiveResourcePrivilege.refresh(*scope)
+
+    @classmethod
+    def get_effective_privilege_scope(cls, **kwargs):
+        """
+        Get the users and resources whose effective privileges depend upon a privilege record
+
+        :param kwargs: the pair of attributes that together form the key of the record
+        :return: (list of user ids, list of resource ids) to recompute in
+            EffectiveResourcePrivilege, or None if the record does not affect them.
+
+        **This is a system routine** and not recommended for use in application code.
+        """
+        return None
 
     @classmethod
     def share(cls, **kwargs):
@@ -228,6 +244,17 @@ class UserGroupPrivilege(PrivilegeBase):
                           str(self.group.name), str(self.group.id),
                           str(self.grantor.username), str(self.grantor.id))
 
+    @classmethod
+    def get_effective_privilege_scope(cls, **kwargs):
+        """
+        Group membership affects the effective privileges of the user over the resources of
+        the group and of its community peers.
+        """
+        # prevent import loops
+        from hs_access_control.models.effective import EffectiveResourcePrivilege
+        peers = EffectiveResourcePrivilege.get_peer_groups([kwargs['group'].id])
+        return [kwargs['user'].id], EffectiveResourcePrivilege.get_group_resources(peers)
+
     @classmethod
     def share(cls, **kwargs):
         """
@@ -407,6 +434,11 @@ class UserResourcePrivilege(PrivilegeBase):
                           str(self.resource.short_id),
                           str(self.grantor.username), str(self.grantor.id))
 
+    @classmethod
+    def get_effective_privilege_scope(cls, **kwargs):
+        """ Only the effective privilege of the user over the resource is affected. """
+        return [kwargs['user'].id], [kwargs['resource'].id]
+
     @classmethod
     def share(cls, **kwargs):
         """
@@ -573,6 +605,17 @@ class GroupResourcePrivilege(PrivilegeBase):
                           str(self.resource.short_id),
                           str(self.grantor.username), str(self.grantor.id))
 
+    @classmethod
+    def get_effective_privilege_scope(cls, **kwargs):
+        """
+        Group privilege affects the effective privileges over the resource of the members of
+        the group and of its community peers.
+        """
+        # prevent import loops
+        from hs_access_control.models.effective import EffectiveResourcePrivilege
+        peers = EffectiveResourcePrivilege.get_peer_groups([kwargs['group'].id])
+        return EffectiveResourcePrivilege.get_group_members(peers), [kwargs['resource'].id]
+
     @classmethod
     def share(cls, **kwargs):
         """
@@ -904,6 +947,20 @@ class GroupCommunityPrivilege(PrivilegeBase):
                           str(self.group.name), str(self.group.id),
                           str(self.grantor.username), str(self.grantor.id))
 
+    @classmethod
+    def get_effective_privilege_scope(cls, **kwargs):
+        """
+        Community membership of a group affects the effective privileges of the members of
+        the groups of the community over the resources of these groups.
+        """
+        # prevent import loops
+        from hs_access_control.models.effective import EffectiveResourcePrivilege
+        groups = [kwargs['group'].id] + \
+            list(GroupCommunityPrivilege.objects.filter(community=kwargs['community'])
+                 .values_list('group_id', flat=True))
+        return (EffectiveResourcePrivilege.get_group_members(groups),
+                EffectiveResourcePrivilege.get_group_resources(groups))
+
     @classmethod
     def share(cls, **kwargs):
         """
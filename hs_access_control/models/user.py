@@ -10,6 +10,7 @@ from hs_access_control.models.privilege import PrivilegeCodes, \
 from hs_access_control.models.group import GroupAccess, GroupMembershipRequest
 from hs_access_control.models.exceptions import PolymorphismError
 from hs_access_control.models.community import Community
+from hs_access_control.models.effective import EffectiveResourcePrivilege
 
 #############################################
 # Methods and data for users
@@ -1077,16 +1078,9 @@ class UserAccess(models.Model):
         if not self.user.is_active:
             raise PermissionDenied("Requesting user is not active")
 
-        return BaseResource.objects.filter(
-            # direct access
-            Q(r2urp__user=self.user) |
-            # access via a group
-            Q(r2grp__group__gaccess__active=True,
-              r2grp__group__g2ugp__user=self.user) |
-            # access via an unprivileged peer group in a community
-            Q(r2grp__group__gaccess__active=True,
-              r2grp__group__g2gcp__community__c2gcp__group__gaccess__active=True,
-              r2grp__group__g2gcp__community__c2gcp__group__g2ugp__user=self.user)).distinct()
+        # EffectiveResourcePrivilege combines direct access, access via a group,
+        # and access via an unprivileged peer group in a community
+        return BaseResource.objects.filter(r2erp__user=self.user)
 
     @property
     def owned_resources(self):
@@ -1119,24 +1113,15 @@ class UserAccess(models.Model):
         if not self.user.is_active:
             raise PermissionDenied("Requesting user is not active")
 
-        # This is a mouthful.
         # a resource is editable if
         # 1. it's shared with the user and editable.
         # 2. it's shared with a group that has edit privilege and contains the user,
-        # 3. it's shared with a group that has edit privilege and a community that
-        #    contains the user, and the community share preserves edit
-
-        return BaseResource.objects.filter(
-            # user has direct access
-            Q(raccess__immutable=False,
-              r2urp__user=self.user,
-              r2urp__privilege__lte=PrivilegeCodes.CHANGE) |
-            # user has direct access through being a member of a group
-            Q(raccess__immutable=False,
-              r2grp__group__gaccess__active=True,
-              r2grp__group__g2ugp__user=self.user,
-              r2grp__privilege=PrivilegeCodes.CHANGE))\
-            .distinct()
+        # Community sharing only grants view privilege. Both are combined in
+        # EffectiveResourcePrivilege, which does not account for immutability.
+
+        return BaseResource.objects.filter(raccess__immutable=False,
+                                           r2erp__user=self.user,
+                                           r2erp__privilege__lte=PrivilegeCodes.CHANGE)
 
     def get_resources_with_explicit_access(self, this_privilege,
                                            via_user=True, via_group=False, via_community=False):
@@ -1422,7 +1407,8 @@ class UserAccess(models.Model):
         if access_resource.public or self.user.is_superuser:
             return True
 
-        if self.view_resources.filter(id=this_resource.id).exists():
+        if EffectiveResourcePrivilege.objects.filter(user=self.user,
+                                                     resource=this_resource).exists():
             return True
 
         return False
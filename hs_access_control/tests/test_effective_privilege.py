@@ -0,0 +1,143 @@
+from django.test import TestCase
+from django.contrib.auth.models import Group
+
+from hs_access_control.management.commands.check_effective_privileges import check_user
+from hs_access_control.models import PrivilegeCodes, EffectiveResourcePrivilege
+from hs_access_control.tests.utilities import global_reset
+from hs_core import hydroshare
+from hs_core.testing import MockIRODSTestCaseMixin
+
+
+class TestEffectivePrivilege(MockIRODSTestCaseMixin, TestCase):
+
+    def setUp(self):
+        super(TestEffectivePrivilege, self).setUp()
+        global_reset()
+        self.group, _ = Group.objects.get_or_create(name='Hydroshare Author')
+
+        self.dog = hydroshare.create_account(
+            'dog@gmail.com',
+            username='dog',
+            first_name='a little arfer',
+            last_name='last_name_dog',
+            superuser=False,
+            groups=[]
+        )
+
+        self.cat = hydroshare.create_account(
+            'cat@gmail.com',
+            username='cat',
+            first_name='not a dog',
+            last_name='last_name_cat',
+            superuser=False,
+            groups=[]
+        )
+
+        self.bat = hydroshare.create_account(
+            'bat@gmail.com',
+            username='bat',
+            first_name='a little batty',
+            last_name='last_name_bat',
+            superuser=False,
+            groups=[]
+        )
+
+        self.dogs = self.dog.uaccess.create_group(
+            title='dogs', description="We are the dogs")
+        self.cats = self.cat.uaccess.create_group(
+            title='cats', description="We are the cats")
+        self.cat.uaccess.share_group_with_user(self.cats, self.bat, PrivilegeCodes.VIEW)
+        # dog can share cats with a community
+        self.cat.uaccess.share_group_with_user(self.cats, self.dog, PrivilegeCodes.OWNER)
+
+        self.holes = hydroshare.create_resource(
+            resource_type='GenericResource',
+            owner=self.dog,
+            title='all about dog holes',
+            metadata=[],
+        )
+
+        self.pets = self.dog.uaccess.create_community(
+            'all kinds of pets',
+            'collaboration on how to be a better pet.')
+
+    def assertConsistent(self):
+        for user in (self.dog, self.cat, self.bat):
+            self.assertEqual(check_user(user), [])
+
+    def privilege(self, user, resource):
+        record = EffectiveResourcePrivilege.objects.filter(user=user, resource=resource).first()
+        return record.privilege if record is not None else PrivilegeCodes.NONE
+
+    def test_user_sharing(self):
+        self.assertEqual(self.privilege(self.dog, self.holes), PrivilegeCodes.OWNER)
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.NONE)
+
+        self.dog.uaccess.share_resource_with_user(self.holes, self.cat, PrivilegeCodes.CHANGE)
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.CHANGE)
+        self.assertTrue(self.cat.uaccess.can_view_resource(self.holes))
+        self.assertConsistent()
+
+        self.dog.uaccess.undo_share_resource_with_user(self.holes, self.cat)
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.NONE)
+        self.assertFalse(self.cat.uaccess.can_view_resource(self.holes))
+        self.assertConsistent()
+
+    def test_group_sharing(self):
+        self.dog.uaccess.share_resource_with_group(self.holes, self.dogs, PrivilegeCodes.CHANGE)
+        self.dog.uaccess.share_group_with_user(self.dogs, self.cat, PrivilegeCodes.VIEW)
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.CHANGE)
+        self.assertTrue(self.holes in self.cat.uaccess.edit_resources)
+        self.assertConsistent()
+
+        # immutability is accounted for when reading
+        self.holes.raccess.immutable = True
+        self.holes.raccess.save()
+        self.assertFalse(self.holes in self.cat.uaccess.edit_resources)
+        self.assertTrue(self.holes in self.cat.uaccess.view_resources)
+        self.assertConsistent()
+
+        self.dogs.gaccess.active = False
+        self.dogs.gaccess.save()
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.NONE)
+        self.assertConsistent()
+
+        self.dogs.gaccess.active = True
+        self.dogs.gaccess.save()
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.CHANGE)
+
+        self.dog.uaccess.unshare_group_with_user(self.dogs, self.cat)
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.NONE)
+        self.assertConsistent()
+
+    def test_community_sharing(self):
+        self.dog.uaccess.share_resource_with_group(self.holes, self.dogs, PrivilegeCodes.CHANGE)
+        self.dog.uaccess.share_community_with_group(self.pets, self.dogs, PrivilegeCodes.VIEW)
+        self.assertEqual(self.privilege(self.bat, self.holes), PrivilegeCodes.NONE)
+
+        self.dog.uaccess.share_community_with_group(self.pets, self.cats, PrivilegeCodes.VIEW)
+        # community members can view but not edit
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.VIEW)
+        self.assertEqual(self.privilege(self.bat, self.holes), PrivilegeCodes.VIEW)
+        self.assertTrue(self.bat.uaccess.can_view_resource(self.holes))
+        self.assertFalse(self.holes in self.bat.uaccess.edit_resources)
+        self.assertConsistent()
+
+        self.dog.uaccess.unshare_community_with_group(self.pets, self.cats)
+        self.assertEqual(self.privilege(self.bat, self.holes), PrivilegeCodes.NONE)
+        self.assertConsistent()
+
+        self.dog.uaccess.share_community_with_group(self.pets, self.cats, PrivilegeCodes.VIEW)
+        self.pets.delete()
+        self.assertEqual(self.privilege(self.bat, self.holes), PrivilegeCodes.NONE)
+        self.assertConsistent()
+
+    def test_group_deletion(self):
+        self.dog.uaccess.share_resource_with_group(self.holes, self.dogs, PrivilegeCodes.VIEW)
+        self.dog.uaccess.share_group_with_user(self.dogs, self.cat, PrivilegeCodes.VIEW)
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.VIEW)
+
+        self.dog.uaccess.delete_group(self.dogs)
+        self.assertEqual(self.privilege(self.cat, self.holes), PrivilegeCodes.NONE)
+        self.assertEqual(self.privilege(self.dog, self.holes), PrivilegeCodes.OWNER)
+        self.assertConsistent()
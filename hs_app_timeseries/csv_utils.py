@@ -0,0 +1,216 @@
+"""
+Reading of time series csv files a chunk of rows at a time. The timestamp format of a file is
+inferred from a sample of its rows; ISO 8601 timestamps are then parsed a whole chunk at a time by
+numpy and other timestamps with that format, and data values are converted to numbers a whole
+chunk at a time. Only values that don't fit the inferred format are parsed with dateutil, so large
+files are validated and converted to ODM2 SQLite without parsing every value in Python.
+"""
+
+import csv
+import itertools
+from datetime import datetime
+
+import numpy
+from dateutil import parser
+from django.conf import settings
+
+# number of data rows read, validated and inserted at a time
+DEFAULT_CHUNK_SIZE = 50000
+# number of timestamps from which the timestamp format of a file is inferred
+SAMPLE_SIZE = 100
+
+# formats tried in order on a sample of timestamps; the first that parses the whole sample is used
+# for the file. ISO 8601 formats come with the length of the timestamps they match, which are
+# parsed by numpy
+TIMESTAMP_FORMATS = (
+    ('%Y-%m-%d %H:%M:%S', 19),
+    ('%Y-%m-%dT%H:%M:%S', 19),
+    ('%Y-%m-%d %H:%M', 16),
+    ('%Y-%m-%dT%H:%M', 16),
+    ('%Y-%m-%d', 10),
+    ('%m/%d/%Y %H:%M:%S', None),
+    ('%m/%d/%Y %H:%M', None),
+    ('%m/%d/%Y', None),
+    ('%Y/%m/%d %H:%M:%S', None),
+    ('%Y/%m/%d %H:%M', None),
+    ('%Y/%m/%d', None),
+)
+
+COLUMN_COUNT_ERROR = " Number of columns in the header is not same as the data columns."
+DATE_VALUE_ERROR = " Data for the first column must be a date value."
+NUMERIC_VALUE_ERROR = " Data values must be numeric."
+
+
+def read_csv_chunks(csv_reader, chunk_size=None):
+    """
+    :param csv_reader: csv reader positioned at the first data row
+    :param chunk_size: number of rows per chunk, HS_TIMESERIES_CSV_CHUNK_SIZE by default
+    :return: iterator of lists of rows
+    """
+    chunk_size = chunk_size or getattr(settings, 'HS_TIMESERIES_CSV_CHUNK_SIZE',
+                                       DEFAULT_CHUNK_SIZE)
+    return iter(lambda: list(itertools.islice(csv_reader, chunk_size)), [])
+
+
+def infer_timestamp_format(values):
+    """
+    :param values: a sample of timestamp strings
+    :return: the (format, ISO 8601 length or None) from TIMESTAMP_FORMATS that parses all values,
+    or None if there is no such format
+    """
+    if not values:
+        return None
+    for timestamp_format in TIMESTAMP_FORMATS:
+        try:
+            for value in values:
+                datetime.strptime(value, timestamp_format[0])
+        except ValueError:
+            continue
+        return timestamp_format
+    return None
+
+
+def parse_timestamp(value):
+    """Parse a single timestamp with dateutil, rejecting numbers"""
+    # some numeric values (e.g., 20080101, 1.602652223413681) are recognized by the
+    # the parser as valid date value - we don't allow any such value as valid date
+    try:
+        float(value)
+    except ValueError:
+        return parser.parse(value)
+    raise ValueError("{} is not a date value".format(value))
+
+
+def parse_timestamps(values, timestamp_format=None):
+    """
+    :param values: sequence (or numpy array) of timestamp strings
+    :param timestamp_format: (optional) format returned by infer_timestamp_format
+    :return: list of datetimes
+    :raises ValueError: if any value is not a date value
+    """
+    if timestamp_format is not None:
+        date_format, iso_length = timestamp_format
+        if iso_length is not None:
+            timestamps = _parse_iso_timestamps(values, iso_length)
+            if timestamps is not None:
+                return timestamps
+        timestamps = []
+        for value in values:
+            try:
+                timestamps.append(datetime.strptime(value, date_format))
+            except ValueError:
+                timestamps.append(parse_timestamp(value))
+        return timestamps
+    return [parse_timestamp(value) for value in values]
+
+
+def _parse_iso_timestamps(values, iso_length):
+    """parse ISO 8601 timestamps of the same length with numpy, or return None if any of the
+    values is not such a timestamp"""
+    values = numpy.asarray(values, dtype=str)
+    if not len(values):
+        return []
+    if (numpy.char.str_len(values) != iso_length).any():
+        return None
+    # numpy would also accept e.g. a year on its own, so check the date separators as well
+    chars = values.astype('U{}'.format(iso_length)).view('U1').reshape(len(values), iso_length)
+    if (chars[:, 4] != '-').any() or (chars[:, 7] != '-').any():
+        return None
+    try:
+        return values.astype('datetime64[us]').tolist()
+    except ValueError:
+        return None
+
+
+def validate_csv_rows(rows, column_count, timestamp_format=None):
+    """
+    Check that each data row has column_count columns, a date value in the first column and
+    numeric values in the other columns
+    :param rows: list of data rows
+    :param column_count: number of columns in the header
+    :param timestamp_format: (optional) format returned by infer_timestamp_format
+    :return: None if all rows are valid, otherwise the error for the first invalid row
+    """
+    try:
+        if any(len(row) != column_count for row in rows):
+            raise ValueError("number of columns")
+        data = numpy.array(rows, dtype=str).reshape(len(rows), column_count)
+        parse_timestamps(data[:, 0], timestamp_format)
+        data[:, 1:].astype(float)
+        return None
+    except ValueError:
+        pass
+
+    # find the first invalid row
+    for row in rows:
+        if len(row) != column_count:
+            return COLUMN_COUNT_ERROR
+        try:
+            parse_timestamp(row[0])
+        except ValueError:
+            return DATE_VALUE_ERROR
+        try:
+            for data_value in row[1:]:
+                float(data_value)
+        except ValueError:
+            return NUMERIC_VALUE_ERROR
+    return None
+
+
+def read_csv_values(csv_file_path, chunk_size=None):
+    """
+    Read the data rows of a valid time series csv file a chunk at a time
+    :param csv_file_path: path of the csv file
+    :param chunk_size: (optional) number of rows per chunk
+    :return: generator of (timestamps, values) for each chunk, where timestamps is a list of
+    datetimes and values is a numpy array of floats with a column for each data column
+    """
+    with open(csv_file_path, 'r') as fl_obj:
+        csv_reader = csv.reader(fl_obj, delimiter=',')
+        header = next(csv_reader)
+        timestamp_format = None
+        for index, rows in enumerate(read_csv_chunks(csv_reader, chunk_size)):
+            data = numpy.array(rows, dtype=str).reshape(len(rows), len(header))
+            if index == 0:
+                timestamp_format = infer_timestamp_format(data[:SAMPLE_SIZE, 0].tolist())
+            yield parse_timestamps(data[:, 0], timestamp_format), data[:, 1:].astype(float)
+
+
+def count_csv_rows(csv_file_path):
+    """Return the number of data rows of a csv file"""
+    with open(csv_file_path, 'r') as fl_obj:
+        csv_reader = csv.reader(fl_obj, delimiter=',')
+        next(csv_reader)
+        return sum(1 for _ in csv_reader)
+
+
+def insert_csv_values(cur, csv_file_path, result_ids, utc_offset, time_interval,
+                      chunk_size=None):
+    """
+    Insert the data values of a valid time series csv file into the TimeSeriesResultValues table
+    of an ODM2 SQLite database with one executemany per chunk of rows and data column. ValueIDs
+    are numbered column by column, i.e., all values of the first data column come first.
+    :param cur: cursor of the SQLite database; the inserts are committed by the caller
+    :param csv_file_path: path of the csv file
+    :param result_ids: ResultID of each data column
+    :param utc_offset: UTC offset of the timestamps
+    :param time_interval: time interval between values in minutes
+    :param chunk_size: (optional) number of rows inserted at a time
+    """
+    insert_sql = "INSERT INTO TimeSeriesResultValues (ValueID, ResultID, DataValue, " \
+                 "ValueDateTime, ValueDateTimeUTCOffset, CensorCodeCV, " \
+                 "QualityCodeCV, TimeAggregationInterval, " \
+                 "TimeAggregationIntervalUnitsID) VALUES(?,?,?,?,?,?,?,?,?)"
+    row_count = count_csv_rows(csv_file_path)
+    first_row = 0
+    for timestamps, values in read_csv_values(csv_file_path, chunk_size):
+        # convert the timestamps the way sqlite3 adapts datetimes, once for all columns
+        timestamps = [timestamp.isoformat(" ") for timestamp in timestamps]
+        for col, result_id in enumerate(result_ids):
+            first_value_id = col * row_count + first_row + 1
+            cur.executemany(insert_sql, (
+                (first_value_id + index, result_id, data_value, date_time, utc_offset,
+                 'Unknown', 'Unknown', time_interval, 102)
+                for index, (date_time, data_value) in enumerate(
+                    zip(timestamps, values[:, col].tolist()))))
+        first_row += len(timestamps)
@@ -22,6 +22,7 @@ from mezzanine.pages.page_processors import processor_for
 from hs_core.models import BaseResource, ResourceManager, resource_processor, CoreMetaData, \
     AbstractMetaDataElement, Creator
 from hs_core.hydroshare import utils
+from hs_app_timeseries.csv_utils import insert_csv_values
 
 
 class TimeSeriesAbstractMetaDataElement(AbstractMetaDataElement):
@@ -1166,11 +1167,6 @@ class TimeSeriesMetaDataMixin(models.Model):
                 return element
         return None
 
-    def _read_csv_specified_column(self, csv_reader, data_column_index):
-        # generator function to read (one row) the datetime column and the specified data column
-        for row in csv_reader:
-            yield row[0], row[data_column_index]
-
     def _get_series_label(self, series_id, source):
         """Generate a label given a series id
         :param  series_id: id of the time series
@@ -1708,10 +1704,6 @@ class TimeSeriesMetaDataMixin(models.Model):
 
         cur.execute("DELETE FROM TimeSeriesResultValues")
         con.commit()
-        insert_sql = "INSERT INTO TimeSeriesResultValues (ValueID, ResultID, DataValue, " \
-                     "ValueDateTime, ValueDateTimeUTCOffset, CensorCodeCV, " \
-                     "QualityCodeCV, TimeAggregationInterval, " \
-                     "TimeAggregationIntervalUnitsID) VALUES(?,?,?,?,?,?,?,?,?)"
 
         # read the csv file to determine time interval (in minutes) between each reading
         # we will use the first 2 rows of data to determine this value
@@ -1725,31 +1717,17 @@ class TimeSeriesMetaDataMixin(models.Model):
             time_interval = (parser.parse(second_row_data[0]) -
                              parser.parse(first_row_data[0])).seconds / 60
 
-        with open(temp_csv_file, 'r') as fl_obj:
-            csv_reader = csv.reader(fl_obj, delimiter=',')
-            # read the first row (header) and skip
-            next(csv_reader)
-            value_id = 1
-            data_header = header[1:]
-            for col, value in enumerate(data_header):
-                # get the ts_result object with matching series_label
-                ts_result = [ts_item for ts_item in self.time_series_results if
-                             ts_item.series_label == value][0]
-                # get the result id associated with ts_result object
-                result_data_item = [dict_item for dict_item in results_data if
-                                    dict_item['object_id'] == ts_result.id][0]
-                result_id = result_data_item['result_id']
-                data_col_index = col + 1
-                # start at the beginning of data row
-                fl_obj.seek(0)
-                next(csv_reader)
-                for date_time, data_value in self._read_csv_specified_column(
-                        csv_reader, data_col_index):
-                    date_time = parser.parse(date_time)
-                    cur.execute(insert_sql, (value_id, result_id, data_value,
-                                             date_time, utc_offset, 'Unknown', 'Unknown',
-                                             time_interval, 102), )
-                    value_id += 1
+        result_ids = []
+        for value in header[1:]:
+            # get the ts_result object with matching series_label
+            ts_result = [ts_item for ts_item in self.time_series_results if
+                         ts_item.series_label == value][0]
+            # get the result id associated with ts_result object
+            result_data_item = [dict_item for dict_item in results_data if
+                                dict_item['object_id'] == ts_result.id][0]
+            result_ids.append(result_data_item['result_id'])
+        # the values are inserted a chunk of csv rows at a time
+        insert_csv_values(cur, temp_csv_file, result_ids, utc_offset, time_interval)
 
     def populate_blank_sqlite_file(self, temp_sqlite_file, user):
         """
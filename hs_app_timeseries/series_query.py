@@ -0,0 +1,262 @@
+"""
+Querying of the values of a time series of an ODM2 SQLite file. Values of a time range are read a
+chunk at a time into numpy arrays and either returned as they are, or aggregated into time
+buckets (minimum, maximum or mean of each bucket) or downsampled to a number of points with the
+Largest-Triangle-Three-Buckets algorithm, and written out as csv, json or binary.
+
+Queries run on a local replica of the SQLite file (see create_query_replica) that has an index
+of the values by series and time, so that reading a time range of a series needs no sort.
+
+References
+Sveinn Steinarsson, Downsampling Time Series for Visual Representation, 2013
+    https://skemman.is/handle/1946/15343
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import uuid
+
+import numpy
+
+# number of values read from the SQLite file at a time
+DEFAULT_CHUNK_SIZE = 50000
+AGGREGATIONS = ('min', 'max', 'mean', 'lttb')
+CONTENT_TYPES = {'csv': 'text/csv',
+                 'json': 'application/json',
+                 'binary': 'application/octet-stream'}
+# first bytes of the binary output format (see write_binary)
+BINARY_MAGIC = b'HSTS\x01'
+REPLICA_INDEX_SQL = "CREATE INDEX IF NOT EXISTS hs_series_values_by_time ON " \
+                    "TimeSeriesResultValues (ResultID, ValueDateTime)"
+
+
+def create_query_replica(sqlite_file, replica_path):
+    """
+    Create a replica of a SQLite file for querying values by series and time range
+    :param sqlite_file: path of the SQLite file to replicate; it is moved to replica_path
+    :param replica_path: path of the replica to create; created atomically so that concurrent
+    requests never open a replica that is not complete
+    """
+    temp_path = '{}.{}'.format(replica_path, uuid.uuid4().hex)
+    shutil.move(sqlite_file, temp_path)
+    try:
+        con = sqlite3.connect(temp_path)
+        with con:
+            con.execute(REPLICA_INDEX_SQL)
+        con.close()
+        os.rename(temp_path, replica_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def open_replica(replica_path):
+    """Return a read-only connection to a replica"""
+    return sqlite3.connect('file:{}?mode=ro'.format(replica_path), uri=True)
+
+
+def normalize_timestamp(value):
+    """
+    :param value: an ISO 8601 date or date time (e.g., 2008-01-01 or 2008-01-01T10:30)
+    :return: the date time as stored in ODM2 SQLite files (e.g., 2008-01-01 10:30:00)
+    :raises ValueError: if value is not an ISO 8601 date time
+    """
+    try:
+        timestamp = numpy.datetime64(value, 's')
+    except ValueError:
+        raise ValueError("{} is not an ISO 8601 date time".format(value))
+    return str(timestamp).replace('T', ' ')
+
+
+def get_series(con, series_id):
+    """
+    :param con: connection to a SQLite file
+    :param series_id: ResultUUID of the time series
+    :return: ResultID and NoDataValue of the series, or None if there is no such series
+    """
+    return con.execute("SELECT r.ResultID, v.NoDataValue FROM Results r LEFT JOIN Variables v "
+                       "ON r.VariableID = v.VariableID WHERE r.ResultUUID=?",
+                       (series_id,)).fetchone()
+
+
+def get_time_range(con, result_id):
+    """Return the first and last ValueDateTime of a series"""
+    return con.execute("SELECT MIN(ValueDateTime), MAX(ValueDateTime) "
+                       "FROM TimeSeriesResultValues WHERE ResultID=?", (result_id,)).fetchone()
+
+
+def read_values(con, result_id, start=None, end=None, chunk_size=None):
+    """
+    Read the values of a series in time order a chunk at a time
+    :param con: connection to a replica
+    :param result_id: ResultID of the series
+    :param start: (optional) first ValueDateTime to read (see normalize_timestamp)
+    :param end: (optional) last ValueDateTime to read
+    :param chunk_size: (optional) number of values per chunk
+    :return: generator of (timestamps, values) numpy arrays of datetime64[us] and float
+    """
+    sql = "SELECT ValueDateTime, DataValue FROM TimeSeriesResultValues WHERE ResultID=?"
+    params = [result_id]
+    if start is not None:
+        sql += " AND ValueDateTime >= ?"
+        params.append(start)
+    if end is not None:
+        sql += " AND ValueDateTime <= ?"
+        params.append(end)
+    cur = con.execute(sql + " ORDER BY ValueDateTime", params)
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    for rows in iter(lambda: cur.fetchmany(chunk_size), []):
+        timestamps, values = zip(*rows)
+        yield (numpy.array(timestamps, dtype=str).astype('datetime64[us]'),
+               numpy.array(values, dtype=float))
+
+
+def _valid(timestamps, values, nodata_value):
+    if nodata_value is None:
+        return timestamps, values
+    keep = values != nodata_value
+    return timestamps[keep], values[keep]
+
+
+def aggregate_values(chunks, start, end, buckets, aggregation, nodata_value=None):
+    """
+    Aggregate values into time buckets of equal length, a chunk at a time
+    :param chunks: iterator of (timestamps, values) in time order (see read_values)
+    :param start: start of the first bucket (numpy.datetime64)
+    :param end: end of the last bucket (numpy.datetime64)
+    :param buckets: number of buckets
+    :param aggregation: 'min', 'max' or 'mean'
+    :param nodata_value: (optional) value of missing data, which is left out
+    :return: (timestamps, values) of the buckets that have values; the timestamp of a bucket is
+    its start
+    """
+    start = numpy.datetime64(start, 'us')
+    span = (numpy.datetime64(end, 'us') - start).astype('int64') + 1
+    # width of a bucket in microseconds; multiplying microseconds by the number of buckets
+    # would overflow int64 for long ranges split into many buckets
+    width = float(span) / buckets
+    counts = numpy.zeros(buckets, dtype='int64')
+    if aggregation == 'mean':
+        totals = numpy.zeros(buckets)
+    else:
+        totals = numpy.full(buckets, numpy.inf if aggregation == 'min' else -numpy.inf)
+    reduce_func = {'min': numpy.minimum, 'max': numpy.maximum, 'mean': numpy.add}[aggregation]
+
+    for timestamps, values in chunks:
+        timestamps, values = _valid(timestamps, values, nodata_value)
+        if not len(values):
+            continue
+        # timestamps are in order, so the values of a bucket are adjacent
+        index = ((timestamps - start).astype('int64') / width).astype('int64')
+        index = numpy.clip(index, 0, buckets - 1)
+        first = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(index)) + 1))
+        chunk_buckets = index[first]
+        totals[chunk_buckets] = reduce_func(totals[chunk_buckets],
+                                            reduce_func.reduceat(values, first))
+        counts[chunk_buckets] += numpy.diff(numpy.append(first, len(values)))
+
+    filled = numpy.flatnonzero(counts)
+    values = totals[filled]
+    if aggregation == 'mean':
+        values = values / counts[filled]
+    bucket_starts = start + (filled * width).astype('int64').astype('timedelta64[us]')
+    return bucket_starts, values
+
+
+def lttb(timestamps, values, points):
+    """
+    Downsample a series to a number of points with the Largest-Triangle-Three-Buckets algorithm,
+    which keeps the points that shape the series when plotted
+    :param timestamps: numpy array of datetime64 of the series, in time order
+    :param values: numpy array of the values of the series
+    :param points: number of points to downsample to (at least 3)
+    :return: indices of the points kept
+    """
+    count = len(values)
+    if points >= count or points < 3:
+        return numpy.arange(count)
+    x = (timestamps - timestamps[0]).astype('timedelta64[us]').astype('float64')
+    y = values
+    # the first and last points are kept; the other points are split into buckets
+    edges = numpy.linspace(1, count - 1, points - 1).astype('int64')
+    kept = numpy.empty(points, dtype='int64')
+    kept[0] = 0
+    kept[-1] = count - 1
+    for i in range(points - 2):
+        low, high = edges[i], edges[i + 1]
+        # the third point of the triangles is the average of the next bucket
+        next_high = edges[i + 2] if i + 2 < len(edges) else count
+        next_x = x[high:next_high].mean()
+        next_y = y[high:next_high].mean()
+        previous = kept[i]
+        areas = numpy.abs((x[previous] - next_x) * (y[low:high] - y[previous]) -
+                          (x[previous] - x[low:high]) * (next_y - y[previous]))
+        kept[i + 1] = low + numpy.argmax(areas)
+    return kept
+
+
+def downsample_values(chunks, points, nodata_value=None):
+    """
+    Downsample the values of a series with LTTB (see lttb); the values of the time range are
+    read into memory
+    :param chunks: iterator of (timestamps, values) in time order (see read_values)
+    :param points: number of points to downsample to
+    :param nodata_value: (optional) value of missing data, which is left out
+    :return: (timestamps, values) of the points kept
+    """
+    timestamps = []
+    values = []
+    for chunk_timestamps, chunk_values in chunks:
+        chunk_timestamps, chunk_values = _valid(chunk_timestamps, chunk_values, nodata_value)
+        timestamps.append(chunk_timestamps)
+        values.append(chunk_values)
+    if not timestamps:
+        return numpy.array([], dtype='datetime64[us]'), numpy.array([])
+    timestamps = numpy.concatenate(timestamps)
+    values = numpy.concatenate(values)
+    kept = lttb(timestamps, values, points)
+    return timestamps[kept], values[kept]
+
+
+def write_csv(chunks, value_name='DataValue'):
+    """Return generator of csv lines of (timestamps, values) chunks"""
+    yield 'ValueDateTime,{}\n'.format(value_name)
+    for timestamps, values in chunks:
+        if not len(values):
+            continue
+        lines = numpy.char.add(numpy.char.add(
+            numpy.datetime_as_string(timestamps, unit='s'), ','), values.astype(str))
+        yield '\n'.join(lines.tolist()) + '\n'
+
+
+def write_json(chunks, series_id, value_name='DataValue'):
+    """Return generator of the json of (timestamps, values) chunks:
+    {"series_id": ..., "value_name": ..., "values": [["2008-01-01T00:00:00", 1.5], ...]}"""
+    yield '{{"series_id": {}, "value_name": {}, "values": ['.format(
+        json.dumps(series_id), json.dumps(value_name))
+    separator = ''
+    for timestamps, values in chunks:
+        if not len(values):
+            continue
+        rows = zip(numpy.datetime_as_string(timestamps, unit='s').tolist(), values.tolist())
+        yield separator + json.dumps(list(rows))[1:-1]
+        separator = ', '
+    yield ']}'
+
+
+def write_binary(chunks):
+    """
+    Return generator of the binary of (timestamps, values) chunks: BINARY_MAGIC followed by a
+    batch of columns per chunk, each a little endian uint32 number of values, the timestamps
+    as int64 microseconds since 1970-01-01 and the values as float64
+    """
+    yield BINARY_MAGIC
+    for timestamps, values in chunks:
+        if not len(values):
+            continue
+        yield struct.pack('<I', len(values))
+        yield timestamps.astype('datetime64[us]').astype('<i8').tobytes()
+        yield values.astype('<f8').tobytes()
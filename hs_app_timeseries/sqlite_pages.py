@@ -0,0 +1,288 @@
+"""
+Copying of the pages of an ODM2 SQLite file that hold its metadata tables, so that the metadata
+of a SQLite file in iRODS can be updated without copying its data values out of iRODS and back.
+The b-trees of all tables and indexes other than those of the result value tables are read by
+byte range into a sparse copy of the file in which the pages of the result value tables read as
+zeros. SQLite updates the metadata tables of the copy, and only the pages it changed or added
+are written back to the file in iRODS, so that a metadata update costs in proportion to the
+size of the metadata rather than of the file.
+
+References
+Database File Format
+    https://www.sqlite.org/fileformat2.html
+"""
+
+import hashlib
+import sqlite3
+import struct
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+SQLITE_HEADER_SIZE = 100
+# b-tree page types
+INTERIOR_INDEX = 2
+INTERIOR_TABLE = 5
+LEAF_INDEX = 10
+LEAF_TABLE = 13
+TEXT_ENCODINGS = {1: 'utf-8', 2: 'utf-16-le', 3: 'utf-16-be'}
+
+
+class SQLiteFormatError(Exception):
+    """The file is not a SQLite database file of a format the pages can be copied from."""
+
+
+def is_data_table(table_name):
+    """Return True for the ODM2 tables that hold the data values of a SQLite file, which are
+    not touched by metadata updates"""
+    return table_name.endswith('ResultValues') or table_name.endswith('ResultValueAnnotations')
+
+
+def _varint(data, pos):
+    """Return the value of the SQLite varint at pos in data and the position after it"""
+    value = 0
+    for i in range(8):
+        byte = data[pos + i]
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, pos + i + 1
+    return (value << 8) | data[pos + 8], pos + 9
+
+
+def _record_values(payload, encoding):
+    """Return the values of a SQLite record"""
+    header_size, pos = _varint(payload, 0)
+    serial_types = []
+    while pos < header_size:
+        serial_type, pos = _varint(payload, pos)
+        serial_types.append(serial_type)
+    int_sizes = {1: 1, 2: 2, 3: 3, 4: 4, 5: 6, 6: 8}
+    values = []
+    pos = header_size
+    for serial_type in serial_types:
+        if serial_type in int_sizes:
+            size = int_sizes[serial_type]
+            values.append(int.from_bytes(payload[pos:pos + size], 'big', signed=True))
+        elif serial_type == 7:
+            size = 8
+            values.append(struct.unpack('>d', payload[pos:pos + size])[0])
+        elif serial_type in (8, 9):
+            size = 0
+            values.append(serial_type - 8)
+        elif serial_type >= 12:
+            size = (serial_type - 12) // 2
+            value = payload[pos:pos + size]
+            values.append(value.decode(encoding) if serial_type % 2 else value)
+        else:
+            size = 0
+            values.append(None)
+        pos += size
+    return values
+
+
+class SQLiteFile(object):
+    """Reads the structure of a SQLite database file from a seekable file object."""
+
+    def __init__(self, fileobj, size):
+        """
+        :param fileobj: seekable file object of the database file
+        :param size: size in bytes of the file
+        :raises SQLiteFormatError: if the file is not a database file or has a format that is
+        not supported (write-ahead logging or auto vacuum, whose pointer map pages would have
+        to be copied as well)
+        """
+        self.fileobj = fileobj
+        fileobj.seek(0)
+        header = fileobj.read(SQLITE_HEADER_SIZE)
+        if len(header) < SQLITE_HEADER_SIZE or header[:16] != SQLITE_MAGIC:
+            raise SQLiteFormatError("not a SQLite database file")
+        page_size = struct.unpack('>H', header[16:18])[0]
+        self.page_size = 65536 if page_size == 1 else page_size
+        if header[18] != 1 or header[19] != 1:
+            raise SQLiteFormatError("SQLite files in WAL mode are not supported")
+        if struct.unpack('>I', header[52:56])[0]:
+            raise SQLiteFormatError("SQLite files with auto vacuum are not supported")
+        self.usable_size = self.page_size - header[20]
+        change_counter, page_count, self.freelist_trunk = struct.unpack('>3I', header[24:36])
+        # the page count in the header is only valid if it was written by the same version
+        if not page_count or change_counter != struct.unpack('>I', header[92:96])[0]:
+            page_count = size // self.page_size
+        self.page_count = page_count
+        self.encoding = TEXT_ENCODINGS.get(struct.unpack('>I', header[56:60])[0], 'utf-8')
+
+    def read_page(self, page_number):
+        if not 0 < page_number <= self.page_count:
+            raise SQLiteFormatError("page {} is out of range".format(page_number))
+        self.fileobj.seek((page_number - 1) * self.page_size)
+        data = self.fileobj.read(self.page_size)
+        if len(data) < self.page_size:
+            raise SQLiteFormatError("unexpected end of SQLite file")
+        return data
+
+    def _local_payload_size(self, payload_size, is_table_leaf):
+        """number of bytes of a cell payload stored on the b-tree page itself"""
+        usable = self.usable_size
+        max_local = usable - 35 if is_table_leaf else ((usable - 12) * 64 // 255) - 23
+        if payload_size <= max_local:
+            return payload_size
+        min_local = ((usable - 12) * 32 // 255) - 23
+        local = min_local + ((payload_size - min_local) % (usable - 4))
+        return local if local <= max_local else min_local
+
+    def _cell_payload(self, page, pos, payload_size, is_table_leaf, pages):
+        """Return the payload of a cell, adding the pages of its overflow chain to the set
+        pages"""
+        local_size = self._local_payload_size(payload_size, is_table_leaf)
+        payload = page[pos:pos + local_size]
+        if local_size < payload_size:
+            overflow_page = struct.unpack('>I', page[pos + local_size:pos + local_size + 4])[0]
+            while overflow_page:
+                if overflow_page in pages:
+                    raise SQLiteFormatError("overflow page chain has a loop")
+                pages.add(overflow_page)
+                data = self.read_page(overflow_page)
+                payload += data[4:4 + min(self.usable_size - 4, payload_size - len(payload))]
+                overflow_page = struct.unpack('>I', data[:4])[0]
+        return payload
+
+    def btree(self, root_page, leaf_payloads=False):
+        """
+        Walk a b-tree
+        :param root_page: page number of the root page of the b-tree
+        :param leaf_payloads: if True, collect the payloads of the cells of table leaf pages
+        :return: set of the page numbers of the b-tree, including overflow pages, and list of
+        the leaf payloads
+        """
+        pages = set()
+        payloads = []
+        to_visit = [root_page]
+        while to_visit:
+            page_number = to_visit.pop()
+            if page_number in pages:
+                raise SQLiteFormatError("b-tree has a loop")
+            pages.add(page_number)
+            page = self.read_page(page_number)
+            offset = SQLITE_HEADER_SIZE if page_number == 1 else 0
+            page_type = page[offset]
+            if page_type not in (INTERIOR_INDEX, INTERIOR_TABLE, LEAF_INDEX, LEAF_TABLE):
+                raise SQLiteFormatError("page {} is not a b-tree page".format(page_number))
+            is_interior = page_type in (INTERIOR_INDEX, INTERIOR_TABLE)
+            cell_count = struct.unpack('>H', page[offset + 3:offset + 5])[0]
+            cell_pointers = offset + (12 if is_interior else 8)
+            if is_interior:
+                to_visit.append(struct.unpack('>I', page[offset + 8:offset + 12])[0])
+            for i in range(cell_count):
+                pos = struct.unpack('>H', page[cell_pointers + 2 * i:cell_pointers + 2 * i + 2])[0]
+                if is_interior:
+                    to_visit.append(struct.unpack('>I', page[pos:pos + 4])[0])
+                    pos += 4
+                if page_type == INTERIOR_TABLE:
+                    # interior table cells have no payload
+                    continue
+                payload_size, pos = _varint(page, pos)
+                if page_type == LEAF_TABLE:
+                    _, pos = _varint(page, pos)
+                payload = self._cell_payload(page, pos, payload_size, page_type == LEAF_TABLE,
+                                             pages)
+                if leaf_payloads and page_type == LEAF_TABLE:
+                    payloads.append(payload)
+        return pages, payloads
+
+    def schema(self):
+        """Return the set of the pages of the schema table and list of (type, name, table name,
+        root page) of the schema objects"""
+        pages, payloads = self.btree(1, leaf_payloads=True)
+        return pages, [tuple(_record_values(payload, self.encoding)[:4]) for payload in payloads]
+
+    def freelist(self):
+        """Return lists of the freelist trunk pages and of the free (freelist leaf) pages"""
+        trunk_pages = []
+        free_pages = []
+        trunk_page = self.freelist_trunk
+        while trunk_page:
+            if trunk_page in trunk_pages:
+                raise SQLiteFormatError("freelist has a loop")
+            trunk_pages.append(trunk_page)
+            data = self.read_page(trunk_page)
+            trunk_page, leaf_count = struct.unpack('>2I', data[:8])
+            free_pages.extend(struct.unpack('>{}I'.format(leaf_count), data[8:8 + 4 * leaf_count]))
+        return trunk_pages, free_pages
+
+
+class SQLiteMetadataCopy(object):
+    """A sparse copy of a SQLite file that holds all pages but those of its data tables."""
+
+    def __init__(self, fileobj, size, path):
+        """
+        Copy the pages of the SQLite file in fileobj that are not pages of data tables
+        (see is_data_table) to path
+        :param fileobj: seekable file object of the SQLite file (e.g., an IrodsRangeFile)
+        :param size: size in bytes of the SQLite file
+        :param path: path of the copy to write
+        :raises SQLiteFormatError: if pages can't be copied from the file
+        """
+        sqlite_file = SQLiteFile(fileobj, size)
+        self.path = path
+        self.page_size = sqlite_file.page_size
+        self.page_count = sqlite_file.page_count
+        self.data_tables = set()
+        pages, schema = sqlite_file.schema()
+        for object_type, name, table_name, root_page in schema:
+            if object_type == 'trigger':
+                # a trigger on a metadata table may write to data tables
+                raise SQLiteFormatError("SQLite files with triggers are not supported")
+            if is_data_table(table_name):
+                self.data_tables.add(table_name)
+            elif root_page:
+                pages.update(sqlite_file.btree(root_page)[0])
+        trunk_pages, free_pages = sqlite_file.freelist()
+        pages.update(trunk_pages)
+        # free pages may be reused by SQLite for the metadata tables
+        self.free_pages = set(free_pages)
+
+        self.page_hashes = {}
+        with open(path, 'wb') as copy:
+            # extending the file leaves a hole that takes no disk space
+            copy.truncate(size)
+            for page_number in sorted(pages):
+                data = sqlite_file.read_page(page_number)
+                self.page_hashes[page_number] = hashlib.md5(data).digest()
+                copy.seek((page_number - 1) * self.page_size)
+                copy.write(data)
+
+    def authorize(self, action, arg1, arg2, db_name, trigger_name):
+        """SQLite authorizer (see sqlite3.Connection.set_authorizer) that denies any access to
+        the data tables, whose pages are not in the copy"""
+        if self.data_tables.intersection((arg1, arg2)):
+            return sqlite3.SQLITE_DENY
+        return sqlite3.SQLITE_OK
+
+    def changed_ranges(self):
+        """
+        :return: list of (offset, bytes) of the pages of the copy that SQLite changed or added,
+        with adjacent pages joined into one range
+        """
+        ranges = []
+        with open(self.path, 'rb') as copy:
+            copy.seek(0, 2)
+            page_count = copy.tell() // self.page_size
+            candidates = set(self.page_hashes).union(self.free_pages).union(
+                range(self.page_count + 1, page_count + 1))
+            for page_number in sorted(candidates):
+                if page_number > page_count:
+                    continue
+                offset = (page_number - 1) * self.page_size
+                copy.seek(offset)
+                data = copy.read(self.page_size)
+                if page_number in self.page_hashes:
+                    changed = hashlib.md5(data).digest() != self.page_hashes[page_number]
+                elif page_number in self.free_pages and page_number <= self.page_count:
+                    # free pages were not copied; SQLite wrote the ones that aren't zeros
+                    changed = data.strip(b'\x00') != b''
+                else:
+                    changed = True
+                if not changed:
+                    continue
+                if ranges and ranges[-1][0] + len(ranges[-1][1]) == offset:
+                    ranges[-1][1].extend(data)
+                else:
+                    ranges.append((offset, bytearray(data)))
+        return [(offset, bytes(data)) for offset, data in ranges]
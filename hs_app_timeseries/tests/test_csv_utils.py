@@ -0,0 +1,90 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from hs_app_timeseries.csv_utils import COLUMN_COUNT_ERROR, DATE_VALUE_ERROR, \
+    NUMERIC_VALUE_ERROR, infer_timestamp_format, insert_csv_values, parse_timestamps, \
+    read_csv_values, validate_csv_rows
+
+
+class TestCSVUtils(SimpleTestCase):
+
+    def setUp(self):
+        super(TestCSVUtils, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.csv_file = os.path.join(self.tmp_dir, 'data.csv')
+        with open(self.csv_file, 'w') as f:
+            f.write('ValueDateTime,Temp,Flow\n')
+            for hour in range(10):
+                f.write('2008-01-01 {:02d}:00:00,{},{}\n'.format(hour, hour * 0.5, hour))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestCSVUtils, self).tearDown()
+
+    def test_infer_timestamp_format(self):
+        self.assertEqual(infer_timestamp_format(['2008-01-01 00:00:00', '2008-01-01 00:30:00']),
+                         ('%Y-%m-%d %H:%M:%S', 19))
+        self.assertEqual(infer_timestamp_format(['1/2/2008 10:00', '12/31/2008 10:30']),
+                         ('%m/%d/%Y %H:%M', None))
+        self.assertIsNone(infer_timestamp_format(['Jan 1 2008', '2008-01-01']))
+        self.assertIsNone(infer_timestamp_format([]))
+
+    def test_parse_timestamps(self):
+        expected = [datetime(2008, 1, 1), datetime(2008, 1, 1, 0, 30)]
+        values = ['2008-01-01 00:00:00', '2008-01-01 00:30:00']
+        self.assertEqual(parse_timestamps(values, infer_timestamp_format(values)), expected)
+        # values that don't fit the inferred format are parsed one at a time
+        self.assertEqual(parse_timestamps(['2008-01-01 00:00:00', 'Jan 1 2008 00:30'],
+                                          ('%Y-%m-%d %H:%M:%S', 19)), expected)
+        self.assertEqual(parse_timestamps(['01/01/2008 00:00', '1/1/2008 0:30'],
+                                          ('%m/%d/%Y %H:%M', None)), expected)
+        # numeric values are not date values, even those that look like ISO 8601 dates
+        for values in (['2008-01-01', '2008'], ['2008-01-01', '20080101'],
+                       ['2008-01-01', '1.602652223413681']):
+            with self.assertRaises(ValueError):
+                parse_timestamps(values, ('%Y-%m-%d', 10))
+
+    def test_validate_csv_rows(self):
+        rows = [['2008-01-01 00:00:00', '1.5', '2'], ['2008-01-01 00:30:00', '-9999', '3']]
+        timestamp_format = ('%Y-%m-%d %H:%M:%S', 19)
+        self.assertIsNone(validate_csv_rows(rows, 3, timestamp_format))
+        self.assertIsNone(validate_csv_rows(rows, 3))
+        # the error is that of the first invalid row
+        self.assertEqual(validate_csv_rows(rows + [['2008-01-01 01:00:00', 'x', '1'],
+                                                   ['2008-01-01 01:30:00', '1']],
+                                           3, timestamp_format), NUMERIC_VALUE_ERROR)
+        self.assertEqual(validate_csv_rows(rows + [['2008-01-01 01:00:00', '1'],
+                                                   ['20080101', '1', '1']],
+                                           3, timestamp_format), COLUMN_COUNT_ERROR)
+        self.assertEqual(validate_csv_rows(rows + [['20080101', '1', '1']], 3, timestamp_format),
+                         DATE_VALUE_ERROR)
+
+    def test_read_csv_values(self):
+        chunks = list(read_csv_values(self.csv_file, chunk_size=4))
+        self.assertEqual([len(timestamps) for timestamps, _ in chunks], [4, 4, 2])
+        timestamps, values = chunks[2]
+        self.assertEqual(timestamps, [datetime(2008, 1, 1, 8), datetime(2008, 1, 1, 9)])
+        self.assertEqual(values.tolist(), [[4.0, 8.0], [4.5, 9.0]])
+
+    def test_insert_csv_values(self):
+        sqlite_file = os.path.join(self.tmp_dir, 'ODM2.sqlite')
+        shutil.copy('hs_app_timeseries/files/ODM2.sqlite', sqlite_file)
+        con = sqlite3.connect(sqlite_file)
+        with con:
+            cur = con.cursor()
+            insert_csv_values(cur, self.csv_file, [1, 2], -7, 60, chunk_size=4)
+            cur.execute("SELECT ValueID, ResultID, DataValue, ValueDateTime "
+                        "FROM TimeSeriesResultValues ORDER BY ValueID")
+            rows = cur.fetchall()
+        con.close()
+        # values are numbered column by column
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0], (1, 1, 0.0, '2008-01-01 00:00:00'))
+        self.assertEqual(rows[9], (10, 1, 4.5, '2008-01-01 09:00:00'))
+        self.assertEqual(rows[10], (11, 2, 0.0, '2008-01-01 00:00:00'))
+        self.assertEqual(rows[19], (20, 2, 9.0, '2008-01-01 09:00:00'))
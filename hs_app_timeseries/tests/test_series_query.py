@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy
+from django.test import SimpleTestCase
+
+from hs_app_timeseries import series_query
+
+SQLITE_FILE = 'hs_file_types/tests/data/ODM2_Multi_Site_One_Variable.sqlite'
+SERIES_ID = '182d8fa3-1ebc-11e6-ad49-f45c8999816f'
+
+
+class TestSeriesQuery(SimpleTestCase):
+
+    def setUp(self):
+        super(TestSeriesQuery, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        sqlite_file = os.path.join(self.tmp_dir, 'ODM2.sqlite')
+        shutil.copy(SQLITE_FILE, sqlite_file)
+        replica_path = os.path.join(self.tmp_dir, 'replica.sqlite')
+        series_query.create_query_replica(sqlite_file, replica_path)
+        self.assertEqual(os.listdir(self.tmp_dir), ['replica.sqlite'])
+        self.con = series_query.open_replica(replica_path)
+        self.result_id, self.nodata_value = series_query.get_series(self.con, SERIES_ID)
+
+    def tearDown(self):
+        self.con.close()
+        shutil.rmtree(self.tmp_dir)
+        super(TestSeriesQuery, self).tearDown()
+
+    def _all_values(self):
+        rows = self.con.execute("SELECT ValueDateTime, DataValue FROM TimeSeriesResultValues "
+                                "WHERE ResultID=? AND DataValue != ? ORDER BY ValueDateTime",
+                                (self.result_id, self.nodata_value)).fetchall()
+        return (numpy.array([row[0] for row in rows]).astype('datetime64[us]'),
+                numpy.array([row[1] for row in rows]))
+
+    def test_read_values(self):
+        self.assertIsNone(series_query.get_series(self.con, 'no-such-series'))
+        # time ranges are read by the index of the replica
+        plan = self.con.execute("EXPLAIN QUERY PLAN SELECT ValueDateTime, DataValue FROM "
+                                "TimeSeriesResultValues WHERE ResultID=1 AND ValueDateTime >= '' "
+                                "ORDER BY ValueDateTime").fetchall()
+        self.assertIn('hs_series_values_by_time', plan[0][-1])
+        self.assertNotIn('TEMP B-TREE', str(plan))
+
+        chunks = list(series_query.read_values(self.con, self.result_id, chunk_size=500))
+        self.assertEqual([len(values) for _, values in chunks], [500, 500, 440])
+        start = series_query.normalize_timestamp('2008-01-02T12:00')
+        end = series_query.normalize_timestamp('2008-01-03')
+        self.assertEqual(start, '2008-01-02 12:00:00')
+        timestamps, values = next(series_query.read_values(self.con, self.result_id, start, end))
+        self.assertEqual(len(values), 25)
+        self.assertEqual(timestamps[0], numpy.datetime64('2008-01-02T12:00'))
+        self.assertEqual(timestamps[-1], numpy.datetime64('2008-01-03T00:00'))
+        with self.assertRaises(ValueError):
+            series_query.normalize_timestamp('yesterday')
+
+    def test_aggregation(self):
+        all_timestamps, all_values = self._all_values()
+        first, last = series_query.get_time_range(self.con, self.result_id)
+        bucket_span = (numpy.datetime64(last, 'us') - numpy.datetime64(first, 'us')) / 10
+        buckets = ((all_timestamps - all_timestamps[0]) / bucket_span).astype(int).clip(0, 9)
+        for aggregation in ('min', 'max', 'mean'):
+            # reading a chunk at a time gives the same buckets as reading all values
+            timestamps, values = series_query.aggregate_values(
+                series_query.read_values(self.con, self.result_id, chunk_size=77), first, last,
+                10, aggregation, self.nodata_value)
+            expected = [getattr(numpy, aggregation)(all_values[buckets == bucket])
+                        for bucket in range(10) if (buckets == bucket).any()]
+            self.assertEqual(len(values), len(expected))
+            self.assertTrue(numpy.allclose(values, expected))
+            self.assertEqual(timestamps[0], all_timestamps[0])
+
+        timestamps, values = series_query.downsample_values(
+            series_query.read_values(self.con, self.result_id, chunk_size=77), 50,
+            self.nodata_value)
+        self.assertEqual(len(values), 50)
+        self.assertEqual(timestamps[0], all_timestamps[0])
+        self.assertEqual(timestamps[-1], all_timestamps[-1])
+        self.assertTrue((numpy.diff(timestamps) > numpy.timedelta64(0)).all())
+        # LTTB keeps the points that shape a series, such as a spike
+        timestamps = all_timestamps[:100]
+        values = numpy.zeros(100)
+        values[37] = 10
+        self.assertIn(37, series_query.lttb(timestamps, values, 5))
+        self.assertEqual(len(series_query.lttb(timestamps, values, 200)), 100)
+
+    def test_aggregation_of_long_ranges(self):
+        # ten years of daily values split into as many buckets as the REST API allows
+        start = numpy.datetime64('2000-01-01T00:00', 'us')
+        timestamps = start + numpy.arange(3653).astype('timedelta64[D]').astype('timedelta64[us]')
+        values = numpy.arange(3653, dtype='float64')
+        end = timestamps[-1]
+        bucket_timestamps, bucket_values = series_query.aggregate_values(
+            [(timestamps, values)], start, end, 100000, 'mean')
+        self.assertEqual(len(bucket_values), len(values))
+        self.assertEqual(bucket_values.tolist(), values.tolist())
+        self.assertTrue((numpy.diff(bucket_timestamps) > numpy.timedelta64(0)).all())
+        self.assertEqual(bucket_timestamps[0], start)
+        self.assertTrue(bucket_timestamps[-1] <= end)
+        self.assertTrue(end - bucket_timestamps[-1] < numpy.timedelta64(1, 'D'))
+
+    def test_output_formats(self):
+        timestamps = numpy.array(['2008-01-01T00:00', '2008-01-01T00:30'], dtype='datetime64[us]')
+        values = numpy.array([1.5, -2.0])
+        chunks = [(timestamps, values), (timestamps[:0], values[:0]), (timestamps, values)]
+
+        self.assertEqual(''.join(series_query.write_csv(chunks, 'mean')),
+                         'ValueDateTime,mean\n' +
+                         '2008-01-01T00:00:00,1.5\n2008-01-01T00:30:00,-2.0\n' * 2)
+        output = json.loads(''.join(series_query.write_json(chunks, SERIES_ID)))
+        self.assertEqual(output['series_id'], SERIES_ID)
+        self.assertEqual(output['values'], [['2008-01-01T00:00:00', 1.5],
+                                            ['2008-01-01T00:30:00', -2.0]] * 2)
+
+        output = b''.join(series_query.write_binary(chunks))
+        self.assertTrue(output.startswith(series_query.BINARY_MAGIC))
+        batch = output[len(series_query.BINARY_MAGIC):]
+        self.assertEqual(len(batch), 2 * (4 + 2 * 8 + 2 * 8))
+        self.assertEqual(struct.unpack('<I', batch[:4])[0], 2)
+        self.assertEqual(numpy.frombuffer(batch[4:20], '<i8').astype('datetime64[us]').tolist(),
+                         timestamps.tolist())
+        self.assertEqual(numpy.frombuffer(batch[20:36], '<f8').tolist(), [1.5, -2.0])
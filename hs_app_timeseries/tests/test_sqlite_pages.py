@@ -0,0 +1,89 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.test import SimpleTestCase
+
+from hs_app_timeseries.sqlite_pages import SQLiteFormatError, SQLiteMetadataCopy
+
+
+class TestSQLitePages(SimpleTestCase):
+
+    def setUp(self):
+        super(TestSQLitePages, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sqlite_file = os.path.join(self.tmp_dir, 'ODM2.sqlite')
+        shutil.copy('hs_app_timeseries/files/ODM2.sqlite', self.sqlite_file)
+        con = sqlite3.connect(self.sqlite_file)
+        with con:
+            con.execute("INSERT INTO Datasets (DatasetID, DatasetUUID, DatasetTypeCV, "
+                        "DatasetCode, DatasetTitle, DatasetAbstract) "
+                        "VALUES (1, 'uuid', 'Unknown', 'code', 'title', 'abstract')")
+            con.executemany("INSERT INTO TimeSeriesResultValues VALUES (?,?,?,?,?,?,?,?,?)",
+                            ((value_id, 1, value_id * 0.5, '2008-01-01 00:00:00', -7,
+                              'Unknown', 'Unknown', 30, 102) for value_id in range(1, 20001)))
+        con.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestSQLitePages, self).tearDown()
+
+    def _update_metadata(self, sqlite_file, authorizer=None):
+        con = sqlite3.connect(sqlite_file)
+        if authorizer is not None:
+            con.set_authorizer(authorizer)
+        with con:
+            # a long abstract takes overflow pages that are added at the end of the file
+            con.execute("UPDATE Datasets SET DatasetTitle=?, DatasetAbstract=?",
+                        ('new title', 'new abstract ' * 1000))
+            con.execute("INSERT INTO People (PersonID, PersonFirstName, PersonLastName) "
+                        "VALUES (1, 'John', 'Smith')")
+        con.close()
+
+    def test_metadata_update(self):
+        updated_file = os.path.join(self.tmp_dir, 'updated.sqlite')
+        shutil.copy(self.sqlite_file, updated_file)
+        self._update_metadata(updated_file)
+
+        copy_file = os.path.join(self.tmp_dir, 'copy.sqlite')
+        with open(self.sqlite_file, 'rb') as f:
+            metadata_copy = SQLiteMetadataCopy(f, os.path.getsize(self.sqlite_file), copy_file)
+        # the pages of the data values are not copied
+        blank_file_pages = os.path.getsize('hs_app_timeseries/files/ODM2.sqlite') // \
+            metadata_copy.page_size
+        self.assertGreater(metadata_copy.page_count, blank_file_pages + 1000)
+        self.assertLessEqual(len(metadata_copy.page_hashes), blank_file_pages + 1)
+        self.assertIn('TimeSeriesResultValues', metadata_copy.data_tables)
+        self._update_metadata(copy_file, metadata_copy.authorize)
+
+        # writing back the changed pages gives the same file as updating the whole file
+        ranges = metadata_copy.changed_ranges()
+        self.assertLess(sum(len(data) for _, data in ranges), 50 * metadata_copy.page_size)
+        with open(self.sqlite_file, 'r+b') as f:
+            for offset, data in ranges:
+                f.seek(offset)
+                f.write(data)
+        with open(self.sqlite_file, 'rb') as f, open(updated_file, 'rb') as updated:
+            self.assertEqual(f.read(), updated.read())
+
+        # the data tables can't be accessed in the copy
+        con = sqlite3.connect(copy_file)
+        con.set_authorizer(metadata_copy.authorize)
+        with self.assertRaises(sqlite3.DatabaseError):
+            con.execute("UPDATE TimeSeriesResultValues SET ValueDateTimeUTCOffset=-5")
+        con.close()
+
+    def test_unsupported_files(self):
+        copy_file = os.path.join(self.tmp_dir, 'copy.sqlite')
+        csv_file = 'hs_app_timeseries/tests/ODM2_Multi_Site_One_Variable_Test.csv'
+        with open(csv_file, 'rb') as f:
+            with self.assertRaises(SQLiteFormatError):
+                SQLiteMetadataCopy(f, os.path.getsize(csv_file), copy_file)
+
+        con = sqlite3.connect(self.sqlite_file)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.close()
+        with open(self.sqlite_file, 'rb') as f:
+            with self.assertRaises(SQLiteFormatError):
+                SQLiteMetadataCopy(f, os.path.getsize(self.sqlite_file), copy_file)
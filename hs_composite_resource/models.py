@@ -1,13 +1,17 @@
 import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 
 from mezzanine.pages.page_processors import processor_for
 
+from hs_core.hydroshare.utils import set_dirty_bag_flag
 from hs_core.models import BaseResource, ResourceManager, ResourceFile, resource_processor
 
 
-from hs_file_types.models import GenericLogicalFile
+from hs_file_types.models import AbstractLogicalFile, DirtyAggregation, GenericLogicalFile
 from hs_file_types.models.base import RESMAP_FILE_ENDSWITH, METADATA_FILE_ENDSWITH
 from hs_file_types.utils import update_target_temporal_coverage, update_target_spatial_coverage
 
@@ -176,10 +180,8 @@ class CompositeResource(BaseResource):
         """
 
         if not path:
-            # create xml docs far all aggregation of this resource
-            for aggregation in self.logical_files:
-                if aggregation.metadata.is_dirty:
-                    aggregation.create_aggregation_xml_documents()
+            # create xml docs for all aggregations of this resource whose metadata is dirty
+            self._create_xml_docs_for_aggregations(DirtyAggregation.get_aggregations(self))
         else:
             # first check if the path is a folder path or file path
             _, ext = os.path.splitext(path)
@@ -254,19 +256,74 @@ class CompositeResource(BaseResource):
         # create xml docs for all non fileset aggregations
         # note: we can't get to all filesets from resource files since
         # it is possible to have filesets without any associated resource files
-        logical_files = self._get_aggregations_by_folder(folder)
-        for lf in logical_files:
-            if lf.metadata.is_dirty:
-                lf.create_aggregation_xml_documents()
+        logical_files = [lf for lf in self._get_aggregations_by_folder(folder)
+                         if lf.metadata.is_dirty]
 
         # create xml docs for all fileset aggregations that exist under folder *folder*
         if folder.startswith(self.file_path):
             folder = folder[len(self.file_path) + 1:]
 
-        filesets = self.filesetlogicalfile_set.filter(folder__startswith=folder)
-        for fs in filesets:
-            if fs.metadata.is_dirty:
-                fs.create_aggregation_xml_documents()
+        filesets = self.filesetlogicalfile_set.filter(folder__startswith=folder,
+                                                      metadata__is_dirty=True)
+        self._create_xml_docs_for_aggregations(logical_files + list(filesets))
+
+    def _create_xml_docs_for_aggregations(self, aggregations):
+        """Creates xml metadata and map documents for the specified aggregations
+
+        The documents are generated one after another, but are copied to iRODS concurrently by
+        HS_AGGREGATION_XML_WORKERS (default 4) threads. The metadata of aggregations whose
+        documents could not be created is left dirty, and the first error is raised after the
+        documents of the other aggregations are created.
+
+        :param  aggregations: a list of aggregations (logical files) of this resource
+        """
+        if len(aggregations) <= 1:
+            for aggregation in aggregations:
+                aggregation.create_aggregation_xml_documents()
+            return
+
+        log = logging.getLogger()
+
+        def save_xml_document(document):
+            AbstractLogicalFile.save_xml_documents(self.get_irods_storage(), [document])
+
+        workers = getattr(settings, 'HS_AGGREGATION_XML_WORKERS', 4)
+        created = []
+        error = None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # documents are generated here, one aggregation after another, and copied to
+            # iRODS by the threads
+            pending = []
+            for aggregation in aggregations:
+                try:
+                    documents = aggregation.get_aggregation_xml_documents()
+                    pending.append((aggregation, [executor.submit(save_xml_document, document)
+                                                  for document in documents], None))
+                except Exception as ex:
+                    pending.append((aggregation, [], ex))
+            for aggregation, futures, generation_error in pending:
+                try:
+                    if generation_error is not None:
+                        raise generation_error
+                    for future in futures:
+                        # re-raises any exception raised in the thread
+                        future.result()
+                except Exception as ex:
+                    # the metadata of the aggregation is left dirty
+                    log.error("Failed to create aggregation metadata xml file for {}. "
+                              "Error:{}".format(aggregation.aggregation_name, str(ex)))
+                    error = error or ex
+                else:
+                    created.append(aggregation)
+
+        if created:
+            # setting bag flag to dirty - as resource map document needs to be re-generated as
+            # resource map xml file has references to aggregation map xml file paths
+            set_dirty_bag_flag(self)
+        for aggregation in created:
+            aggregation.aggregation_xml_documents_created()
+        if error is not None:
+            raise error
 
     def _get_aggregations_by_folder(self, folder):
         """Get a list of all non-fileset aggregations associated with resource files that
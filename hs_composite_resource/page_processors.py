@@ -4,6 +4,7 @@ from django.http import HttpResponseRedirect
 from mezzanine.pages.page_processors import processor_for
 
 from hs_core import page_processors
+from hs_core.landing_page_cache import get_missing_file_type_metadata_info
 from hs_core.views import add_generic_context
 from .models import CompositeResource
 
@@ -57,7 +58,7 @@ def landing_page(request, page):
         return context
 
     file_type_missing_metadata = {'file_type_missing_metadata':
-                                  content_model.get_missing_file_type_metadata_info()}
+                                  get_missing_file_type_metadata_info(content_model)}
     context.update(file_type_missing_metadata)
     hs_core_context = add_generic_context(request, page)
     context.update(hs_core_context)
@@ -1,11 +1,17 @@
 # coding=utf-8
 import os
+import shutil
+import tempfile
+import threading
+import zipfile
 
-from django.test import TransactionTestCase
+from django.test import TransactionTestCase, override_settings
 from django.contrib.auth.models import Group
 
+from mock import patch
 from rest_framework import status
 
+from django_irods.icommands import SessionException
 from hs_core.testing import MockIRODSTestCaseMixin
 from hs_core import hydroshare
 from hs_core.models import BaseResource, ResourceFile
@@ -16,7 +22,8 @@ from hs_composite_resource.models import CompositeResource
 from hs_file_types.models import GenericLogicalFile, GeoRasterLogicalFile, GenericFileMetaData, \
     RefTimeseriesLogicalFile, FileSetLogicalFile, NetCDFLogicalFile, TimeSeriesLogicalFile, \
     GeoFeatureLogicalFile
-from hs_file_types.models.base import METADATA_FILE_ENDSWITH, RESMAP_FILE_ENDSWITH
+from hs_file_types.models.base import METADATA_FILE_ENDSWITH, RESMAP_FILE_ENDSWITH, \
+    AbstractLogicalFile, DirtyAggregation
 from hs_file_types.tests.utils import CompositeResourceTestMixin
 
 
@@ -571,6 +578,86 @@ class CompositeResourceTest(MockIRODSTestCaseMixin, TransactionTestCase,
         except Exception as ex:
             self.fail("Failed to generate metadata in xml format. Error:{}".format(str(ex)))
 
+    def _create_dirty_generic_aggregations(self):
+        """creates a generic aggregation in each of three folders, marks their metadata dirty
+        and removes their xml documents from iRODS; returns the paths of the xml documents"""
+        self.create_composite_resource()
+        for folder in ('folder-1', 'folder-2', 'folder-3'):
+            res_file = self.add_file_to_resource(file_to_add=self.generic_file,
+                                                 upload_folder=folder)
+            GenericLogicalFile.set_file_type(self.composite_resource, self.user, res_file.id)
+        aggregations = list(GenericLogicalFile.objects.all())
+        self.assertEqual(len(aggregations), 3)
+
+        istorage = self.composite_resource.get_irods_storage()
+        xml_paths = []
+        for aggregation in aggregations:
+            aggregation.metadata.is_dirty = True
+            aggregation.metadata.save()
+            xml_paths.extend([aggregation.metadata_file_path, aggregation.map_file_path])
+        for xml_path in xml_paths:
+            if istorage.exists(xml_path):
+                istorage.delete(xml_path)
+        self.assertEqual(DirtyAggregation.objects.filter(
+            resource=self.composite_resource).count(), 3)
+        return xml_paths
+
+    def test_create_xml_docs_for_dirty_aggregations(self):
+        """Test that the xml documents of several dirty aggregations are copied to iRODS by
+        multiple threads and that the aggregations are no longer dirty afterwards"""
+
+        xml_paths = self._create_dirty_generic_aggregations()
+        istorage = self.composite_resource.get_irods_storage()
+        save_xml_documents = AbstractLogicalFile.save_xml_documents
+        saved_by_thread = []
+
+        def record_thread(storage, documents):
+            saved_by_thread.append(threading.current_thread().name)
+            save_xml_documents(storage, documents)
+
+        with override_settings(HS_AGGREGATION_XML_WORKERS=2), \
+                patch.object(AbstractLogicalFile, 'save_xml_documents',
+                             side_effect=record_thread):
+            self.composite_resource.create_aggregation_xml_documents()
+
+        # one document is saved at a time, by the worker threads
+        self.assertEqual(len(saved_by_thread), 6)
+        self.assertNotIn(threading.current_thread().name, saved_by_thread)
+        for xml_path in xml_paths:
+            self.assertTrue(istorage.exists(xml_path))
+        self.assertEqual(DirtyAggregation.objects.filter(
+            resource=self.composite_resource).count(), 0)
+        for aggregation in GenericLogicalFile.objects.all():
+            self.assertFalse(aggregation.metadata.is_dirty)
+
+    def test_create_xml_docs_for_dirty_aggregations_failure(self):
+        """Test that an aggregation whose xml documents could not be copied to iRODS stays
+        dirty while the documents of the other aggregations are created"""
+
+        xml_paths = self._create_dirty_generic_aggregations()
+        istorage = self.composite_resource.get_irods_storage()
+        save_xml_documents = AbstractLogicalFile.save_xml_documents
+
+        def fail_in_folder_2(storage, documents):
+            if any('folder-2' in path for path, _ in documents):
+                raise SessionException(-1, '', 'cannot save')
+            save_xml_documents(storage, documents)
+
+        with override_settings(HS_AGGREGATION_XML_WORKERS=2), \
+                patch.object(AbstractLogicalFile, 'save_xml_documents',
+                             side_effect=fail_in_folder_2), \
+                self.assertLogs(level='ERROR') as logs:
+            with self.assertRaises(SessionException):
+                self.composite_resource.create_aggregation_xml_documents()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('folder-2', logs.output[0])
+
+        for xml_path in xml_paths:
+            self.assertEqual(istorage.exists(xml_path), 'folder-2' not in xml_path)
+        dirty = DirtyAggregation.get_aggregations(self.composite_resource)
+        self.assertEqual([aggregation.aggregation_name for aggregation in dirty],
+                         ['folder-2/generic_file.txt'])
+
     def test_resource_coverage_auto_update(self):
         # this is to test that the spatial coverage and temporal coverage
         # for composite resource get updated by the system based on the
@@ -2168,6 +2255,68 @@ class CompositeResourceTest(MockIRODSTestCaseMixin, TransactionTestCase,
         # ensure files are overwriting
         self.assertEqual(self.composite_resource.files.count(), 2)
 
+    def test_unzip_nested_folders_overwrite(self):
+        """Test that when a zip file with nested folders gets unzipped with overwrite True into
+        a resource where some of its folders already exist, all files are moved into place and
+        linked to the resource once"""
+
+        self.create_composite_resource()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        zip_file = os.path.join(tmp_dir, 'nested.zip')
+        with zipfile.ZipFile(zip_file, 'w') as zfile:
+            for name in ('folder/a.txt', 'folder/sub/b.txt', 'folder/new/c.txt', 'd.txt'):
+                zfile.writestr(name, name)
+        self.add_file_to_resource(file_to_add=zip_file)
+        zip_file_rel_path = os.path.join('data', 'contents', 'nested.zip')
+        unzip_file(self.user, self.composite_resource.short_id, zip_file_rel_path,
+                   bool_remove_original=False, overwrite=True)
+        self.assertEqual(self.composite_resource.files.count(), 5)
+
+        # unzip again after one of the sub folders has been removed
+        remove_folder(self.user, self.composite_resource.short_id, 'data/contents/folder/new')
+        self.assertEqual(self.composite_resource.files.count(), 4)
+        unzip_file(self.user, self.composite_resource.short_id, zip_file_rel_path,
+                   bool_remove_original=False, overwrite=True)
+
+        self.assertEqual(self.composite_resource.files.count(), 5)
+        self.assertEqual(sorted(f.short_path for f in self.composite_resource.files.all()),
+                         ['d.txt', 'folder/a.txt', 'folder/new/c.txt', 'folder/sub/b.txt',
+                          'nested.zip'])
+        for res_file in self.composite_resource.files.all():
+            self.assertTrue(res_file.exists)
+
+    def test_unzip_shapefile_aggregation_overwrite(self):
+        """Test that when a zip file with all files of a shapefile gets unzipped with overwrite
+        True over the same shapefile aggregation, the aggregation is replaced and no file is
+        lost"""
+
+        self.create_composite_resource()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        zip_file = os.path.join(tmp_dir, 'watersheds.zip')
+        with zipfile.ZipFile(zip_file, 'w') as zfile:
+            for file_path in (self.watershed_dbf_file, self.watershed_shp_file,
+                              self.watershed_shx_file):
+                zfile.write(file_path, os.path.basename(file_path))
+        self.add_file_to_resource(file_to_add=zip_file)
+        zip_file_rel_path = os.path.join('data', 'contents', 'watersheds.zip')
+        unzip_file(self.user, self.composite_resource.short_id, zip_file_rel_path,
+                   bool_remove_original=False, overwrite=True)
+        self.assertEqual(self.composite_resource.files.count(), 4)
+        self.assertEqual(GeoFeatureLogicalFile.objects.count(), 1)
+
+        # overwriting the first file deletes the whole aggregation, including the files that
+        # are overwritten next
+        unzip_file(self.user, self.composite_resource.short_id, zip_file_rel_path,
+                   bool_remove_original=False, overwrite=True)
+
+        self.assertEqual(self.composite_resource.files.count(), 4)
+        self.assertEqual(GeoFeatureLogicalFile.objects.count(), 1)
+        self.assertEqual(GeoFeatureLogicalFile.objects.first().files.count(), 3)
+        for res_file in self.composite_resource.files.all():
+            self.assertTrue(res_file.exists)
+
     def test_unzip_aggregation(self):
         """Test that when a zip file gets unzipped at data/contents/ where the contents includes a
         single file aggregation.  Testing the aggregation is recognized on unzip"""
@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+
+from hs_core import hydroshare
+from hs_core.testing import MockIRODSTestCaseMixin, ViewTestCase
+from hs_core.views.resource_folder_hierarchy import data_store_structure
+from hs_core.views.utils import create_folder
+from hs_file_types.models import GenericLogicalFile
+from hs_file_types.tests.utils import CompositeResourceTestMixin
+
+
+class TestDataStoreStructure(MockIRODSTestCaseMixin, ViewTestCase, CompositeResourceTestMixin):
+    def setUp(self):
+        super(TestDataStoreStructure, self).setUp()
+        self.group, _ = Group.objects.get_or_create(name='Hydroshare Author')
+        self.username = 'john'
+        self.password = 'jhmypassword'
+        self.user = hydroshare.create_account(
+            'john@gmail.com',
+            username=self.username,
+            first_name='John',
+            last_name='Clarson',
+            superuser=False,
+            password=self.password,
+            groups=[]
+        )
+        self.res_title = 'Testing Composite Resource'
+
+    def tearDown(self):
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+        super(TestDataStoreStructure, self).tearDown()
+
+    def _add_files(self, count, start=0):
+        """add count text files, each with a folder and a generic aggregation"""
+        for i in range(start, start + count):
+            file_path = os.path.join(self.temp_dir, 'file_{}.txt'.format(i))
+            with open(file_path, 'w') as f:
+                f.write("Hello World {}\n".format(i))
+            res_file = self.add_file_to_resource(file_to_add=file_path)
+            GenericLogicalFile.set_file_type(self.composite_resource, self.user, res_file.id)
+            create_folder(self.composite_resource.short_id,
+                          'data/contents/folder_{}'.format(i))
+            file_path = os.path.join(self.temp_dir, 'nested_{}.txt'.format(i))
+            with open(file_path, 'w') as f:
+                f.write("Hello World {}\n".format(i))
+            self.add_file_to_resource(file_to_add=file_path,
+                                      upload_folder='folder_{}'.format(i))
+
+    def _get_structure(self):
+        request = self.factory.post('/hsapi/_internal/data-store-structure/',
+                                    data={'res_id': self.composite_resource.short_id,
+                                          'store_path': 'data/contents'})
+        request.user = self.user
+        with CaptureQueriesContext(connection) as queries:
+            response = data_store_structure(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content.decode()), len(queries)
+
+    def test_query_count_does_not_grow_with_files(self):
+        """the number of queries to list a folder must not depend on how many files and folders
+        it holds"""
+        self.create_composite_resource()
+        self._add_files(2)
+        structure, small_count = self._get_structure()
+        self.assertEqual(len(structure['files']), 2)
+        self.assertEqual(len(structure['folders']), 2)
+        self.assertEqual(len(structure['aggregations']), 2)
+
+        self._add_files(6, start=2)
+        structure, large_count = self._get_structure()
+        self.assertEqual(len(structure['files']), 8)
+        self.assertEqual(len(structure['folders']), 8)
+        self.assertEqual(len(structure['aggregations']), 8)
+        self.assertEqual(large_count, small_count)
+
+        for folder in structure['folders']:
+            self.assertEqual(folder['folder_aggregation_type_to_set'], 'FileSetLogicalFile')
+        for res_file in structure['files']:
+            self.assertEqual(res_file['logical_type'], 'GenericLogicalFile')
+        self.composite_resource.delete()
@@ -0,0 +1,161 @@
+"""Cache of the decisions made by hs_core.views.utils.authorize.
+
+Decisions are keyed by user, resource and action. They are memoized on the request, so
+that repeated authorization of the same action within a request is free, and, if
+HS_AUTHORIZE_CACHE_TIMEOUT is set to a number of seconds, shared across requests and
+processes through the Django cache named by HS_AUTHORIZE_CACHE (default 'default').
+
+All decisions are invalidated at once by bumping a version counter kept in that cache
+whenever a resource access flag, a privilege or a group's activity changes, and again when the
+transaction making the change commits (see hs_core.receivers). The shared cache should be one
+that is common to all web processes (e.g., memcached or redis) for invalidation to reach all of
+them; with the default local memory cache, keep the timeout short.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+AUTHORIZE_VERSION_KEY = 'hs_core.authorize.version'
+
+_stats_lock = threading.Lock()
+_stats = {'request_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+
+def _get_cache():
+    return caches[getattr(settings, 'HS_AUTHORIZE_CACHE', 'default')]
+
+
+def _get_timeout():
+    return getattr(settings, 'HS_AUTHORIZE_CACHE_TIMEOUT', 0)
+
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def get_authorize_cache_stats():
+    """
+    Get the hit and miss counters of this process
+    :return: dict with the number of decisions found in the request memo ('request_hits'),
+    in the shared cache ('shared_hits'), and not found ('misses')
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_authorize_cache_stats():
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
+
+
+def get_authorize_version():
+    """ Get the version counter against which decisions are cached """
+    cache = _get_cache()
+    version = cache.get(AUTHORIZE_VERSION_KEY)
+    if version is None:
+        # start from the clock rather than from 1 so that decisions cached under versions
+        # used before the counter was evicted are not revived
+        cache.add(AUTHORIZE_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(AUTHORIZE_VERSION_KEY)
+    return version
+
+
+def bump_authorize_version():
+    """ Invalidate all cached decisions """
+    cache = _get_cache()
+    try:
+        cache.incr(AUTHORIZE_VERSION_KEY)
+    except ValueError:
+        # counter not set or evicted
+        get_authorize_version()
+
+
+def _get_memo(request):
+    # a rest framework Request wraps the HttpRequest; memoize on the latter so that
+    # decisions are shared between the two
+    request = getattr(request, '_request', request)
+    memo = getattr(request, '_authorize_memo', None)
+    if memo is None:
+        memo = {}
+        request._authorize_memo = memo
+    return memo
+
+
+def _decision_key(user, res_id, action):
+    if user.is_authenticated():
+        # decisions depend upon these flags, which are not versioned
+        return (user.pk, user.is_active, user.is_superuser, res_id, action)
+    return (None, False, False, res_id, action)
+
+
+def get_cached_resource(request, res_id, version):
+    """
+    Get the resource memoized for the request by cache_resource
+    :param request: the request being authorized
+    :param res_id: short id of the resource
+    :param version: the current version from get_authorize_version()
+    :return: the resource, or None if it is not memoized or access has changed since
+    """
+    memo = _get_memo(request)
+    key = ('resource', res_id)
+    if key in memo and memo[key][0] == version:
+        return memo[key][1]
+    return None
+
+
+def cache_resource(request, res_id, version, resource):
+    """ Memoize a resource fetched for authorization for the rest of the request """
+    _get_memo(request)[('resource', res_id)] = (version, resource)
+
+
+def get_cached_decision(request, user, res_id, action, version):
+    """
+    Get a cached authorization decision
+    :param request: the request being authorized
+    :param user: the requesting user
+    :param res_id: short id of the resource
+    :param action: one of ACTION_TO_AUTHORIZE
+    :param version: the current version from get_authorize_version()
+    :return: True or False if the decision is cached, otherwise None
+    """
+    key = _decision_key(user, res_id, action)
+    memo = _get_memo(request)
+    if key in memo and memo[key][0] == version:
+        _count('request_hits')
+        return memo[key][1]
+
+    if _get_timeout():
+        authorized = _get_cache().get(_shared_key(version, key))
+        if authorized is not None:
+            _count('shared_hits')
+            memo[key] = (version, authorized)
+            return authorized
+    _count('misses')
+    return None
+
+
+def cache_decision(request, user, res_id, action, version, authorized):
+    """
+    Cache an authorization decision
+    :param request: the request being authorized
+    :param user: the requesting user
+    :param res_id: short id of the resource
+    :param action: one of ACTION_TO_AUTHORIZE
+    :param version: the version obtained before the decision was made, so that a decision
+    made during a change of access is not cached as current
+    :param authorized: the decision
+    """
+    key = _decision_key(user, res_id, action)
+    _get_memo(request)[key] = (version, authorized)
+    timeout = _get_timeout()
+    if timeout:
+        _get_cache().set(_shared_key(version, key), authorized, timeout)
+
+
+def _shared_key(version, key):
+    return 'hs_core.authorize.{}.{}'.format(version, '.'.join(str(k) for k in key))
@@ -5,6 +5,12 @@ import tempfile
 import mimetypes
 import zipfile
 import logging
+import json
+import hashlib
+import io
+import struct
+
+from django.conf import settings
 
 from foresite import utils, Aggregation, AggregatedResource, RdfLibSerializer
 from rdflib import Namespace, URIRef
@@ -13,6 +19,10 @@ import bagit
 from hs_core.models import ResourceFile
 
 
+# content of bagit.txt as written by the iRODS bagit rule
+BAGIT_TXT = "BagIt-Version: 0.96\nTag-File-Character-Encoding: UTF-8\n"
+
+
 class HsBagitException(Exception):
     pass
 
@@ -35,12 +45,13 @@ def delete_files_and_bag(resource):
         logger = logging.getLogger(__name__)
         logger.error("cannot remove {}: {}".format(resource.root_path, e))
 
-    try:
-        if istorage.exists(resource.bag_path):
-            istorage.delete(resource.bag_path)
-    except Exception as e:
-        logger = logging.getLogger(__name__)
-        logger.error("cannot remove {}: {}".format(resource.bag_path, e))
+    for path in (resource.bag_path, get_bag_manifest_path(resource)):
+        try:
+            if istorage.exists(path):
+                istorage.delete(path)
+        except Exception as e:
+            logger = logging.getLogger(__name__)
+            logger.error("cannot remove {}: {}".format(path, e))
 
 
 def create_bag_files(resource):
@@ -84,13 +95,18 @@ def create_bag_files(resource):
     # to_file_name = '{res_id}/data/visualization/'.format(res_id=resource.short_id)
     # istorage.saveFile('', to_file_name, create_directory=True)
 
-    # create resourcemetadata.xml in local directory and upload it to iRODS
-    from_file_name = os.path.join(temp_path, 'resourcemetadata.xml')
-    with open(from_file_name, 'w') as out:
-        # write resource level metadata
-        out.write(resource.get_metadata_xml())
+    # create resourcemetadata.xml in local directory and upload it to iRODS, unless the
+    # metadata has not changed since it was last uploaded
     to_file_name = os.path.join(resource.root_path, 'data', 'resourcemetadata.xml')
-    istorage.saveFile(from_file_name, to_file_name, True)
+    metadata_xml_version = resource.metadata.get_xml_version()
+    if resource.getAVU('metadata_xml_version') != metadata_xml_version or \
+            not istorage.exists(to_file_name):
+        from_file_name = os.path.join(temp_path, 'resourcemetadata.xml')
+        with open(from_file_name, 'w') as out:
+            # write resource level metadata
+            out.write(resource.get_metadata_xml())
+        istorage.saveFile(from_file_name, to_file_name, True)
+        resource.setAVU('metadata_xml_version', metadata_xml_version)
 
     # URLs are found in the /data/ subdirectory to comply with bagit format assumptions
     current_site_url = current_site_url()
@@ -131,7 +147,7 @@ def create_bag_files(resource):
     a.add_resource(resMetaFile)
 
     # Add the resource files to the aggregation
-    files = ResourceFile.objects.filter(object_id=resource.id)
+    files = ResourceFile.prefetch_logical_files(ResourceFile.objects.filter(object_id=resource.id))
 
     for f in files:
         # only the files that are not part of file type aggregation (logical file)
@@ -206,8 +222,7 @@ def create_bag_files(resource):
     if resource.resource_type == "CompositeResource":
         resource.create_aggregation_xml_documents()
 
-    res_coll = resource.root_path
-    istorage.setAVU(res_coll, 'metadata_dirty', "false")
+    resource.setAVU('metadata_dirty', False)
     shutil.rmtree(temp_path)
     return istorage
 
@@ -236,6 +251,316 @@ def create_bag(resource):
     return
 
 
+def get_bag_manifest_path(resource):
+    """
+    Return the iRODS path of the manifest recorded for the last bag of the resource. The manifest
+    is kept next to the bag rather than in the resource collection so that it is never bagged.
+    """
+    return "{}.manifest.json".format(os.path.splitext(resource.bag_path)[0])
+
+
+def _get_bag_file_stats(istorage, root_path):
+    """
+    Return size, checksum and modified time of all files in the resource collection keyed by
+    path relative to the bag root, e.g., data/contents/file.txt
+    """
+    _, files = istorage.walk(root_path)
+    return dict((f['path'][len(root_path):].lstrip('/'),
+                 {'size': f['size'],
+                  'checksum': f['checksum'],
+                  'modified_time': str(f['modified_time'])}) for f in files)
+
+
+def _save_bag_manifest(resource, istorage, file_stats, temp_path):
+    from_file_name = os.path.join(temp_path, 'bag_manifest.json')
+    with open(from_file_name, 'w') as out:
+        json.dump({'files': file_stats}, out)
+    istorage.saveFile(from_file_name, get_bag_manifest_path(resource), True)
+
+
+def record_bag_manifest(resource, istorage=None):
+    """
+    Record path, size, checksum and modified time of every file of a bag just created by the
+    iRODS bagit rule, for update_bag_incrementally() to find the files changed since then.
+
+    Parameters:
+    :param resource: the resource whose bag has just been created
+    :param istorage: IrodsStorage object of the resource; retrieved from the resource if None
+    :return: None
+    """
+    istorage = istorage or resource.get_irods_storage()
+    file_stats = _get_bag_file_stats(istorage, resource.root_path)
+    temp_path = istorage.getUniqueTmpPath
+    os.makedirs(temp_path)
+    try:
+        _save_bag_manifest(resource, istorage, file_stats, temp_path)
+    finally:
+        shutil.rmtree(temp_path)
+
+
+def _is_unchanged(previous, current):
+    return previous is not None and bool(previous['checksum']) and \
+        previous['size'] == current['size'] and \
+        previous['modified_time'] == current['modified_time'] and \
+        current['checksum'] in ('', previous['checksum'])
+
+
+def _md5(file_name):
+    md5 = hashlib.md5()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class _BagAppendFile(io.RawIOBase):
+    """
+    Seekable file object over a zipped bag in iRODS for zipfile's append mode. Reads are served
+    by byte ranges of the bag; writes, which zipfile only makes from the start of the central
+    directory on, are kept in a local spool file until write_to_bag writes them over the tail of
+    the bag, so the members before them are neither read nor written.
+    """
+
+    # bytes written to the bag by each range write
+    WRITE_CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, range_file, spool):
+        """
+        :param range_file: IrodsRangeFile of the zipped bag
+        :param spool: local binary file object, opened for reading and writing, to keep the
+        written bytes in
+        """
+        super(_BagAppendFile, self).__init__()
+        self._range_file = range_file
+        self._spool = spool
+        self._position = 0
+        # offset of the first byte written, and the size of the bag as written
+        self.start = None
+        self.size = range_file.size
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self.size + offset
+        else:
+            raise ValueError("invalid whence ({})".format(whence))
+        return self._position
+
+    def readinto(self, buffer):
+        if self.start is not None and self._position >= self.start:
+            self._spool.seek(self._position - self.start)
+            data = self._spool.read(min(len(buffer), self.size - self._position))
+        else:
+            data = self._range_file.read_at(self._position, len(buffer))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def write(self, data):
+        if self.start is None:
+            self.start = self._position
+        if self._position < self.start:
+            raise IOError("cannot write before offset {} of the bag".format(self.start))
+        self._spool.seek(self._position - self.start)
+        self._spool.write(data)
+        self._position += len(data)
+        self.size = max(self.size, self._position)
+        return len(data)
+
+    def truncate(self, size=None):
+        size = self._position if size is None else size
+        if self.start is not None:
+            self._spool.truncate(max(0, size - self.start))
+        self.size = size
+        return size
+
+    def write_to_bag(self, istorage, bag_path):
+        """Write the spooled bytes over the tail of the bag in iRODS"""
+        if self.start is None:
+            return
+        self._spool.seek(0)
+        offset = self.start
+        for chunk in iter(lambda: self._spool.read(self.WRITE_CHUNK_SIZE), b''):
+            istorage.write_ranges(bag_path, [(offset, chunk)])
+            offset += len(chunk)
+
+
+def _pad_end_record(bag_file, size, comment_length):
+    """
+    Pad the zip comment after the end of central directory record at the end of bag_file so
+    that the zip file is size bytes long; data objects in iRODS can be extended by range writes
+    but not truncated
+    :return: False if the zip comment can't be made that long
+    """
+    padding = size - bag_file.size
+    end_record_offset = bag_file.size - comment_length - zipfile.sizeEndCentDir
+    if padding <= 0:
+        return True
+    if comment_length + padding > 0xFFFF:
+        return False
+    bag_file.seek(end_record_offset + zipfile.sizeEndCentDir - 2)
+    bag_file.write(struct.pack('<H', comment_length + padding))
+    bag_file.seek(0, io.SEEK_END)
+    bag_file.write(b' ' * padding)
+    return True
+
+
+def _member_size(info):
+    # local file header, name, extra field and compressed data of a zip member
+    return 30 + len(info.filename.encode('utf-8')) + len(info.extra) + info.compress_size
+
+
+def _update_zipped_bag(istorage, bag_path, bag_root, replaced, added, max_dead_size):
+    """
+    Update a zipped bag in iRODS in place: the members of unchanged files stay where they are,
+    untouched; the members of replaced files are dropped from the central directory, the added
+    files are appended after the last member and the central directory is written after them
+    :param istorage: IrodsStorage whose session supports byte range reads and writes
+    :param bag_path: path of the zipped bag in iRODS
+    :param bag_root: name of the folder all bag members are in
+    :param replaced: paths, relative to bag_root, of the members to drop
+    :param added: list of (path relative to bag_root, function returning a local file path) of
+    the files to append
+    :param max_dead_size: maximum number of bytes of dropped members the bag may hold; the bag
+    needs to be created from scratch to reclaim them
+    :return: False if the bag can't be updated in place
+    """
+    range_file = istorage.open_range(bag_path)
+    with tempfile.TemporaryFile() as spool:
+        bag_file = _BagAppendFile(range_file, spool)
+        size = bag_file.size
+        with zipfile.ZipFile(bag_file, 'a', zipfile.ZIP_DEFLATED, allowZip64=True) as bag_zip:
+            for info in list(bag_zip.infolist()):
+                if info.filename[len(bag_root) + 1:] in replaced:
+                    bag_zip.filelist.remove(info)
+                    del bag_zip.NameToInfo[info.filename]
+            live_size = sum(_member_size(info) for info in bag_zip.infolist())
+            if bag_zip.start_dir - live_size > max_dead_size:
+                return False
+            comment_length = len(bag_zip.comment)
+            for path, get_local_file in added:
+                bag_zip.write(get_local_file(), os.path.join(bag_root, path))
+        if not _pad_end_record(bag_file, size, comment_length):
+            return False
+        bag_file.write_to_bag(istorage, bag_path)
+    return True
+
+
+def update_bag_incrementally(resource, istorage=None):
+    """
+    Update the bag of a resource in place of running the iRODS bagit rule and ibun zip over the
+    whole resource collection. Using the manifest recorded for the last bag, only the checksums
+    of files added or changed since then are computed, and only those files are fetched from
+    iRODS and appended to the zipped bag in place (see _update_zipped_bag); the other members of
+    the bag are neither read nor rewritten. The bag tag files (bagit.txt, manifest-md5.txt and
+    tagmanifest-md5.txt) are always regenerated.
+
+    Parameters:
+    :param resource: the resource to update the bag for
+    :param istorage: IrodsStorage object of the resource; retrieved from the resource if None
+    :return: True if the bag has been updated; False if the bag cannot be updated incrementally,
+    i.e., the iRODS session can't read and write byte ranges, there is no last bag or manifest,
+    more than HS_BAGIT_INCREMENTAL_MAX_CHANGE of the payload size has changed or that much of
+    the zipped bag is taken by replaced members, in which case the bag needs to be created from
+    scratch
+    """
+    istorage = istorage or resource.get_irods_storage()
+    if not istorage.supports_range_writes():
+        return False
+    root_path = resource.root_path
+    bag_path = resource.bag_path
+    manifest_path = get_bag_manifest_path(resource)
+    if not istorage.exists(manifest_path) or not istorage.exists(bag_path):
+        return False
+
+    temp_path = istorage.getUniqueTmpPath
+    os.makedirs(temp_path)
+    try:
+        local_manifest = os.path.join(temp_path, 'bag_manifest.json')
+        istorage.getFile(manifest_path, local_manifest)
+        with open(local_manifest) as f:
+            previous = json.load(f)['files']
+
+        current = _get_bag_file_stats(istorage, root_path)
+        tag_files = ('bagit.txt', 'manifest-md5.txt', 'tagmanifest-md5.txt')
+        for name in tag_files:
+            current.pop(name, None)
+        if 'readme.txt' not in current:
+            return False
+        payload = sorted(path for path in current if path.startswith('data/'))
+        changed = set(path for path in current
+                      if not _is_unchanged(previous.get(path), current[path]))
+
+        max_change = getattr(settings, 'HS_BAGIT_INCREMENTAL_MAX_CHANGE', 0.5)
+        total_size = sum(current[path]['size'] for path in payload)
+        changed_size = sum(current[path]['size'] for path in changed)
+        if total_size and changed_size > total_size * max_change:
+            return False
+
+        for path in current:
+            if path in changed:
+                current[path]['checksum'] = istorage.checksum(os.path.join(root_path, path))
+            else:
+                current[path]['checksum'] = previous[path]['checksum']
+
+        # regenerate bag tag files the same way as the iRODS bagit rule does
+        local_files = {}
+        for name in tag_files:
+            local_files[name] = os.path.join(temp_path, name)
+        with open(local_files['bagit.txt'], 'w') as out:
+            out.write(BAGIT_TXT)
+        with open(local_files['manifest-md5.txt'], 'w') as out:
+            for path in payload:
+                out.write("{}    {}\n".format(current[path]['checksum'], path))
+        with open(local_files['tagmanifest-md5.txt'], 'w') as out:
+            out.write("{}    bagit.txt\n".format(_md5(local_files['bagit.txt'])))
+            out.write("{}    manifest-md5.txt\n".format(_md5(local_files['manifest-md5.txt'])))
+            out.write("{}    readme.txt\n".format(current['readme.txt']['checksum']))
+        for name in tag_files:
+            istorage.saveFile(local_files[name], os.path.join(root_path, name))
+            current[name] = {'size': os.path.getsize(local_files[name]),
+                             'checksum': _md5(local_files[name]),
+                             'modified_time': ''}
+
+        # update the zipped bag in place, fetching from iRODS only the files that have changed
+        def fetch(path):
+            def get_local_file():
+                local_file = os.path.join(temp_path, 'changed', path)
+                if not os.path.isdir(os.path.dirname(local_file)):
+                    os.makedirs(os.path.dirname(local_file))
+                istorage.getFile(os.path.join(root_path, path), local_file)
+                return local_file
+            return get_local_file
+
+        replaced = changed | set(tag_files) | (set(previous) - set(current))
+        added = [(path, fetch(path)) for path in sorted(changed)] + \
+            [(name, lambda name=name: local_files[name]) for name in tag_files]
+        bag_size = istorage.size(bag_path)
+        if not _update_zipped_bag(istorage, bag_path, os.path.basename(root_path), replaced,
+                                  added, max_dead_size=bag_size * max_change):
+            return False
+
+        _save_bag_manifest(resource, istorage, current, temp_path)
+        return True
+    finally:
+        shutil.rmtree(temp_path)
+
+
 def read_bag(bag_path):
     """
     :param bag_path:
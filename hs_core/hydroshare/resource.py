@@ -143,7 +143,7 @@ def get_science_metadata(pk):
     Exception.ServiceFailure  - The service is unable to process the request
     """
     res = utils.get_resource_by_shortkey(pk)
-    return res.metadata.get_xml()
+    return res.metadata.get_cached_xml()
 
 
 def get_capabilities(pk):
@@ -257,22 +257,19 @@ def replicate_resource_bag_to_user_zone(user, res_id):
     # accommodate the case where the very same resource gets deleted by another request when
     # it is getting downloaded
     if istorage.exists(res_coll):
-        bag_modified = istorage.getAVU(res_coll, 'bag_modified')
-
         # make sure bag_modified_flag is set to False only if bag exists and bag_modified AVU
         # is False; otherwise, bag_modified_flag will take the default True value so that the
         # bag will be created or recreated
-        if bag_modified:
-            if bag_modified.lower() == "false":
-                bag_file_name = res_id + '.zip'
-                if res.resource_federation_path:
-                    bag_full_path = os.path.join(res.resource_federation_path, 'bags',
-                                                 bag_file_name)
-                else:
-                    bag_full_path = os.path.join('bags', bag_file_name)
-
-                if istorage.exists(bag_full_path):
-                    bag_modified_flag = False
+        if not res.getAVU('bag_modified'):
+            bag_file_name = res_id + '.zip'
+            if res.resource_federation_path:
+                bag_full_path = os.path.join(res.resource_federation_path, 'bags',
+                                             bag_file_name)
+            else:
+                bag_full_path = os.path.join('bags', bag_file_name)
+
+            if istorage.exists(bag_full_path):
+                bag_modified_flag = False
 
         if bag_modified_flag:
             # import here to avoid circular import issue
@@ -777,6 +774,7 @@ def add_resource_files(pk, *files, **kwargs):
         base_dir = folder[len(prefix_path) + 1:]
     else:
         base_dir = folder
+    folders = []
     for f in files:
         full_dir = base_dir
         if f in full_paths:
@@ -785,7 +783,8 @@ def add_resource_files(pk, *files, **kwargs):
             dir_name = os.path.dirname(full_path)
             # Only do join if dir_name is not empty, otherwise, it'd result in a trailing slash
             full_dir = os.path.join(base_dir, dir_name) if dir_name else base_dir
-        ret.append(utils.add_file_to_resource(resource, f, folder=full_dir))
+        folders.append(full_dir)
+    ret.extend(utils.add_files_to_resource(resource, files, folder=folders))
 
     if len(source_names) > 0:
         for ifname in source_names:
@@ -3,7 +3,7 @@ import logging
 
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist, ValidationError
 from django.contrib.auth.models import User, Group
-from django.contrib.gis.geos import Polygon, Point
+from django.contrib.gis.geos import Polygon
 from django.core.files import File
 from django.core.files.uploadedfile import UploadedFile
 from django.core import exceptions
@@ -350,33 +350,12 @@ def get_resource_list(creator=None, group=None, user=None, owner=None, from_date
         if not north or not west or not south or not east: \
             raise ValueError("coverage queries must have north, west, south, and east params")
 
-        coverages = set()
-        search_polygon = Polygon.from_bbox((east,south,west,north))
+        search_polygon = Polygon.from_bbox((east, south, west, north))
+        search_polygon.srid = 4326
 
-        for coverage in Coverage.objects.filter(type="box"):
-            coverage_polygon = Polygon.from_bbox((
-                coverage.value.get('eastlimit', None),
-                coverage.value.get('southlimit', None),
-                coverage.value.get('westlimit', None),
-                coverage.value.get('northlimit', None)
-            ))
-
-            if search_polygon.intersects(coverage_polygon):
-                coverages.add(coverage.id)
-
-        for coverage in Coverage.objects.filter(type="point"):
-            try:
-                coverage_shape = Point(
-                    coverage.value.get('east', None),
-                    coverage.value.get('north', None),
-                )
-
-                if search_polygon.intersects(coverage_shape):
-                    coverages.add(coverage.id)
-            except Exception as e:
-                log.error("Coverage value invalid for coverage id %d" % coverage.id)
-
-        coverage_hits = (Coverage.objects.filter(id__in=coverages))
+        # uses the spatial index on the geometry maintained for box and point coverages
+        coverage_hits = Coverage.objects.filter(type__in=('box', 'point'),
+                                                _geometry__intersects=search_polygon)
         q.append(Q(object_id__in=coverage_hits.values_list('object_id', flat=True)))
 
     if contributor:
@@ -258,6 +258,8 @@ def get_file_from_irods(res_file, temp_dir=None):
     Copy the file (res_file) from iRODS (local or federated zone)
     over to django (temp directory) which is
     necessary for manipulating the file (e.g. metadata extraction).
+    The file is copied through the node-local cache of iRODS data objects (see
+    django_irods.cache), so an unchanged file is copied from iRODS only once.
     Note: The caller is responsible for cleaning the temp directory
 
     :param  res_file: an instance of ResourceFile
@@ -270,23 +272,65 @@ def get_file_from_irods(res_file, temp_dir=None):
     res_file_path = res_file.storage_path
     file_name = os.path.basename(res_file_path)
 
+    tmpfile = os.path.join(_get_temp_dir(temp_dir), file_name)
+    istorage.get_file_cached(res_file_path, tmpfile)
+    copied_file = tmpfile
+    return copied_file
+
+
+def get_file_ranges_from_irods(res_file, get_ranges, temp_dir=None):
+    """
+    Copy only the parts of the file (res_file) that are going to be read (e.g. file headers
+    for metadata extraction) from iRODS (local or federated zone) over to django (temp
+    directory). The copy is a sparse file of the same size as the original in which all bytes
+    outside of the copied ranges read as zeros - it must not be used for anything but reading
+    these ranges. The whole file is copied if iRODS byte range reads are not available or
+    get_ranges can't tell which ranges are needed.
+    Note: The caller is responsible for cleaning the temp directory
+
+    :param  res_file: an instance of ResourceFile
+    :param  get_ranges: a function that takes a seekable file object over the file in iRODS and
+    returns a list of (offset, length) byte ranges to copy, or None if the whole file is needed
+    :param  temp_dir: (optional) existing temp directory to which the file will be copied from
+    irods. If temp_dir is None then a new temporary directory will be created.
+    :return: location of the copied file
+    """
+    istorage = res_file.resource.get_irods_storage()
+    range_file = istorage.open_range(res_file.storage_path)
+    if range_file is None:
+        return get_file_from_irods(res_file, temp_dir)
+
+    with range_file:
+        ranges = get_ranges(range_file)
+        if ranges is None:
+            return get_file_from_irods(res_file, temp_dir)
+
+        tmpfile = os.path.join(_get_temp_dir(temp_dir), os.path.basename(res_file.storage_path))
+        with open(tmpfile, 'wb') as copied_file:
+            # extending the file leaves a hole that takes no disk space
+            copied_file.truncate(range_file.size)
+            for offset, length in ranges:
+                copied_file.seek(offset)
+                copied_file.write(range_file.read_at(offset, length))
+        logger.debug("copied {} of {} bytes of {} from iRODS".format(
+            range_file.bytes_fetched, range_file.size, res_file.storage_path))
+    return tmpfile
+
+
+def _get_temp_dir(temp_dir=None):
+    """validate the specified temp directory or create a new one if temp_dir is None"""
     if temp_dir is not None:
         if not temp_dir.startswith(settings.TEMP_FILE_DIR):
             raise ValueError("Specified temp directory is not valid")
         elif not os.path.exists(temp_dir):
             raise ValueError("Specified temp directory doesn't exist")
+        return temp_dir
 
-        tmpdir = temp_dir
-    else:
-        tmpdir = os.path.join(settings.TEMP_FILE_DIR, uuid4().hex)
-        if os.path.exists(tmpdir):
-            shutil.rmtree(tmpdir)
-        os.makedirs(tmpdir)
-
-    tmpfile = os.path.join(tmpdir, file_name)
-    istorage.getFile(res_file_path, tmpfile)
-    copied_file = tmpfile
-    return copied_file
+    tmpdir = os.path.join(settings.TEMP_FILE_DIR, uuid4().hex)
+    if os.path.exists(tmpdir):
+        shutil.rmtree(tmpdir)
+    os.makedirs(tmpdir)
+    return tmpdir
 
 
 # TODO: should be ResourceFile.replace
@@ -310,6 +354,28 @@ def replace_resource_file_on_irods(new_file, original_resource_file, user):
     resource_modified(ori_res, by_user=user, overwrite_bag=False)
 
 
+def write_resource_file_ranges_on_irods(ranges, original_resource_file, user):
+    """
+    Writes byte ranges (e.g., changed pages of a SQLite file) to the specified resource file in
+    iRODS (local or federated zone) in place, instead of copying the whole file to iRODS
+    :param ranges: list of (offset, bytes) to write to the resource file
+    :param original_resource_file: an instance of ResourceFile that is to be written to
+    :param user: user who is updating the resource file.
+    :return:
+    """
+    ori_res = original_resource_file.resource
+    istorage = ori_res.get_irods_storage()
+    if ranges:
+        istorage.write_ranges(original_resource_file.storage_path, ranges)
+        end = max(offset + len(data) for offset, data in ranges)
+        if end > original_resource_file.size:
+            original_resource_file._size = end
+            original_resource_file.save(update_fields=['_size'])
+
+    # do this so that the bag will be regenerated prior to download of the bag
+    resource_modified(ori_res, by_user=user, overwrite_bag=False)
+
+
 # TODO: should be inside ResourceFile, and federation logic should be transparent.
 def get_resource_file_name_and_extension(res_file):
     """
@@ -370,21 +436,20 @@ def copy_resource_files_and_AVUs(src_res_id, dest_res_id):
     istorage.copyFiles(src_files, dest_files)
 
     src_coll = src_res.root_path
-    tgt_coll = tgt_res.root_path
     for avu_name in avu_list:
         value = istorage.getAVU(src_coll, avu_name)
 
         # make formerly public things private
         if avu_name == 'isPublic':
-            istorage.setAVU(tgt_coll, avu_name, 'false')
+            tgt_res.setAVU(avu_name, 'false')
 
         # bag_modified AVU needs to be set to true for copied resource
         elif avu_name == 'bag_modified':
-            istorage.setAVU(tgt_coll, avu_name, 'true')
+            tgt_res.setAVU(avu_name, 'true')
 
         # everything else gets copied literally
         else:
-            istorage.setAVU(tgt_coll, avu_name, value)
+            tgt_res.setAVU(avu_name, value)
 
     # link copied resource files to Django resource model
     files = src_res.files.all()
@@ -500,12 +565,8 @@ def set_dirty_bag_flag(resource):
     bag is recreated only after multiple changes to the bag files, rather than
     after each change. It is created when someone attempts to download it.
     """
-    res_coll = resource.root_path
-
-    istorage = resource.get_irods_storage()
-    res_coll = resource.root_path
-    istorage.setAVU(res_coll, "bag_modified", "true")
-    istorage.setAVU(res_coll, "metadata_dirty", "true")
+    resource.setAVU("bag_modified", "true")
+    resource.setAVU("metadata_dirty", "true")
 
 
 def _validate_email(email):
@@ -945,6 +1006,152 @@ def add_file_to_resource(resource, f, folder='', source_name='',
     return ret
 
 
+def add_files_to_resource(resource, files, folder='', check_target_folder=False,
+                          add_to_aggregation=True, progress_callback=None):
+    """
+    Add many ResourceFiles to a Resource at once. Adds the 'format' metadata elements to the
+    resource. Unlike calling add_file_to_resource for each file, the files are copied to iRODS
+    concurrently (HS_UPLOAD_WORKERS at a time), file sizes are taken from the files being
+    uploaded rather than read back from iRODS, the ResourceFile records are created with a
+    single query and a 'format' element is created only once for each new file format.
+    Either all or none of the files are added.
+    :param  resource: Resource to which files should be added
+    :param  files: File-like objects to add to the resource
+    :param  folder: folder at which the files will live, or a list with the folder of each file
+    :param  check_target_folder: if true and the resource is a composite resource then uploading
+    files to the specified folders will be validated before adding the files to the resource
+    :param  add_to_aggregation: if true and the resource is a composite resource then the files
+    being added to the resource also will be added to a fileset aggregation if such an
+    aggregation exists in the file path
+    :param  progress_callback: (optional) function that is called with the number of files
+    copied to iRODS so far and the total number of files each time a file has been copied
+    :return: list of the ResourceFiles added, in the same order as files
+    """
+    files = [File(f) if not isinstance(f, UploadedFile) else f for f in files]
+    if not files:
+        return []
+    folders = list(folder) if isinstance(folder, (list, tuple)) else [folder] * len(files)
+
+    # validate parameters
+    if check_target_folder:
+        if resource.resource_type != 'CompositeResource':
+            raise ValidationError("Resource must be a CompositeResource for validating target "
+                                  "folder")
+        for target_folder in set(folders):
+            if target_folder and not resource.can_add_files(
+                    target_full_path=os.path.join(resource.file_path, target_folder)):
+                raise ValidationError("File can't be added to this folder which represents an "
+                                      "aggregation")
+
+    file_field = 'fed_resource_file' if resource.is_federated else 'resource_file'
+    res_files = []
+    for f, file_folder in zip(files, folders):
+        res_file = ResourceFile(content_object=resource, file_folder=file_folder, _size=f.size)
+        # determine the storage path the same way as saving a file through the file field does
+        setattr(res_file, file_field, ResourceFile._meta.get_field(file_field).generate_filename(
+            res_file, f.name))
+        res_files.append(res_file)
+    paths = [getattr(res_file, file_field).name for res_file in res_files]
+
+    istorage = resource.get_irods_storage()
+    existing_paths = set(istorage.sizes(paths))
+    seen_paths = set()
+    for path in paths:
+        if path in existing_paths or path in seen_paths:
+            raise ValidationError(str.format("File {} already exists.", path))
+        seen_paths.add(path)
+
+    _upload_files_to_irods(istorage, files, paths, progress_callback)
+
+    ResourceFile.objects.bulk_create(res_files)
+
+    if add_to_aggregation and resource.resource_type == 'CompositeResource':
+        aggregations = {}
+        for res_file, file_folder in zip(res_files, folders):
+            if not file_folder:
+                continue
+            if file_folder not in aggregations:
+                aggregations[file_folder] = resource.get_fileset_aggregation_in_path(file_folder)
+            if aggregations[file_folder] is not None:
+                # make the added file part of the fileset aggregation
+                aggregations[file_folder].add_resource_file(res_file)
+
+    # add format metadata elements if necessary
+    # TODO: generate this from data in ResourceFile rather than extension
+    file_format_types = set(mime.value for mime in resource.metadata.formats.all())
+    for f in files:
+        file_format_type = get_file_mime_type(f.name)
+        if file_format_type not in file_format_types:
+            resource.metadata.create_element('format', value=file_format_type)
+            file_format_types.add(file_format_type)
+
+    return res_files
+
+
+def _upload_files_to_irods(istorage, files, paths, progress_callback=None):
+    """
+    Copy local files to iRODS concurrently. If any file fails to be copied, the files already
+    copied are removed from iRODS and the error is raised.
+    :param  istorage: IrodsStorage to copy the files to
+    :param  files: File-like objects to copy
+    :param  paths: the iRODS path of each file
+    :param  progress_callback: (optional) see add_files_to_resource
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    for collection in set(os.path.dirname(path) for path in paths):
+        istorage.saveFile('', collection + '/', create_directory=True)
+
+    local_paths = []
+    staged_paths = []
+    try:
+        for f in files:
+            local_path = _get_local_file_path(f)
+            if local_path is None:
+                # the file is not on local disk (e.g., an in-memory upload)
+                with tempfile.NamedTemporaryFile(delete=False) as staged_file:
+                    for chunk in f.chunks():
+                        staged_file.write(chunk)
+                local_path = staged_file.name
+                staged_paths.append(local_path)
+            local_paths.append(local_path)
+
+        workers = getattr(settings, 'HS_UPLOAD_WORKERS', 4)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(istorage.saveFile, local_path, path)
+                       for local_path, path in zip(local_paths, paths)]
+            copied = 0
+            for future in as_completed(futures):
+                if future.exception() is None:
+                    copied += 1
+                    if progress_callback is not None:
+                        progress_callback(copied, len(futures))
+    finally:
+        for staged_path in staged_paths:
+            os.unlink(staged_path)
+
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        for future, path in zip(futures, paths):
+            if future.exception() is None:
+                try:
+                    istorage.delete(path)
+                except SessionException:
+                    logger.warning("failed to remove {} from iRODS".format(path))
+        raise errors[0]
+
+
+def _get_local_file_path(f):
+    """Return the path of the local file that holds the content of f, or None if there is
+    no such file"""
+    if hasattr(f, 'temporary_file_path'):
+        return f.temporary_file_path()
+    name = getattr(f.file, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
+
+
 def add_metadata_element_to_xml(root, md_element, md_fields):
     """
     helper function to generate xml elements for a given metadata element that belongs to
@@ -0,0 +1,162 @@
+"""Deferred updates of the search index.
+
+Rather than rebuilding and posting the SOLR document of a resource every time the resource or
+its access flags are saved, IndexQueueSignalProcessor records the resource in a queue once the
+saving transaction commits. The queue holds at most one entry per resource (IndexQueueEntry),
+so that repeated saves coalesce. The celery task hs_core.tasks.drain_index_queue periodically
+drains the queue in batches: each resource that still exists and is public or discoverable is
+indexed, and every other resource is removed from the index.
+
+Statistics of the queue and of recent drains are available from get_index_queue_stats and the
+index_queue management command. Drain statistics are kept in the default cache, which should
+be shared by the celery workers and web processes for them to be visible from the latter.
+"""
+
+import logging
+import time
+from functools import reduce
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Min, Q
+from django.utils.timezone import now
+from haystack import connections
+from haystack.signals import BaseSignalProcessor
+
+logger = logging.getLogger(__name__)
+
+INDEX_QUEUE_STATS_KEY = 'hs_core.index_queue.stats'
+
+
+def enqueue_resource(resource_id, short_id):
+    """
+    Record that the index entry of a resource is out of date
+    :param resource_id: id of the resource
+    :param short_id: short id of the resource
+    """
+    from hs_core.models import IndexQueueEntry
+
+    requested = now()
+    if not IndexQueueEntry.objects.filter(resource_id=resource_id) \
+            .update(requested=requested):
+        IndexQueueEntry.objects.get_or_create(
+            resource_id=resource_id,
+            defaults={'short_id': short_id, 'enqueued': requested, 'requested': requested})
+
+
+def enqueue_resource_on_commit(resource_id, short_id):
+    """ Record that the index entry of a resource is out of date once the change commits """
+    transaction.on_commit(lambda: enqueue_resource(resource_id, short_id))
+
+
+class IndexQueueSignalProcessor(BaseSignalProcessor):
+    """
+    Enqueue resources for indexing when they or their access flags are saved or deleted.
+
+    Like HydroRealtimeSignalProcessor, this responds to changes of any subclass of
+    BaseResource and of ResourceAccess.
+    """
+
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+
+    def handle_save(self, sender, instance, **kwargs):
+        from hs_core.models import BaseResource
+        from hs_access_control.models import ResourceAccess
+
+        if isinstance(instance, BaseResource):
+            enqueue_resource_on_commit(instance.pk, instance.short_id)
+        elif isinstance(instance, ResourceAccess):
+            enqueue_resource_on_commit(instance.resource_id, instance.resource.short_id)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        from hs_core.models import BaseResource
+
+        if isinstance(instance, BaseResource):
+            enqueue_resource_on_commit(instance.pk, instance.short_id)
+
+
+def drain_index_queue(batch_size=500, max_batches=None, using='default'):
+    """
+    Update the index entries of queued resources
+    :param batch_size: number of resources indexed at a time
+    :param max_batches: maximum number of batches to process, or None to empty the queue
+    :param using: name of the haystack connection
+    :return: tuple of the numbers of resources indexed and removed from the index
+    """
+    from hs_core.models import BaseResource, IndexQueueEntry
+    from hs_core.search_indexes import load_resources_for_indexing
+
+    index = connections[using].get_unified_index().get_index(BaseResource)
+    backend = connections[using].get_backend()
+    indexed = 0
+    removed = 0
+    batches = 0
+    start = time.time()
+    while max_batches is None or batches < max_batches:
+        entries = list(IndexQueueEntry.objects.order_by('enqueued')[:batch_size])
+        if not entries:
+            break
+        batches += 1
+
+        resources = load_resources_for_indexing([e.resource_id for e in entries])
+        to_index = [r for r in resources if r.raccess.public or r.raccess.discoverable]
+        to_remove = set(e.resource_id for e in entries) - set(r.id for r in to_index)
+        if to_index:
+            backend.update(index, to_index, commit=False)
+        for resource_id in to_remove:
+            backend.remove('hs_core.baseresource.{}'.format(resource_id), commit=False)
+        backend.conn.commit()
+
+        # keep the entries of resources that changed again while they were indexed
+        IndexQueueEntry.objects.filter(reduce(
+            lambda q, e: q | Q(resource_id=e.resource_id, requested=e.requested),
+            entries, Q())).delete()
+        indexed += len(to_index)
+        removed += len(to_remove)
+
+    if batches:
+        _record_drain(indexed, removed, time.time() - start)
+    return indexed, removed
+
+
+def _record_drain(indexed, removed, seconds):
+    stats = cache.get(INDEX_QUEUE_STATS_KEY) or {'total_indexed': 0, 'total_removed': 0}
+    stats['total_indexed'] += indexed
+    stats['total_removed'] += removed
+    stats.update({'last_drained': now(),
+                  'last_indexed': indexed,
+                  'last_removed': removed,
+                  'last_seconds': seconds})
+    cache.set(INDEX_QUEUE_STATS_KEY, stats, None)
+    logger.info("index queue: %d resources indexed and %d removed in %.1f seconds",
+                indexed, removed, seconds)
+
+
+def get_index_queue_stats():
+    """
+    Get statistics of the index queue
+    :return: dict with the number of queued resources ('pending'), the number of seconds
+    since the oldest out-of-date index entry went out of date ('lag'), the resources per
+    second indexed or removed by the last drain ('throughput'), and the counts kept by
+    drains ('last_drained', 'last_indexed', 'last_removed', 'last_seconds',
+    'total_indexed', 'total_removed')
+    """
+    from hs_core.models import IndexQueueEntry
+
+    queue = IndexQueueEntry.objects.aggregate(pending=models.Count('resource_id'),
+                                              oldest=Min('enqueued'))
+    stats = cache.get(INDEX_QUEUE_STATS_KEY) or {'total_indexed': 0, 'total_removed': 0}
+    stats['pending'] = queue['pending']
+    stats['lag'] = (now() - queue['oldest']).total_seconds() if queue['oldest'] else 0
+    if stats.get('last_seconds'):
+        stats['throughput'] = \
+            (stats['last_indexed'] + stats['last_removed']) / stats['last_seconds']
+    else:
+        stats['throughput'] = None
+    return stats
@@ -0,0 +1,183 @@
+"""Cache of the parts of a resource landing page that are the same for every user.
+
+The citation, the rendered readme, the metadata status and the missing metadata of a resource
+and of its aggregations, and the metadata html of its aggregations, are computed once for each
+version of the content of the resource and kept in the Django cache named by
+HS_LANDING_PAGE_CACHE (default 'default') for HS_LANDING_PAGE_CACHE_TIMEOUT seconds (default
+one day). The parts that depend on the user viewing the page (permissions, labels) are not
+cached and are added to the page context on every request (see
+hs_core.page_processors.get_page_context), so that the landing pages of popular public
+resources are served without reading readme files from iRODS.
+
+The content version of a resource (see get_content_version) changes whenever a metadata
+element of the resource changes (see CoreMetaData.get_xml_version), whenever the resource is
+marked modified (see hs_core.hydroshare.utils.resource_modified) and whenever files or
+aggregations are added or removed. The metadata of an aggregation can change without the
+resource being marked modified (e.g., when its coverage is updated or deleted), so the parts
+that show aggregation metadata are also keyed on a version of the metadata of the aggregation,
+a counter kept in the cache that is bumped whenever the aggregation, its metadata or one of its
+metadata elements is saved or deleted (see bump_aggregation_version). Stale parts are thus never
+served; parts of older versions expire from the cache.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.db.models import Count, Max, Sum
+
+from hs_core.hydroshare.resource import METADATA_STATUS_SUFFICIENT, METADATA_STATUS_INSUFFICIENT, \
+    res_has_web_reference
+from hs_core.models import ResourceFile
+
+
+def _get_cache():
+    return caches[getattr(settings, 'HS_LANDING_PAGE_CACHE', 'default')]
+
+
+def _get_timeout():
+    return getattr(settings, 'HS_LANDING_PAGE_CACHE_TIMEOUT', 86400)
+
+
+def get_content_version(resource):
+    """
+    Get a version identifying the content of a resource shown on its landing page
+    :param resource: an instance of BaseResource or of one of its subclasses
+    :return: a string that changes whenever the metadata, files or aggregations of the
+    resource change
+    """
+    files = ResourceFile.objects.filter(object_id=resource.id).aggregate(
+        count=Count('id'), last_id=Max('id'), size=Sum('_size'),
+        aggregations=Count('logical_file_object_id'),
+        last_aggregation_id=Max('logical_file_object_id'))
+    digest = hashlib.md5(repr([str(resource.updated), resource.doi,
+                               sorted(files.items())]).encode()).hexdigest()
+    return '{}.{}'.format(resource.metadata.get_xml_version(), digest)
+
+
+def _aggregation_version_key(content_type_id, object_id):
+    return 'hs_core.landing_page.aggregation_version.{}.{}'.format(content_type_id, object_id)
+
+
+def _get_aggregation_version_keys(logical_files):
+    keys = []
+    for logical_file in logical_files:
+        metadata_model = type(logical_file)._meta.get_field('metadata').related_model
+        keys.append(_aggregation_version_key(ContentType.objects.get_for_model(metadata_model).id,
+                                             logical_file.metadata_id))
+    return keys
+
+
+def _get_versions(keys):
+    cache = _get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # start from the clock rather than from 1 so that parts cached under versions
+            # used before the counter was evicted are not revived
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_aggregation_version(content_type_id, object_id):
+    """
+    Invalidate the cached parts showing the metadata of an aggregation
+    :param content_type_id: id of the content type of the metadata of the aggregation
+    :param object_id: id of the metadata of the aggregation
+    """
+    try:
+        _get_cache().incr(_aggregation_version_key(content_type_id, object_id))
+    except ValueError:
+        # counter not set or evicted; a new one is started when it is next read
+        pass
+
+
+def get_aggregations_version(logical_files):
+    """
+    Get a version identifying the metadata of a set of aggregations
+    :param logical_files: the aggregations
+    :return: a string that changes whenever the metadata of one of the aggregations changes
+    """
+    keys = _get_aggregation_version_keys(logical_files)
+    return hashlib.md5(repr(sorted(zip(keys, _get_versions(keys)))).encode()).hexdigest()
+
+
+def get_cached(resource, name, compute, version=None):
+    """
+    Get a part of the landing page of a resource, computing it only if the content of the
+    resource changed since it was last cached
+    :param resource: the resource the part is of
+    :param name: name of the part, unique among the parts of a resource
+    :param compute: function that computes the part; its return value must be picklable
+    :param version: (optional) the content version of the resource, if already known
+    :return: the part
+    """
+    if version is None:
+        version = get_content_version(resource)
+    key = 'hs_core.landing_page.{}.{}.{}'.format(resource.short_id, version, name)
+    cache = _get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, _get_timeout())
+    return value
+
+
+def _get_metadata_status(resource):
+    if resource.metadata.has_all_required_elements():
+        metadata_status = METADATA_STATUS_SUFFICIENT
+    else:
+        metadata_status = METADATA_STATUS_INSUFFICIENT
+
+    return metadata_status
+
+
+def _compute_fragments(resource):
+    readme = resource.get_readme_file_content()
+    return {'citation': resource.get_citation(),
+            'readme': readme if readme is not None else '',
+            'metadata_status': _get_metadata_status(resource),
+            'missing_metadata_elements': resource.metadata.get_required_missing_elements(),
+            'show_web_reference_note': res_has_web_reference(resource)}
+
+
+def get_landing_page_fragments(resource, version=None):
+    """
+    Get the parts of the landing page context of a resource that are the same for every user
+    :param resource: the resource of the landing page
+    :param version: (optional) the content version of the resource, if already known
+    :return: dict with the 'citation', 'readme', 'metadata_status',
+    'missing_metadata_elements' and 'show_web_reference_note' context values
+    """
+    return get_cached(resource, 'fragments', lambda: _compute_fragments(resource),
+                      version=version)
+
+
+def get_aggregation_metadata_html(logical_file, **kwargs):
+    """
+    Get the metadata html (in view mode) of an aggregation
+    :param logical_file: the aggregation
+    :param kwargs: arguments of the get_html method of the aggregation metadata (e.g.,
+    series_id of time series aggregations)
+    :return: the html
+    """
+    name = 'aggregation.{}.{}.{}.{}'.format(type(logical_file).__name__, logical_file.id,
+                                            get_aggregations_version([logical_file]),
+                                            '.'.join('{}={}'.format(key, kwargs[key])
+                                                     for key in sorted(kwargs)))
+    return get_cached(logical_file.resource, name,
+                      lambda: logical_file.metadata.get_html(**kwargs))
+
+
+def get_missing_file_type_metadata_info(resource):
+    """
+    Get the metadata missing from the aggregations of a composite resource
+    :param resource: an instance of CompositeResource
+    :return: the value of resource.get_missing_file_type_metadata_info()
+    """
+    name = 'file_type_missing_metadata.{}'.format(
+        get_aggregations_version(resource.logical_files))
+    return get_cached(resource, name, resource.get_missing_file_type_metadata_info)
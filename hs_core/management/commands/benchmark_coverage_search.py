@@ -0,0 +1,79 @@
+"""
+This times a bounding box search of resource coverages done with the spatial index on
+Coverage._geometry against the former approach of testing every box and point coverage for
+intersection in Python, and checks that both find the same coverages.
+
+* Takes the bounding box of the search as north, south, east and west coordinates.
+* Optional argument --repeat: number of times to run each search (default 5).
+"""
+
+import time
+
+from django.contrib.gis.geos import Point, Polygon
+from django.core.management.base import BaseCommand
+
+from hs_core.models import Coverage
+
+
+def search_by_loop(search_polygon):
+    """ Find the ids of the coverages intersecting search_polygon one coverage at a time """
+    coverages = set()
+    for coverage in Coverage.objects.filter(type="box"):
+        coverage_polygon = Polygon.from_bbox((
+            coverage.value.get('eastlimit', None),
+            coverage.value.get('southlimit', None),
+            coverage.value.get('westlimit', None),
+            coverage.value.get('northlimit', None)
+        ))
+        if search_polygon.intersects(coverage_polygon):
+            coverages.add(coverage.id)
+
+    for coverage in Coverage.objects.filter(type="point"):
+        try:
+            coverage_shape = Point(coverage.value.get('east', None),
+                                   coverage.value.get('north', None))
+            if search_polygon.intersects(coverage_shape):
+                coverages.add(coverage.id)
+        except Exception:
+            pass
+    return coverages
+
+
+def search_by_index(search_polygon):
+    """ Find the ids of the coverages intersecting search_polygon with the spatial index """
+    return set(Coverage.objects.filter(type__in=('box', 'point'),
+                                       _geometry__intersects=search_polygon)
+               .values_list('id', flat=True))
+
+
+class Command(BaseCommand):
+    help = "Benchmark bounding box searches of resource coverages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('north', type=float)
+        parser.add_argument('south', type=float)
+        parser.add_argument('east', type=float)
+        parser.add_argument('west', type=float)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='number of times to run each search')
+
+    def handle(self, *args, **options):
+        search_polygon = Polygon.from_bbox((options['east'], options['south'],
+                                            options['west'], options['north']))
+        search_polygon.srid = 4326
+        print("{} box and point coverages".format(
+            Coverage.objects.filter(type__in=('box', 'point')).count()))
+
+        results = {}
+        for name, search in (('loop', search_by_loop), ('index', search_by_index)):
+            start = time.time()
+            for _ in range(options['repeat']):
+                results[name] = search(search_polygon)
+            elapsed = (time.time() - start) / options['repeat']
+            print("{}: {} coverages found in {:.4f} seconds".format(
+                name, len(results[name]), elapsed))
+
+        if results['loop'] != results['index']:
+            print("MISMATCH: found only by loop {}, found only by index {}".format(
+                sorted(results['loop'] - results['index']),
+                sorted(results['index'] - results['loop'])))
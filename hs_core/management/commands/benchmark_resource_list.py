@@ -0,0 +1,95 @@
+"""
+This times building the REST resource list (/hsapi/resource/) for pages of resources with
+ResourceToListItemMixin.resourcesToResourceListItems against the former approach of building
+each list item separately, counts the queries made by each, and checks that both render
+byte-identical JSON.
+
+* Optional arguments: page sizes to benchmark (default 10 100 1000).
+"""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from hs_core import hydroshare
+from hs_core.models import BaseResource
+from hs_core.views import serializers
+from hs_core.views.resource_rest_api import ResourceToListItemMixin
+
+
+def resource_list_item(r):
+    """ Build the list item of a resource one metadata element at a time """
+    site_url = hydroshare.utils.current_site_url()
+    bag_url = site_url + r.bag_url
+    science_metadata_url = site_url + reverse('get_update_science_metadata', args=[r.short_id])
+    resource_map_url = site_url + reverse('get_resource_map', args=[r.short_id])
+    resource_url = site_url + r.get_absolute_url()
+    coverages = [{"type": v['type'], "value": json.loads(v['_value'])}
+                 for v in list(r.metadata.coverages.values())]
+    authors = []
+    for c in r.metadata.creators.all():
+        authors.append(c.name)
+    doi = None
+    if r.raccess.published:
+        doi = "10.4211/hs.{}".format(r.short_id)
+    return serializers.ResourceListItem(resource_type=r.resource_type,
+                                        resource_id=r.short_id,
+                                        resource_title=r.metadata.title.value,
+                                        abstract=r.metadata.description,
+                                        authors=authors,
+                                        creator=r.first_creator.name,
+                                        doi=doi,
+                                        public=r.raccess.public,
+                                        discoverable=r.raccess.discoverable,
+                                        shareable=r.raccess.shareable,
+                                        immutable=r.raccess.immutable,
+                                        published=r.raccess.published,
+                                        date_created=r.created,
+                                        date_last_updated=r.last_updated,
+                                        bag_url=bag_url,
+                                        coverages=coverages,
+                                        science_metadata_url=science_metadata_url,
+                                        resource_map_url=resource_map_url,
+                                        resource_url=resource_url,
+                                        content_types=r.aggregation_types)
+
+
+def build_per_row(resources):
+    return [resource_list_item(r) for r in resources]
+
+
+def build_batched(resources):
+    return ResourceToListItemMixin().resourcesToResourceListItems(resources)
+
+
+class Command(BaseCommand):
+    help = "Benchmark building the REST resource list for pages of resources."
+
+    def add_arguments(self, parser):
+        parser.add_argument('page_sizes', nargs='*', type=int, default=[10, 100, 1000])
+
+    def handle(self, *args, **options):
+        for page_size in options['page_sizes']:
+            resources = list(BaseResource.objects.all().order_by('id')[:page_size])
+            print("page of {} resources".format(len(resources)))
+
+            rendered = {}
+            for name, build in (('per row', build_per_row), ('batched', build_batched)):
+                # start from the same state of the cache of related objects
+                page = [BaseResource.objects.get(id=r.id) for r in resources]
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.time()
+                    items = build(page)
+                    elapsed = time.time() - start
+                rendered[name] = JSONRenderer().render(
+                    serializers.ResourceListItemSerializer(items, many=True).data)
+                print("  {}: {} queries in {:.4f} seconds".format(
+                    name, len(queries), elapsed))
+
+            if rendered['per row'] != rendered['batched']:
+                print("  MISMATCH: rendered JSON differs")
@@ -0,0 +1,119 @@
+"""
+This times the validation of time series csv files and the insertion of their values into a blank
+ODM2 SQLite file done a chunk of rows at a time against the former approach of parsing and
+inserting one value at a time, on generated csv files of the given numbers of rows.
+
+* Optional argument --rows: numbers of data rows to benchmark (default 10000 1000000 10000000).
+* Optional argument --columns: number of data columns (default 2).
+* Optional argument --row-by-row-max: largest number of rows for which the row by row
+  approach is timed as well (default 1000000), as it takes long on larger files.
+"""
+
+import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from dateutil import parser
+from django.core.management.base import BaseCommand
+
+from hs_app_timeseries.csv_utils import insert_csv_values
+from hs_file_types.models.timeseries import validate_csv_file
+
+INSERT_SQL = "INSERT INTO TimeSeriesResultValues (ValueID, ResultID, DataValue, " \
+             "ValueDateTime, ValueDateTimeUTCOffset, CensorCodeCV, QualityCodeCV, " \
+             "TimeAggregationInterval, TimeAggregationIntervalUnitsID) VALUES(?,?,?,?,?,?,?,?,?)"
+
+
+def validate_row_by_row(csv_file_path):
+    """ Validate the data rows of a csv file one value at a time """
+    with open(csv_file_path, 'r') as fl_obj:
+        csv_reader = csv.reader(fl_obj, delimiter=',')
+        header = next(csv_reader)
+        for row in csv_reader:
+            if len(row) != len(header):
+                return False
+            try:
+                float(row[0])
+                return False
+            except ValueError:
+                try:
+                    parser.parse(row[0])
+                except ValueError:
+                    return False
+            for data_value in row[1:]:
+                try:
+                    float(data_value)
+                except ValueError:
+                    return False
+    return True
+
+
+def insert_row_by_row(cur, csv_file_path, result_ids):
+    """ Insert the values of a csv file one value at a time """
+    value_id = 1
+    for col, result_id in enumerate(result_ids):
+        with open(csv_file_path, 'r') as fl_obj:
+            csv_reader = csv.reader(fl_obj, delimiter=',')
+            next(csv_reader)
+            for row in csv_reader:
+                cur.execute(INSERT_SQL, (value_id, result_id, row[col + 1],
+                                         parser.parse(row[0]), -7, 'Unknown', 'Unknown',
+                                         30, 102))
+                value_id += 1
+
+
+def insert_by_chunk(cur, csv_file_path, result_ids):
+    insert_csv_values(cur, csv_file_path, result_ids, -7, 30)
+
+
+class Command(BaseCommand):
+    help = "Benchmark validation and SQLite conversion of time series csv files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000, 10000000],
+                            help='numbers of data rows to benchmark')
+        parser.add_argument('--columns', type=int, default=2, help='number of data columns')
+        parser.add_argument('--row-by-row-max', type=int, default=1000000,
+                            help='largest number of rows to time the row by row approach for')
+
+    def handle(self, *args, **options):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for rows in options['rows']:
+                csv_file = os.path.join(temp_dir, 'data.csv')
+                self.write_csv_file(csv_file, rows, options['columns'])
+                result_ids = list(range(1, options['columns'] + 1))
+                approaches = [('chunked', validate_csv_file, insert_by_chunk)]
+                if rows <= options['row_by_row_max']:
+                    approaches.append(('row by row', validate_row_by_row, insert_row_by_row))
+
+                for name, validate, insert in approaches:
+                    start = time.time()
+                    validate(csv_file)
+                    validated = time.time()
+
+                    sqlite_file = os.path.join(temp_dir, 'ODM2.sqlite')
+                    shutil.copy('hs_app_timeseries/files/ODM2.sqlite', sqlite_file)
+                    con = sqlite3.connect(sqlite_file)
+                    with con:
+                        insert(con.cursor(), csv_file, result_ids)
+                    con.close()
+                    inserted = time.time()
+                    print("{} rows, {}: validated in {:.2f} seconds, inserted in {:.2f} "
+                          "seconds".format(rows, name, validated - start, inserted - validated))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def write_csv_file(self, csv_file, rows, columns):
+        start = datetime(2000, 1, 1)
+        with open(csv_file, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['ValueDateTime'] + ['Series_{}'.format(col)
+                                                 for col in range(columns)])
+            for row in range(rows):
+                writer.writerow([(start + timedelta(minutes=30 * row)).strftime(
+                    '%Y-%m-%d %H:%M:%S')] + [row * 0.01 + col for col in range(columns)])
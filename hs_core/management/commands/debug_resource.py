@@ -6,7 +6,7 @@
 
 from django.core.management.base import BaseCommand
 from hs_core.models import BaseResource
-from hs_core.management.utils import check_irods_files
+from hs_core.management.utils import check_irods_files, get_irods_avu
 
 
 def debug_resource(short_id):
@@ -25,10 +25,10 @@ def debug_resource(short_id):
     print("resource: {}".format(short_id))
     print("resource type: {}".format(resource.resource_type))
     print("resource creator: {} {}".format(resource.creator.first_name, resource.creator.last_name))
-    print("resource irods bag modified: {}".format(str(resource.getAVU('bag_modified'))))
-    print("resource irods isPublic: {}".format(str(resource.getAVU('isPublic'))))
-    print("resource irods resourceType: {}".format(str(resource.getAVU('resourceType'))))
-    print("resource irods quotaUserName: {}".format(str(resource.getAVU('quotaUserName'))))
+    print("resource irods bag modified: {}".format(str(get_irods_avu(resource, 'bag_modified'))))
+    print("resource irods isPublic: {}".format(str(get_irods_avu(resource, 'isPublic'))))
+    print("resource irods resourceType: {}".format(str(get_irods_avu(resource, 'resourceType'))))
+    print("resource irods quotaUserName: {}".format(str(get_irods_avu(resource, 'quotaUserName'))))
     if irods_errors:
         print("iRODS errors:")
         for e in irods_issues:
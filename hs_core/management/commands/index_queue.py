@@ -0,0 +1,45 @@
+"""Inspect or drain the queue of resources whose search index entries are out of date.
+
+* By default, prints statistics of the queue and of recent drains.
+* Optional argument --list: lists the queued resources.
+* Optional argument --drain: indexes the queued resources now.
+* Optional argument --batch-size: number of resources indexed at a time (default 500).
+"""
+
+from django.core.management.base import BaseCommand
+
+from hs_core.index_queue import drain_index_queue, get_index_queue_stats
+from hs_core.models import IndexQueueEntry
+
+
+class Command(BaseCommand):
+    help = "Inspect or drain the search index queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', dest='list', default=False,
+                            help='list the queued resources')
+        parser.add_argument('--drain', action='store_true', dest='drain', default=False,
+                            help='index the queued resources now')
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=500,
+                            help='number of resources indexed at a time')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for entry in IndexQueueEntry.objects.order_by('enqueued'):
+                print("{} (id={}) out of date since {}, last changed {}".format(
+                    entry.short_id, entry.resource_id, entry.enqueued, entry.requested))
+
+        if options['drain']:
+            indexed, removed = drain_index_queue(batch_size=options['batch_size'])
+            print("{} resources indexed and {} removed from the index".format(indexed, removed))
+
+        stats = get_index_queue_stats()
+        print("{} resources queued; oldest out of date for {:.1f} seconds"
+              .format(stats['pending'], stats['lag']))
+        if stats.get('last_drained'):
+            print("last drain at {}: {} indexed and {} removed in {:.1f} seconds "
+                  "({:.1f} resources per second)"
+                  .format(stats['last_drained'], stats['last_indexed'], stats['last_removed'],
+                          stats['last_seconds'], stats['throughput'] or 0))
+        print("{} resources indexed and {} removed in total"
+              .format(stats['total_indexed'], stats['total_removed']))
@@ -1,3 +1,5 @@
+import copy
+
 from django.core.management.base import BaseCommand
 
 from hs_core.models import BaseResource
@@ -25,16 +27,18 @@ class Command(BaseCommand):
                         storage.delete(tgt_coll)
                     storage.copyFiles(src_coll, tgt_coll)
                     # copy AVU over for the resource collection from iRODS user zone to data zone
-
+                    # through the resource in the data zone, so that mirrored AVUs are updated
+                    tgt_res = copy.copy(resource)
+                    tgt_res.resource_federation_path = ''
                     for avu_name in avu_list:
                         value = storage.getAVU(src_coll, avu_name)
                         # bag_modified AVU needs to be set to true for the new resource so the bag
                         # can be regenerated in the data zone
                         if avu_name == 'bag_modified':
-                            storage.setAVU(tgt_coll, avu_name, 'true')
+                            tgt_res.setAVU(avu_name, 'true')
                         # everything else gets copied literally
                         else:
-                            storage.setAVU(tgt_coll, avu_name, value)
+                            tgt_res.setAVU(avu_name, value)
 
                     # Just to be on the safe side, it is better not to delete resources from user
                     # zone after it is migrated over to data zone in case there are issues with
@@ -0,0 +1,66 @@
+"""Compare the resource level AVUs mirrored in the database with the AVUs in iRODS.
+
+iRODS is the source of truth for these AVUs (see hs_core.models.ResourceAVU); this reports
+the AVUs whose mirrored value differs from iRODS and the AVUs not mirrored yet.
+
+* By default, checks all resources and prints the differences on stdout.
+* Optional argument resource_ids: checks only these resources.
+* Optional argument --fix: copies the values of the differing AVUs from iRODS to the database.
+* Optional argument --batch-size: number of resources whose mirrored AVUs are read at a time.
+"""
+
+from django.core.management.base import BaseCommand
+
+from hs_core.models import BaseResource, ResourceAVU, MIRRORED_AVUS
+from django_irods.icommands import SessionException
+
+
+class Command(BaseCommand):
+    help = "Detect and optionally repair drift between mirrored resource AVUs and iRODS."
+
+    def add_arguments(self, parser):
+        # a list of resource id's, or none to check all resources
+        parser.add_argument('resource_ids', nargs='*', type=str)
+        parser.add_argument('--fix', action='store_true', dest='fix', default=False,
+                            help='copy the values of differing AVUs from iRODS to the database')
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=500,
+                            help='number of resources whose mirrored AVUs are read at a time')
+
+    def handle(self, *args, **options):
+        resources = BaseResource.objects.order_by('id')
+        if options['resource_ids']:
+            resources = resources.filter(short_id__in=options['resource_ids'])
+
+        checked = drifted = missing = fixed = 0
+        resources = list(resources)
+        for start in range(0, len(resources), options['batch_size']):
+            batch = resources[start:start + options['batch_size']]
+            mirrored = {(avu.resource_id, avu.attribute): avu.value for avu in
+                        ResourceAVU.objects.filter(resource_id__in=[res.id for res in batch])}
+            for res in batch:
+                istorage = res.get_irods_storage()
+                checked += 1
+                for attribute in MIRRORED_AVUS:
+                    try:
+                        value = istorage.getAVU(res.root_path, attribute)
+                    except SessionException as ex:
+                        print("{}: cannot read {} from iRODS: {}".format(res.short_id, attribute,
+                                                                         ex.stderr))
+                        break
+                    key = (res.id, attribute)
+                    if key not in mirrored:
+                        missing += 1
+                        print("{}: {} is not mirrored (iRODS: {})".format(res.short_id, attribute,
+                                                                           value))
+                    elif mirrored[key] != value:
+                        drifted += 1
+                        print("{}: {} is {} in the database but {} in iRODS".format(
+                            res.short_id, attribute, mirrored[key], value))
+                    else:
+                        continue
+                    if options['fix']:
+                        ResourceAVU.mirror(res, attribute, value)
+                        fixed += 1
+
+        print("{} resources checked: {} AVUs differ from iRODS, {} are not mirrored, "
+              "{} fixed".format(checked, drifted, missing, fixed))
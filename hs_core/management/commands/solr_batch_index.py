@@ -0,0 +1,72 @@
+"""Index resources in SOLR in bulk.
+
+Resources are loaded a chunk at a time with all of the metadata that is indexed, and the
+documents of a chunk are posted to SOLR together. This is much faster than solr_update or
+rebuild_index for reindexing many resources.
+
+* By default, indexes all discoverable and public resources.
+* Optional arguments: short ids of resources to index.
+* Optional argument --chunk-size: number of resources loaded and posted at once (default 500).
+* Optional argument --processes: number of processes indexing chunks in parallel (default 1).
+"""
+
+import time
+from multiprocessing import Pool
+
+from django import db
+from django.core.management.base import BaseCommand
+from haystack import connections
+
+from hs_core.models import BaseResource
+from hs_core.search_indexes import BaseResourceIndex, index_resources
+
+
+def index_chunk(args):
+    resource_ids, chunk_size = args
+    return index_resources(resource_ids, chunk_size=chunk_size, commit=False)
+
+
+class Command(BaseCommand):
+    help = "Index resources in SOLR in bulk."
+
+    def add_arguments(self, parser):
+
+        # a list of resource id's: none acts on all discoverable resources.
+        parser.add_argument('resource_ids', nargs='*', type=str)
+
+        parser.add_argument('--chunk-size', type=int, dest='chunk_size', default=500,
+                            help='number of resources loaded and posted to SOLR at once')
+        parser.add_argument('--processes', type=int, dest='processes', default=1,
+                            help='number of processes indexing in parallel')
+
+    def handle(self, *args, **options):
+        if options['resource_ids']:
+            resources = BaseResource.objects.filter(short_id__in=options['resource_ids'])
+        else:
+            resources = BaseResourceIndex().index_queryset()
+        resource_ids = list(resources.order_by('id').values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        chunks = [(resource_ids[start:start + chunk_size], chunk_size)
+                  for start in range(0, len(resource_ids), chunk_size)]
+        print("indexing {} resources in {} chunks".format(len(resource_ids), len(chunks)))
+
+        start = time.time()
+        indexed = 0
+        if options['processes'] > 1:
+            # connections must not be shared with the forked processes
+            db.connections.close_all()
+            pool = Pool(options['processes'])
+            try:
+                for posted in pool.imap_unordered(index_chunk, chunks):
+                    indexed += posted
+                    print("{} resources indexed".format(indexed))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for chunk in chunks:
+                indexed += index_chunk(chunk)
+                print("{} resources indexed".format(indexed))
+
+        connections['default'].get_backend().conn.commit()
+        print("{} resources indexed in {:.1f} seconds".format(indexed, time.time() - start))
@@ -21,7 +21,7 @@ from hs_file_types.utils import set_logical_file_type, get_logical_file_type
 
 from requests import post
 
-from hs_core.models import BaseResource
+from hs_core.models import BaseResource, convert_avu_value
 from hs_core.hydroshare import get_resource_by_shortkey
 from hs_core.views.utils import link_irods_file_to_django
 
@@ -69,6 +69,17 @@ def check_relations(resource):
                       .format(resource.short_id, r.type, target))
 
 
+def get_irods_avu(resource, attribute):
+    """Get an AVU of a resource from iRODS rather than from its mirror in the database.
+
+    :param resource: resource whose AVU to get
+    :param attribute: name of the AVU
+    :return: the value of the AVU, converted as by resource.getAVU
+    """
+    istorage = resource.get_irods_storage()
+    return convert_avu_value(attribute, istorage.getAVU(resource.root_path, attribute))
+
+
 def check_irods_files(resource, stop_on_error=False, log_errors=True,
                       echo_errors=False, return_errors=False,
                       sync_ispublic=False, clean_irods=False, clean_django=False):
@@ -113,8 +124,10 @@ def check_irods_files(resource, stop_on_error=False, log_errors=True,
 
     else:
         # Step 2: does every file in Django refer to an existing file in iRODS?
+        # Existence of all files is read from iRODS with a single query.
+        irods_stats = istorage.stat_many([f.storage_path for f in resource.files.all()])
         for f in resource.files.all():
-            if not istorage.exists(f.storage_path):
+            if f.storage_path not in irods_stats:
                 ecount += 1
                 msg = "check_irods_files: django file {} does not exist in iRODS"\
                     .format(f.storage_path)
@@ -136,9 +149,7 @@ def check_irods_files(resource, stop_on_error=False, log_errors=True,
         if isinstance(resource, CR):
             for lf in resource.logical_files:
                     for f in lf.files.all():
-                        try:
-                            f.resource_file.size
-                        except:
+                        if f.storage_path not in irods_stats:
                             ecount += 1
                             msg = "check_resource: file {} does not exist on irods" \
                                 .format(f.storage_path.encode('ascii', 'replace'))
@@ -167,7 +178,7 @@ def check_irods_files(resource, stop_on_error=False, log_errors=True,
         django_public = resource.raccess.public
         irods_public = None
         try:
-            irods_public = resource.getAVU('isPublic')
+            irods_public = get_irods_avu(resource, 'isPublic')
         except SessionException as ex:
             msg = "cannot read isPublic attribute of {}: {}"\
                 .format(resource.short_id, ex.stderr)
@@ -249,16 +260,12 @@ def __check_irods_directory(resource, dir, logger,
     ecount = 0
     istorage = resource.get_irods_storage()
     try:
-        listing = istorage.listdir(dir)
-        for fname in listing[1]:  # files
-            # do not use os.path.join because fname might contain unicode characters
-            fullpath = dir + '/' + fname
-            found = False
-            for f in resource.files.all():
-                if f.storage_path == fullpath:
-                    found = True
-                    break
-            if not found and not resource.is_aggregation_xml_file(fullpath):
+        # list all files at any depth under dir at once
+        _, irods_files = istorage.walk(dir)
+        django_paths = set(f.storage_path for f in resource.files.all())
+        for irods_file in irods_files:
+            fullpath = irods_file['path']
+            if fullpath not in django_paths and not resource.is_aggregation_xml_file(fullpath):
                 ecount += 1
                 msg = "check_irods_files: file {} in iRODs does not exist in Django"\
                     .format(fullpath)
@@ -278,17 +285,6 @@ def __check_irods_directory(resource, dir, logger,
                 if stop_on_error:
                     raise ValidationError(msg)
 
-        for dname in listing[0]:  # directories
-            # do not use os.path.join because paths might contain unicode characters!
-            error2, ecount2 = __check_irods_directory(resource, dir + '/' + dname, logger,
-                                                      stop_on_error=stop_on_error,
-                                                      echo_errors=echo_errors,
-                                                      log_errors=log_errors,
-                                                      return_errors=return_errors,
-                                                      clean=clean)
-            errors.extend(error2)
-            ecount += ecount2
-
     except SessionException:
         pass  # not an error not to have a file directory.
         # Non-existence of files is checked elsewhere.
@@ -371,16 +367,12 @@ def __ingest_irods_directory(resource,
     ecount = 0
     istorage = resource.get_irods_storage()
     try:
-        listing = istorage.listdir(dir)
-        for fname in listing[1]:  # files
-            # do not use os.path.join because fname might contain unicode characters
-            fullpath = dir + '/' + fname
-            found = False
-            for res_file in resource.files.all():
-                if res_file.storage_path == fullpath:
-                    found = True
-
-            if not found and not resource.is_aggregation_xml_file(fullpath):
+        # list all files at any depth under dir at once
+        _, irods_files = istorage.walk(dir)
+        django_paths = set(f.storage_path for f in resource.files.all())
+        for irods_file in irods_files:
+            fullpath = irods_file['path']
+            if fullpath not in django_paths and not resource.is_aggregation_xml_file(fullpath):
                 ecount += 1
                 msg = "ingest_irods_files: file {} in iRODs does not exist in Django (INGESTING)"\
                     .format(fullpath)
@@ -393,7 +385,7 @@ def __ingest_irods_directory(resource,
                 if stop_on_error:
                     raise ValidationError(msg)
                 # TODO: does not ingest logical file structure for composite resources
-                link_irods_file_to_django(resource, fullpath)
+                res_file = link_irods_file_to_django(resource, fullpath)
 
                 # Create required logical files as necessary
                 if resource.resource_type == "CompositeResource":
@@ -439,18 +431,6 @@ def __ingest_irods_directory(resource,
                         if stop_on_error:
                             raise ValidationError(msg)
 
-        for dname in listing[0]:  # directories
-            # do not use os.path.join because fname might contain unicode characters
-            error2, ecount2 = __ingest_irods_directory(resource,
-                                                       dir + '/' + dname,
-                                                       logger,
-                                                       stop_on_error=stop_on_error,
-                                                       echo_errors=echo_errors,
-                                                       log_errors=log_errors,
-                                                       return_errors=return_errors)
-            errors.extend(error2)
-            ecount += ecount2
-
     except SessionException as se:
         print("iRODs error: {}".format(se.stderr))
         logger.error("iRODs error: {}".format(se.stderr))
@@ -577,7 +557,7 @@ class CheckResource(object):
 
     def check_avu(self, label):
         try:
-            value = self.resource.getAVU(label)
+            value = get_irods_avu(self.resource, label)
             if value is None:
                 self.label()
                 print("  AVU {} is None".format(label))
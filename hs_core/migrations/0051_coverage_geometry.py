@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+import django.contrib.gis.db.models.fields
+from django.contrib.gis.geos import GEOSException, Point, Polygon
+from django.db import migrations
+
+
+def populate_coverage_geometry(apps, schema_editor):
+    Coverage = apps.get_model('hs_core', 'Coverage')
+    for coverage in Coverage.objects.filter(type__in=('box', 'point')).iterator():
+        value = json.loads(coverage._value)
+        try:
+            if coverage.type == 'point':
+                geometry = Point(float(value['east']), float(value['north']), srid=4326)
+            else:
+                geometry = Polygon.from_bbox((float(value['westlimit']),
+                                              float(value['southlimit']),
+                                              float(value['eastlimit']),
+                                              float(value['northlimit'])))
+                geometry.srid = 4326
+        except (KeyError, TypeError, ValueError, GEOSException):
+            continue
+        Coverage.objects.filter(id=coverage.id).update(_geometry=geometry)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hs_core', '0050_auto_20200611_1912'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coverage',
+            name='_geometry',
+            field=django.contrib.gis.db.models.fields.GeometryField(blank=True, null=True, srid=4326),
+        ),
+        migrations.RunPython(populate_coverage_geometry, migrations.RunPython.noop),
+    ]
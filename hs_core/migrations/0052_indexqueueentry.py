@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hs_core', '0051_coverage_geometry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexQueueEntry',
+            fields=[
+                ('resource_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('short_id', models.CharField(max_length=32)),
+                ('enqueued', models.DateTimeField(db_index=True)),
+                ('requested', models.DateTimeField()),
+            ],
+        ),
+    ]
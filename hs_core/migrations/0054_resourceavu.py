@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hs_core', '0053_coremetadata_xml_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceAVU',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attribute', models.CharField(max_length=64)),
+                ('value', models.TextField(null=True)),
+                ('resource', models.ForeignKey(editable=False, help_text='resource whose collection has the AVU', on_delete=django.db.models.deletion.CASCADE, related_name='mirrored_avus', to='hs_core.BaseResource')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='resourceavu',
+            unique_together=set([('resource', 'attribute')]),
+        ),
+    ]
@@ -2,6 +2,7 @@
 
 import os.path
 import json
+import hashlib
 import arrow
 import logging
 from uuid import uuid4
@@ -13,6 +14,8 @@ from markdown import markdown
 from django_irods.icommands import SessionException
 
 from django.contrib.postgres.fields import HStoreField
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.geos import GEOSException, Point, Polygon
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.auth.models import User, Group
@@ -25,6 +28,7 @@ from django.dispatch import receiver
 from django.utils.timezone import now
 from django_irods.storage import IrodsStorage
 from django.conf import settings
+from django.core.cache import caches
 from django.core.files import File
 from django.core.exceptions import ObjectDoesNotExist, ValidationError, \
     SuspiciousFileOperation, PermissionDenied
@@ -1187,12 +1191,41 @@ class Coverage(AbstractMetaDataElement):
                     'projection': name of the projection (optional)}"
     """
     _value = models.CharField(max_length=1024)
+    # point or polygon of a point or box coverage (WGS 84) derived from _value on save to make
+    # spatial searches use the spatial index of this field
+    _geometry = GeometryField(srid=4326, null=True, blank=True)
 
     @property
     def value(self):
         """Return json representation of coverage values."""
         return json.loads(self._value)
 
+    def save(self, *args, **kwargs):
+        """Keep the coverage geometry in sync with the coverage value."""
+        self._geometry = self.get_geometry(self.type, json.loads(self._value))
+        super(Coverage, self).save(*args, **kwargs)
+
+    @classmethod
+    def get_geometry(cls, coverage_type, value_dict):
+        """Return the geometry of a point or box coverage value dict.
+
+        None is returned for period coverages and for coverages whose coordinates are invalid
+        """
+        try:
+            if coverage_type == 'point':
+                return Point(float(value_dict['east']), float(value_dict['north']), srid=4326)
+            if coverage_type == 'box':
+                polygon = Polygon.from_bbox((float(value_dict['westlimit']),
+                                             float(value_dict['southlimit']),
+                                             float(value_dict['eastlimit']),
+                                             float(value_dict['northlimit'])))
+                polygon.srid = 4326
+                return polygon
+        except (KeyError, TypeError, ValueError, GEOSException):
+            logger = logging.getLogger(__name__)
+            logger.error("invalid {} coverage value {}".format(coverage_type, value_dict))
+        return None
+
     @classmethod
     def create(cls, **kwargs):
         """Define custom create method for Coverage model.
@@ -2028,6 +2061,8 @@ class AbstractResource(ResourcePermissionsMixin, ResourceIRODSMixin):
         istorage = self.get_irods_storage()
         root_path = self.root_path
         istorage.session.run("imeta", None, 'rm', '-C', root_path, attribute, value)
+        if attribute in MIRRORED_AVUS:
+            ResourceAVU.mirror(self, attribute, None)
 
     def setAVU(self, attribute, value):
         """Set an AVU at the resource level.
@@ -2041,42 +2076,28 @@ class AbstractResource(ResourcePermissionsMixin, ResourceIRODSMixin):
         root_path = self.root_path
         # has to create the resource collection directory if it does not exist already due to
         # the need for setting quota holder on the resource collection before adding files into
-        # the resource collection in order for the real-time iRODS quota micro-services to work
-        if not istorage.exists(root_path):
+        # the resource collection in order for the real-time iRODS quota micro-services to work;
+        # the collection exists if any AVU of the resource has been mirrored
+        if not ResourceAVU.objects.filter(resource_id=self.id).exists() and \
+                not istorage.exists(root_path):
             istorage.session.run("imkdir", None, '-p', root_path)
         istorage.setAVU(root_path, attribute, value)
+        if attribute in MIRRORED_AVUS:
+            ResourceAVU.mirror(self, attribute, value)
 
     def getAVU(self, attribute):
         """Get an AVU for a resource.
 
         This avoids mistakes in getting AVUs by assuring that the appropriate root path
-        is alway used.
+        is alway used. The attributes in MIRRORED_AVUS are read from the database (see
+        ResourceAVU) rather than from iRODS.
         """
-        istorage = self.get_irods_storage()
-        root_path = self.root_path
-        value = istorage.getAVU(root_path, attribute)
-
-        # Convert selected boolean attribute values to bool; non-existence implies False
-        # "Private" is the appropriate response if "isPublic" is None
-        if attribute == 'isPublic':
-            if value is not None and value.lower() == 'true':
-                return True
-            else:
-                return False
-
-        # Convert selected boolean attribute values to bool; non-existence implies True
-        # If bag_modified or metadata_dirty does not exist, then we do not know the
-        # state of metadata files and/or bags. They may not exist. Thus we interpret
-        # None as "true", which will generate the appropriate files if they do not exist.
-        if attribute == 'bag_modified' or attribute == 'metadata_dirty':
-            if value is None or value.lower() == 'true':
-                return True
-            else:
-                return False
-
-        # return strings for all other attributes
+        if attribute in MIRRORED_AVUS:
+            value = ResourceAVU.get_value(self, attribute)
         else:
-            return value
+            istorage = self.get_irods_storage()
+            value = istorage.getAVU(self.root_path, attribute)
+        return convert_avu_value(attribute, value)
 
     @classmethod
     def scimeta_url(cls, resource_id):
@@ -2143,8 +2164,8 @@ class AbstractResource(ResourcePermissionsMixin, ResourceIRODSMixin):
         must override this method. See Composite Resource
         type as an example
         """
-        return self.metadata.get_xml(pretty_print=pretty_print,
-                                     include_format_elements=include_format_elements)
+        return self.metadata.get_cached_xml(pretty_print=pretty_print,
+                                            include_format_elements=include_format_elements)
 
     def is_aggregation_xml_file(self, file_path):
         """Checks if the file path *file_path* is one of the aggregation related xml file paths
@@ -2357,7 +2378,11 @@ class AbstractResource(ResourcePermissionsMixin, ResourceIRODSMixin):
         """
         readme_file = self.readme_file
         if readme_file is not None:
-            readme_file_content = readme_file.read().decode('utf-8', 'ignore')
+            # the readme is read on every landing page view, so it is read through the local
+            # cache of iRODS data objects
+            istorage = self.get_irods_storage()
+            with istorage.open_cached(readme_file.storage_path) as f:
+                readme_file_content = f.read().decode('utf-8', 'ignore')
             if readme_file.extension.lower() == '.md':
                 markdown_file_content = markdown(readme_file_content)
                 return {'content': markdown_file_content,
@@ -2370,20 +2395,24 @@ class AbstractResource(ResourcePermissionsMixin, ResourceIRODSMixin):
     def logical_files(self):
         """Get a list of logical files for resource."""
         logical_files_list = []
-        for res_file in self.files.all():
-            if res_file.logical_file is not None:
-                if res_file.logical_file not in logical_files_list:
-                    logical_files_list.append(res_file.logical_file)
+        seen = set()
+        for res_file in ResourceFile.prefetch_logical_files(self.files.all()):
+            logical_file = res_file.logical_file
+            if logical_file is not None:
+                key = (res_file.logical_file_content_type_id, logical_file.id)
+                if key not in seen:
+                    seen.add(key)
+                    logical_files_list.append(logical_file)
         return logical_files_list
 
     @property
     def aggregation_types(self):
         """Gets a list of all aggregation types that currently exist in this resource"""
         aggr_types = []
-        aggr_type_names = []
+        aggr_type_names = set()
         for lf in self.logical_files:
-            if lf.type_name not in aggr_type_names:
-                aggr_type_names.append(lf.type_name)
+            if lf.type_name() not in aggr_type_names:
+                aggr_type_names.add(lf.type_name())
                 aggr_type = lf.get_aggregation_display_name().split(":")[0]
                 aggr_types.append(aggr_type)
         return aggr_types
@@ -2391,22 +2420,13 @@ class AbstractResource(ResourcePermissionsMixin, ResourceIRODSMixin):
     @property
     def non_logical_files(self):
         """Get list of non-logical files for resource."""
-        non_logical_files_list = []
-        for res_file in self.files.all():
-            if res_file.logical_file is None:
-                if res_file.logical_file not in non_logical_files_list:
-                    non_logical_files_list.append(res_file)
-        return non_logical_files_list
+        return [res_file for res_file in ResourceFile.prefetch_logical_files(self.files.all())
+                if res_file.logical_file is None]
 
     @property
     def generic_logical_files(self):
         """Get list of generic logical files for resource."""
-        generic_logical_files_list = []
-        for res_file in self.files.all():
-            if res_file.has_generic_logical_file:
-                if res_file.logical_file not in generic_logical_files_list:
-                    generic_logical_files_list.append(res_file.logical_file)
-        return generic_logical_files_list
+        return [lf for lf in self.logical_files if lf.type_name() == "GenericLogicalFile"]
 
     def get_logical_files(self, logical_file_class_name):
         """Get a list of logical files (aggregations) for a specified logical file class name."""
@@ -2827,6 +2847,28 @@ class ResourceFile(ResourceFileIRODSMixin):
                 self._size = 0
         self.save()
 
+    @classmethod
+    def calculate_sizes(cls, resource, files):
+        """Reads the sizes of many files of resource with a single iRODS query and saves
+        them to the DB"""
+        files = list(files)
+        if not files:
+            return
+        # resolve storage paths without fetching the resource once per file
+        if resource.is_federated:
+            paths = [f.fed_resource_file.name for f in files]
+        else:
+            paths = [f.resource_file.name for f in files]
+        sizes = resource.get_irods_storage().sizes(paths)
+        for f, path in zip(files, paths):
+            if path in sizes:
+                f._size = sizes[path]
+            else:
+                logger = logging.getLogger(__name__)
+                logger.warn("file {} not found".format(path))
+                f._size = 0
+            f.save()
+
     # ResourceFile API handles file operations
     def set_storage_path(self, path, test_exists=True):
         """Bind this ResourceFile instance to an existing file.
@@ -3046,6 +3088,42 @@ class ResourceFile(ResourceFileIRODSMixin):
         # TODO: move code from location used below to here
         remove_folder(user, resource.short_id, os.path.join('data', 'contents', folder))
 
+    @classmethod
+    def prefetch_logical_files(cls, resource_files):
+        """Resolve the logical files of many resource files in bulk.
+
+        Resource files are grouped by logical file content type and the logical files (with
+        their metadata) of each type are fetched with a single in_bulk query. The logical file
+        is cached on each resource file so that accessing its logical_file afterwards does not
+        query the database.
+
+        :param resource_files: an iterable (e.g., a queryset) of resource files
+        :return: a list of the resource files, in their original order
+        """
+        resource_files = list(resource_files)
+        cache_attr = cls.logical_file_content_object.cache_attr
+        ids_by_type = {}
+        for res_file in resource_files:
+            if res_file.logical_file_content_type_id is None or hasattr(res_file, cache_attr):
+                continue
+            ids_by_type.setdefault(res_file.logical_file_content_type_id, set()).add(
+                res_file.logical_file_object_id)
+
+        logical_files = {}
+        for content_type_id, object_ids in ids_by_type.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            for object_id, logical_file in model.objects.select_related('metadata')\
+                    .in_bulk(list(object_ids)).items():
+                logical_files[(content_type_id, object_id)] = logical_file
+
+        for res_file in resource_files:
+            key = (res_file.logical_file_content_type_id, res_file.logical_file_object_id)
+            if key in logical_files:
+                setattr(res_file, cache_attr, logical_files[key])
+            elif res_file.logical_file_content_type_id is None:
+                setattr(res_file, cache_attr, None)
+        return resource_files
+
     @property
     def has_logical_file(self):
         """Check existence of logical file."""
@@ -3423,8 +3501,7 @@ class BaseResource(Page, AbstractResource):
         Raises SessionException if iRODS fails.
         """
         # trigger file size read for files that haven't been set yet
-        for f in self.files.filter(_size__lt=0):
-            f.calculate_size()
+        ResourceFile.calculate_sizes(self, self.files.filter(_size__lt=0))
         # compute the total file size for the resource
         res_size_dict = self.files.aggregate(Sum('_size'))
         # handle case if no resource files
@@ -3571,6 +3648,9 @@ class CoreMetaData(models.Model):
     _type = GenericRelation(Type)
     _publisher = GenericRelation(Publisher)
     funding_agencies = GenericRelation(FundingAgency)
+    # incremented whenever a metadata element of this metadata object is created, updated or
+    # deleted, so that rendered xml can be cached (see get_cached_xml)
+    xml_version = models.PositiveIntegerField(default=0)
 
     @property
     def resource(self):
@@ -3961,6 +4041,61 @@ class CoreMetaData(models.Model):
                 self.update_repeatable_element(element_name=element_name, metadata=metadata,
                                                property_name="funding_agencies")
 
+    def save(self, *args, **kwargs):
+        """Save the metadata object without writing xml_version, which is only changed by
+        bump_xml_version and is stale in objects loaded before a metadata element changed."""
+        if not self._state.adding and kwargs.get('update_fields') is None and \
+                not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'xml_version']
+        super(CoreMetaData, self).save(*args, **kwargs)
+
+    @classmethod
+    def bump_xml_version(cls, content_type_id, object_id):
+        """Record a change to a metadata element of a metadata object.
+
+        :param content_type_id: id of the content type of the element's metadata object
+        :param object_id: id of the element's metadata object
+        """
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        # elements also describe aggregations, whose metadata are not CoreMetaData
+        if model is not None and issubclass(model, CoreMetaData):
+            CoreMetaData.objects.filter(id=object_id) \
+                .update(xml_version=models.F('xml_version') + 1)
+
+    def get_xml_version(self):
+        """Get a version identifying the content of the metadata XML.
+
+        This changes whenever a metadata element or the extended metadata of the resource
+        changes, so that it can be used to tell whether a rendering is current.
+        """
+        from .hydroshare.utils import current_site_url
+
+        xml_version = CoreMetaData.objects.filter(id=self.id) \
+            .values_list('xml_version', flat=True).first()
+        extra_metadata = BaseResource.objects.filter(object_id=self.id) \
+            .values_list('extra_metadata', flat=True).first()
+        digest = hashlib.md5(json.dumps([current_site_url(), extra_metadata],
+                                        sort_keys=True).encode()).hexdigest()
+        return '{}.{}.{}'.format(self.id, xml_version, digest)
+
+    def get_cached_xml(self, pretty_print=True, include_format_elements=True):
+        """Get metadata XML rendering, rendering it only if it has changed since last cached.
+
+        Renderings are cached in the cache named by HS_METADATA_XML_CACHE (default 'default')
+        for HS_METADATA_XML_CACHE_TIMEOUT seconds (default one day).
+        """
+        key = 'hs_core.metadata_xml.{}.{}.{}.{}'.format(
+            self.get_xml_version(), type(self).__name__, int(pretty_print),
+            int(include_format_elements))
+        cache = caches[getattr(settings, 'HS_METADATA_XML_CACHE', 'default')]
+        xml = cache.get(key)
+        if xml is None:
+            xml = self.get_xml(pretty_print=pretty_print,
+                               include_format_elements=include_format_elements)
+            cache.set(key, xml, getattr(settings, 'HS_METADATA_XML_CACHE_TIMEOUT', 86400))
+        return xml
+
     def get_xml(self, pretty_print=True, include_format_elements=True):
         """Get metadata XML rendering."""
         # importing here to avoid circular import problem
@@ -3978,7 +4113,6 @@ class CoreMetaData(models.Model):
         resource = BaseResource.objects.filter(object_id=self.id).first()
         rt = [rt for rt in get_resource_types()
               if rt._meta.object_name == resource.resource_type][0]
-        resource = rt.objects.get(id=resource.id)
 
         # create the title element
         if self.title:
@@ -4132,13 +4266,12 @@ class CoreMetaData(models.Model):
         rdf_Description_resource.set('{%s}about' % self.NAMESPACES['rdf'], self.type.url)
         rdfs1_label = etree.SubElement(rdf_Description_resource,
                                        '{%s}label' % self.NAMESPACES['rdfs1'])
-        rdfs1_label.text = resource._meta.verbose_name
+        rdfs1_label.text = rt._meta.verbose_name
         rdfs1_isDefinedBy = etree.SubElement(rdf_Description_resource,
                                              '{%s}isDefinedBy' % self.NAMESPACES['rdfs1'])
         rdfs1_isDefinedBy.text = current_site_url() + "/terms"
 
         # encode extended key/value arbitrary metadata
-        resource = BaseResource.objects.filter(object_id=self.id).first()
         for key, value in list(resource.extra_metadata.items()):
             hsterms_key_value = etree.SubElement(
                 rdf_Description, '{%s}extendedMetadata' % self.NAMESPACES['hsterms'])
@@ -4392,6 +4525,132 @@ class CoreMetaData(models.Model):
                 self.create_element(element_model_name=element_name, **element[element_name])
 
 
+class IndexQueueEntry(models.Model):
+    """A resource whose entry in the search index is out of date.
+
+    There is at most one entry per resource, so that any number of changes to a resource made
+    before the queue is drained (see hs_core.index_queue) result in a single update or removal
+    of its index entry. The resource is not a foreign key so that entries outlive deleted
+    resources, whose index entries must be removed.
+    """
+
+    resource_id = models.IntegerField(primary_key=True)
+    short_id = models.CharField(max_length=32)
+    # when the index entry first went out of date
+    enqueued = models.DateTimeField(db_index=True)
+    # when the resource last changed; the entry is kept if this changes while draining
+    requested = models.DateTimeField()
+
+
+# resource level AVUs that are read so often that they are mirrored in the database
+MIRRORED_AVUS = ('quotaUserName', 'bag_modified', 'metadata_dirty', 'isPublic')
+
+
+def convert_avu_value(attribute, value):
+    """Convert the value of a resource level AVU as stored in iRODS for use in python.
+
+    :param attribute: name of the AVU
+    :param value: string value of the AVU, or None if the AVU does not exist
+    :return: bool for the isPublic, bag_modified and metadata_dirty AVUs, value otherwise
+    """
+    # Convert selected boolean attribute values to bool; non-existence implies False
+    # "Private" is the appropriate response if "isPublic" is None
+    if attribute == 'isPublic':
+        if value is not None and value.lower() == 'true':
+            return True
+        else:
+            return False
+
+    # Convert selected boolean attribute values to bool; non-existence implies True
+    # If bag_modified or metadata_dirty does not exist, then we do not know the
+    # state of metadata files and/or bags. They may not exist. Thus we interpret
+    # None as "true", which will generate the appropriate files if they do not exist.
+    if attribute == 'bag_modified' or attribute == 'metadata_dirty':
+        if value is None or value.lower() == 'true':
+            return True
+        else:
+            return False
+
+    # return strings for all other attributes
+    else:
+        return value
+
+
+class ResourceAVU(models.Model):
+    """A copy of a resource level iRODS AVU in MIRRORED_AVUS.
+
+    iRODS remains the source of truth for these AVUs (the iRODS rule engine reads them from
+    there), but the web tier reads them on every landing page and download, so they are written
+    through to this table by AbstractResource.setAVU and removeAVU and read from it by getAVU.
+    An AVU that was never mirrored is read from iRODS once and copied here. A value of None
+    records that the AVU does not exist in iRODS. AVUs set in iRODS without going through
+    setAVU make the mirror drift; see the reconcile_resource_avus command.
+    """
+
+    resource = models.ForeignKey(BaseResource, null=False, editable=False,
+                                 related_name='mirrored_avus',
+                                 help_text='resource whose collection has the AVU',
+                                 on_delete=models.CASCADE)
+    attribute = models.CharField(max_length=64)
+    value = models.TextField(null=True)
+
+    class Meta:
+        unique_together = ('resource', 'attribute')
+
+    @classmethod
+    def mirror(cls, resource, attribute, value):
+        """Record the value of an AVU just set in iRODS; None if it was removed.
+
+        iRODS is not rolled back with the database, so the value is recorded in a transaction
+        of its own once the enclosing transaction, if any, commits. Until then the AVU is read
+        from iRODS by the enclosing transaction.
+        """
+        resource_id = resource.id
+
+        def record():
+            with transaction.atomic():
+                cls.objects.update_or_create(resource_id=resource_id, attribute=attribute,
+                                             defaults={'value': value})
+
+        if transaction.get_connection().in_atomic_block:
+            cls.objects.filter(resource_id=resource_id, attribute=attribute).delete()
+        transaction.on_commit(record)
+
+    @classmethod
+    def get_value(cls, resource, attribute):
+        """Get the string value of an AVU of a resource, copying it from iRODS if not mirrored.
+
+        :raises SessionException: if the AVU is not mirrored and the resource collection
+        does not exist in iRODS
+        """
+        try:
+            return cls.objects.get(resource_id=resource.id, attribute=attribute).value
+        except cls.DoesNotExist:
+            istorage = resource.get_irods_storage()
+            value = istorage.getAVU(resource.root_path, attribute)
+            cls.mirror(resource, attribute, value)
+            return value
+
+    @classmethod
+    def get_values(cls, resources, attribute):
+        """Get the values of an AVU of many resources with a single query.
+
+        AVUs that are not mirrored yet are read from iRODS and copied to the database.
+        :param resources: resources (instances of BaseResource or of one of its subclasses)
+        :param attribute: name of an AVU in MIRRORED_AVUS
+        :return: dict of the values (converted by convert_avu_value) by resource id
+        """
+        resources = list(resources)
+        values = dict(cls.objects.filter(resource_id__in=[res.id for res in resources],
+                                         attribute=attribute)
+                      .values_list('resource_id', 'value'))
+        for res in resources:
+            if res.id not in values:
+                values[res.id] = cls.get_value(res, attribute)
+        return {res_id: convert_avu_value(attribute, value)
+                for res_id, value in values.items()}
+
+
 def resource_processor(request, page):
     """Return mezzanine page processor for resource page."""
     extra = page_permissions_page_processor(request, page)
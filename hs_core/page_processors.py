@@ -11,8 +11,7 @@ from mezzanine.pages.page_processors import processor_for
 from .forms import ExtendedMetadataForm
 from hs_communities.models import Topic
 from hs_core import languages_iso
-from hs_core.hydroshare.resource import METADATA_STATUS_SUFFICIENT, METADATA_STATUS_INSUFFICIENT, \
-    res_has_web_reference
+from hs_core.landing_page_cache import get_landing_page_fragments
 from hs_core.models import GenericResource, Relation
 from hs_core.views.utils import show_relations_section, \
     rights_allows_copy
@@ -67,7 +66,9 @@ def get_page_context(page, user, resource_edit=False, extended_metadata_layout=N
     if user.is_authenticated():
         resource_is_mine = content_model.rlabels.is_mine(user)
 
-    metadata_status = _get_metadata_status(content_model)
+    # parts of the page that are the same for every user are cached by content version
+    fragments = get_landing_page_fragments(content_model)
+    metadata_status = fragments['metadata_status']
 
     belongs_to_collections = content_model.collections.all()
 
@@ -115,10 +116,8 @@ def get_page_context(page, user, resource_edit=False, extended_metadata_layout=N
 
     qholder = content_model.get_quota_holder()
 
-    readme = content_model.get_readme_file_content()
-    if readme is None:
-        readme = ''
-    has_web_ref = res_has_web_reference(content_model)
+    readme = fragments['readme']
+    has_web_ref = fragments['show_web_reference_note']
 
     keywords = json.dumps([sub.value for sub in content_model.metadata.subjects.all()])
     topics = Topic.objects.all().values_list('name', flat=True).order_by('name')
@@ -171,14 +170,14 @@ def get_page_context(page, user, resource_edit=False, extended_metadata_layout=N
         abstract = content_model.metadata.description.abstract if \
             content_model.metadata.description else None
 
-        missing_metadata_elements = content_model.metadata.get_required_missing_elements()
+        missing_metadata_elements = fragments['missing_metadata_elements']
         maps_key = settings.MAPS_KEY if hasattr(settings, 'MAPS_KEY') else ''
 
         context = {
                    'cm': content_model,
                    'resource_edit_mode': resource_edit,
                    'metadata_form': None,
-                   'citation': content_model.get_citation(),
+                   'citation': fragments['citation'],
                    'title': title,
                    'readme': readme,
                    'abstract': abstract,
@@ -303,8 +302,8 @@ def get_page_context(page, user, resource_edit=False, extended_metadata_layout=N
                'spatial_coverage': spatial_coverage_data_dict,
                'keywords': keywords,
                'metadata_status': metadata_status,
-               'missing_metadata_elements': content_model.metadata.get_required_missing_elements(),
-               'citation': content_model.get_citation(),
+               'missing_metadata_elements': fragments['missing_metadata_elements'],
+               'citation': fragments['citation'],
                'rights': content_model.metadata.rights,
                'bag_url': bag_url,
                'current_user': user,
@@ -367,12 +366,3 @@ def check_for_validation(request):
             return validation_error
 
     return None
-
-
-def _get_metadata_status(resource):
-    if resource.metadata.has_all_required_elements():
-        metadata_status = METADATA_STATUS_SUFFICIENT
-    else:
-        metadata_status = METADATA_STATUS_INSUFFICIENT
-
-    return metadata_status
@@ -1,12 +1,22 @@
 """Signal receivers for the hs_core app."""
 
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from hs_core.signals import pre_metadata_element_create, pre_metadata_element_update, \
     post_delete_resource, post_add_geofeature_aggregation, post_add_generic_aggregation, \
     post_add_netcdf_aggregation, post_add_raster_aggregation, post_add_timeseries_aggregation, \
     post_add_reftimeseries_aggregation, post_remove_file_aggregation, post_raccess_change
 from hs_core.tasks import update_web_services
-from hs_core.models import GenericResource, Party
+from hs_core.models import GenericResource, BaseResource, Party, AbstractMetaDataElement, \
+    CoreMetaData
+from hs_core.authorization_cache import bump_authorize_version
+from hs_access_control.models import ResourceAccess, GroupAccess, UserResourcePrivilege, \
+    GroupResourcePrivilege, UserGroupPrivilege, GroupCommunityPrivilege
+from hs_file_types.models.base import AbstractFileMetaData, AbstractLogicalFile
+from hs_modelinstance.models import ExecutedBy
 from django.conf import settings
 from .forms import SubjectsForm, AbstractValidationForm, CreatorValidationForm, \
     ContributorValidationForm, RelationValidationForm, SourceValidationForm, RightsValidationForm, \
@@ -168,3 +178,55 @@ def hs_update_web_services(sender, **kwargs):
             settings.HSWS_PUBLISH_URLS,
             kwargs.get("resource").short_id
         ), countdown=1)
+
+
+@receiver(post_save, sender=ResourceAccess)
+@receiver(post_save, sender=GroupAccess)
+@receiver(post_save, sender=UserResourcePrivilege)
+@receiver(post_save, sender=GroupResourcePrivilege)
+@receiver(post_save, sender=UserGroupPrivilege)
+@receiver(post_save, sender=GroupCommunityPrivilege)
+@receiver(post_delete, sender=ResourceAccess)
+@receiver(post_delete, sender=GroupAccess)
+@receiver(post_delete, sender=UserResourcePrivilege)
+@receiver(post_delete, sender=GroupResourcePrivilege)
+@receiver(post_delete, sender=UserGroupPrivilege)
+@receiver(post_delete, sender=GroupCommunityPrivilege)
+def hs_invalidate_authorize_cache(sender, **kwargs):
+    """Signal to invalidate cached authorization decisions when access changes."""
+    # bump now for the rest of this transaction, and again once it commits, so that decisions
+    # other requests made from the access before the change are not cached under the new version
+    bump_authorize_version()
+    transaction.on_commit(bump_authorize_version)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def hs_bump_metadata_xml_version(sender, instance, **kwargs):
+    """Signal to invalidate the cached metadata xml when the metadata of a resource changes.
+
+    Besides its own metadata elements, the metadata xml of a resource depends on the metadata of
+    its aggregations and, for a model instance, on the title of the model program that executed it.
+    """
+    if isinstance(instance, AbstractMetaDataElement):
+        CoreMetaData.bump_xml_version(instance.content_type_id, instance.object_id)
+        model = ContentType.objects.get_for_id(instance.content_type_id).model_class()
+        if model is not None and issubclass(model, AbstractFileMetaData):
+            _bump_xml_versions(model.objects.filter(id=instance.object_id)
+                               .values('logical_file__resource__object_id'))
+    elif isinstance(instance, AbstractFileMetaData):
+        _bump_xml_versions(type(instance).objects.filter(id=instance.id)
+                           .values('logical_file__resource__object_id'))
+    elif isinstance(instance, AbstractLogicalFile):
+        _bump_xml_versions(BaseResource.objects.filter(id=instance.resource_id).values('object_id'))
+    elif isinstance(instance, BaseResource) and instance.resource_type == 'ModelProgramResource':
+        _bump_xml_versions(ExecutedBy.objects.filter(model_program_fk_id=instance.id)
+                           .values('object_id'))
+
+
+def _bump_xml_versions(metadata_ids):
+    """Record a change to the metadata xml of the resources with the given metadata objects.
+
+    :param metadata_ids: a queryset of the ids of the CoreMetaData objects of the resources
+    """
+    CoreMetaData.objects.filter(id__in=metadata_ids).update(xml_version=F('xml_version') + 1)
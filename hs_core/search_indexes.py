@@ -1,12 +1,14 @@
 """Define search indexes for hs_core module."""
 
-from haystack import indexes
+from haystack import connections, indexes
 from hs_core.models import BaseResource
+from hs_access_control.models import PrivilegeCodes, UserResourcePrivilege
 from hs_geographic_feature_resource.models import GeographicFeatureMetaData
 from hs_app_netCDF.models import NetcdfMetaData
 from ref_ts.models import RefTSMetadata
 from hs_app_timeseries.models import TimeSeriesMetaData
-from django.db.models import Q
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.template import loader
 from datetime import datetime
 from nameparser import HumanName
 import probablepeople
@@ -100,6 +102,46 @@ def normalize_name(name):
     return normalized.strip()
 
 
+def first_element(related):
+    """ return the first element of a metadata relation, or None
+
+        This is the element that relation.all().first() would return, found among the
+        elements prefetched by load_resources_for_indexing if there are any.
+    """
+    elements = list(related.all())
+    if not related.model._meta.ordering:
+        elements.sort(key=lambda element: element.pk)
+    return elements[0] if elements else None
+
+
+def get_first_creator(metadata):
+    """ return the creator of order 1, or None """
+    for creator in metadata.creators.all():
+        if creator.order == 1:
+            return creator
+    return None
+
+
+def get_owners(res):
+    """ return the active owners of a resource, prefetched by load_resources_for_indexing """
+    owners = getattr(res, '_index_owners', None)
+    if owners is None:
+        owners = list(res.raccess.owners.all())
+        res._index_owners = owners
+    return owners
+
+
+def get_content_model(res):
+    """ return the resource as an instance of its resource type, fetching it only once """
+    if type(res) is not BaseResource:
+        return res
+    content_model = getattr(res, '_index_content_model', None)
+    if content_model is None:
+        content_model = res.get_content_model()
+        res._index_content_model = content_model
+    return content_model
+
+
 def get_content_types(res):
     """ return a set of content types matching extensions in a resource.
         These include content types of logical files, as well as the generic
@@ -108,9 +150,9 @@ def get_content_types(res):
         This is only meaningful for Generic or Composite resources.
     """
 
-    resource = res.get_content_model()  # enable full logical file interface
+    resource = get_content_model(res)  # enable full logical file interface
 
-    types = set([res.discovery_content_type])  # accumulate high-level content types.
+    types = set([resource.discovery_content_type])  # accumulate high-level content types.
     exts = set()  # track individual file extensions
 
     # categorize logical files by type, and files without a logical file by extension.
@@ -141,7 +183,7 @@ def get_content_types(res):
 class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
     """Define base class for resource indexes."""
 
-    text = indexes.CharField(document=True, use_template=True)
+    text = indexes.CharField(document=True)
     short_id = indexes.CharField(model_attr='short_id')
     doi = indexes.CharField(model_attr='doi', null=True)
     author = indexes.CharField(faceted=True)  # normalized to last, first, middle
@@ -156,7 +198,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
     # TODO: We might need more information than a bool in the future
     replaced = indexes.BooleanField()
     created = indexes.DateTimeField(model_attr='created')
-    modified = indexes.DateTimeField(model_attr='last_updated')
+    modified = indexes.DateTimeField()
     organization = indexes.MultiValueField(faceted=True)
     creator_email = indexes.MultiValueField()
     publisher = indexes.CharField(faceted=True)
@@ -231,29 +273,40 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         return self.get_model().objects.filter(Q(raccess__discoverable=True) |
                                                Q(raccess__public=True)).distinct()
 
+    def prepare_text(self, obj):
+        """Return the text searched by default, rendered from a template."""
+        return loader.get_template('search/indexes/hs_core/baseresource_text.txt').render({
+            'object': obj,
+            'title': first_element(obj.metadata._title),
+            'description': first_element(obj.metadata._description),
+            'publisher': first_element(obj.metadata._publisher),
+            'owners': get_owners(obj)})
+
     def prepare_created(self, obj):
         return obj.created.strftime('%Y-%m-%dT%H:%M:%SZ')
 
     def prepare_modified(self, obj):
-        return obj.last_updated.strftime('%Y-%m-%dT%H:%M:%SZ')
+        last_updated = next(date.start_date for date in obj.metadata.dates.all()
+                            if date.type == 'modified')
+        return last_updated.strftime('%Y-%m-%dT%H:%M:%SZ')
 
     def prepare_title(self, obj):
         """Return metadata title if exists, otherwise return 'none'."""
-        if hasattr(obj, 'metadata') and \
-                obj.metadata is not None and \
-                obj.metadata.title is not None and \
-                obj.metadata.title.value is not None:
-            return obj.metadata.title.value.lstrip()
+        title = None
+        if hasattr(obj, 'metadata') and obj.metadata is not None:
+            title = first_element(obj.metadata._title)
+        if title is not None and title.value is not None:
+            return title.value.lstrip()
         else:
             return 'none'
 
     def prepare_abstract(self, obj):
         """Return metadata abstract if exists, otherwise return None."""
-        if hasattr(obj, 'metadata') and \
-                obj.metadata is not None and \
-                obj.metadata.description is not None and \
-                obj.metadata.description.abstract is not None:
-            return obj.metadata.description.abstract.lstrip()
+        description = None
+        if hasattr(obj, 'metadata') and obj.metadata is not None:
+            description = first_element(obj.metadata._description)
+        if description is not None and description.abstract is not None:
+            return description.abstract.lstrip()
         else:
             return None
 
@@ -266,7 +319,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         if hasattr(obj, 'metadata') and \
                 obj.metadata is not None and \
                 obj.metadata.creators is not None:
-            first_creator = obj.metadata.creators.filter(order=1).first()
+            first_creator = get_first_creator(obj.metadata)
             if first_creator is None:
                 return 'none'
             elif first_creator.name:
@@ -288,7 +341,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         if hasattr(obj, 'metadata') and \
                 obj.metadata is not None and \
                 obj.metadata.creators is not None:
-            first_creator = obj.metadata.creators.filter(order=1).first()
+            first_creator = get_first_creator(obj.metadata)
             if first_creator is None:
                 return 'none'
             elif first_creator.name:
@@ -310,7 +363,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         if hasattr(obj, 'metadata') and \
                 obj.metadata is not None and \
                 obj.metadata.creators is not None:
-            first_creator = obj.metadata.creators.filter(order=1).first()
+            first_creator = get_first_creator(obj.metadata)
             if first_creator is not None and first_creator.description is not None:
                 return first_creator.description
             else:
@@ -328,8 +381,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
                 obj.metadata is not None and \
                 obj.metadata.creators is not None:
             return [normalize_name(creator.name)
-                    for creator in obj.metadata.creators.all()
-                    .exclude(name__isnull=True).exclude(name='')]
+                    for creator in obj.metadata.creators.all() if creator.name]
         else:
             return []
 
@@ -343,8 +395,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
                 obj.metadata is not None and \
                 obj.metadata.contributors is not None:
             output1 = [normalize_name(contributor.name)
-                       for contributor in obj.metadata.contributors.all()
-                       .exclude(name__isnull=True).exclude(name='')]
+                       for contributor in obj.metadata.contributors.all() if contributor.name]
             return list(set(output1))  # eliminate duplicates
         else:
             return []
@@ -359,7 +410,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
                 obj.metadata is not None and \
                 obj.metadata.subjects is not None:
             return [subject.value.strip() for subject in obj.metadata.subjects.all()
-                    .exclude(value__isnull=True)]
+                    if subject.value is not None]
         else:
             return []
 
@@ -381,7 +432,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         Return metadata publisher if it exists; otherwise return empty array.
         """
         if hasattr(obj, 'metadata') and obj.metadata is not None:
-            publisher = obj.metadata.publisher
+            publisher = first_element(obj.metadata._publisher)
             if publisher is not None:
                 return str(publisher).lstrip()
             else:
@@ -395,7 +446,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
                 obj.metadata is not None and \
                 obj.metadata.creators is not None:
             return [creator.email.strip() for creator in obj.metadata.creators.all()
-                    .exclude(email__isnull=True).exclude(email='')]
+                    if creator.email]
         else:
             return []
 
@@ -424,7 +475,8 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         if hasattr(obj, 'metadata') and \
                 obj.metadata is not None and \
                 obj.metadata.relations is not None:
-            return obj.metadata.relations.filter(type='isReplacedBy').exists()
+            return any(relation.type == 'isReplacedBy'
+                       for relation in obj.metadata.relations.all())
         else:
             return False
 
@@ -669,10 +721,11 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
 
     def prepare_language(self, obj):
         """Return resource language if exists, otherwise return None."""
-        if hasattr(obj, 'metadata') and \
-                obj.metadata is not None and \
-                obj.metadata.language is not None:
-            return obj.metadata.language.code.strip()
+        language = None
+        if hasattr(obj, 'metadata') and obj.metadata is not None:
+            language = first_element(obj.metadata._language)
+        if language is not None:
+            return language.code.strip()
         else:
             return None
 
@@ -696,16 +749,17 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
 
     def prepare_resource_type(self, obj):
         """Resource type is verbose_name attribute of obj argument."""
-        return obj.verbose_name
+        return get_content_model(obj)._meta.verbose_name
 
     def prepare_content_type(self, obj):
         """ register content types for both logical files and some MIME types """
-        if obj.verbose_name == 'Composite Resource' or \
-           obj.verbose_name == 'Generic Resource':
+        verbose_name = get_content_model(obj)._meta.verbose_name
+        if verbose_name == 'Composite Resource' or \
+           verbose_name == 'Generic Resource':
             output = get_content_types(obj)[0]
             return list(output)
         else:
-            return [obj.discovery_content_type]
+            return [get_content_model(obj).discovery_content_type]
 
     def prepare_comment(self, obj):
         """Return list of all comments on resource."""
@@ -718,7 +772,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
     def prepare_owner_login(self, obj):
         """Return list of usernames that have ownership access to resource."""
         if hasattr(obj, 'raccess'):
-            return [owner.username for owner in obj.raccess.owners.all()]
+            return [owner.username for owner in get_owners(obj)]
         else:
             return []
 
@@ -727,7 +781,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         """Return list of names of resource owners."""
         names = []
         if hasattr(obj, 'raccess'):
-            for owner in obj.raccess.owners.all():
+            for owner in get_owners(obj):
                 name = normalize_name(owner.first_name + ' ' + owner.last_name)
                 names.append(name)
         return names
@@ -739,7 +793,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         output1 = []
         output2 = []
         if hasattr(obj, 'raccess'):
-            for owner in obj.raccess.owners.all():
+            for owner in get_owners(obj):
                 name = normalize_name(owner.first_name + ' ' + owner.last_name)
                 output0.append(name)
 
@@ -747,17 +801,15 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
                 obj.metadata is not None and \
                 obj.metadata.creators is not None:
             output1 = [normalize_name(creator.name)
-                       for creator in obj.metadata.creators.all()
-                       .exclude(name__isnull=True).exclude(name='')]
+                       for creator in obj.metadata.creators.all() if creator.name]
             output2 = [normalize_name(contributor.name)
-                       for contributor in obj.metadata.contributors.all()
-                       .exclude(name__isnull=True).exclude(name='')]
+                       for contributor in obj.metadata.contributors.all() if contributor.name]
         return list(set(output0 + output1 + output2))  # eliminate duplicates
 
     def prepare_owners_count(self, obj):
         """Return count of resource owners if 'raccess' attribute exists, othrerwise return 0."""
         if hasattr(obj, 'raccess'):
-            return obj.raccess.owners.all().count()
+            return len(get_owners(obj))
         else:
             return 0
 
@@ -815,7 +867,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         """
         if hasattr(obj, 'metadata'):
             if isinstance(obj.metadata, GeographicFeatureMetaData):
-                geometry_info = obj.metadata.geometryinformation
+                geometry_info = first_element(obj.metadata.geometryinformations)
                 if geometry_info is not None:
                     return geometry_info.geometryType
                 else:
@@ -831,7 +883,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         """
         if hasattr(obj, 'metadata'):
             if isinstance(obj.metadata, GeographicFeatureMetaData):
-                field_info = obj.metadata.fieldinformations.all().first()
+                field_info = first_element(obj.metadata.fieldinformations)
                 if field_info is not None and field_info.fieldName is not None:
                     return field_info.fieldName.strip()
                 else:
@@ -847,7 +899,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         """
         if hasattr(obj, 'metadata'):
             if isinstance(obj.metadata, GeographicFeatureMetaData):
-                field_info = obj.metadata.fieldinformations.all().first()
+                field_info = first_element(obj.metadata.fieldinformations)
                 if field_info is not None and field_info.fieldType is not None:
                     return field_info.fieldType.strip()
                 else:
@@ -863,7 +915,7 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         """
         if hasattr(obj, 'metadata'):
             if isinstance(obj.metadata, GeographicFeatureMetaData):
-                field_info = obj.metadata.fieldinformations.all().first()
+                field_info = first_element(obj.metadata.fieldinformations)
                 if field_info is not None and field_info.fieldTypeCode is not None:
                     return field_info.fieldTypeCode.strip()
                 else:
@@ -1061,3 +1113,90 @@ class BaseResourceIndex(indexes.SearchIndex, indexes.Indexable):
         for key, value in list(obj.extra_metadata.items()):
             extra.append(key + ': ' + value)
         return extra
+
+
+# metadata relations read by BaseResourceIndex, by the metadata class that defines them
+INDEXED_METADATA_RELATIONS = (
+    (None, ('_title', '_description', '_publisher', '_language', 'creators', 'contributors',
+            'subjects', 'dates', 'coverages', 'formats', 'identifiers', 'sources',
+            'relations')),
+    (NetcdfMetaData, ('variables',)),
+    (RefTSMetadata, ('variables', 'sites', 'methods', 'quality_levels', 'datasources')),
+    (TimeSeriesMetaData, ('_variables', '_sites', '_methods', '_time_series_results')),
+    (GeographicFeatureMetaData, ('geometryinformations', 'fieldinformations')),
+)
+
+
+def load_resources_for_indexing(resource_ids):
+    """
+    Load resources together with everything that BaseResourceIndex reads from them.
+
+    The number of queries depends upon the number of resource types and metadata classes
+    involved, but not upon the number of resources, so that documents can be prepared for a
+    chunk of resources without further queries.
+
+    :param resource_ids: ids of the resources to load
+    :return: list of resources, as instances of their resource types, in the order of ids
+    """
+    from hs_core.hydroshare.utils import get_resource_types
+    resource_types = {rt._meta.model_name: rt for rt in get_resource_types()}
+
+    ids_by_type = {}
+    for content_model, resource_id in BaseResource.objects.filter(id__in=resource_ids) \
+            .values_list('content_model', 'id'):
+        ids_by_type.setdefault(content_model, []).append(resource_id)
+
+    resources = []
+    for content_model, ids in ids_by_type.items():
+        resource_type = resource_types.get(content_model, BaseResource)
+        resources.extend(resource_type.objects.filter(id__in=ids).select_related('raccess'))
+    owner_privileges = UserResourcePrivilege.objects \
+        .filter(privilege=PrivilegeCodes.OWNER, user__is_active=True) \
+        .select_related('user')
+    prefetch_related_objects(resources, 'content_object', 'comments',
+                             'files__logical_file_content_object',
+                             Prefetch('r2urp', queryset=owner_privileges,
+                                      to_attr='_index_owner_privileges'))
+
+    metadata_by_class = {}
+    for resource in resources:
+        resource._index_owners = [p.user for p in resource._index_owner_privileges]
+        for f in resource.files.all():
+            f.content_object = resource
+        if resource.metadata is not None:
+            metadata_by_class.setdefault(type(resource.metadata), []).append(resource.metadata)
+
+    for metadata_class, metadata in metadata_by_class.items():
+        lookups = []
+        for defining_class, relations in INDEXED_METADATA_RELATIONS:
+            if defining_class is None or issubclass(metadata_class, defining_class):
+                lookups.extend(r for r in relations if hasattr(metadata_class, r))
+        prefetch_related_objects(metadata, *lookups)
+
+    order = {resource_id: position for position, resource_id in enumerate(resource_ids)}
+    resources.sort(key=lambda resource: order.get(resource.id, len(order)))
+    return resources
+
+
+def index_resources(resource_ids, chunk_size=500, commit=True, using='default'):
+    """
+    Index resources in Solr, loading and posting them a chunk at a time.
+
+    :param resource_ids: ids of the resources to index
+    :param chunk_size: number of resources loaded and posted to Solr at once
+    :param commit: whether to commit the Solr index when done
+    :param using: name of the haystack connection
+    :return: number of resources posted
+    """
+    index = connections[using].get_unified_index().get_index(BaseResource)
+    backend = connections[using].get_backend()
+    resource_ids = list(resource_ids)
+    posted = 0
+    for start in range(0, len(resource_ids), chunk_size):
+        resources = load_resources_for_indexing(resource_ids[start:start + chunk_size])
+        if resources:
+            backend.update(index, resources, commit=False)
+            posted += len(resources)
+    if commit:
+        backend.conn.commit()
+    return posted
@@ -6,6 +6,8 @@ import traceback
 import zipfile
 import logging
 import json
+import itertools
+import time
 
 from datetime import datetime, timedelta, date
 from xml.etree import ElementTree
@@ -15,14 +17,16 @@ from celery import shared_task
 from celery.schedules import crontab
 from celery.task import periodic_task
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 
 from rest_framework import status
 
 from hs_access_control.models import GroupMembershipRequest
 from hs_core.hydroshare import utils
-from hs_core.hydroshare.hs_bagit import create_bag_files
+from hs_core.hydroshare.hs_bagit import create_bag_files, get_bag_manifest_path, \
+    record_bag_manifest, update_bag_incrementally
 from hs_core.hydroshare.resource import get_activated_doi, get_resource_doi, \
     get_crossref_url, deposit_res_metadata_with_crossref
 from hs_odm2.models import ODM2Variable
@@ -291,12 +295,27 @@ def add_zip_file_contents_to_resource(pk, zip_file_path):
         resource.file_unpack_status = 'Running'
         resource.save()
 
-        for i, f in enumerate(files):
-            logger.debug("Adding file {0} to resource {1}".format(f.name, pk))
-            utils.add_file_to_resource(resource, f)
-            resource.file_unpack_message = "Imported {0} of about {1} file(s) ...".format(
-                i, num_files)
-            resource.save()
+        # the progress message is saved at most once every HS_UPLOAD_PROGRESS_INTERVAL seconds
+        progress_interval = getattr(settings, 'HS_UPLOAD_PROGRESS_INTERVAL', 5)
+        progress = {'imported': 0, 'saved': time.time()}
+
+        def update_progress(copied, total):
+            if time.time() - progress['saved'] >= progress_interval:
+                resource.file_unpack_message = "Imported {0} of about {1} file(s) ...".format(
+                    progress['imported'] + copied, num_files)
+                resource.save()
+                progress['saved'] = time.time()
+
+        # files are extracted from the zip file and added to the resource a chunk at a time
+        chunk_size = getattr(settings, 'HS_UPLOAD_CHUNK_SIZE', 100)
+        for chunk in iter(lambda: list(itertools.islice(files, chunk_size)), []):
+            logger.debug("Adding {0} files to resource {1}".format(len(chunk), pk))
+            try:
+                utils.add_files_to_resource(resource, chunk, progress_callback=update_progress)
+            finally:
+                for f in chunk:
+                    f.close()
+            progress['imported'] += len(chunk)
 
         # This might make the resource unsuitable for public consumption
         resource.update_public_and_discoverable()
@@ -328,6 +347,55 @@ def add_zip_file_contents_to_resource(pk, zip_file_path):
         os.unlink(zip_file_path)
 
 
+@shared_task(bind=True)
+def unzip_file_task(self, user_pk, res_id, zip_with_rel_path, bool_remove_original,
+                    overwrite=False):
+    """
+    Unzip a zip file of a resource in iRODS (see hs_core.views.utils.unzip_file). The number
+    of unzipped files moved into place so far is reported as the task's PROGRESS state, at most
+    once every HS_UPLOAD_PROGRESS_INTERVAL seconds.
+    """
+    from hs_core.views.utils import unzip_file
+
+    user = User.objects.get(pk=user_pk)
+    progress_interval = getattr(settings, 'HS_UPLOAD_PROGRESS_INTERVAL', 5)
+    progress = {'saved': time.time()}
+
+    def update_progress(moved, total):
+        if time.time() - progress['saved'] >= progress_interval:
+            self.update_state(state='PROGRESS', meta={'moved': moved, 'total': total})
+            progress['saved'] = time.time()
+
+    unzip_file(user, res_id, zip_with_rel_path, bool_remove_original, overwrite=overwrite,
+               progress_callback=update_progress)
+    return os.path.dirname(zip_with_rel_path)
+
+
+@shared_task
+def set_file_type_task(user_pk, res_id, file_id, hs_file_type, folder_path=''):
+    """
+    Set a file (file_id) or a folder (folder_path) of a composite resource to an aggregation
+    type (see hs_file_types.views.set_file_type), for aggregations such as GeoFeature whose
+    metadata extraction can take long.
+    :return: json of the status ('success' or 'error') and message of the request
+    """
+    from hs_file_types.utils import set_logical_file_type
+
+    user = User.objects.get(pk=user_pk)
+    res = utils.get_resource_by_shortkey(res_id)
+    response_data = {'status': 'error'}
+    try:
+        set_logical_file_type(res, user, file_id, hs_file_type, folder_path)
+        utils.resource_modified(res, user, overwrite_bag=False)
+        msg = "{} was successfully set to the selected aggregation type."
+        response_data['message'] = msg.format("Selected folder" if folder_path
+                                              else "Selected file")
+        response_data['status'] = 'success'
+    except ValidationError as ex:
+        response_data['message'] = str(ex)
+    return json.dumps(response_data)
+
+
 @shared_task
 def delete_zip(zip_path):
     istorage = IrodsStorage()
@@ -409,9 +477,8 @@ def create_bag_by_irods(resource_id):
 
     bag_path = res.bag_path
 
-    metadata_dirty = istorage.getAVU(res.root_path, 'metadata_dirty')
     # if metadata has been changed, then regenerate metadata xml files
-    if metadata_dirty is None or metadata_dirty.lower() == "true":
+    if res.getAVU('metadata_dirty'):
         create_bag_files(res)
 
     irods_bagit_input_path = res.get_irods_path(resource_id, prepend_short_id=False)
@@ -436,7 +503,8 @@ def create_bag_by_irods(resource_id):
         res.get_irods_path('bagit.txt'),
         res.get_irods_path('manifest-md5.txt'),
         res.get_irods_path('tagmanifest-md5.txt'),
-        bag_path
+        bag_path,
+        get_bag_manifest_path(res)
     ]
 
     # only proceed when the resource is not deleted potentially by another request
@@ -458,13 +526,19 @@ def create_bag_by_irods(resource_id):
             # for now as a workaround which could be raised from potential race conditions when
             # multiple ibun commands try to create the same zip file or the very same resource
             # gets deleted by another request when being downloaded
-            istorage.runBagitRule(bagit_rule_file, bagit_input_path, bagit_input_resource)
-            istorage.zipup(irods_bagit_input_path, bag_path)
+            # in incremental mode only the files changed since the last bag are re-bagged,
+            # falling back to bagging the whole resource when that is not possible
+            incremental = getattr(settings, 'HS_BAGIT_INCREMENTAL', False)
+            if not incremental or not update_bag_incrementally(res, istorage):
+                istorage.runBagitRule(bagit_rule_file, bagit_input_path, bagit_input_resource)
+                istorage.zipup(irods_bagit_input_path, bag_path)
+                if incremental:
+                    record_bag_manifest(res, istorage)
             if res.raccess.published:
                 # compute checksum to meet DataONE distribution requirement
                 chksum = istorage.checksum(bag_path)
                 res.bag_checksum = chksum
-            istorage.setAVU(irods_bagit_input_path, 'bag_modified', "false")
+            res.setAVU('bag_modified', False)
             return True
         except SessionException as ex:
             # if an exception occurs, delete incomplete files potentially being generated by
@@ -555,3 +629,22 @@ def monthly_group_membership_requests_cleanup():
     """
     two_months_ago = datetime.today() - timedelta(days=60)
     GroupMembershipRequest.objects.filter(my_date__lte=two_months_ago).delete()
+
+
+@periodic_task(ignore_result=True,
+               run_every=timedelta(seconds=getattr(settings, 'HS_INDEX_QUEUE_INTERVAL', 30)))
+def drain_index_queue():
+    """
+    Update the search index entries of resources queued by IndexQueueSignalProcessor
+    """
+    from hs_core.index_queue import drain_index_queue as drain
+
+    lock_timeout = getattr(settings, 'HS_INDEX_QUEUE_LOCK_TIMEOUT', 600)
+    # do not drain concurrently when a drain outlasts the interval
+    if not cache.add('hs_core.index_queue.lock', True, lock_timeout):
+        return
+    try:
+        drain(batch_size=getattr(settings, 'HS_INDEX_QUEUE_BATCH_SIZE', 500),
+              max_batches=getattr(settings, 'HS_INDEX_QUEUE_MAX_BATCHES', 20))
+    finally:
+        cache.delete('hs_core.index_queue.lock')
@@ -2,12 +2,14 @@ import os
 import unittest
 
 from django.contrib.auth.models import User, Group
+from django.core.exceptions import ValidationError
 
 from hs_core.hydroshare.resource import add_resource_files, create_resource
 from hs_core.hydroshare.users import create_account
 from hs_core.models import GenericResource
 from hs_core.testing import MockIRODSTestCaseMixin
-from hs_core.hydroshare.utils import QuotaException, resource_file_add_pre_process
+from hs_core.hydroshare.utils import QuotaException, resource_file_add_pre_process, \
+    add_files_to_resource
 from theme.models import QuotaMessage
 
 
@@ -85,6 +87,32 @@ class TestAddResourceFiles(MockIRODSTestCaseMixin, unittest.TestCase):
         self.assertTrue(self.n3 in file_list, "file 3 has not been added")
         res.delete()
 
+    def test_add_files_in_bulk(self):
+        # create a resource
+        res = create_resource(resource_type='GenericResource',
+                              owner=self.user,
+                              title='Test Resource',
+                              metadata=[],)
+
+        progress = []
+        res_files = add_files_to_resource(res, [self.myfile1, self.myfile2],
+                                          folder=['', 'folder-1'],
+                                          progress_callback=lambda copied, total:
+                                          progress.append((copied, total)))
+        self.assertEqual(progress, [(1, 2), (2, 2)])
+        self.assertEqual([f.short_path for f in res_files], [self.n1, 'folder-1/' + self.n2])
+        self.assertEqual(res.files.all().count(), 2)
+        # sizes are taken from the uploaded files
+        self.assertEqual(54, res.size)
+        # both files have the same format
+        self.assertEqual(res.metadata.formats.filter(value='text/plain').count(), 1)
+
+        # no file is added if any of the files already exists
+        with self.assertRaises(ValidationError):
+            add_files_to_resource(res, [self.myfile3, self.myfile1])
+        self.assertEqual(res.files.all().count(), 2)
+        res.delete()
+
     def test_add_files_over_quota(self):
         # create a resource
         res = create_resource(resource_type='GenericResource',
@@ -1,5 +1,11 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import namedtuple
+
 from django.contrib.auth.models import Group
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 
 from hs_core import hydroshare
 from hs_core.hydroshare import hs_bagit
@@ -7,6 +13,7 @@ from hs_core.hydroshare.utils import get_resource_by_shortkey
 from hs_core.tasks import create_bag_by_irods
 from hs_core.models import GenericResource
 from django_irods.storage import IrodsStorage
+from django_irods.testing import FakeIrodsServer, get_fake_irods_storage
 from hs_core.task_utils import _retrieve_task_id
 
 
@@ -60,6 +67,36 @@ class TestBagIt(TestCase):
         bag_path = self.test_res.bag_path
         self.assertFalse(istorage.exists(bag_path))
 
+    @override_settings(HS_BAGIT_INCREMENTAL=True)
+    def test_incremental_bag_update(self):
+        istorage = self.test_res.get_irods_storage()
+        manifest_path = hs_bagit.get_bag_manifest_path(self.test_res)
+        # there is no previous bag to update
+        self.assertFalse(hs_bagit.update_bag_incrementally(self.test_res, istorage))
+
+        # the first bag is created from scratch, recording its manifest
+        status = create_bag_by_irods(self.test_res.short_id)
+        self.assertTrue(status)
+        self.assertTrue(istorage.exists(manifest_path))
+
+        # after a metadata change only the changed files are bagged again, in place, if the
+        # iRODS session can read and write byte ranges
+        hs_bagit.create_bag_files(self.test_res)
+        self.assertEqual(hs_bagit.update_bag_incrementally(self.test_res, istorage),
+                         istorage.supports_range_writes())
+
+        # the updated bag must be a valid bag
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            local_bag = os.path.join(tmp_dir, os.path.basename(self.test_res.bag_path))
+            istorage.getFile(self.test_res.bag_path, local_bag)
+            hs_bagit.read_bag(local_bag)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        hs_bagit.delete_files_and_bag(self.test_res)
+        self.assertFalse(istorage.exists(manifest_path))
+
     def test_retrieve_create_bag_by_irods_task_id(self):
         mock_res_id = '84d1b8b60f274ba4be155881129561a9'
         mock_active_and_reserved_job_id = '04ee96ac-1cf2-459f-b497-3b2ac04b3877'
@@ -99,3 +136,103 @@ class TestBagIt(TestCase):
                                                                       "mock_active_and_reserved_job_id")
         ret_id = _retrieve_task_id(mock_res_id, mock_scheduled_jobs)
         self.assertEqual(ret_id, mock_scheduled_job_id, msg="retrieved task id not equal to mock_scheduled_job_id")
+
+
+FakeResource = namedtuple('FakeResource', ['root_path', 'bag_path'])
+
+
+class TestIncrementalBagUpdate(SimpleTestCase):
+    """Test that bags are updated in place, reading and writing only the changed members."""
+
+    def setUp(self):
+        super(TestIncrementalBagUpdate, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeIrodsServer()
+        self.istorage = get_fake_irods_storage(self.server, self.tmp_dir)
+        self.resource = FakeResource('abc123', 'bags/abc123.zip')
+        # random contents, so that compressed members are about as large as the files
+        self.unchanged = os.urandom(30000).hex()
+        self.files = {'readme.txt': 'read me', 'bagit.txt': hs_bagit.BAGIT_TXT,
+                      'manifest-md5.txt': '', 'tagmanifest-md5.txt': '',
+                      'data/contents/unchanged.txt': self.unchanged,
+                      'data/contents/large.txt': os.urandom(20000).hex(),
+                      'data/contents/changed.txt': 'old',
+                      'data/contents/deleted.txt': 'deleted'}
+        for path, content in self.files.items():
+            self._save(path, content)
+        # a bag made by ibun, with its manifest
+        bag = os.path.join(self.tmp_dir, 'bag.zip')
+        with zipfile.ZipFile(bag, 'w', zipfile.ZIP_DEFLATED) as bag_zip:
+            for path, content in sorted(self.files.items()):
+                bag_zip.writestr(os.path.join('abc123', path), content)
+        self.istorage.saveFile(bag, self.resource.bag_path, create_directory=True)
+        hs_bagit.record_bag_manifest(self.resource, self.istorage)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestIncrementalBagUpdate, self).tearDown()
+
+    def _save(self, path, content):
+        local_file = os.path.join(self.tmp_dir, 'file')
+        with open(local_file, 'w') as f:
+            f.write(content)
+        self.istorage.saveFile(local_file, os.path.join('abc123', path), create_directory=True)
+        self.istorage.checksum(os.path.join('abc123', path))
+
+    def _bag_contents(self):
+        bag = os.path.join(self.tmp_dir, 'updated.zip')
+        self.istorage.getFile(self.resource.bag_path, bag)
+        with zipfile.ZipFile(bag) as bag_zip:
+            self.assertIsNone(bag_zip.testzip())
+            return dict((name[len('abc123/'):], bag_zip.read(name).decode())
+                        for name in bag_zip.namelist())
+
+    def test_update_in_place(self):
+        self._save('data/contents/changed.txt', 'new')
+        self._save('data/contents/added.txt', 'added')
+        self.istorage.delete('abc123/data/contents/deleted.txt')
+        bag_size = self.istorage.size(self.resource.bag_path)
+        read_range = self.istorage.read_range
+        bytes_read = []
+
+        def count_bytes_read(name, offset, length):
+            data = read_range(name, offset, length)
+            bytes_read.append(len(data))
+            return data
+        with override_settings(IRODS_RANGE_READ_BLOCK_SIZE=1024):
+            self.istorage.read_range = count_bytes_read
+            self.assertTrue(hs_bagit.update_bag_incrementally(self.resource, self.istorage))
+
+        # only the central directory of the bag was read, not the unchanged members
+        self.assertLess(sum(bytes_read), 4096)
+        contents = self._bag_contents()
+        self.assertEqual(contents['data/contents/changed.txt'], 'new')
+        self.assertEqual(contents['data/contents/added.txt'], 'added')
+        self.assertEqual(contents['data/contents/unchanged.txt'], self.unchanged)
+        self.assertNotIn('data/contents/deleted.txt', contents)
+        self.assertIn('data/contents/added.txt', contents['manifest-md5.txt'])
+        self.assertNotIn('data/contents/deleted.txt', contents['manifest-md5.txt'])
+        self.assertGreaterEqual(self.istorage.size(self.resource.bag_path), bag_size)
+
+        # a bag whose central directory shrinks keeps its size, padding the zip comment
+        for name in ('data/contents/added.txt', 'data/contents/changed.txt'):
+            self.istorage.delete(os.path.join('abc123', name))
+        for i in range(10):
+            self._save('data/contents/{}_with_a_long_name.txt'.format(i), str(i))
+        self.assertTrue(hs_bagit.update_bag_incrementally(self.resource, self.istorage))
+        for i in range(10):
+            self.istorage.delete('abc123/data/contents/{}_with_a_long_name.txt'.format(i))
+        bag_size = self.istorage.size(self.resource.bag_path)
+        self.assertTrue(hs_bagit.update_bag_incrementally(self.resource, self.istorage))
+        self.assertEqual(self.istorage.size(self.resource.bag_path), bag_size)
+        self.assertEqual(sorted(self._bag_contents()),
+                         ['bagit.txt', 'data/contents/large.txt', 'data/contents/unchanged.txt',
+                          'manifest-md5.txt', 'readme.txt', 'tagmanifest-md5.txt'])
+
+    def test_dead_space_needs_new_bag(self):
+        # each change replaces 40% of the payload, leaving the replaced members in the bag
+        self._save('data/contents/large.txt', os.urandom(20000).hex())
+        self.assertTrue(hs_bagit.update_bag_incrementally(self.resource, self.istorage))
+        # until more than half of the bag is taken by replaced members
+        self._save('data/contents/large.txt', os.urandom(20000).hex())
+        self.assertFalse(hs_bagit.update_bag_incrementally(self.resource, self.istorage))
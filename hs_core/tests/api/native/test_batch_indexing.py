@@ -0,0 +1,64 @@
+# Test loading resources in bulk for indexing in SOLR.
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from hs_core import hydroshare
+from hs_core.models import BaseResource
+from hs_core.testing import MockIRODSTestCaseMixin
+from hs_core.search_indexes import BaseResourceIndex, load_resources_for_indexing
+
+
+class TestBatchIndexing(MockIRODSTestCaseMixin, TestCase):
+    def setUp(self):
+        super(TestBatchIndexing, self).setUp()
+        self.group, _ = Group.objects.get_or_create(name='Hydroshare Author')
+        self.user = hydroshare.create_account(
+            'creator@usu.edu',
+            username='creator',
+            first_name='Creator_FirstName',
+            last_name='Creator_LastName',
+            superuser=False,
+            groups=[]
+        )
+        self.resources = []
+        for number in range(4):
+            resource = hydroshare.create_resource(
+                'CompositeResource',
+                self.user,
+                'My Test Resource {}'.format(number),
+                keywords=['kw1', 'kw2'],
+                metadata=[{'creator': {'name': 'John Smith'}},
+                          {'contributor': {'name': 'Lisa Molini'}},
+                          {'coverage': {'type': 'period',
+                                        'value': {'name': 'Name for period coverage',
+                                                  'start': '1/1/2000',
+                                                  'end': '12/12/2012'}}}]
+            )
+            self.resources.append(resource)
+
+    def test_constant_queries(self):
+        """ loading resources makes as many queries for one resource as for several """
+        with CaptureQueriesContext(connection) as one:
+            load_resources_for_indexing([self.resources[0].id])
+        with CaptureQueriesContext(connection) as several:
+            load_resources_for_indexing([r.id for r in self.resources])
+        self.assertEqual(len(one), len(several))
+
+    def test_no_queries_when_preparing(self):
+        """ documents are prepared from loaded resources without queries """
+        index = BaseResourceIndex()
+        resources = load_resources_for_indexing([r.id for r in self.resources])
+        with self.assertNumQueries(0):
+            for resource in resources:
+                index.full_prepare(resource)
+
+    def test_same_documents(self):
+        """ documents prepared in bulk match those prepared one resource at a time """
+        index = BaseResourceIndex()
+        resources = load_resources_for_indexing([r.id for r in self.resources])
+        self.assertEqual([r.id for r in resources], [r.id for r in self.resources])
+        for resource in resources:
+            single = BaseResource.objects.get(id=resource.id)
+            self.assertEqual(index.full_prepare(resource), index.full_prepare(single))
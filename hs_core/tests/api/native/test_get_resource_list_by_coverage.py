@@ -0,0 +1,55 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase
+
+from hs_core import hydroshare
+from hs_core.models import Coverage
+from hs_core.testing import MockIRODSTestCaseMixin
+
+
+class TestGetResourceListByCoverage(MockIRODSTestCaseMixin, TestCase):
+    def setUp(self):
+        super(TestGetResourceListByCoverage, self).setUp()
+        self.hydroshare_author_group, _ = Group.objects.get_or_create(name='Hydroshare Author')
+        self.user = hydroshare.create_account(
+            'creator@usu.edu',
+            username='creator',
+            first_name='Creator_FirstName',
+            last_name='Creator_LastName',
+            superuser=False,
+            groups=[]
+        )
+        self.box_res = hydroshare.create_resource('GenericResource', self.user, 'Box Resource')
+        self.box_res.metadata.create_element('coverage', type='box',
+                                             value={'northlimit': '45', 'eastlimit': '-100',
+                                                    'southlimit': '40', 'westlimit': '-110',
+                                                    'units': 'Decimal degrees'})
+        self.point_res = hydroshare.create_resource('GenericResource', self.user,
+                                                    'Point Resource')
+        self.point_res.metadata.create_element('coverage', type='point',
+                                               value={'east': '10', 'north': '50',
+                                                      'units': 'Decimal degrees'})
+
+    def _search(self, north, south, east, west):
+        return set(hydroshare.get_resource_list(user=self.user, coverage_type='box',
+                                                north=north, south=south, east=east,
+                                                west=west))
+
+    def test_coverage_geometry_is_kept_in_sync(self):
+        box = self.box_res.metadata.coverages.get(type='box')
+        self.assertEqual(box._geometry.extent, (-110, 40, -100, 45))
+        point = self.point_res.metadata.coverages.get(type='point')
+        self.assertEqual(point._geometry.coords, (10, 50))
+
+        self.point_res.metadata.update_element('coverage', point.id, type='point',
+                                               value={'east': '20', 'north': '30',
+                                                      'units': 'Decimal degrees'})
+        self.assertEqual(Coverage.objects.get(id=point.id)._geometry.coords, (20, 30))
+
+    def test_get_resource_list_by_coverage(self):
+        self.assertEqual(self._search(north='50', south='42', east='-90', west='-105'),
+                         {self.box_res})
+        self.assertEqual(self._search(north='55', south='45', east='15', west='5'),
+                         {self.point_res})
+        self.assertEqual(self._search(north='60', south='30', east='20', west='-120'),
+                         {self.box_res, self.point_res})
+        self.assertEqual(self._search(north='10', south='0', east='10', west='0'), set())
@@ -0,0 +1,64 @@
+# Test deferred updates of the search index.
+from django.contrib.auth.models import Group
+from django.test import TransactionTestCase
+from mock import patch
+
+from hs_core import hydroshare
+from hs_core.index_queue import IndexQueueSignalProcessor, drain_index_queue, \
+    get_index_queue_stats
+from hs_core.models import IndexQueueEntry
+from hs_core.testing import MockIRODSTestCaseMixin
+
+
+class TestIndexQueue(MockIRODSTestCaseMixin, TransactionTestCase):
+    def setUp(self):
+        super(TestIndexQueue, self).setUp()
+        self.processor = IndexQueueSignalProcessor(None, None)
+        self.group, _ = Group.objects.get_or_create(name='Hydroshare Author')
+        self.user = hydroshare.create_account(
+            'creator@usu.edu',
+            username='creator',
+            first_name='Creator_FirstName',
+            last_name='Creator_LastName',
+            superuser=False,
+            groups=[]
+        )
+        self.public = hydroshare.create_resource('CompositeResource', self.user, 'Public')
+        self.private = hydroshare.create_resource('CompositeResource', self.user, 'Private')
+
+    def tearDown(self):
+        self.processor.teardown()
+        super(TestIndexQueue, self).tearDown()
+
+    def test_coalescing(self):
+        """ repeated changes to a resource are queued once """
+        self.public.save()
+        self.public.raccess.discoverable = True
+        self.public.raccess.public = True
+        self.public.raccess.save()
+        self.public.save()
+        self.assertEqual(IndexQueueEntry.objects.filter(resource_id=self.public.id).count(), 1)
+        self.assertEqual(get_index_queue_stats()['pending'], 2)
+
+    @patch('hs_core.index_queue.connections')
+    def test_drain(self, connections):
+        """ queued resources are indexed or removed from the index """
+        self.public.raccess.discoverable = True
+        self.public.raccess.public = True
+        self.public.raccess.save()
+        backend = connections['default'].get_backend()
+
+        self.assertEqual(drain_index_queue(), (1, 1))
+        self.assertFalse(IndexQueueEntry.objects.exists())
+        indexed = backend.update.call_args[0][1]
+        self.assertEqual([r.id for r in indexed], [self.public.id])
+        backend.remove.assert_called_once_with(
+            'hs_core.baseresource.{}'.format(self.private.id), commit=False)
+
+        # deleted resources are removed from the index
+        backend.reset_mock()
+        private_id = self.private.id
+        hydroshare.delete_resource(self.private.short_id)
+        self.assertEqual(drain_index_queue(), (0, 1))
+        backend.remove.assert_called_once_with(
+            'hs_core.baseresource.{}'.format(private_id), commit=False)
@@ -0,0 +1,89 @@
+# Test caching of the parts of resource landing pages that are the same for every user.
+import json
+
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.files.uploadedfile import UploadedFile
+from django.test import TestCase, RequestFactory
+from mock import patch
+
+from hs_core import hydroshare
+from hs_core.hydroshare.utils import resource_modified, add_file_to_resource
+from hs_core.landing_page_cache import get_content_version, get_landing_page_fragments, \
+    get_aggregation_metadata_html, get_missing_file_type_metadata_info
+from hs_core.testing import MockIRODSTestCaseMixin
+from hs_file_types.models import GenericLogicalFile
+from hs_file_types.views import delete_coverage_element
+
+
+class TestLandingPageCache(MockIRODSTestCaseMixin, TestCase):
+    def setUp(self):
+        super(TestLandingPageCache, self).setUp()
+        caches['default'].clear()
+        self.group, _ = Group.objects.get_or_create(name='Hydroshare Author')
+        self.user = hydroshare.create_account(
+            'creator@usu.edu',
+            username='creator',
+            first_name='Creator_FirstName',
+            last_name='Creator_LastName',
+            superuser=False,
+            groups=[]
+        )
+        self.res = hydroshare.create_resource('CompositeResource', self.user, 'My Test Resource')
+
+    def test_version_changes_with_content(self):
+        """ changing the metadata or marking the resource modified changes the content version """
+        version = get_content_version(self.res)
+        self.assertEqual(get_content_version(self.res), version)
+
+        self.res.metadata.create_element('subject', value='sub-1')
+        self.assertNotEqual(get_content_version(self.res), version)
+
+        version = get_content_version(self.res)
+        resource_modified(self.res, self.user, overwrite_bag=False)
+        self.assertNotEqual(get_content_version(self.res), version)
+
+    def test_cached_fragments(self):
+        """ fragments are computed once for each content version """
+        fragments = get_landing_page_fragments(self.res)
+        self.assertEqual(fragments['citation'], self.res.get_citation())
+        self.assertEqual(fragments['readme'], '')
+
+        with patch.object(type(self.res), 'get_citation') as get_citation:
+            self.assertEqual(get_landing_page_fragments(self.res), fragments)
+            get_citation.assert_not_called()
+
+        self.res.metadata.create_element('subject', value='sub-1')
+        with patch.object(type(self.res), 'get_citation', return_value='new citation'):
+            self.assertEqual(get_landing_page_fragments(self.res)['citation'], 'new citation')
+
+    def test_aggregation_html_changes_with_coverage(self):
+        """ deleting the coverage of an aggregation changes its cached metadata html """
+        res_file = add_file_to_resource(
+            self.res, UploadedFile(file=open('hs_file_types/tests/generic_file.txt', 'rb'),
+                                   name='generic_file.txt'))
+        GenericLogicalFile.set_file_type(self.res, self.user, res_file.id)
+        logical_file = GenericLogicalFile.objects.get(resource=self.res)
+        value_dict = {'east': '56.45678', 'north': '12.6789', 'units': 'Decimal degree'}
+        logical_file.metadata.create_element('coverage', type='point', value=value_dict)
+        html = get_aggregation_metadata_html(logical_file)
+        self.assertIn('56.45678', html)
+        missing_metadata = get_missing_file_type_metadata_info(self.res)
+
+        with patch.object(type(logical_file.metadata), 'get_html') as get_html:
+            self.assertEqual(get_aggregation_metadata_html(logical_file), html)
+            get_html.assert_not_called()
+
+        # the view does not mark the resource modified
+        request = RequestFactory().post('/')
+        request.user = self.user
+        response = delete_coverage_element(request, hs_file_type='GenericLogicalFile',
+                                           file_type_id=logical_file.id,
+                                           element_id=logical_file.metadata.spatial_coverage.id)
+        self.assertEqual(json.loads(response.content.decode())['status'], 'success')
+
+        logical_file = GenericLogicalFile.objects.get(id=logical_file.id)
+        self.assertNotIn('56.45678', get_aggregation_metadata_html(logical_file))
+        with patch.object(type(self.res), 'get_missing_file_type_metadata_info',
+                          return_value=missing_metadata + ['recomputed']):
+            self.assertIn('recomputed', get_missing_file_type_metadata_info(self.res))
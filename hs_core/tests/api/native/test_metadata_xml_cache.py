@@ -0,0 +1,103 @@
+# Test caching of rendered science metadata xml.
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from mock import patch
+
+from hs_core import hydroshare
+from hs_core.testing import MockIRODSTestCaseMixin
+from hs_file_types.models import GenericLogicalFile
+
+
+class TestMetadataXMLCache(MockIRODSTestCaseMixin, TestCase):
+    def setUp(self):
+        super(TestMetadataXMLCache, self).setUp()
+        self.group, _ = Group.objects.get_or_create(name='Hydroshare Author')
+        self.user = hydroshare.create_account(
+            'creator@usu.edu',
+            username='creator',
+            first_name='Creator_FirstName',
+            last_name='Creator_LastName',
+            superuser=False,
+            groups=[]
+        )
+        self.res = hydroshare.create_resource('CompositeResource', self.user, 'My Test Resource')
+
+    def test_version_changes_with_elements(self):
+        """ creating, updating and deleting elements changes the xml version """
+        metadata = self.res.metadata
+        version = metadata.get_xml_version()
+        self.assertEqual(metadata.get_xml_version(), version)
+
+        subject = metadata.create_element('subject', value='sub-1')
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+        version = metadata.get_xml_version()
+        metadata.update_element('subject', subject.id, value='sub-2')
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+        version = metadata.get_xml_version()
+        metadata.delete_element('subject', subject.id)
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+        # saving a metadata object loaded before an element changed keeps the new version
+        version = metadata.get_xml_version()
+        metadata.create_element('subject', value='sub-3')
+        metadata.save()
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+        version = metadata.get_xml_version()
+        self.res.extra_metadata = {'key': 'value'}
+        self.res.save()
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+    def test_version_changes_with_aggregation_metadata(self):
+        """ changing the metadata of an aggregation changes the xml version of its resource """
+        metadata = self.res.metadata
+        version = metadata.get_xml_version()
+        logical_file = GenericLogicalFile.create(self.res)
+        logical_file.save()
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+        version = metadata.get_xml_version()
+        logical_file.metadata.extra_metadata = {'key': 'value'}
+        logical_file.metadata.save()
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+        version = metadata.get_xml_version()
+        logical_file.metadata.create_element('coverage', type='period',
+                                             value={'name': 'Name for period coverage',
+                                                    'start': '1/1/2000', 'end': '12/12/2012'})
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+        version = metadata.get_xml_version()
+        logical_file.dataset_name = 'aggregation'
+        logical_file.save()
+        self.assertNotEqual(metadata.get_xml_version(), version)
+
+    def test_version_changes_with_model_program_title(self):
+        """ changing the title of a model program changes the xml version of the model instances
+        it executed """
+        program = hydroshare.create_resource('ModelProgramResource', self.user, 'Model Program')
+        instance = hydroshare.create_resource('ModelInstanceResource', self.user, 'Model Instance')
+        instance.metadata.create_element('ExecutedBy', model_name=program.short_id)
+
+        version = instance.metadata.get_xml_version()
+        program.metadata.update_element('title', program.metadata.title.id, value='New Title')
+        hydroshare.utils.resource_modified(program, self.user, overwrite_bag=False)
+        self.assertNotEqual(instance.metadata.get_xml_version(), version)
+        self.assertIn('New Title', instance.metadata.get_cached_xml())
+
+    def test_cached_xml(self):
+        """ cached xml matches the xml rendered anew """
+        metadata = self.res.metadata
+        self.assertEqual(metadata.get_cached_xml(), metadata.get_xml())
+
+        metadata.create_element('subject', value='sub-1')
+        xml = metadata.get_cached_xml()
+        self.assertIn('sub-1', xml)
+        self.assertEqual(xml, metadata.get_xml())
+
+        # unchanged metadata is not rendered again
+        with patch.object(type(metadata), 'get_xml') as get_xml:
+            self.assertEqual(metadata.get_cached_xml(), xml)
+            get_xml.assert_not_called()
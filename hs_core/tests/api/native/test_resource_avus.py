@@ -0,0 +1,78 @@
+# Test mirroring of resource level iRODS AVUs in the database.
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase
+from mock import patch
+
+from django_irods.storage import IrodsStorage
+from hs_core import hydroshare
+from hs_core.models import ResourceAVU
+from hs_core.testing import MockIRODSTestCaseMixin
+
+
+class TestResourceAVUs(MockIRODSTestCaseMixin, TransactionTestCase):
+    def setUp(self):
+        super(TestResourceAVUs, self).setUp()
+        self.group, _ = Group.objects.get_or_create(name='Hydroshare Author')
+        self.user = hydroshare.create_account(
+            'creator@usu.edu',
+            username='creator',
+            first_name='Creator_FirstName',
+            last_name='Creator_LastName',
+            superuser=False,
+            groups=[]
+        )
+        self.res = hydroshare.create_resource('CompositeResource', self.user, 'My Test Resource')
+
+    def tearDown(self):
+        super(TestResourceAVUs, self).tearDown()
+        self.res.delete()
+
+    def _irods_value(self, attribute):
+        return self.res.get_irods_storage().getAVU(self.res.root_path, attribute)
+
+    def test_write_through(self):
+        """ AVUs set, read and removed through a resource are mirrored in the database """
+        self.assertEqual(ResourceAVU.objects.get(resource_id=self.res.id,
+                                                 attribute='quotaUserName').value, 'creator')
+
+        self.res.setAVU('bag_modified', False)
+        self.assertEqual(self._irods_value('bag_modified'), 'false')
+        with patch.object(IrodsStorage, 'getAVU') as get_avu:
+            self.assertFalse(self.res.getAVU('bag_modified'))
+            self.assertEqual(self.res.get_quota_holder(), self.user)
+            get_avu.assert_not_called()
+
+        self.res.removeAVU('quotaUserName', 'creator')
+        self.assertIsNone(self.res.get_quota_holder())
+
+        # AVUs that were never mirrored are read from iRODS once
+        ResourceAVU.objects.filter(resource_id=self.res.id, attribute='bag_modified').delete()
+        self.assertFalse(self.res.getAVU('bag_modified'))
+        self.assertEqual(ResourceAVU.objects.get(resource_id=self.res.id,
+                                                 attribute='bag_modified').value, 'false')
+
+        self.assertEqual(ResourceAVU.get_values([self.res], 'isPublic'), {self.res.id: False})
+
+    def test_write_after_commit(self):
+        """ AVUs set in a transaction are read from iRODS until the transaction commits """
+        with transaction.atomic():
+            self.res.setAVU('bag_modified', False)
+            self.assertFalse(ResourceAVU.objects.filter(resource_id=self.res.id,
+                                                        attribute='bag_modified').exists())
+            self.assertFalse(self.res.getAVU('bag_modified'))
+        self.assertEqual(ResourceAVU.objects.get(resource_id=self.res.id,
+                                                 attribute='bag_modified').value, 'false')
+
+    def test_reconcile(self):
+        """ the reconcile command repairs AVUs that drifted from iRODS """
+        ResourceAVU.objects.filter(resource_id=self.res.id, attribute='isPublic').update(
+            value='true')
+        self.assertTrue(self.res.getAVU('isPublic'))
+
+        call_command('reconcile_resource_avus', self.res.short_id, fix=True)
+        self.assertFalse(self.res.getAVU('isPublic'))
+        self.assertEqual(ResourceAVU.objects.get(resource_id=self.res.id,
+                                                 attribute='isPublic').value,
+                         self._irods_value('isPublic'))
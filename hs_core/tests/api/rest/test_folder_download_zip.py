@@ -2,6 +2,7 @@ import json
 import os
 import tempfile
 
+from django.test import override_settings
 from rest_framework import status
 
 from hs_core.hydroshare import resource
@@ -78,3 +79,17 @@ class TestPublicZipEndpoint(HSRESTTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         response_json = json.loads(response.content.decode())
         self.assertNotEqual(response_json["download_path"].split("/")[5], download_split[5])
+
+    def test_folder_download_rest_with_streaming(self):
+        """ REST API clients get the task to poll even if browser zip downloads are streamed """
+        zip_download_url = "/django_irods/rest_download/{pid}/data/contents/foo"\
+                           .format(pid=self.pid)
+
+        with override_settings(IRODS_STREAM_ZIP_DOWNLOADS=True):
+            response = self.client.get(zip_download_url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        response_json = json.loads(response.content.decode())
+        self.assertEqual(response_json['zip_status'], 'Not ready')
+        self.assertTrue(len(response_json['task_id']) > 0)
+        self.assertTrue(response_json['download_path'].endswith('/data/contents/foo.zip'))
@@ -1,9 +1,15 @@
 import json
 import os
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 
 from hs_core.hydroshare import resource
+from hs_core.management.commands.benchmark_resource_list import build_per_row, build_batched
+from hs_core.models import BaseResource
+from hs_core.views.serializers import ResourceListItemSerializer
 from .base import HSRESTTestCase
 
 
@@ -340,3 +346,33 @@ class TestResourceList(HSRESTTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         content = json.loads(response.content.decode())
         self.assertEqual(content['count'], 0)
+
+    def test_resource_list_queries(self):
+        def create_resources(count):
+            for i in range(count):
+                res = resource.create_resource('CompositeResource', self.user,
+                                               'My Test Resource {}'.format(i))
+                res.metadata.create_element('description', abstract='abstract {}'.format(i))
+                res.metadata.create_element('coverage', type='point',
+                                            value={'east': '10', 'north': str(i),
+                                                   'units': 'Decimal degrees'})
+                self.resources_to_delete.append(res.short_id)
+
+        def list_resources():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/hsapi/resource/', format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        create_resources(2)
+        num_queries = list_resources()
+        create_resources(3)
+        # the number of queries does not depend upon the number of resources listed
+        self.assertEqual(list_resources(), num_queries)
+
+        # list items are identical to those built one resource at a time
+        resources = list(BaseResource.objects.all().order_by('id'))
+        rendered = [JSONRenderer().render(ResourceListItemSerializer(build(resources),
+                                                                     many=True).data)
+                    for build in (build_per_row, build_batched)]
+        self.assertEqual(rendered[0], rendered[1])
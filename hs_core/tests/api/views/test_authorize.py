@@ -9,6 +9,7 @@ from hs_core.hydroshare import resource
 from hs_core.hydroshare import users
 from hs_core.testing import MockIRODSTestCaseMixin
 from hs_core.views.utils import authorize, ACTION_TO_AUTHORIZE
+from hs_core.authorization_cache import get_authorize_cache_stats, reset_authorize_cache_stats
 from hs_access_control.models import PrivilegeCodes
 
 class TestAuthorize(MockIRODSTestCaseMixin, TestCase):
@@ -844,6 +845,48 @@ class TestAuthorize(MockIRODSTestCaseMixin, TestCase):
         self.assertEqual(res, self.res)
         self.assertEqual(user, anonymous_user)
 
+    def test_decision_cache(self):
+        # create user - has no assigned resource access privilege
+        authenticated_user = users.create_account(
+            'user@email.com',
+            username='user',
+            first_name='user_first_name',
+            last_name='user_last_name',
+            superuser=False,
+            groups=[])
+        self.request.user = authenticated_user
+        reset_authorize_cache_stats()
+
+        _, authorized, _ = authorize(self.request, res_id=self.res.short_id,
+                                     raises_exception=False)
+        self.assertFalse(authorized)
+        # repeated authorization within a request is answered from the cache
+        _, authorized, _ = authorize(self.request, res_id=self.res.short_id,
+                                     raises_exception=False)
+        self.assertFalse(authorized)
+        self.assertEqual(get_authorize_cache_stats()['misses'], 1)
+        self.assertEqual(get_authorize_cache_stats()['request_hits'], 1)
+
+        # sharing invalidates cached decisions
+        self.user.uaccess.share_resource_with_user(self.res, authenticated_user,
+                                                   PrivilegeCodes.VIEW)
+        _, authorized, _ = authorize(self.request, res_id=self.res.short_id)
+        self.assertTrue(authorized)
+        self.assertEqual(get_authorize_cache_stats()['misses'], 2)
+
+        # as do changes of resource flags
+        self.user.uaccess.unshare_resource_with_user(self.res, authenticated_user)
+        self.res.raccess.public = True
+        self.res.raccess.save()
+        _, authorized, _ = authorize(self.request, res_id=self.res.short_id)
+        self.assertTrue(authorized)
+        self.res.raccess.public = False
+        self.res.raccess.save()
+        _, authorized, _ = authorize(self.request, res_id=self.res.short_id,
+                                     raises_exception=False)
+        self.assertFalse(authorized)
+        self.assertEqual(get_authorize_cache_stats()['request_hits'], 1)
+
     def _run_tests(self, request, parameters):
         for params in parameters:
             if params['exception'] is None:
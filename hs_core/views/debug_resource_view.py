@@ -14,7 +14,7 @@ def debug_resource(request, shortkey):
     resource, _, _ = authorize(request, shortkey,
                                needed_permission=ACTION_TO_AUTHORIZE.VIEW_RESOURCE)
     # importing here to avoid circular dependency
-    from hs_core.management.utils import check_irods_files
+    from hs_core.management.utils import check_irods_files, get_irods_avu
     irods_issues, irods_errors = check_irods_files(resource, log_errors=False, return_errors=True)
 
     template = loader.get_template('debug/debug_resource.html')
@@ -26,10 +26,10 @@ def debug_resource(request, shortkey):
         'owners': resource.raccess.owners,
         'editors': resource.raccess.get_users_with_explicit_access(PrivilegeCodes.CHANGE),
         'viewers': resource.raccess.get_users_with_explicit_access(PrivilegeCodes.VIEW),
-        'public_AVU': resource.getAVU('isPublic'),
-        'type_AVU': resource.getAVU('resourceType'),
-        'modified_AVU': resource.getAVU('bag_modified'),
-        'quota_AVU': resource.getAVU('quotaUserName'),
+        'public_AVU': get_irods_avu(resource, 'isPublic'),
+        'type_AVU': get_irods_avu(resource, 'resourceType'),
+        'modified_AVU': get_irods_avu(resource, 'bag_modified'),
+        'quota_AVU': get_irods_avu(resource, 'quotaUserName'),
     }
     return HttpResponse(template.render(context, request))
 
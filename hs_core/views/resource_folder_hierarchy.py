@@ -3,6 +3,7 @@ import logging
 import os
 
 from django.core.exceptions import ValidationError
+from django.db.models import prefetch_related_objects
 from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest
 
 from rest_framework.decorators import api_view
@@ -72,19 +73,39 @@ def data_store_structure(request):
     aggregations = []
     # folder path relative to 'data/contents/' needed for the UI
     folder_path = store_path[len("data/contents/"):]
+    is_composite = resource.resource_type == "CompositeResource"
+
+    if is_composite:
+        # look up the fileset aggregations of all sub-folders and which sub-folders contain
+        # files with one query each rather than per folder
+        sub_folder_paths = [os.path.join(folder_path, dname) for dname in store[0]]
+        folder_aggregations = dict(
+            (aggr.folder, aggr) for aggr in
+            resource.filesetlogicalfile_set.filter(folder__in=sub_folder_paths))
+        file_folders = ResourceFile.objects.filter(
+            object_id=resource.id, file_folder__startswith=folder_path
+        ).values_list('file_folder', flat=True).distinct()
+        non_empty_folders = set()
+        for file_folder in file_folders:
+            # a file in a nested folder makes all its ancestor folders non-empty
+            while file_folder:
+                non_empty_folders.add(file_folder)
+                file_folder = os.path.dirname(file_folder)
+
     for dname in store[0]:     # directories
         d_pk = dname
         d_store_path = os.path.join(store_path, d_pk)
         d_url = resource.get_url_of_path(d_store_path)
+        d_short_path = os.path.join(folder_path, d_pk)
         main_file = ''
         folder_aggregation_type = ''
         folder_aggregation_name = ''
         folder_aggregation_id = ''
         folder_aggregation_type_to_set = ''
-        if resource.resource_type == "CompositeResource":
-            dir_path = resource.get_irods_path(d_store_path)
-            # find if this folder *dir_path* represents (contains) an aggregation object
-            aggregation_object = resource.get_folder_aggregation_object(dir_path)
+        if is_composite:
+            # find if this folder represents (contains) an aggregation object
+            # (see CompositeResource.get_folder_aggregation_object)
+            aggregation_object = folder_aggregations.get(d_short_path)
             # folder aggregation type is not relevant for single file aggregation types - which
             # are: GenericLogicalFile, and RefTimeseriesLogicalFile
             if aggregation_object is not None:
@@ -95,7 +116,8 @@ def data_store_structure(request):
                     main_file = aggregation_object.get_main_file.file_name
             else:
                 # find if FileSet aggregation type that can be created from this folder
-                if resource.can_set_folder_to_fileset(dir_path):
+                # (see CompositeResource.can_set_folder_to_fileset)
+                if d_short_path in non_empty_folders:
                     folder_aggregation_type_to_set = FileSetLogicalFile.__name__
                 else:
                     folder_aggregation_type_to_set = ""
@@ -106,25 +128,17 @@ def data_store_structure(request):
                      'folder_aggregation_name': folder_aggregation_name,
                      'folder_aggregation_id': folder_aggregation_id,
                      'folder_aggregation_type_to_set': folder_aggregation_type_to_set,
-                     'folder_short_path': os.path.join(folder_path, d_pk)})
+                     'folder_short_path': d_short_path})
 
-    is_federated = resource.is_federated
+    res_files = _get_listed_resource_files(resource, store_path, store[1])
     for index, fname in enumerate(store[1]):  # files
-        f_store_path = os.path.join(store_path, fname)
-        file_in_irods = resource.get_irods_path(f_store_path)
         size = store[2][index]
         mtype = get_file_mime_type(fname)
         idx = mtype.find('/')
         if idx >= 0:
             mtype = mtype[idx + 1:]
 
-        if is_federated:
-            f = ResourceFile.objects.filter(object_id=resource.id,
-                                            fed_resource_file=file_in_irods).first()
-        else:
-            f = ResourceFile.objects.filter(object_id=resource.id,
-                                            resource_file=file_in_irods).first()
-
+        f = res_files.get(fname)
         if not f:
             # skip metadata files
             continue
@@ -173,6 +187,41 @@ def data_store_structure(request):
     )
 
 
+def _get_listed_resource_files(resource, store_path, file_names):
+    """
+    Get the ResourceFiles for the files listed from iRODS in a folder together with their
+    logical files, using a fixed number of queries regardless of the number of files
+    :param resource: the resource whose folder has been listed
+    :param store_path: folder path relative to the resource root, starting with data/contents
+    :param file_names: names of the files listed in the folder
+    :return: dict of ResourceFile keyed by file name; files without a ResourceFile (e.g.,
+    aggregation metadata files) are left out
+    """
+    paths = dict((resource.get_irods_path(os.path.join(store_path, fname)), fname)
+                 for fname in file_names)
+    path_field = 'fed_resource_file' if resource.is_federated else 'resource_file'
+    # the generic foreign key prefetch runs one query per logical file type
+    res_files = ResourceFile.objects.filter(
+        object_id=resource.id, **{path_field + '__in': list(paths.keys())}
+    ).prefetch_related('content_object', 'logical_file_content_object')
+
+    res_files_by_name = {}
+    logical_files_by_type = {}
+    for f in res_files:
+        name = paths.get(getattr(f, path_field).name)
+        if name is not None and name not in res_files_by_name:
+            res_files_by_name[name] = f
+            if f.logical_file is not None and not f.logical_file.is_fileset:
+                logical_files_by_type.setdefault(type(f.logical_file), {})[f.logical_file.pk] = \
+                    f.logical_file
+
+    # files of single file and single folder aggregations are needed to find their main and
+    # primary files; fileset aggregations are left alone as they may hold any number of files
+    for logical_files in logical_files_by_type.values():
+        prefetch_related_objects(list(logical_files.values()), 'resource', 'files__content_object')
+    return res_files_by_name
+
+
 def to_external_url(url):
     """
     Convert an internal download file/folder url to the external url.  This should eventually be
@@ -265,7 +314,9 @@ def data_store_folder_unzip(request, **kwargs):
     input data passed in for res_id, zip_with_rel_path, and remove_original_zip where
     zip_with_rel_path is the zip file name with relative path under res_id collection to be
     unzipped, and remove_original_zip has a value of "true" or "false" (default is "true")
-    indicating whether original zip file will be deleted after unzipping.
+    indicating whether original zip file will be deleted after unzipping. When async is "true"
+    (default is "false"), the zip file is unzipped by a celery task whose id is returned as
+    task_id; its status and progress can be checked with check_task_status.
     """
     res_id = request.POST.get('res_id', kwargs.get('res_id'))
     if res_id is None:
@@ -289,6 +340,24 @@ def data_store_folder_unzip(request, **kwargs):
 
     overwrite = request.POST.get('overwrite', 'false').lower() == 'true'  # False by default
     remove_original_zip = request.POST.get('remove_original_zip', 'true').lower() == 'true'
+    unzip_async = request.POST.get('async', 'false').lower() == 'true'
+
+    # this unzipped_path can be used for POST request input to data_store_structure()
+    # to list the folder structure after unzipping
+    return_object = {'unzipped_path': os.path.dirname(zip_with_rel_path)}
+
+    if unzip_async:
+        if not resource.supports_unzip(zip_with_rel_path):
+            return HttpResponse("Unzipping of this file is not supported.",
+                                status=status.HTTP_400_BAD_REQUEST)
+        from hs_core.tasks import unzip_file_task
+        task = unzip_file_task.apply_async((user.pk, res_id, zip_with_rel_path,
+                                            remove_original_zip, overwrite))
+        return_object['task_id'] = task.task_id
+        return HttpResponse(
+            json.dumps(return_object),
+            content_type="application/json"
+        )
 
     try:
         unzip_file(user, res_id, zip_with_rel_path, bool_remove_original=remove_original_zip,
@@ -302,10 +371,6 @@ def data_store_folder_unzip(request, **kwargs):
     except DRF_ValidationError as ex:
         return HttpResponse(ex.detail, status=status.HTTP_400_BAD_REQUEST)
 
-    # this unzipped_path can be used for POST request input to data_store_structure()
-    # to list the folder structure after unzipping
-    return_object = {'unzipped_path': os.path.dirname(zip_with_rel_path)}
-
     return HttpResponse(
         json.dumps(return_object),
         content_type="application/json"
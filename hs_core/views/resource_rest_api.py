@@ -5,6 +5,7 @@ import tempfile
 import shutil
 import logging
 import json
+from collections import defaultdict
 
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ObjectDoesNotExist, SuspiciousFileOperation
@@ -12,6 +13,9 @@ from django.core.exceptions import ValidationError as CoreValidationError
 from django.http import HttpResponseRedirect
 from django.shortcuts import redirect
 from django.contrib.sites.models import Site
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.db.models.query import prefetch_related_objects
 
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
@@ -21,7 +25,8 @@ from rest_framework.request import Request
 from rest_framework.exceptions import ValidationError, NotAuthenticated, PermissionDenied, NotFound
 
 from hs_core import hydroshare
-from hs_core.models import AbstractResource
+from hs_core.models import AbstractResource, ResourceFile, Title, Description, Creator, Date, \
+    Coverage
 from hs_core.hydroshare.utils import get_resource_by_shortkey, get_resource_types, \
     get_content_types
 from hs_core.views import utils as view_utils
@@ -39,57 +44,144 @@ logger = logging.getLogger(__name__)
 
 
 # Mixins
+def _get_metadata_element_values(element_class, metadata_keys, order_by, *fields):
+    """
+    Get field values of the metadata elements of a kind for many resources in one query
+    :param element_class: metadata element model, e.g., Creator
+    :param metadata_keys: (content_type_id, object_id) of the metadata of the resources
+    :param order_by: fields to order the elements of each resource by
+    :param fields: names of the fields to get
+    :return: dict of lists of values() dicts keyed by (content_type_id, object_id)
+    """
+    object_ids = defaultdict(set)
+    for content_type_id, object_id in metadata_keys:
+        object_ids[content_type_id].add(object_id)
+    values = defaultdict(list)
+    if not object_ids:
+        return values
+    query = Q()
+    for content_type_id, ids in object_ids.items():
+        query |= Q(content_type_id=content_type_id, object_id__in=ids)
+    for element in element_class.objects.filter(query).order_by(*order_by)\
+            .values('content_type_id', 'object_id', *fields):
+        values[(element['content_type_id'], element['object_id'])].append(element)
+    return values
+
+
+def _get_aggregation_types(resources):
+    """
+    Get the aggregation types in many resources in one query, as in
+    AbstractResource.aggregation_types
+    :param resources: list of resources
+    :return: dict of lists of aggregation type display names keyed by resource id
+    """
+    aggregation_types = defaultdict(list)
+    type_names = defaultdict(set)
+    for res_id, logical_file_type_id in ResourceFile.objects\
+            .filter(object_id__in=[r.id for r in resources],
+                    logical_file_content_type__isnull=False)\
+            .order_by('id').values_list('object_id', 'logical_file_content_type_id'):
+        logical_file_class = ContentType.objects.get_for_id(logical_file_type_id).model_class()
+        if logical_file_class.type_name() not in type_names[res_id]:
+            type_names[res_id].add(logical_file_class.type_name())
+            aggregation_types[res_id].append(
+                logical_file_class.get_aggregation_display_name().split(":")[0])
+    return aggregation_types
+
+
 class ResourceToListItemMixin(object):
     def resourceToResourceListItem(self, r):
+        return self.resourcesToResourceListItems([r])[0]
+
+    def resourcesToResourceListItems(self, resources):
+        """
+        Build list items for many resources in a fixed number of queries
+        :param resources: list of resources, e.g., a page of the resource list
+        :return: list of serializers.ResourceListItem in the order of resources
+        """
         # URLs in metadata should be fully qualified.
         # ALWAYS qualify them with www.hydroshare.org, rather than the local server name.
         site_url = hydroshare.utils.current_site_url()
-        bag_url = site_url + r.bag_url
-        science_metadata_url = site_url + reverse('get_update_science_metadata', args=[r.short_id])
-        resource_map_url = site_url + reverse('get_resource_map', args=[r.short_id])
-        resource_url = site_url + r.get_absolute_url()
-        coverages = [{"type": v['type'], "value": json.loads(v['_value'])}
-                     for v in list(r.metadata.coverages.values())]
-        authors = []
-        for c in r.metadata.creators.all():
-            authors.append(c.name)
-        doi = None
-        if r.raccess.published:
-            doi = "10.4211/hs.{}".format(r.short_id)
-        resource_list_item = serializers.ResourceListItem(resource_type=r.resource_type,
-                                                          resource_id=r.short_id,
-                                                          resource_title=r.metadata.title.value,
-                                                          abstract=r.metadata.description,
-                                                          authors=authors,
-                                                          creator=r.first_creator.name,
-                                                          doi=doi,
-                                                          public=r.raccess.public,
-                                                          discoverable=r.raccess.discoverable,
-                                                          shareable=r.raccess.shareable,
-                                                          immutable=r.raccess.immutable,
-                                                          published=r.raccess.published,
-                                                          date_created=r.created,
-                                                          date_last_updated=r.last_updated,
-                                                          bag_url=bag_url,
-                                                          coverages=coverages,
-                                                          science_metadata_url=science_metadata_url,
-                                                          resource_map_url=resource_map_url,
-                                                          resource_url=resource_url,
-                                                          content_types=r.aggregation_types)
-        return resource_list_item
+        resources = list(resources)
+        prefetch_related_objects(resources, 'raccess')
+        metadata_keys = [(r.content_type_id, r.object_id) for r in resources]
+        titles = _get_metadata_element_values(Title, metadata_keys, ('id',), 'value')
+        descriptions = _get_metadata_element_values(Description, metadata_keys, ('id',),
+                                                    'abstract')
+        creators = _get_metadata_element_values(Creator, metadata_keys, ('order', 'id'),
+                                                'name', 'order')
+        modified_dates = _get_metadata_element_values(Date, metadata_keys, ('id',),
+                                                      'type', 'start_date')
+        all_coverages = _get_metadata_element_values(Coverage, metadata_keys, ('id',),
+                                                     'type', '_value')
+        aggregation_types = _get_aggregation_types(resources)
+
+        resource_list_items = []
+        for r in resources:
+            metadata_key = (r.content_type_id, r.object_id)
+            bag_url = site_url + r.bag_url
+            science_metadata_url = site_url + reverse('get_update_science_metadata',
+                                                      args=[r.short_id])
+            resource_map_url = site_url + reverse('get_resource_map', args=[r.short_id])
+            resource_url = site_url + r.get_absolute_url()
+            coverages = [{"type": v['type'], "value": json.loads(v['_value'])}
+                         for v in all_coverages[metadata_key]]
+            authors = [c['name'] for c in creators[metadata_key]]
+            first_creator = next((c['name'] for c in creators[metadata_key]
+                                  if c['order'] == 1), None)
+            title = next((t['value'] for t in titles[metadata_key]), None)
+            abstract = next((d['abstract'] for d in descriptions[metadata_key]), None)
+            last_updated = next((d['start_date'] for d in modified_dates[metadata_key]
+                                 if d['type'] == 'modified'), None)
+            doi = None
+            if r.raccess.published:
+                doi = "10.4211/hs.{}".format(r.short_id)
+            resource_list_item = serializers.ResourceListItem(
+                resource_type=r.resource_type,
+                resource_id=r.short_id,
+                resource_title=title,
+                abstract=abstract,
+                authors=authors,
+                creator=first_creator,
+                doi=doi,
+                public=r.raccess.public,
+                discoverable=r.raccess.discoverable,
+                shareable=r.raccess.shareable,
+                immutable=r.raccess.immutable,
+                published=r.raccess.published,
+                date_created=r.created,
+                date_last_updated=last_updated,
+                bag_url=bag_url,
+                coverages=coverages,
+                science_metadata_url=science_metadata_url,
+                resource_map_url=resource_map_url,
+                resource_url=resource_url,
+                content_types=aggregation_types[r.id])
+            resource_list_items.append(resource_list_item)
+        return resource_list_items
 
 
 class ResourceFileToListItemMixin(object):
-    def resourceFileToListItem(self, f):
+    def resourceFileToListItem(self, f, irods_stat=None):
+        """
+        :param f: ResourceFile to list
+        :param irods_stat: size, checksum and modified time of f read in bulk with
+        IrodsStorage.stat_many; read from iRODS for this file only when not provided
+        """
         # URLs in metadata should be fully qualified.
         # ALWAYS qualify them with www.hydroshare.org, rather than the local server name.
         site_url = hydroshare.utils.current_site_url()
         url = site_url + f.url
-        fsize = f.size
         logical_file_type = f.logical_file_type_name
         file_name = os.path.basename(f.resource_file.name)
-        modified_time = f.modified_time
-        checksum = f.checksum
+        if irods_stat is None:
+            fsize = f.size
+            modified_time = f.modified_time
+            checksum = f.checksum
+        else:
+            fsize = f._size if f._size >= 0 else irods_stat['size']
+            modified_time = irods_stat['modified_time']
+            checksum = irods_stat['checksum']
         # trailing slash confuses mime guesser
         mimetype = mimetypes.guess_type(url)
         if mimetype[0]:
@@ -299,13 +391,8 @@ class ResourceListCreate(ResourceToListItemMixin, generics.ListCreateAPIView):
             filter_parms['type'] = list(filter_parms['type'])
 
         filter_parms['public'] = not self.request.user.is_authenticated()
-        filtered_res_list = []
-
-        for r in self.paginate_queryset(hydroshare.get_resource_list(**filter_parms)):
-            resource_list_item = self.resourceToResourceListItem(r)
-            filtered_res_list.append(resource_list_item)
-
-        return filtered_res_list
+        return self.resourcesToResourceListItems(
+            self.paginate_queryset(hydroshare.get_resource_list(**filter_parms)))
 
     # covers serialization of output from GET request
     def get_serializer_class(self):
@@ -798,8 +885,12 @@ class ResourceFileListCreate(ResourceFileToListItemMixin, generics.ListCreateAPI
         resource, _, _ = view_utils.authorize(self.request, self.kwargs['pk'],
                                               needed_permission=ACTION_TO_AUTHORIZE.VIEW_RESOURCE)
         resource_file_info_list = []
-        for f in resource.files.all():
-            resource_file_info_list.append(self.resourceFileToListItem(f))
+        files = ResourceFile.prefetch_logical_files(resource.files.all())
+        istorage = resource.get_irods_storage()
+        irods_stats = istorage.stat_many([f.storage_path for f in files], compute_checksums=True)
+        for f in files:
+            resource_file_info_list.append(
+                self.resourceFileToListItem(f, irods_stat=irods_stats.get(f.storage_path)))
         return resource_file_info_list
 
     def get_serializer_class(self):
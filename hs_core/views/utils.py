@@ -6,7 +6,7 @@ import logging
 import os
 import shutil
 import string
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
 from tempfile import NamedTemporaryFile
 from urllib.request import Request, urlopen
 from urllib.error import HTTPError, URLError
@@ -35,13 +35,15 @@ from rest_framework.exceptions import NotFound, ValidationError
 from django_irods.icommands import SessionException
 from django_irods.storage import IrodsStorage
 from hs_access_control.models import PrivilegeCodes
+from hs_core.authorization_cache import get_authorize_version, get_cached_resource, \
+    cache_resource, get_cached_decision, cache_decision
 from hs_core import hydroshare
 from hs_core.hydroshare import add_resource_files
 from hs_core.hydroshare import check_resource_type, delete_resource_file
 from hs_core.hydroshare.utils import check_aggregations
 from hs_core.hydroshare.utils import get_file_mime_type
 from hs_core.models import AbstractMetaDataElement, BaseResource, GenericResource, Relation, \
-    ResourceFile, get_user, CoreMetaData
+    ResourceFile, get_user, CoreMetaData, get_resource_file_path
 from hs_core.signals import pre_metadata_element_create, post_delete_file_from_resource
 from hs_file_types.utils import set_logical_file_type
 from theme.backends import without_login_date_token_generator
@@ -362,14 +364,34 @@ def authorize(request, res_id, needed_permission=ACTION_TO_AUTHORIZE.VIEW_RESOUR
        needed_permission=ACTION_TO_AUTHORIZE.CREATE_RESOURCE_VERSION)
 
     Note: resource 'shareable' status has no effect on authorization
+
+    Decisions are cached per request and, optionally, across requests
+    (see hs_core.authorization_cache).
     """
-    authorized = False
     user = get_user(request)
-    try:
-        res = hydroshare.utils.get_resource_by_shortkey(res_id, or_404=False)
-    except ObjectDoesNotExist:
-        raise NotFound(detail="No resource was found for resource id:%s" % res_id)
+    version = get_authorize_version()
+    res = get_cached_resource(request, res_id, version)
+    if res is None:
+        try:
+            res = hydroshare.utils.get_resource_by_shortkey(res_id, or_404=False)
+        except ObjectDoesNotExist:
+            raise NotFound(detail="No resource was found for resource id:%s" % res_id)
+        cache_resource(request, res_id, version, res)
+
+    authorized = get_cached_decision(request, user, res_id, needed_permission, version)
+    if authorized is None:
+        authorized = _authorize(user, res, needed_permission)
+        cache_decision(request, user, res_id, needed_permission, version, authorized)
+
+    if raises_exception and not authorized:
+        raise PermissionDenied
+    else:
+        return res, authorized, user
+
 
+def _authorize(user, res, needed_permission):
+    """ Decide whether user has authorization for an action on resource res """
+    authorized = False
     if needed_permission == ACTION_TO_AUTHORIZE.VIEW_METADATA:
         if res.raccess.discoverable or res.raccess.public:
             authorized = True
@@ -392,11 +414,7 @@ def authorize(request, res_id, needed_permission=ACTION_TO_AUTHORIZE.VIEW_RESOUR
             authorized = user.uaccess.can_share_resource(res, 2)
     elif needed_permission == ACTION_TO_AUTHORIZE.VIEW_RESOURCE:
         authorized = res.raccess.public
-
-    if raises_exception and not authorized:
-        raise PermissionDenied
-    else:
-        return res, authorized, user
+    return authorized
 
 
 def validate_json(js):
@@ -720,19 +738,56 @@ def link_irods_file_to_django(resource, filepath):
         return ret
 
 
+def link_irods_files_to_django(resource, files):
+    """
+    Link many newly created irods files to Django resource model with one query for the files
+    that are already linked and one insert for the files that are not
+
+    :param resource: the BaseResource object representing a HydroShare resource
+    :param files: a dict for each file with keys 'path', the full path to the file, and 'size',
+        as listed by IrodsStorage.walk
+    :return: List of ResourceFile of the files, in the same order as files
+    """
+    file_field = 'fed_resource_file' if resource.is_federated else 'resource_file'
+    targets = []
+    for f in files:
+        folder, base = ResourceFile.resource_path_is_acceptable(resource, f['path'],
+                                                                test_exists=False)
+        targets.append((folder, get_resource_file_path(resource, base, folder=folder)))
+
+    linked_files = ResourceFile.objects.filter(
+        object_id=resource.id, **{file_field + '__in': [target for _, target in targets]})
+    linked_files = dict((getattr(res_file, file_field).name, res_file)
+                        for res_file in linked_files)
+    res_files = []
+    new_files = []
+    for f, (folder, target) in zip(files, targets):
+        res_file = linked_files.get(target)
+        if res_file is None:
+            # this does not copy the file from anywhere; it must exist already
+            res_file = ResourceFile(content_object=resource, file_folder=folder,
+                                    _size=f['size'], **{file_field: target})
+            linked_files[target] = res_file
+            new_files.append(res_file)
+        res_files.append(res_file)
+    ResourceFile.objects.bulk_create(new_files)
+
+    file_format_types = set(mime.value for mime in resource.metadata.formats.all())
+    for res_file in new_files:
+        file_format_type = get_file_mime_type(getattr(res_file, file_field).name)
+        if file_format_type not in file_format_types:
+            resource.metadata.create_element('format', value=file_format_type)
+            file_format_types.add(file_format_type)
+    return res_files
+
+
 def link_irods_folder_to_django(resource, istorage, foldername, exclude=()):
     res_files = _link_irods_folder_to_django(resource, istorage, foldername, exclude=())
     check_aggregations(resource, res_files)
 
 
 def listfolders_recursively(istorage, path):
-    folders = []
-    listing = istorage.listdir(path)
-    for folder in listing[0]:
-        folder_path = os.path.join(path, folder)
-        folders.append(folder_path)
-        folders = folders + listfolders_recursively(istorage, folder_path)
-    return folders
+    return istorage.walk(path)[0]
 
 
 def _link_irods_folder_to_django(resource, istorage, foldername, exclude=()):
@@ -754,18 +809,11 @@ def _link_irods_folder_to_django(resource, istorage, foldername, exclude=()):
 
     res_files = []
     if foldername:
-        store = istorage.listdir(foldername)
+        # list files in the folder and all its sub-folders at once
+        _, files = istorage.walk(foldername)
         # add files into Django resource model
-        for file in store[1]:
-            if file not in exclude:
-                file_path = os.path.join(foldername, file)
-                # This assumes that file_path is a full path
-                res_files.append(link_irods_file_to_django(resource, file_path))
-        # recursively add sub-folders into Django resource model
-        for folder in store[0]:
-            res_files = res_files + \
-                        _link_irods_folder_to_django(resource, istorage,
-                                                     os.path.join(foldername, folder), exclude)
+        res_files = link_irods_files_to_django(
+            resource, [f for f in files if os.path.basename(f['path']) not in exclude])
     return res_files
 
 
@@ -926,10 +974,14 @@ def zip_folder(user, res_id, input_coll_path, output_zip_fname, bool_remove_orig
     return output_zip_fname, output_zip_size
 
 
-def unzip_file(user, res_id, zip_with_rel_path, bool_remove_original, overwrite=False):
+def unzip_file(user, res_id, zip_with_rel_path, bool_remove_original, overwrite=False,
+               progress_callback=None):
     """
     Unzip the input zip file while preserving folder structures in hydroshareZone or
     any federated zone used for HydroShare resource backend store and keep Django DB in sync.
+    The zip file is unzipped in iRODS into a temporary folder, whose contents are planned against
+    a single listing of the destination folder, moved into place with batched iRODS moves and
+    linked to the resource with a single insert.
     :param user: requesting user
     :param res_id: resource uuid
     :param zip_with_rel_path: the zip file name with relative path under res_id collection to
@@ -937,6 +989,8 @@ def unzip_file(user, res_id, zip_with_rel_path, bool_remove_original, overwrite=
     :param bool_remove_original: a bool indicating whether original zip file will be deleted
     after unzipping.
     :param bool overwrite: a bool indicating whether to overwrite files on unzip
+    :param progress_callback: (optional) function that is called with the number of unzipped
+    files moved into place so far and the total number of unzipped files
     :return:
     """
     if __debug__:
@@ -961,40 +1015,53 @@ def unzip_file(user, res_id, zip_with_rel_path, bool_remove_original, overwrite=
 
             # unzip to a temporary folder
             unzip_path = istorage.unzip(zip_with_full_path, unzipped_folder=uuid4().hex)
-            # list all files to be moved into the resource
-            unzipped_files = listfiles_recursively(istorage, unzip_path)
             unzipped_foldername = os.path.basename(unzip_path)
-            destination_folders = []
-            # list all folders to be written into the resource
-            for folder in listfolders(istorage, unzip_path):
-                destination_folder = os.path.join(working_dir, folder)
-                destination_folders.append(destination_folder)
-            # walk through each unzipped file, delete aggregations if they exist
-            for file in unzipped_files:
-                destination_file = _get_destination_filename(file, unzipped_foldername)
-                if (istorage.exists(destination_file)):
+            # list all unzipped files and folders, and all files and folders already in the
+            # destination, with one listing each
+            unzipped_folders, unzipped_files = istorage.walk(unzip_path)
+
+            def list_existing():
+                folders, files = istorage.walk(working_dir)
+                return folders, set(f['path'] for f in files
+                                    if not _is_in_folder(f['path'], unzip_path))
+            existing_folders, existing_files = list_existing()
+
+            # delete the files to be overwritten and the aggregations they are part of
+            files_to_delete = []
+            for f in unzipped_files:
+                destination_file = _get_destination_filename(f['path'], unzipped_foldername)
+                if destination_file in existing_files:
                     if resource.resource_type == "CompositeResource":
                         aggregation_object = resource.get_file_aggregation_object(
                             destination_file)
                         if aggregation_object:
                             aggregation_object.logical_delete(user)
+                            # the aggregation may have taken other files to be overwritten
+                            # (e.g., all files of a shapefile) and folders with it
+                            existing_folders, existing_files = list_existing()
                         else:
                             logger.error("No aggregation object found for " + destination_file)
-                            istorage.delete(destination_file)
+                            files_to_delete.append(destination_file)
                     else:
-                        istorage.delete(destination_file)
-            # now move each file to the destination
-            for file in unzipped_files:
-                destination_file = _get_destination_filename(file, unzipped_foldername)
-                istorage.moveFile(file, destination_file)
+                        files_to_delete.append(destination_file)
+            istorage.delete_many(files_to_delete)
+            existing_folders = set(folder for folder in existing_folders
+                                   if not _is_in_folder(folder, unzip_path))
+
+            # move the unzipped files into place
+            moves = _plan_unzip_moves(unzip_path, unzipped_folders, unzipped_files,
+                                      existing_folders | {working_dir})
+            moved_files = 0
+            for destination_folder, sources in moves:
+                istorage.move_many([source for source, _ in sources], destination_folder)
+                moved_files += sum(file_count for _, file_count in sources)
+                if progress_callback is not None:
+                    progress_callback(moved_files, len(unzipped_files))
+
             # and now link them to the resource
-            res_files = []
-            for file in unzipped_files:
-                destination_file = _get_destination_filename(file, unzipped_foldername)
-                destination_file = destination_file.replace(res_id + "/", "")
-                destination_file = resource.get_irods_path(destination_file)
-                res_file = link_irods_file_to_django(resource, destination_file)
-                res_files.append(res_file)
+            res_files = link_irods_files_to_django(
+                resource, [{'path': _get_destination_filename(f['path'], unzipped_foldername),
+                            'size': f['size']} for f in unzipped_files])
 
             # scan for aggregations
             check_aggregations(resource, res_files)
@@ -1017,6 +1084,53 @@ def unzip_file(user, res_id, zip_with_rel_path, bool_remove_original, overwrite=
     hydroshare.utils.resource_modified(resource, user, overwrite_bag=False)
 
 
+def _is_in_folder(path, folder):
+    return path == folder or path.startswith(folder + '/')
+
+
+def _plan_unzip_moves(unzip_path, unzipped_folders, unzipped_files, existing_folders):
+    """
+    Plan the moves of unzipped files from the temporary unzip folder into the folder the zip
+    file is in. An unzipped folder that doesn't exist at the destination is moved as a whole;
+    the contents of one that does are moved into the existing folder.
+    :param unzip_path: the temporary folder the zip file was unzipped into
+    :param unzipped_folders: all folders under unzip_path, parents listed before children
+    :param unzipped_files: a dict for each file under unzip_path, as listed by IrodsStorage.walk
+    :param existing_folders: the folders that already exist at the destination
+    :return: list of (destination folder, [(source, number of files moved with source)])
+    """
+    unzipped_foldername = os.path.basename(unzip_path)
+    moves = OrderedDict()
+    moved_folders = OrderedDict()
+
+    def moved_folder(path):
+        # the closest parent folder of path that is moved as a whole, if any
+        parent = os.path.dirname(path)
+        while parent != unzip_path:
+            if parent in moved_folders:
+                return parent
+            parent = os.path.dirname(parent)
+        return None
+
+    for folder in unzipped_folders:
+        if moved_folder(folder) is None and \
+                _get_destination_filename(folder, unzipped_foldername) not in existing_folders:
+            moved_folders[folder] = 0
+    for f in unzipped_files:
+        folder = moved_folder(f['path'])
+        if folder is not None:
+            moved_folders[folder] += 1
+        else:
+            destination_folder = os.path.dirname(
+                _get_destination_filename(f['path'], unzipped_foldername))
+            moves.setdefault(destination_folder, []).append((f['path'], 1))
+    for folder, file_count in moved_folders.items():
+        destination_folder = os.path.dirname(
+            _get_destination_filename(folder, unzipped_foldername))
+        moves.setdefault(destination_folder, []).append((folder, file_count))
+    return list(moves.items())
+
+
 def _get_destination_filename(file, unzipped_foldername):
     """
     Returns the destination file path by removing the temp unzipped_foldername from the file path.
@@ -1032,13 +1146,7 @@ def _get_destination_filename(file, unzipped_foldername):
 
 
 def listfiles_recursively(istorage, path):
-    files = []
-    listing = istorage.listdir(path)
-    for file in listing[1]:
-        files.append(os.path.join(path, file))
-    for folder in listing[0]:
-        files = files + listfiles_recursively(istorage, os.path.join(path, folder))
-    return files
+    return [f['path'] for f in istorage.walk(path)[1]]
 
 
 def listfolders(istorage, path):
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+LOGICAL_FILE_MODELS = ('FileSetLogicalFile', 'GenericLogicalFile', 'GeoFeatureLogicalFile',
+                       'NetCDFLogicalFile', 'GeoRasterLogicalFile', 'RefTimeseriesLogicalFile',
+                       'TimeSeriesLogicalFile')
+
+
+def populate_dirty_aggregations(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    DirtyAggregation = apps.get_model('hs_file_types', 'DirtyAggregation')
+    for model_name in LOGICAL_FILE_MODELS:
+        model = apps.get_model('hs_file_types', model_name)
+        content_type, _ = ContentType.objects.get_or_create(app_label='hs_file_types',
+                                                            model=model_name.lower())
+        DirtyAggregation.objects.bulk_create(
+            DirtyAggregation(resource_id=resource_id,
+                             logical_file_content_type=content_type,
+                             logical_file_object_id=logical_file_id)
+            for logical_file_id, resource_id in model.objects.filter(
+                metadata__is_dirty=True, resource__isnull=False).values_list('id', 'resource_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('hs_composite_resource', '0001_initial'),
+        ('hs_file_types', '0010_auto_20181209_0255'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyAggregation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('logical_file_object_id', models.PositiveIntegerField()),
+                ('logical_file_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dirty_aggregations', to='hs_composite_resource.CompositeResource')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dirtyaggregation',
+            unique_together=set([('logical_file_content_type', 'logical_file_object_id')]),
+        ),
+        migrations.RunPython(populate_dirty_aggregations, migrations.RunPython.noop),
+    ]
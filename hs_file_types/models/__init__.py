@@ -1,4 +1,4 @@
-from .base import AbstractLogicalFile, AbstractFileMetaData      # noqa
+from .base import AbstractLogicalFile, AbstractFileMetaData, DirtyAggregation     # noqa
 from .generic import GenericFileMetaData, GenericLogicalFile     # noqa
 from .raster import GeoRasterFileMetaData, GeoRasterLogicalFile  # noqa
 from .netcdf import NetCDFFileMetaData, NetCDFLogicalFile        # noqa
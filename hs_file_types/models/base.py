@@ -8,7 +8,9 @@ import logging
 from foresite import utils, Aggregation, AggregatedResource, RdfLibSerializer
 from rdflib import Namespace, URIRef
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.core.files.uploadedfile import UploadedFile
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericRelation
@@ -24,9 +26,11 @@ from dominate.tags import div, legend, table, tr, tbody, thead, td, th, \
 from lxml import etree
 
 from hs_core.hydroshare.utils import current_site_url, get_resource_file_by_id, \
-    set_dirty_bag_flag, add_file_to_resource, resource_modified, get_file_from_irods
+    set_dirty_bag_flag, add_file_to_resource, resource_modified, get_file_from_irods, \
+    get_file_ranges_from_irods
 from hs_core.models import ResourceFile, AbstractMetaDataElement, Coverage, CoreMetaData
 from hs_core.hydroshare.resource import delete_resource_file
+from hs_core.landing_page_cache import bump_aggregation_version
 from hs_core.signals import post_remove_file_aggregation
 
 RESMAP_FILE_ENDSWITH = "_resmap.xml"
@@ -1257,40 +1261,55 @@ class AbstractLogicalFile(models.Model):
         """
 
         log = logging.getLogger()
-
-        # create a temp dir where the xml files will be temporarily saved before copying to iRODS
-        tmpdir = os.path.join(settings.TEMP_FILE_DIR, str(random.getrandbits(32)), uuid4().hex)
-        istorage = self.resource.get_irods_storage()
-
-        if os.path.exists(tmpdir):
-            shutil.rmtree(tmpdir)
-        os.makedirs(tmpdir)
-
-        # create and copy the map and metadata xml documents for the aggregation
-        meta_from_file_name = os.path.join(tmpdir, 'metadata.xml')
-        map_from_file_name = os.path.join(tmpdir, 'map.xml')
         try:
-            with open(meta_from_file_name, 'w') as out:
-                out.write(self.metadata.get_xml())
-            to_file_name = self.metadata_file_path
-            istorage.saveFile(meta_from_file_name, to_file_name, True)
-            log.debug("Aggregation metadata xml file:{} created".format(to_file_name))
-
-            if create_map_xml:
-                with open(map_from_file_name, 'w') as out:
-                    out.write(self._generate_map_xml())
-                to_file_name = self.map_file_path
-                istorage.saveFile(map_from_file_name, to_file_name, True)
-                log.debug("Aggregation map xml file:{} created".format(to_file_name))
+            documents = self.get_aggregation_xml_documents(create_map_xml)
+            self.save_xml_documents(self.resource.get_irods_storage(), documents)
+            for to_file_name, _ in documents:
+                log.debug("Aggregation xml file:{} created".format(to_file_name))
             # setting bag flag to dirty - as resource map document needs to be re-generated as
             # resource map xml file has references to aggregation map xml file paths
             set_dirty_bag_flag(self.resource)
         except Exception as ex:
             log.error("Failed to create aggregation metadata xml file. Error:{}".format(str(ex)))
             raise ex
+        self.aggregation_xml_documents_created()
+
+    def get_aggregation_xml_documents(self, create_map_xml=True):
+        """Generates aggregation metadata xml and aggregation map xml documents
+        :param  create_map_xml: if true, aggregation map xml document will be generated
+        :return a list of (iRODS path, xml string) pairs of the documents
+        """
+        documents = [(self.metadata_file_path, self.metadata.get_xml())]
+        if create_map_xml:
+            documents.append((self.map_file_path, self._generate_map_xml()))
+        return documents
+
+    @staticmethod
+    def save_xml_documents(istorage, documents):
+        """Copies xml documents to iRODS
+        :param  istorage: an instance of IrodsStorage or FedStorage for the resource
+        :param  documents: a list of (iRODS path, xml string) pairs as returned by
+        get_aggregation_xml_documents
+        """
+        # create a temp dir where the xml files will be temporarily saved before copying to iRODS
+        tmpdir = os.path.join(settings.TEMP_FILE_DIR, str(random.getrandbits(32)), uuid4().hex)
+        if os.path.exists(tmpdir):
+            shutil.rmtree(tmpdir)
+        os.makedirs(tmpdir)
+        try:
+            for to_file_name, xml in documents:
+                from_file_name = os.path.join(tmpdir, os.path.basename(to_file_name))
+                with open(from_file_name, 'w') as out:
+                    out.write(xml)
+                istorage.saveFile(from_file_name, to_file_name, True)
         finally:
             shutil.rmtree(tmpdir)
 
+    def aggregation_xml_documents_created(self):
+        """Called after the xml documents of this aggregation have been copied to iRODS.
+        Subclasses that reset the dirty flag of their metadata at this point override this."""
+        pass
+
     def _generate_map_xml(self):
         """Generates the xml needed to write to the aggregation map xml document"""
 
@@ -1410,6 +1429,104 @@ class AbstractLogicalFile(models.Model):
         return xml_file_name
 
 
+class DirtyAggregation(models.Model):
+    """An aggregation whose metadata has changed since its xml documents were last created.
+
+    This indexes the is_dirty flags of the metadata of all logical file types, so that the
+    aggregations of a resource whose xml documents need to be regenerated can be found with a
+    single query. It is maintained from the post_save and post_delete signals of the logical
+    files and their metadata.
+    """
+
+    resource = models.ForeignKey('hs_composite_resource.CompositeResource',
+                                 related_name='dirty_aggregations')
+    logical_file_content_type = models.ForeignKey(ContentType)
+    logical_file_object_id = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('logical_file_content_type', 'logical_file_object_id')
+
+    @classmethod
+    def update_for(cls, logical_file):
+        """Records whether the metadata of a logical file is dirty
+        :param  logical_file: an instance of a subclass of AbstractLogicalFile
+        """
+        content_type = ContentType.objects.get_for_model(logical_file)
+        if logical_file.metadata.is_dirty:
+            cls.objects.get_or_create(logical_file_content_type=content_type,
+                                      logical_file_object_id=logical_file.id,
+                                      defaults={'resource_id': logical_file.resource_id})
+        else:
+            cls.objects.filter(logical_file_content_type=content_type,
+                               logical_file_object_id=logical_file.id).delete()
+
+    @classmethod
+    def get_aggregations(cls, resource):
+        """Gets the aggregations of a resource whose metadata is dirty
+        :param  resource: an instance of CompositeResource
+        :return a list of logical files
+        """
+        ids_by_type = {}
+        for content_type_id, object_id in cls.objects.filter(resource=resource).values_list(
+                'logical_file_content_type_id', 'logical_file_object_id'):
+            ids_by_type.setdefault(content_type_id, []).append(object_id)
+
+        aggregations = []
+        for content_type_id, ids in ids_by_type.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            aggregations.extend(model.objects.filter(id__in=ids).select_related('metadata'))
+        return aggregations
+
+
+@receiver(post_save)
+def update_dirty_aggregation(sender, instance, created, **kwargs):
+    """Keeps DirtyAggregation in step with the is_dirty flag of logical file metadata"""
+    if isinstance(instance, AbstractLogicalFile):
+        DirtyAggregation.update_for(instance)
+    elif isinstance(instance, AbstractFileMetaData) and not created:
+        try:
+            logical_file = instance.logical_file
+        except ObjectDoesNotExist:
+            # metadata is saved before its logical file is created
+            return
+        DirtyAggregation.update_for(logical_file)
+
+
+@receiver(post_delete)
+def delete_dirty_aggregation(sender, instance, **kwargs):
+    """Removes a deleted logical file from DirtyAggregation"""
+    if isinstance(instance, AbstractLogicalFile):
+        DirtyAggregation.objects.filter(
+            logical_file_content_type=ContentType.objects.get_for_model(instance),
+            logical_file_object_id=instance.id).delete()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_aggregation_metadata_html(sender, instance, **kwargs):
+    """Invalidates the cached metadata html of an aggregation when its metadata changes"""
+    if isinstance(instance, AbstractMetaDataElement):
+        content_type_id, object_id = instance.content_type_id, instance.object_id
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        # elements also describe resources, whose metadata html is not cached here
+        if model is None or not issubclass(model, AbstractFileMetaData):
+            return
+    elif isinstance(instance, AbstractFileMetaData):
+        content_type_id = ContentType.objects.get_for_model(instance).id
+        object_id = instance.id
+    elif isinstance(instance, AbstractLogicalFile):
+        # the dataset name of the aggregation is part of its metadata html
+        content_type_id = ContentType.objects.get_for_model(
+            type(instance)._meta.get_field('metadata').related_model).id
+        object_id = instance.metadata_id
+    else:
+        return
+    # bump again once the change is committed, so that html rendered by other requests
+    # from the metadata before the change is not cached under the new version
+    bump_aggregation_version(content_type_id, object_id)
+    transaction.on_commit(lambda: bump_aggregation_version(content_type_id, object_id))
+
+
 class FileTypeContext(object):
     """A ContextManager for creating file type/aggregation
     :param  aggr_cls  aggregation class using this context manager
@@ -1422,9 +1539,12 @@ class FileTypeContext(object):
     :param post_aggr_signal (optional) post aggregation creation signal to send signal
     :param  is_temp_file if True resource file specified by file_id will be retrieved from
     irods to temp directory
+    :param  temp_file_ranges (optional) a function that returns the byte ranges of the resource
+    file that are read from the temp file (see get_file_ranges_from_irods) - if specified only
+    these ranges are retrieved from irods
     """
     def __init__(self, aggr_cls, user, resource, file_id=None, folder_path='',
-                 post_aggr_signal=None, is_temp_file=True):
+                 post_aggr_signal=None, is_temp_file=True, temp_file_ranges=None):
 
         self.aggr_cls = aggr_cls
         self.user = user
@@ -1433,6 +1553,7 @@ class FileTypeContext(object):
         self.folder_path = folder_path
         self.post_aggr_signal = post_aggr_signal
         self.is_temp_file = is_temp_file
+        self.temp_file_ranges = temp_file_ranges
         # caller must set the logical_file attribute of the context manager
         # before existing context manager
         self.logical_file = None
@@ -1450,7 +1571,10 @@ class FileTypeContext(object):
 
         if self.is_temp_file:
             # need to get the file from irods to temp dir
-            self.temp_file = get_file_from_irods(self.res_file)
+            if self.temp_file_ranges is not None:
+                self.temp_file = get_file_ranges_from_irods(self.res_file, self.temp_file_ranges)
+            else:
+                self.temp_file = get_file_from_irods(self.res_file)
             self.temp_dir = os.path.dirname(self.temp_file)
         return self  # control returned to the caller
 
@@ -259,7 +259,6 @@ class GenericLogicalFile(AbstractLogicalFile):
 
         return resource_files[0]
 
-    def create_aggregation_xml_documents(self, create_map_xml=True):
-        super(GenericLogicalFile, self).create_aggregation_xml_documents(create_map_xml)
+    def aggregation_xml_documents_created(self):
         self.metadata.is_dirty = False
         self.metadata.save()
@@ -3,10 +3,12 @@ import logging
 import shutil
 import zipfile
 import xmltodict
+from uuid import uuid4
 from lxml import etree
 
 from osgeo import ogr, osr
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.utils.html import strip_tags
@@ -24,6 +26,7 @@ from hs_geographic_feature_resource.models import GeographicFeatureMetaDataMixin
     OriginalCoverage, GeometryInformation, FieldInformation
 
 from .base import AbstractFileMetaData, AbstractLogicalFile, FileTypeContext
+from ..shp_header import ShapefileHeaderError, get_feature_count, write_header_shapefile
 
 UNKNOWN_STR = "unknown"
 
@@ -255,7 +258,7 @@ class GeoFeatureLogicalFile(AbstractLogicalFile):
         with FileTypeContext(aggr_cls=cls, user=user, resource=resource, file_id=file_id,
                              folder_path=folder_path,
                              post_aggr_signal=post_add_geofeature_aggregation,
-                             is_temp_file=True) as ft_ctx:
+                             is_temp_file=False) as ft_ctx:
 
             res_file = ft_ctx.res_file
             try:
@@ -264,6 +267,8 @@ class GeoFeatureLogicalFile(AbstractLogicalFile):
             except ValidationError as ex:
                 log.exception(str(ex))
                 raise ex
+            # temp dir of the copied shape files is deleted on exiting the context
+            ft_ctx.temp_dir = os.path.dirname(shape_files[0])
 
             file_name = res_file.file_name
             # file name without the extension
@@ -328,8 +333,7 @@ class GeoFeatureLogicalFile(AbstractLogicalFile):
         res_files = [f for f in resource_files if f.extension.lower() == '.shp']
         return res_files[0] if res_files else None
 
-    def create_aggregation_xml_documents(self, create_map_xml=True):
-        super(GeoFeatureLogicalFile, self).create_aggregation_xml_documents(create_map_xml)
+    def aggregation_xml_documents_created(self):
         self.metadata.is_dirty = False
         self.metadata.save()
 
@@ -346,8 +350,11 @@ def extract_metadata_and_files(resource, res_file, file_type=True):
     """
     shape_files, shp_res_files = get_all_related_shp_files(resource, res_file, file_type=file_type)
     temp_dir = os.path.dirname(shape_files[0])
-    if not _check_if_shape_files(shape_files):
-        if res_file.extension.lower() == '.shp':
+    is_shp_file = res_file.extension.lower() == '.shp'
+    # not all component files are copied, so check the names of the resource files as well
+    if not _check_if_shape_files(shape_files) or \
+            (is_shp_file and not _check_if_shape_files(shp_res_files, temp_files=False)):
+        if is_shp_file:
             err_msg = "There was a problem parsing the component files associated with " \
                       "{folder_path} as a geographic shapefile. This may be because a component " \
                       "file is corrupt or missing. The .shp, .shx, and .dbf shapefile component " \
@@ -367,8 +374,16 @@ def extract_metadata_and_files(resource, res_file, file_type=True):
         if f.lower().endswith('.shp'):
             shp_file = f
             break
+    feature_count = None
+    if is_shp_file:
+        # the feature count follows from the size of the .shx file, as the copy of the .shp
+        # file may have the first feature only; the size is read from iRODS, as the size
+        # recorded for the resource file may be stale
+        shx_res_file = [f for f in shp_res_files if f.extension.lower() == '.shx'][0]
+        istorage = resource.get_irods_storage()
+        feature_count = get_feature_count(istorage.size(shx_res_file.storage_path))
     try:
-        meta_dict = extract_metadata(shp_file_full_path=shp_file)
+        meta_dict = extract_metadata(shp_file_full_path=shp_file, feature_count=feature_count)
         return meta_dict, shape_files, shp_res_files
     except Exception as ex:
         # remove temp dir
@@ -479,16 +494,19 @@ def get_all_related_shp_files(resource, selected_resource_file, file_type):
                 if f.extension.lower() in GeoFeatureLogicalFile.get_allowed_storage_file_types():
                     collect_shape_resource_files(f)
 
+        # metadata is extracted from the headers of the .shp, .shx and .dbf files and from the
+        # .prj, .cpg and .shp.xml files - the spatial index files are not read
+        temp_dir, shape_temp_files = _copy_shapefile_headers(shape_res_files)
         for f in shape_res_files:
-            temp_file = utils.get_file_from_irods(f)
+            if f.extension.lower() in ('.shp', '.shx', '.dbf'):
+                if shape_temp_files:
+                    # header copies made
+                    continue
+            elif f.extension.lower() not in ('.prj', '.cpg', '.xml'):
+                continue
+            temp_file = utils.get_file_from_irods(f, temp_dir or None)
             if not temp_dir:
                 temp_dir = os.path.dirname(temp_file)
-            else:
-                file_temp_dir = os.path.dirname(temp_file)
-                dst_dir = os.path.join(temp_dir, os.path.basename(temp_file))
-                shutil.copy(temp_file, dst_dir)
-                shutil.rmtree(file_temp_dir)
-                temp_file = dst_dir
             shape_temp_files.append(temp_file)
 
     elif selected_resource_file.extension.lower() == '.zip':
@@ -514,6 +532,44 @@ def get_all_related_shp_files(resource, selected_resource_file, file_type):
     return shape_temp_files, shape_res_files
 
 
+def _copy_shapefile_headers(shape_res_files):
+    """
+    Copy the headers and the first feature of the .shp, .shx and .dbf files in
+    *shape_res_files* from iRODS into a shapefile of a single feature in a new temp directory
+    (see hs_file_types.shp_header), reading only these byte ranges of the files in iRODS
+    :param shape_res_files: list of resource files of a shapefile
+    :return: the temp directory and a list of the temp paths of the copied files, or ('', [])
+    if a component is missing or not valid, or if iRODS byte range reads are not available, in
+    which case the files need to be copied in full
+    """
+    components = {f.extension.lower(): f for f in shape_res_files}
+    if any(ext not in components for ext in ('.shp', '.shx', '.dbf')):
+        return '', []
+    istorage = components['.shp'].resource.get_irods_storage()
+    paths = [components[ext].storage_path for ext in ('.shp', '.shx', '.dbf')]
+    # the sizes recorded for the resource files may be stale, so they are read from iRODS
+    sizes = istorage.sizes(paths)
+    if any(path not in sizes for path in paths):
+        return '', []
+    range_files = [istorage.open_range(path, size=sizes[path]) for path in paths]
+    if None in range_files:
+        return '', []
+
+    temp_dir = os.path.join(settings.TEMP_FILE_DIR, uuid4().hex)
+    os.makedirs(temp_dir)
+    temp_files = [os.path.join(temp_dir, components[ext].file_name)
+                  for ext in ('.shp', '.shx', '.dbf')]
+    try:
+        write_header_shapefile(*(range_files + temp_files))
+    except ShapefileHeaderError:
+        shutil.rmtree(temp_dir)
+        return '', []
+    finally:
+        for range_file in range_files:
+            range_file.close()
+    return temp_dir, temp_files
+
+
 def _check_if_shape_files(files, temp_files=True):
     """
     checks if the list of file temp paths in *files* are part of shape files
@@ -595,10 +651,12 @@ def _check_if_shape_files(files, temp_files=True):
     return True
 
 
-def extract_metadata(shp_file_full_path):
+def extract_metadata(shp_file_full_path, feature_count=None):
     """
     Collects metadata from a .shp file specified by *shp_file_full_path*
     :param shp_file_full_path:
+    :param feature_count: (optional) number of features of the shapefile, counted by OGR if
+    not specified
     :return: returns a dict of collected metadata
     """
 
@@ -606,7 +664,7 @@ def extract_metadata(shp_file_full_path):
         metadata_dict = {}
 
         # wgs84 extent
-        parsed_md_dict = parse_shp(shp_file_full_path)
+        parsed_md_dict = parse_shp(shp_file_full_path, feature_count=feature_count)
         if parsed_md_dict["wgs84_extent_dict"]["westlimit"] != UNKNOWN_STR:
             wgs84_dict = parsed_md_dict["wgs84_extent_dict"]
             # if extent is a point, create point type coverage
@@ -671,9 +729,11 @@ def extract_metadata(shp_file_full_path):
         raise ValidationError("Parsing of shapefiles failed!")
 
 
-def parse_shp(shp_file_path):
+def parse_shp(shp_file_path, feature_count=None):
     """
     :param shp_file_path: full file path fo the .shp file
+    :param feature_count: (optional) number of features of the shapefile, counted by OGR if
+    not specified
 
     output dictionary format
     shp_metadata_dict["origin_projection_string"]: original projection string
@@ -749,8 +809,9 @@ def parse_shp(shp_file_path):
     layer_extent = layer.GetExtent()
 
     # get feature count
-    featureCount = layer.GetFeatureCount()
-    shp_metadata_dict["feature_count"] = featureCount
+    if feature_count is None:
+        feature_count = layer.GetFeatureCount()
+    shp_metadata_dict["feature_count"] = feature_count
 
     # get a feature from layer
     feature = layer.GetNextFeature()
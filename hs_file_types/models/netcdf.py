@@ -14,6 +14,7 @@ from dominate.tags import div, legend, form, button, p, textarea, _input
 from lxml import etree
 
 import hs_file_types.nc_functions.nc_dump as nc_dump
+import hs_file_types.nc_functions.nc_header as nc_header
 import hs_file_types.nc_functions.nc_meta as nc_meta
 import hs_file_types.nc_functions.nc_utils as nc_utils
 from .base import AbstractFileMetaData, AbstractLogicalFile, FileTypeContext
@@ -390,7 +391,8 @@ class NetCDFLogicalFile(AbstractLogicalFile):
         with FileTypeContext(aggr_cls=cls, user=user, resource=resource, file_id=file_id,
                              folder_path=folder_path,
                              post_aggr_signal=post_add_netcdf_aggregation,
-                             is_temp_file=True) as ft_ctx:
+                             is_temp_file=True,
+                             temp_file_ranges=nc_header.get_nc_metadata_ranges) as ft_ctx:
 
             # base file name (no path included)
             res_file = ft_ctx.res_file
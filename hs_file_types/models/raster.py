@@ -388,8 +388,7 @@ class GeoRasterLogicalFile(AbstractLogicalFile):
 
         return res_files[0] if res_files else None
 
-    def create_aggregation_xml_documents(self, create_map_xml=True):
-        super(GeoRasterLogicalFile, self).create_aggregation_xml_documents(create_map_xml)
+    def aggregation_xml_documents_created(self):
         self.metadata.is_dirty = False
         self.metadata.save()
 
@@ -874,8 +874,7 @@ class RefTimeseriesLogicalFile(AbstractLogicalFile):
         copy_of_logical_file.save()
         return copy_of_logical_file
 
-    def create_aggregation_xml_documents(self, create_map_xml=True):
-        super(RefTimeseriesLogicalFile, self).create_aggregation_xml_documents(create_map_xml)
+    def aggregation_xml_documents_created(self):
         self.metadata.is_dirty = False
         self.metadata.save()
 
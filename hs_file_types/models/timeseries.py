@@ -4,9 +4,10 @@ import logging
 import sqlite3
 from lxml import etree
 import csv
-from dateutil import parser
 import tempfile
+from uuid import uuid4
 
+from django.conf import settings
 from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import UploadedFile
@@ -20,6 +21,9 @@ from hs_core.models import CoreMetaData
 from hs_core.signals import post_add_timeseries_aggregation
 
 from hs_app_timeseries.models import TimeSeriesMetaDataMixin, AbstractCVLookupTable
+from hs_app_timeseries.csv_utils import SAMPLE_SIZE, infer_timestamp_format, read_csv_chunks, \
+    validate_csv_rows
+from hs_app_timeseries.sqlite_pages import SQLiteFormatError, SQLiteMetadataCopy
 from hs_app_timeseries.forms import SiteValidationForm, VariableValidationForm, \
     MethodValidationForm, ProcessingLevelValidationForm, TimeSeriesResultValidationForm, \
     UTCOffSetValidationForm
@@ -798,41 +802,19 @@ def validate_csv_file(csv_file_path):
             log.error(err_message)
             return err_message
 
-        # process data rows
-        date_data_error = False
+        # process data rows a chunk at a time
+        timestamp_format = None
         data_row_count = 0
-        for row in csv_reader:
-            # check that data row has the same number of columns as the header
-            if len(row) != len(header):
-                err_message += " Number of columns in the header is not same as the data columns."
-                log.error(err_message)
-                return err_message
-            # check that the first column data is of type datetime
-            try:
-                # some numeric values (e.g., 20080101, 1.602652223413681) are recognized by the
-                # the parser as valid date value - we don't allow any such value as valid date
-                float(row[0])
-                date_data_error = True
-            except ValueError:
-                try:
-                    parser.parse(row[0])
-                except ValueError:
-                    date_data_error = True
-
-            if date_data_error:
-                err_message += " Data for the first column must be a date value."
+        for rows in read_csv_chunks(csv_reader):
+            if data_row_count == 0:
+                timestamp_format = infer_timestamp_format(
+                    [row[0] for row in rows[:SAMPLE_SIZE] if row])
+            row_error = validate_csv_rows(rows, len(header), timestamp_format)
+            if row_error:
+                err_message += row_error
                 log.error(err_message)
                 return err_message
-
-            # check that the data values (2nd column onwards) are of numeric
-            for data_value in row[1:]:
-                try:
-                    float(data_value)
-                except ValueError:
-                    err_message += " Data values must be numeric."
-                    log.error(err_message)
-                    return err_message
-            data_row_count += 1
+            data_row_count += len(rows)
 
         if data_row_count < 2:
             err_message += " There needs to be at least two rows of data."
@@ -1728,72 +1710,126 @@ def sqlite_file_update(instance, sqlite_res_file, user):
     log = logging.getLogger()
 
     sqlite_file_to_update = sqlite_res_file
-    # retrieve the sqlite file from iRODS and save it to temp directory
-    temp_sqlite_file = utils.get_file_from_irods(sqlite_file_to_update)
 
     if instance.has_csv_file and instance.metadata.series_names:
+        # retrieve the sqlite file from iRODS and save it to temp directory
+        temp_sqlite_file = utils.get_file_from_irods(sqlite_file_to_update)
         instance.metadata.populate_blank_sqlite_file(temp_sqlite_file, user)
+        return
+
+    metadata_copy = None
+    utc_offset = instance.metadata.utc_offset
+    # updating the UTC offset for a csv file updates all values, which needs the whole file
+    if not (instance.has_csv_file and utc_offset is not None and utc_offset.is_dirty):
+        metadata_copy = _get_sqlite_metadata_copy_from_irods(sqlite_file_to_update)
+    if metadata_copy is not None:
+        temp_sqlite_file = metadata_copy.path
     else:
-        try:
-            con = sqlite3.connect(temp_sqlite_file)
-            with con:
-                # get the records in python dictionary format
-                con.row_factory = sqlite3.Row
-                cur = con.cursor()
-                # update dataset table for changes in title and abstract
-                instance.metadata.update_datasets_table(con, cur)
-                if not is_file_type:
-                    # here we are updating sqlite file time series resource
-
-                    # update people related tables (People, Affiliations, Organizations, ActionBy)
-                    # using updated creators/contributors in django db
-
-                    # insert record to People table
-                    people_data = instance.metadata.update_people_table_insert(con, cur)
-
-                    # insert record to Organizations table
-                    instance.metadata.update_organizations_table_insert(con, cur)
-
-                    # insert record to Affiliations table
-                    instance.metadata.update_affiliations_table_insert(con, cur, people_data)
-
-                    # insert record to ActionBy table
-                    instance.metadata.update_actionby_table_insert(con, cur, people_data)
-
-                # since we are allowing user to set the UTC offset in case of CSV file
-                # upload we have to update the actions table
-                if instance.metadata.utc_offset is not None:
-                    instance.metadata.update_utcoffset_related_tables(con, cur)
-
-                # update resource/file specific metadata
-                instance.metadata.update_variables_table(con, cur)
-                instance.metadata.update_methods_table(con, cur)
-                instance.metadata.update_processinglevels_table(con, cur)
-                instance.metadata.update_sites_related_tables(con, cur)
-                instance.metadata.update_results_related_tables(con, cur)
-
-                # update CV terms related tables
-                instance.metadata.update_CV_tables(con, cur)
-
-                # push the updated sqlite file to iRODS
-                utils.replace_resource_file_on_irods(temp_sqlite_file, sqlite_file_to_update,
-                                                     user)
-                metadata = instance.metadata
-                if is_file_type:
-                    instance.create_aggregation_xml_documents(create_map_xml=False)
-                metadata.is_dirty = False
-                metadata.save()
-                log.info("SQLite file update was successful.")
-        except sqlite3.Error as ex:
-            sqlite_err_msg = str(ex.args[0])
-            log.error("Failed to update SQLite file. Error:{}".format(sqlite_err_msg))
-            raise Exception(sqlite_err_msg)
-        except Exception as ex:
-            log.exception("Failed to update SQLite file. Error:{}".format(str(ex)))
-            raise ex
-        finally:
-            if os.path.exists(temp_sqlite_file):
-                shutil.rmtree(os.path.dirname(temp_sqlite_file))
+        # retrieve the sqlite file from iRODS and save it to temp directory
+        temp_sqlite_file = utils.get_file_from_irods(sqlite_file_to_update)
+
+    try:
+        con = sqlite3.connect(temp_sqlite_file)
+        if metadata_copy is not None:
+            # pages of the data values are not in the copy
+            con.set_authorizer(metadata_copy.authorize)
+        with con:
+            # get the records in python dictionary format
+            con.row_factory = sqlite3.Row
+            cur = con.cursor()
+            _update_sqlite_file_tables(instance, con, cur, is_file_type)
+        con.close()
+
+        # push the updated sqlite file to iRODS
+        if metadata_copy is not None:
+            utils.write_resource_file_ranges_on_irods(metadata_copy.changed_ranges(),
+                                                      sqlite_file_to_update, user)
+        else:
+            utils.replace_resource_file_on_irods(temp_sqlite_file, sqlite_file_to_update, user)
+        metadata = instance.metadata
+        if is_file_type:
+            instance.create_aggregation_xml_documents(create_map_xml=False)
+        metadata.is_dirty = False
+        metadata.save()
+        log.info("SQLite file update was successful.")
+    except sqlite3.Error as ex:
+        sqlite_err_msg = str(ex.args[0])
+        log.error("Failed to update SQLite file. Error:{}".format(sqlite_err_msg))
+        raise Exception(sqlite_err_msg)
+    except Exception as ex:
+        log.exception("Failed to update SQLite file. Error:{}".format(str(ex)))
+        raise ex
+    finally:
+        if os.path.exists(temp_sqlite_file):
+            shutil.rmtree(os.path.dirname(temp_sqlite_file))
+
+
+def _update_sqlite_file_tables(instance, con, cur, is_file_type):
+    """updates the metadata tables of a sqlite file from the metadata in django db
+    :param  instance: an instance of either TimeSeriesLogicalFile or TimeSeriesResource
+    """
+    # update dataset table for changes in title and abstract
+    instance.metadata.update_datasets_table(con, cur)
+    if not is_file_type:
+        # here we are updating sqlite file time series resource
+
+        # update people related tables (People, Affiliations, Organizations, ActionBy)
+        # using updated creators/contributors in django db
+
+        # insert record to People table
+        people_data = instance.metadata.update_people_table_insert(con, cur)
+
+        # insert record to Organizations table
+        instance.metadata.update_organizations_table_insert(con, cur)
+
+        # insert record to Affiliations table
+        instance.metadata.update_affiliations_table_insert(con, cur, people_data)
+
+        # insert record to ActionBy table
+        instance.metadata.update_actionby_table_insert(con, cur, people_data)
+
+    # since we are allowing user to set the UTC offset in case of CSV file
+    # upload we have to update the actions table
+    if instance.metadata.utc_offset is not None:
+        instance.metadata.update_utcoffset_related_tables(con, cur)
+
+    # update resource/file specific metadata
+    instance.metadata.update_variables_table(con, cur)
+    instance.metadata.update_methods_table(con, cur)
+    instance.metadata.update_processinglevels_table(con, cur)
+    instance.metadata.update_sites_related_tables(con, cur)
+    instance.metadata.update_results_related_tables(con, cur)
+
+    # update CV terms related tables
+    instance.metadata.update_CV_tables(con, cur)
+
+
+def _get_sqlite_metadata_copy_from_irods(sqlite_res_file):
+    """
+    Copy the pages of the sqlite file (sqlite_res_file) in iRODS that hold its metadata tables
+    to a temp directory (see hs_app_timeseries.sqlite_pages)
+    Note: The caller is responsible for cleaning the temp directory
+    :param  sqlite_res_file: an instance of ResourceFile
+    :return: an instance of SQLiteMetadataCopy, or None if the pages can't be read and
+    written back by byte range or the file has a format the pages can't be copied from
+    """
+    istorage = sqlite_res_file.resource.get_irods_storage()
+    if not istorage.supports_range_writes():
+        return None
+    range_file = istorage.open_range(sqlite_res_file.storage_path, size=sqlite_res_file.size)
+    if range_file is None:
+        return None
+
+    temp_dir = os.path.join(settings.TEMP_FILE_DIR, uuid4().hex)
+    os.makedirs(temp_dir)
+    temp_sqlite_file = os.path.join(temp_dir, sqlite_res_file.file_name)
+    try:
+        with range_file:
+            return SQLiteMetadataCopy(range_file, range_file.size, temp_sqlite_file)
+    except SQLiteFormatError as ex:
+        logging.getLogger().info("Copying the whole SQLite file. {}".format(str(ex)))
+        shutil.rmtree(temp_dir)
+        return None
 
 
 def add_to_xml_container_helper(target_obj, container):
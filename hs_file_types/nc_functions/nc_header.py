@@ -0,0 +1,222 @@
+"""
+Module reads the header of netCDF classic format files (CDF-1, CDF-2 and CDF-5) to find the
+byte ranges of a file that netCDF metadata extraction reads: the header itself and the values
+of the coordinate, auxiliary coordinate, bounds and scalar variables. Data variables are only
+described in the header, so their values never need to be copied from iRODS for metadata
+extraction.
+
+References
+netCDF classic format specification
+    https://www.unidata.ucar.edu/software/netcdf/docs/file_format_specifications.html
+"""
+
+import io
+import struct
+
+NC_DIMENSION = 10
+NC_VARIABLE = 11
+NC_ATTRIBUTE = 12
+NC_CHAR = 2
+
+# size in bytes of the values of each nc_type
+NC_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 4, 6: 8, 7: 1, 8: 2, 9: 4, 10: 8, 11: 8}
+
+# values of a record variable are spread over all records and need one range per record; above
+# this many records it is cheaper to copy the whole file
+MAX_RECORD_RANGES = 10000
+
+
+class NCHeaderError(Exception):
+    """The file is not a valid netCDF classic format file."""
+
+
+class _HeaderReader(object):
+    def __init__(self, fileobj, version):
+        self.fileobj = fileobj
+        self.version = version
+
+    def read(self, size):
+        data = self.fileobj.read(size)
+        if len(data) < size:
+            raise NCHeaderError("unexpected end of netCDF header")
+        return data
+
+    def skip_padding(self, size):
+        if size % 4:
+            self.read(4 - size % 4)
+
+    def int32(self):
+        return struct.unpack('>i', self.read(4))[0]
+
+    def non_neg(self):
+        # CDF-5 uses 64 bit integers for all counts and lengths
+        if self.version == 5:
+            return struct.unpack('>q', self.read(8))[0]
+        return self.int32()
+
+    def offset(self):
+        # CDF-2 and CDF-5 use 64 bit offsets
+        if self.version == 1:
+            return self.int32()
+        return struct.unpack('>q', self.read(8))[0]
+
+    def name(self):
+        size = self.non_neg()
+        name = self.read(size).decode('utf-8')
+        self.skip_padding(size)
+        return name
+
+    def list_size(self, tag):
+        list_tag = self.int32()
+        size = self.non_neg()
+        if list_tag == 0 and size == 0:
+            return 0
+        if list_tag != tag:
+            raise NCHeaderError("unexpected tag {} in netCDF header".format(list_tag))
+        return size
+
+    def nc_type(self):
+        nc_type = self.int32()
+        if nc_type not in NC_TYPE_SIZES:
+            raise NCHeaderError("unknown nc_type {} in netCDF header".format(nc_type))
+        return nc_type
+
+    def attributes(self):
+        attributes = {}
+        for _ in range(self.list_size(NC_ATTRIBUTE)):
+            name = self.name()
+            nc_type = self.nc_type()
+            size = self.non_neg() * NC_TYPE_SIZES[nc_type]
+            values = self.read(size)
+            self.skip_padding(size)
+            # only text attribute values are needed to find related variables
+            attributes[name] = values.decode('utf-8', 'replace').rstrip('\x00') \
+                if nc_type == NC_CHAR else None
+        return attributes
+
+
+def read_nc_classic_header(fileobj):
+    """
+    (file object) -> dict
+
+    Return: the dimensions, global attributes, variables and number of records of a netCDF
+    classic format file, or None if the file is not in classic format (e.g., netCDF-4/HDF5)
+    Format: {'version': 1, 'header_size': 1024, 'numrecs': 10,
+             'dimensions': [(name, length)], 'attributes': {name: text or None},
+             'variables': [{'name': name, 'dimensions': [dimension index],
+                            'attributes': {name: text or None}, 'nc_type': nc_type,
+                            'vsize': vsize, 'begin': offset}]}
+    numrecs is None for files written in streaming mode
+    """
+    fileobj.seek(0)
+    magic = fileobj.read(4)
+    if len(magic) < 4 or magic[:3] != b'CDF' or magic[3] not in (1, 2, 5):
+        return None
+
+    reader = _HeaderReader(fileobj, magic[3])
+    numrecs = reader.non_neg()
+    dimensions = []
+    for _ in range(reader.list_size(NC_DIMENSION)):
+        dimensions.append((reader.name(), reader.non_neg()))
+    attributes = reader.attributes()
+    variables = []
+    for _ in range(reader.list_size(NC_VARIABLE)):
+        name = reader.name()
+        dim_ids = [reader.non_neg() for _ in range(reader.non_neg())]
+        if any(dim_id >= len(dimensions) for dim_id in dim_ids):
+            raise NCHeaderError("variable {} has an unknown dimension".format(name))
+        variables.append({'name': name,
+                          'dimensions': dim_ids,
+                          'attributes': reader.attributes(),
+                          'nc_type': reader.nc_type(),
+                          'vsize': reader.non_neg(),
+                          'begin': reader.offset()})
+
+    return {'version': reader.version,
+            'header_size': fileobj.tell(),
+            # all ones (-1 when read as a signed integer) indicates streaming mode
+            'numrecs': None if numrecs == -1 else numrecs,
+            'dimensions': dimensions,
+            'attributes': attributes,
+            'variables': variables}
+
+
+def get_nc_metadata_variable_names(header):
+    """
+    (dict) -> set
+
+    Return: names of the variables whose values are read by metadata extraction: coordinate,
+    auxiliary coordinate, bounds and scalar variables (see nc_utils)
+    """
+    dimensions = header['dimensions']
+    variables = dict((var['name'], var) for var in header['variables'])
+    coordinate_names = set()
+    for var in header['variables']:
+        if len(var['dimensions']) == 1 and dimensions[var['dimensions'][0]][0] == var['name']:
+            coordinate_names.add(var['name'])
+        coordinates = var['attributes'].get('coordinates')
+        if coordinates:
+            coordinate_names.update(name for name in coordinates.split(' ') if name)
+    coordinate_names &= set(variables)
+
+    names = set(coordinate_names)
+    for name in coordinate_names:
+        bounds = variables[name]['attributes'].get('bounds')
+        if bounds in variables:
+            names.add(bounds)
+    names.update(var['name'] for var in header['variables'] if not var['dimensions'])
+    return names
+
+
+def get_nc_metadata_ranges(fileobj):
+    """
+    (file object) -> list
+
+    Return: the (offset, length) byte ranges of a netCDF classic format file that metadata
+    extraction reads, or None if the whole file is needed (e.g., netCDF-4/HDF5 files)
+    """
+    try:
+        header = read_nc_classic_header(fileobj)
+    except (NCHeaderError, UnicodeDecodeError):
+        return None
+    if header is None:
+        return None
+
+    file_size = fileobj.seek(0, io.SEEK_END)
+    dimensions = header['dimensions']
+
+    def is_record_variable(var):
+        # the first dimension of a record variable is the unlimited (zero length) dimension
+        return bool(var['dimensions']) and dimensions[var['dimensions'][0]][1] == 0
+
+    def values_size(var):
+        size = NC_TYPE_SIZES[var['nc_type']]
+        for dim_id in var['dimensions']:
+            if dimensions[dim_id][1]:
+                size *= dimensions[dim_id][1]
+        return size
+
+    record_variables = [var for var in header['variables'] if is_record_variable(var)]
+    if len(record_variables) == 1:
+        # records of a single record variable are not padded
+        record_size = values_size(record_variables[0])
+    else:
+        record_size = sum(var['vsize'] for var in record_variables)
+    numrecs = header['numrecs']
+    if numrecs is None:
+        numrecs = (file_size - min(var['begin'] for var in record_variables)) // record_size \
+            if record_variables and record_size else 0
+
+    ranges = [(0, header['header_size'])]
+    names = get_nc_metadata_variable_names(header)
+    for var in header['variables']:
+        if var['name'] not in names:
+            continue
+        if is_record_variable(var):
+            if numrecs > MAX_RECORD_RANGES:
+                return None
+            ranges.extend((var['begin'] + record * record_size, values_size(var))
+                          for record in range(numrecs))
+        else:
+            ranges.append((var['begin'], values_size(var)))
+    return ranges
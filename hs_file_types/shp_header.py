@@ -0,0 +1,122 @@
+"""
+Module reads the headers of ESRI shapefile components so that geographic feature metadata can be
+extracted without copying or reading the features of a shapefile: the bounding box is in the .shp
+header, the field schema in the .dbf header and the feature count follows from the length of the
+.shx index. write_header_shapefile copies these headers together with the first feature into a
+shapefile of a single feature, from which OGR reads the field schema, spatial reference, extent
+and geometry type in constant time and memory however many features the original shapefile has.
+
+References
+ESRI Shapefile Technical Description
+    https://www.esri.com/library/whitepapers/pdfs/shapefile.pdf
+dBASE file format
+    http://www.dbase.com/Knowledgebase/INT/db7_file_fmt.htm
+"""
+
+import struct
+
+SHP_FILE_CODE = 9994
+# size in bytes of the .shp and .shx headers, of a .shx index record and of a .shp record header
+SHP_HEADER_SIZE = 100
+SHX_RECORD_SIZE = 8
+SHP_RECORD_HEADER_SIZE = 8
+DBF_HEADER_SIZE = 32
+DBF_EOF = b'\x1a'
+
+
+class ShapefileHeaderError(Exception):
+    """The file is not a valid shapefile component."""
+
+
+def _read(fileobj, offset, size):
+    fileobj.seek(offset)
+    data = fileobj.read(size)
+    if len(data) < size:
+        raise ShapefileHeaderError("unexpected end of shapefile component")
+    return data
+
+
+def read_shp_header(fileobj):
+    """
+    (file object) -> dict
+
+    Return: the header of a .shp or .shx file
+    Format: {'file_length': length in bytes, 'shape_type': 5, 'bbox': (xmin, ymin, xmax, ymax)}
+    """
+    header = _read(fileobj, 0, SHP_HEADER_SIZE)
+    if struct.unpack('>i', header[:4])[0] != SHP_FILE_CODE:
+        raise ShapefileHeaderError("not a shapefile component")
+    # the file length is in 16 bit words
+    return {'file_length': struct.unpack('>i', header[24:28])[0] * 2,
+            'shape_type': struct.unpack('<i', header[32:36])[0],
+            'bbox': struct.unpack('<4d', header[36:68])}
+
+
+def read_dbf_header(fileobj):
+    """
+    (file object) -> dict
+
+    Return: the record count and the lengths of the header (including the field descriptors)
+    and of each record of a .dbf file
+    Format: {'record_count': 10, 'header_length': 97, 'record_length': 20}
+    """
+    header = _read(fileobj, 0, DBF_HEADER_SIZE)
+    record_count, header_length, record_length = struct.unpack('<IHH', header[4:12])
+    if header_length < DBF_HEADER_SIZE:
+        raise ShapefileHeaderError("not a dbf file")
+    return {'record_count': record_count,
+            'header_length': header_length,
+            'record_length': record_length}
+
+
+def get_feature_count(shx_size):
+    """
+    (int) -> int
+
+    Return: the number of features of a shapefile given the size in bytes of its .shx file
+    """
+    return max(0, (shx_size - SHP_HEADER_SIZE) // SHX_RECORD_SIZE)
+
+
+def write_header_shapefile(shp_file, shx_file, dbf_file, shp_path, shx_path, dbf_path):
+    """
+    Write a shapefile that has the headers, and so the bounding box and field schema, of a
+    shapefile but only its first feature. Only the headers and the first feature are read.
+    :param shp_file: file object of the .shp file to copy
+    :param shx_file: file object of the .shx file to copy
+    :param dbf_file: file object of the .dbf file to copy
+    :param shp_path: path of the .shp file to write
+    :param shx_path: path of the .shx file to write
+    :param dbf_path: path of the .dbf file to write
+    :return: the number of features of the shapefile copied
+    """
+    # reading the headers also checks that the files are shapefile components
+    read_shp_header(shp_file)
+    feature_count = get_feature_count(read_shp_header(shx_file)['file_length'])
+    dbf = read_dbf_header(dbf_file)
+    shp_header = bytearray(_read(shp_file, 0, SHP_HEADER_SIZE))
+    shx_header = bytearray(_read(shx_file, 0, SHP_HEADER_SIZE))
+
+    shp_records = b''
+    shx_records = b''
+    if feature_count:
+        # offset and content length of the first feature, both in 16 bit words
+        offset, content_length = struct.unpack('>2i', _read(shx_file, SHP_HEADER_SIZE,
+                                                            SHX_RECORD_SIZE))
+        shp_records = _read(shp_file, offset * 2, SHP_RECORD_HEADER_SIZE + content_length * 2)
+        shx_records = struct.pack('>2i', SHP_HEADER_SIZE // 2, content_length)
+    shp_header[24:28] = struct.pack('>i', (SHP_HEADER_SIZE + len(shp_records)) // 2)
+    shx_header[24:28] = struct.pack('>i', (SHP_HEADER_SIZE + len(shx_records)) // 2)
+
+    dbf_header = bytearray(_read(dbf_file, 0, dbf['header_length']))
+    dbf_records = b''
+    if feature_count and dbf['record_count']:
+        dbf_records = _read(dbf_file, dbf['header_length'], dbf['record_length'])
+    dbf_header[4:8] = struct.pack('<I', 1 if dbf_records else 0)
+
+    for path, data in ((shp_path, shp_header + shp_records),
+                       (shx_path, shx_header + shx_records),
+                       (dbf_path, dbf_header + dbf_records + DBF_EOF)):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return feature_count
@@ -9,7 +9,7 @@ from hs_core import hydroshare
 from hs_core.models import Coverage, ResourceFile
 from hs_core.views.utils import move_or_rename_file_or_folder, create_folder
 from .utils import CompositeResourceTestMixin
-from hs_file_types.models import GenericLogicalFile, GenericFileMetaData
+from hs_file_types.models import GenericLogicalFile, GenericFileMetaData, DirtyAggregation
 from hs_file_types.models.base import METADATA_FILE_ENDSWITH, RESMAP_FILE_ENDSWITH
 
 
@@ -574,3 +574,54 @@ class GenericFileTypeTest(MockIRODSTestCaseMixin, TransactionTestCase,
                          gen_logical_file.metadata.extra_metadata)
         self.assertEqual("generic_file", gen_logical_file.dataset_name)
         self.assertTrue(gen_logical_file.metadata.has_modified_metadata)
+
+    def test_prefetch_logical_files(self):
+        """Test that logical files of resource files are resolved in bulk"""
+
+        self.create_composite_resource(self.generic_file)
+        res_file = self.composite_resource.files.first()
+        GenericLogicalFile.set_file_type(self.composite_resource, self.user, res_file.id)
+        gen_logical_file = GenericLogicalFile.objects.first()
+        create_folder(self.composite_resource.short_id, 'data/contents/folder-1')
+        self.add_file_to_resource(file_to_add=self.generic_file, upload_folder='folder-1')
+
+        files = ResourceFile.prefetch_logical_files(self.composite_resource.files.all())
+        self.assertEqual(len(files), 2)
+        with self.assertNumQueries(0):
+            logical_files = [f.logical_file for f in files if f.has_logical_file]
+            self.assertEqual(logical_files, [gen_logical_file])
+            self.assertEqual(logical_files[0].metadata.id, gen_logical_file.metadata_id)
+
+        self.assertEqual(len(self.composite_resource.non_logical_files), 1)
+        self.assertEqual(self.composite_resource.generic_logical_files, [gen_logical_file])
+        self.composite_resource.delete()
+
+    def test_dirty_aggregation_index(self):
+        """Test that aggregations with dirty metadata are indexed and that only these have their
+        xml documents created"""
+
+        self.create_composite_resource(self.generic_file)
+        res_file = self.composite_resource.files.first()
+        GenericLogicalFile.set_file_type(self.composite_resource, self.user, res_file.id)
+        gen_logical_file = GenericLogicalFile.objects.first()
+        self.composite_resource.create_aggregation_xml_documents()
+        self.assertEqual(DirtyAggregation.get_aggregations(self.composite_resource), [])
+
+        gen_logical_file.metadata.extra_metadata = {'key1': 'value 1'}
+        gen_logical_file.metadata.is_dirty = True
+        gen_logical_file.metadata.save()
+        self.assertEqual(DirtyAggregation.get_aggregations(self.composite_resource),
+                         [gen_logical_file])
+
+        self.composite_resource.create_aggregation_xml_documents()
+        gen_logical_file.metadata.refresh_from_db()
+        self.assertFalse(gen_logical_file.metadata.is_dirty)
+        self.assertEqual(DirtyAggregation.get_aggregations(self.composite_resource), [])
+
+        # removing the aggregation removes it from the index
+        gen_logical_file.metadata.is_dirty = True
+        gen_logical_file.metadata.save()
+        gen_logical_file.remove_aggregation()
+        self.assertFalse(DirtyAggregation.objects.exists())
+
+        self.composite_resource.delete()
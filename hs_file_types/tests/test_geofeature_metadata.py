@@ -269,6 +269,24 @@ class GeoFeatureFileTypeTest(MockIRODSTestCaseMixin, TransactionTestCase,
         # there should be no GenericFileMetaData object at this point
         self.assertEqual(GeoFeatureFileMetaData.objects.count(), 0)
 
+    def test_create_aggregation_from_shp_file_stale_sizes(self):
+        # the sizes recorded for the resource files may be stale (e.g., after files were
+        # overwritten by an unzip) - the feature count and the headers are read using the sizes
+        # of the files in iRODS
+
+        self.create_composite_resource()
+        for file_to_add in (self.states_shp_file, self.states_shx_file, self.states_dbf_file):
+            self.add_file_to_resource(file_to_add=file_to_add)
+        ResourceFile.objects.filter(object_id=self.composite_resource.id).update(_size=200)
+
+        shp_res_file = [f for f in self.composite_resource.files.all() if f.extension == '.shp'][0]
+        GeoFeatureLogicalFile.set_file_type(self.composite_resource, self.user, shp_res_file.id)
+
+        logical_file = GeoFeatureLogicalFile.objects.first()
+        self.assertEqual(logical_file.metadata.geometryinformation.featureCount, 51)
+        self.assertEqual(logical_file.metadata.geometryinformation.geometryType,
+                         "MULTIPOLYGON")
+
     def test_create_aggregation_from_shp_file_required_2(self):
         # here we are using a shp file that exists in a folder
         # for setting it to Geo Feature file type which includes metadata extraction
@@ -0,0 +1,103 @@
+import io
+import struct
+
+from django.test import SimpleTestCase
+
+from hs_file_types.nc_functions.nc_header import get_nc_metadata_ranges, read_nc_classic_header
+
+NC_CHAR, NC_INT, NC_FLOAT, NC_DOUBLE = 2, 4, 5, 6
+
+
+def _int(value):
+    return struct.pack('>i', value)
+
+
+def _name(name):
+    name = name.encode('utf-8')
+    return _int(len(name)) + name + b'\x00' * (-len(name) % 4)
+
+
+def _attributes(attributes):
+    if not attributes:
+        return _int(0) + _int(0)
+    data = _int(12) + _int(len(attributes))
+    for name, value in attributes:
+        value = value.encode('utf-8')
+        data += _name(name) + _int(NC_CHAR) + _int(len(value)) + value + \
+            b'\x00' * (-len(value) % 4)
+    return data
+
+
+def make_nc_classic_file(dimensions, variables, numrecs):
+    """
+    Build a CDF-1 file
+    :param dimensions: list of (name, length); length 0 for the unlimited dimension
+    :param variables: list of (name, dimension indexes, attributes, nc_type, vsize, begin)
+    :param numrecs: number of records
+    :return: header bytes
+    """
+    data = b'CDF\x01' + _int(numrecs)
+    data += _int(10) + _int(len(dimensions))
+    for name, length in dimensions:
+        data += _name(name) + _int(length)
+    data += _attributes([('title', 'test file')])
+    data += _int(11) + _int(len(variables))
+    for name, dim_ids, attributes, nc_type, vsize, begin in variables:
+        data += _name(name) + _int(len(dim_ids)) + b''.join(_int(i) for i in dim_ids)
+        data += _attributes(attributes) + _int(nc_type) + _int(vsize) + _int(begin)
+    return data
+
+
+class NCHeaderTest(SimpleTestCase):
+
+    def setUp(self):
+        super(NCHeaderTest, self).setUp()
+        self.dimensions = [('time', 0), ('lat', 3), ('nv', 2)]
+
+    def _variables(self, header_size):
+        # non-record variables are followed by 2 records of 8 (time) + 12 (temp) bytes
+        return [('lat', [1], [('units', 'degrees_north'), ('bounds', 'lat_bnds')], NC_FLOAT,
+                 12, header_size),
+                ('lat_bnds', [1, 2], [], NC_FLOAT, 24, header_size + 12),
+                ('crs', [], [('grid_mapping_name', 'latitude_longitude')], NC_INT, 4,
+                 header_size + 36),
+                ('elev', [1], [('units', 'm')], NC_FLOAT, 12, header_size + 40),
+                ('time', [0], [('units', 'days since 2000-01-01')], NC_DOUBLE, 8,
+                 header_size + 52),
+                ('temp', [0, 1], [('coordinates', 'time lat')], NC_FLOAT, 12,
+                 header_size + 60)]
+
+    def _nc_file(self):
+        header_size = len(make_nc_classic_file(self.dimensions, self._variables(0), 2))
+        header = make_nc_classic_file(self.dimensions, self._variables(header_size), 2)
+        return io.BytesIO(header + b'\x01' * (52 + 2 * 20)), header_size
+
+    def test_read_header(self):
+        nc_file, header_size = self._nc_file()
+        header = read_nc_classic_header(nc_file)
+        self.assertEqual(header['header_size'], header_size)
+        self.assertEqual(header['numrecs'], 2)
+        self.assertEqual(header['dimensions'], self.dimensions)
+        self.assertEqual(header['attributes'], {'title': 'test file'})
+        self.assertEqual([var['name'] for var in header['variables']],
+                         ['lat', 'lat_bnds', 'crs', 'elev', 'time', 'temp'])
+        self.assertEqual(header['variables'][0]['attributes']['bounds'], 'lat_bnds')
+
+        # netCDF-4 (HDF5) files are not in classic format
+        self.assertIsNone(read_nc_classic_header(io.BytesIO(b'\x89HDF\r\n\x1a\n')))
+
+    def test_metadata_ranges(self):
+        nc_file, header_size = self._nc_file()
+        ranges = get_nc_metadata_ranges(nc_file)
+        # the header, coordinate (lat and time), bounds and scalar variables are read, but not
+        # the data variables elev and temp
+        self.assertEqual(sorted(ranges), [(0, header_size),
+                                          (header_size, 12),
+                                          (header_size + 12, 24),
+                                          (header_size + 36, 4),
+                                          (header_size + 52, 8),
+                                          (header_size + 72, 8)])
+
+        # the whole file is needed for files that are not in classic format or are invalid
+        self.assertIsNone(get_nc_metadata_ranges(io.BytesIO(b'\x89HDF\r\n\x1a\n')))
+        self.assertIsNone(get_nc_metadata_ranges(io.BytesIO(nc_file.getvalue()[:40])))
@@ -0,0 +1,66 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from hs_file_types.shp_header import ShapefileHeaderError, get_feature_count, read_dbf_header, \
+    read_shp_header, write_header_shapefile
+
+DATA_DIR = 'hs_file_types/tests/data'
+
+
+class TestShapefileHeader(SimpleTestCase):
+
+    def setUp(self):
+        super(TestShapefileHeader, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.shape_files = [os.path.join(DATA_DIR, 'states' + ext)
+                            for ext in ('.shp', '.shx', '.dbf')]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestShapefileHeader, self).tearDown()
+
+    def test_read_headers(self):
+        shp_file, shx_file, dbf_file = self.shape_files
+        with open(shp_file, 'rb') as f:
+            header = read_shp_header(f)
+        self.assertEqual(header['file_length'], os.path.getsize(shp_file))
+        # polygon
+        self.assertEqual(header['shape_type'], 5)
+        self.assertEqual([round(value, 4) for value in header['bbox']],
+                         [-178.2176, 18.9218, -66.9693, 71.4062])
+        self.assertEqual(get_feature_count(os.path.getsize(shx_file)), 51)
+        with open(dbf_file, 'rb') as f:
+            self.assertEqual(read_dbf_header(f), {'record_count': 51, 'header_length': 193,
+                                                  'record_length': 52})
+        with self.assertRaises(ShapefileHeaderError):
+            read_shp_header(io.BytesIO(b'\x00' * 100))
+        with self.assertRaises(ShapefileHeaderError):
+            read_dbf_header(io.BytesIO(b'\x03' * 10))
+
+    def test_write_header_shapefile(self):
+        copies = [os.path.join(self.tmp_dir, os.path.basename(f)) for f in self.shape_files]
+        with open(self.shape_files[0], 'rb') as shp_file, \
+                open(self.shape_files[1], 'rb') as shx_file, \
+                open(self.shape_files[2], 'rb') as dbf_file:
+            self.assertEqual(write_header_shapefile(shp_file, shx_file, dbf_file, *copies), 51)
+
+        # the copy has the headers of the shapefile and its first feature only
+        with open(self.shape_files[0], 'rb') as f:
+            original_header = read_shp_header(f)
+        with open(copies[0], 'rb') as f:
+            header = read_shp_header(f)
+        self.assertEqual(header['bbox'], original_header['bbox'])
+        self.assertEqual(header['file_length'], os.path.getsize(copies[0]))
+        self.assertLess(header['file_length'], original_header['file_length'])
+        self.assertEqual(get_feature_count(os.path.getsize(copies[1])), 1)
+        with open(copies[2], 'rb') as f:
+            dbf_header = read_dbf_header(f)
+        self.assertEqual(dbf_header['record_count'], 1)
+        self.assertEqual(os.path.getsize(copies[2]), 193 + 52 + 1)
+        with open(self.shape_files[2], 'rb') as original, open(copies[2], 'rb') as copy:
+            self.assertEqual(original.read(193)[12:], copy.read(193)[12:])
+            self.assertEqual(original.read(52), copy.read(52))
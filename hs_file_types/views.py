@@ -18,6 +18,7 @@ from hs_core.hydroshare import METADATA_STATUS_SUFFICIENT, METADATA_STATUS_INSUF
     ResourceFile, utils
 from hs_core.views.utils import ACTION_TO_AUTHORIZE, authorize, get_coverage_data_dict
 from hs_core.hydroshare.utils import resource_modified
+from hs_core.landing_page_cache import get_aggregation_metadata_html
 from hs_core.views.utils import rename_irods_file_or_folder_in_django
 
 from .models import GeoRasterLogicalFile, NetCDFLogicalFile, GeoFeatureLogicalFile, \
@@ -46,6 +47,9 @@ def set_file_type(request, resource_id, hs_file_type, file_id=None, **kwargs):
     :param  hs_file_type: file type to be set (e.g, SingleFile, NetCDF, GeoRaster, RefTimeseries,
     TimeSeries and GeoFeature)
     :return an instance of JsonResponse type
+    When the request has async set to "true" the file type is set by a celery task whose id is
+    returned as task_id; check_task_status returns the status and message of the task as its
+    payload once it is done.
     """
 
     response_data = {'status': 'error'}
@@ -71,6 +75,14 @@ def set_file_type(request, resource_id, hs_file_type, file_id=None, **kwargs):
         response_data['message'] = err_msg
         return JsonResponse(response_data, status=status.HTTP_400_BAD_REQUEST)
 
+    if request.POST.get('async', 'false').lower() == 'true':
+        from hs_core.tasks import set_file_type_task
+        task = set_file_type_task.apply_async((request.user.pk, resource_id, file_id,
+                                               hs_file_type, folder_path))
+        response_data['status'] = 'success'
+        response_data['task_id'] = task.task_id
+        return JsonResponse(response_data, status=status.HTTP_202_ACCEPTED)
+
     try:
         set_logical_file_type(res, request.user, file_id, hs_file_type, folder_path)
         resource_modified(res, request.user, overwrite_bag=False)
@@ -968,7 +980,7 @@ def get_metadata(request, hs_file_type, file_type_id, metadata_mode):
 
     try:
         if metadata_mode == 'view':
-            metadata = logical_file.metadata.get_html()
+            metadata = get_aggregation_metadata_html(logical_file)
         else:
             metadata = logical_file.metadata.get_html_forms()
         ajax_response_data = {'status': 'success', 'metadata': metadata}
@@ -1007,7 +1019,7 @@ def get_timeseries_metadata(request, file_type_id, series_id, resource_mode):
         series_id = list(series_ids.keys())[0]
     try:
         if resource_mode == 'view':
-            metadata = logical_file.metadata.get_html(series_id=series_id)
+            metadata = get_aggregation_metadata_html(logical_file, series_id=series_id)
         else:
             metadata = logical_file.metadata.get_html_forms(series_id=series_id)
         ajax_response_data = {'status': 'success', 'metadata': metadata}
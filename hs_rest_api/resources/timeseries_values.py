@@ -0,0 +1,187 @@
+import hashlib
+import os
+import re
+import shutil
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import StreamingHttpResponse
+
+from rest_framework import generics
+from rest_framework.exceptions import NotFound, ValidationError
+
+from hs_core import hydroshare
+from hs_core.hydroshare import utils
+from hs_core.views.utils import authorize, ACTION_TO_AUTHORIZE
+from hs_app_timeseries import series_query
+
+# the number of buckets or points returned by aggregation if not given, and at most
+DEFAULT_POINTS = 1000
+MAX_POINTS = 100000
+
+
+def _is_time_series_file(res_file):
+    if res_file.extension.lower() != '.sqlite':
+        return False
+    if res_file.has_logical_file:
+        return res_file.logical_file_type_name == 'TimeSeriesLogicalFile'
+    return res_file.resource.resource_type == 'TimeSeriesResource'
+
+
+def get_query_replica(res_file):
+    """
+    Return the path of the local replica (see series_query.create_query_replica) of a time
+    series SQLite file, copying the file from iRODS if there is no replica of its current
+    version. Replicas are kept in HS_TIMESERIES_REPLICA_DIR, named by the storage path, modified
+    time and size of the file, and replicas of older versions of the file are removed.
+    :param res_file: an instance of ResourceFile of a SQLite file
+    :return: path of the replica
+    """
+    replica_dir = getattr(settings, 'HS_TIMESERIES_REPLICA_DIR',
+                          os.path.join(settings.TEMP_FILE_DIR, 'timeseries_replicas'))
+    istorage = res_file.resource.get_irods_storage()
+    path_key = hashlib.md5(res_file.storage_path.encode()).hexdigest()
+    modified_time = istorage.get_modified_time(res_file.storage_path)
+    replica_name = '{}-{}-{}.sqlite'.format(path_key, int(modified_time.timestamp()),
+                                            res_file.size)
+    replica_path = os.path.join(replica_dir, replica_name)
+    if os.path.exists(replica_path):
+        return replica_path
+
+    temp_dir = os.path.join(settings.TEMP_FILE_DIR, uuid4().hex)
+    os.makedirs(temp_dir)
+    try:
+        temp_sqlite_file = utils.get_file_from_irods(res_file, temp_dir=temp_dir)
+        if not os.path.isdir(replica_dir):
+            os.makedirs(replica_dir, exist_ok=True)
+        series_query.create_query_replica(temp_sqlite_file, replica_path)
+    finally:
+        shutil.rmtree(temp_dir)
+    # replicas of other versions of the file; replicas being created by other requests have a
+    # temporary name (see series_query.create_query_replica) and are left alone
+    replica_name_pattern = re.compile(r'^{}-\d+-\d+\.sqlite$'.format(path_key))
+    for name in os.listdir(replica_dir):
+        if replica_name_pattern.match(name) and name != replica_name:
+            try:
+                os.remove(os.path.join(replica_dir, name))
+            except OSError:
+                # removed by another request
+                pass
+    return replica_path
+
+
+def _int_param(query_params, name, default, minimum, maximum):
+    try:
+        value = int(query_params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: "must be an integer"})
+    if not minimum <= value <= maximum:
+        raise ValidationError({name: "must be between {} and {}".format(minimum, maximum)})
+    return value
+
+
+class TimeSeriesValuesRetrieve(generics.GenericAPIView):
+    allowed_methods = ('GET',)
+
+    def get(self, request, pk, pathname):
+        """
+        Get the values of a time series of a time series SQLite file, optionally of a time
+        range only and aggregated or downsampled on the server.
+
+        ## Parameters
+        * `id` - alphanumeric uuid of the resource, i.e. cde01b3898c94cdab78a2318330cf795
+        * `pathname` - The pathname of the SQLite file
+        * `series_id` - series id (ResultUUID) of the time series
+        * `start` - (optional) ISO 8601 date time of the first value, i.e. 2008-01-01T10:30
+        * `end` - (optional) ISO 8601 date time of the last value
+        * `aggregation` - (optional) `min`, `max` or `mean` of the values of each of `points`
+        time buckets of equal length, or `lttb` to downsample to `points` values
+        * `points` - (optional) number of time buckets or values of an aggregation; default 1000
+        * `format` - (optional) `json` (default), `csv` or `binary` (a 5 byte header
+        `HSTS\\x01` followed by batches, each a little endian uint32 number of values n, n int64
+        timestamps in microseconds since 1970-01-01 and n float64 values)
+
+        ## Returns
+        ```
+        {
+            "series_id": "182d8fa3-1ebc-11e6-ad49-f45c8999816f",
+            "value_name": "DataValue",
+            "values": [
+                ["2008-01-01T00:00:00", 0.1766667],
+                ["2008-01-01T00:30:00", 0.1633333]
+            ]
+        }
+        ```
+        """
+        authorize(request, pk, needed_permission=ACTION_TO_AUTHORIZE.VIEW_RESOURCE)
+        try:
+            res_file = hydroshare.get_resource_file(pk, pathname)
+        except ObjectDoesNotExist:
+            res_file = None
+        if res_file is None or not _is_time_series_file(res_file):
+            raise NotFound("Time series file {} in resource {} does not exist".format(pathname,
+                                                                                      pk))
+
+        query_params = request.query_params
+        series_id = query_params.get('series_id')
+        if not series_id:
+            raise ValidationError({'series_id': "is required"})
+        output_format = query_params.get('format', 'json')
+        if output_format not in series_query.CONTENT_TYPES:
+            raise ValidationError({'format': "must be one of {}".format(
+                ", ".join(series_query.CONTENT_TYPES))})
+        aggregation = query_params.get('aggregation')
+        if aggregation is not None and aggregation not in series_query.AGGREGATIONS:
+            raise ValidationError({'aggregation': "must be one of {}".format(
+                ", ".join(series_query.AGGREGATIONS))})
+        points = _int_param(query_params, 'points', DEFAULT_POINTS, 3,
+                            getattr(settings, 'HS_TIMESERIES_QUERY_MAX_POINTS', MAX_POINTS))
+        time_range = {}
+        for name in ('start', 'end'):
+            if query_params.get(name):
+                try:
+                    time_range[name] = series_query.normalize_timestamp(query_params[name])
+                except ValueError as ex:
+                    raise ValidationError({name: str(ex)})
+
+        con = series_query.open_replica(get_query_replica(res_file))
+        try:
+            series = series_query.get_series(con, series_id)
+            if series is None:
+                raise NotFound("Time series {} does not exist in {}".format(series_id, pathname))
+            result_id, nodata_value = series
+            chunks = series_query.read_values(con, result_id, **time_range)
+            value_name = 'DataValue'
+            if aggregation == 'lttb':
+                chunks = [series_query.downsample_values(chunks, points, nodata_value)]
+            elif aggregation is not None:
+                first, last = series_query.get_time_range(con, result_id)
+                start = time_range.get('start', first)
+                end = time_range.get('end', last)
+                if start is None or end is None or start > end:
+                    chunks = []
+                else:
+                    chunks = [series_query.aggregate_values(chunks, start, end, points,
+                                                            aggregation, nodata_value)]
+                value_name = aggregation
+        except Exception:
+            con.close()
+            raise
+
+        if output_format == 'csv':
+            output = series_query.write_csv(chunks, value_name)
+        elif output_format == 'json':
+            output = series_query.write_json(chunks, series_id, value_name)
+        else:
+            output = series_query.write_binary(chunks)
+
+        def stream():
+            try:
+                for data in output:
+                    yield data
+            finally:
+                con.close()
+
+        return StreamingHttpResponse(stream(),
+                                     content_type=series_query.CONTENT_TYPES[output_format])
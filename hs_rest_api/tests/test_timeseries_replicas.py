@@ -0,0 +1,55 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import pytz
+from django.test import SimpleTestCase, override_settings
+from mock import MagicMock, patch
+
+from hs_rest_api.resources.timeseries_values import get_query_replica
+
+SQLITE_FILE = 'hs_file_types/tests/data/ODM2_Multi_Site_One_Variable.sqlite'
+
+
+class TestQueryReplicas(SimpleTestCase):
+
+    def setUp(self):
+        super(TestQueryReplicas, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.replica_dir = os.path.join(self.tmp_dir, 'replicas')
+        self.res_file = MagicMock(storage_path='abc123/data/contents/ODM2.sqlite', size=100)
+        istorage = self.res_file.resource.get_irods_storage.return_value
+        istorage.get_modified_time.return_value = datetime(2020, 1, 1, tzinfo=pytz.utc)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(TestQueryReplicas, self).tearDown()
+
+    def _get_file_from_irods(self, res_file, temp_dir):
+        sqlite_file = os.path.join(temp_dir, 'ODM2.sqlite')
+        shutil.copy(SQLITE_FILE, sqlite_file)
+        return sqlite_file
+
+    def test_stale_replicas_are_removed(self):
+        path_key = hashlib.md5(self.res_file.storage_path.encode()).hexdigest()
+        os.makedirs(self.replica_dir)
+        stale_replica = os.path.join(self.replica_dir, '{}-1-100.sqlite'.format(path_key))
+        # a replica being created by another request
+        temp_replica = os.path.join(self.replica_dir, '{}-1577836800-100.sqlite.{}'.format(
+            path_key, 'f' * 32))
+        for name in (stale_replica, temp_replica):
+            open(name, 'w').close()
+
+        with override_settings(HS_TIMESERIES_REPLICA_DIR=self.replica_dir,
+                               TEMP_FILE_DIR=self.tmp_dir), \
+                patch('hs_rest_api.resources.timeseries_values.utils.get_file_from_irods',
+                      side_effect=self._get_file_from_irods):
+            replica_path = get_query_replica(self.res_file)
+
+        self.assertEqual(os.path.basename(replica_path),
+                         '{}-1577836800-100.sqlite'.format(path_key))
+        self.assertTrue(os.path.exists(replica_path))
+        self.assertFalse(os.path.exists(stale_replica))
+        self.assertTrue(os.path.exists(temp_replica))
@@ -7,6 +7,7 @@ from hs_core.views.resource_folder_hierarchy import data_store_add_reference_pub
     data_store_edit_reference_url_public
 
 from .resources.file_metadata import FileMetaDataRetrieveUpdateDestroy
+from .resources.timeseries_values import TimeSeriesValuesRetrieve
 
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -103,6 +104,9 @@ urlpatterns = [
     url(r'resource/(?P<pk>[0-9a-f-]+)/files/metadata/(?P<pathname>.*)/$',
         FileMetaDataRetrieveUpdateDestroy.as_view(), name="get_update_resource_file_metadata"),
 
+    url(r'^resource/(?P<pk>[0-9a-f-]+)/timeseries/values/(?P<pathname>.+)/$',
+        TimeSeriesValuesRetrieve.as_view(), name="get_resource_file_timeseries_values"),
+
     # Patterns are now checked in the view class.
     url(r'^resource/(?P<pk>[0-9a-f-]+)/files/(?P<pathname>.+)/$',
         core_views.resource_rest_api.ResourceFileCRUD.as_view(),
@@ -484,7 +484,7 @@ HAYSTACK_CONNECTIONS = {
         # 'URL': 'http://127.0.0.1:8983/solr/mysite',
     },
 }
-HAYSTACK_SIGNAL_PROCESSOR = "hs_core.hydro_realtime_signal_processor.HydroRealtimeSignalProcessor"
+HAYSTACK_SIGNAL_PROCESSOR = "hs_core.index_queue.IndexQueueSignalProcessor"
 
 
 # customized value for password reset token, email verification and group invitation link token
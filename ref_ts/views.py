@@ -194,7 +194,7 @@ def download_refts_resource_bag(request, shortkey, *args, **kwargs):
                                                  use_reverse_proxy=False)
 
         tempdir = tempfile.mkdtemp()
-        response = assemble_refts_bag(shortkey, response_irods.streaming_content,
+        response = assemble_refts_bag(shortkey, _cached_bag_stream(shortkey, response_irods),
                                       temp_dir=tempdir)
 
         return response
@@ -225,7 +225,7 @@ def rest_download_refts_resource_bag(request, shortkey, *args, **kwargs):
             raise Exception("Failed to stream RefTS bag")
         else:
             tempdir = tempfile.mkdtemp()
-            response = assemble_refts_bag(shortkey, response_irods.streaming_content,
+            response = assemble_refts_bag(shortkey, _cached_bag_stream(shortkey, response_irods),
                                           temp_dir=tempdir)
             return response
 
@@ -239,6 +239,24 @@ def rest_download_refts_resource_bag(request, shortkey, *args, **kwargs):
            shutil.rmtree(tempdir)
 
 
+def _cached_bag_stream(res_id, bag_response):
+    """
+    Return the content of the bag of a RefTS resource read through the local cache of iRODS
+    data objects rather than streamed from iRODS on every download
+    :param res_id: the resource id of the RefTS resource
+    :param bag_response: the streaming response of the bag returned by download(), which
+    makes sure that the bag is up to date; it is closed without being read
+    :return: generator of the bytes of the bag
+    """
+    if not getattr(bag_response, 'streaming', False):
+        raise Exception("Failed to stream RefTS bag")
+    bag_response.close()
+    res = hydroshare.get_resource_by_shortkey(res_id)
+    with res.get_irods_storage().open_cached(res.bag_path) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            yield chunk
+
+
 def assemble_refts_bag(res_id, empty_bag_stream, temp_dir=None):
     """
     save empty_bag_stream to local; download latest wml;
@@ -2194,7 +2194,8 @@ function setFileType(fileType){
 
     $(".file-browser-container, #fb-files-container").css("cursor", "progress");
     var calls = [];
-    calls.push(set_file_type_ajax_submit(url, folderPath));
+    // metadata extraction of large shapefiles can take long, so it is done in the background
+    calls.push(set_file_type_ajax_submit(url, folderPath, fileType === "GeoFeature"));
 
     // Wait for the asynchronous calls to finish to get new folder structure
     $.when.apply($, calls).done(function (result) {
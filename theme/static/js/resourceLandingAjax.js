@@ -358,7 +358,7 @@ function makeTimeSeriesMetaDataElementFormReadOnly(form_id, element_id){
     }
 }
 
-function set_file_type_ajax_submit(url, folder_path) {
+function set_file_type_ajax_submit(url, folder_path, run_async) {
     var $alert_success = '<div class="alert alert-success" id="success-alert"> \
         <button type="button" class="close" data-dismiss="alert">x</button> \
         <strong>Success! </strong> \
@@ -366,6 +366,44 @@ function set_file_type_ajax_submit(url, folder_path) {
     </div>';
 
     var waitDialog = showWaitDialog();
+    var onSuccess = function () {
+        waitDialog.dialog("close");
+        $("#fb-inner-controls").before($alert_success);
+        $("#success-alert").fadeTo(2000, 500).slideUp(1000, function(){
+            $("#success-alert").alert('close');
+        });
+    };
+    var onError = function (message) {
+        waitDialog.dialog("close");
+        display_error_message('Failed to set the selected aggregation type', message);
+        $(".file-browser-container, #fb-files-container").css("cursor", "auto");
+    };
+
+    if (run_async) {
+        // the aggregation is created by a celery task; the returned promise is resolved with
+        // the json response of the task when it is done
+        var fileTypeSet = $.Deferred();
+        $.ajax({
+            type: "POST",
+            url: url,
+            dataType: 'json',
+            async: true,
+            data: {
+                folder_path: folder_path,
+                async: "true"
+            },
+            success: function (result) {
+                check_set_file_type_task_status(result.task_id, fileTypeSet);
+            },
+            error: function (xhr, textStatus, errorThrown) {
+                fileTypeSet.reject(JSON.parse(xhr.responseText).message);
+            }
+        });
+        fileTypeSet.done(onSuccess);
+        fileTypeSet.fail(onError);
+        return fileTypeSet.promise();
+    }
+
     return $.ajax({
         type: "POST",
         url: url,
@@ -375,17 +413,42 @@ function set_file_type_ajax_submit(url, folder_path) {
             folder_path: folder_path
         },
         success: function (result) {
-            waitDialog.dialog("close");
-            $("#fb-inner-controls").before($alert_success);
-            $("#success-alert").fadeTo(2000, 500).slideUp(1000, function(){
-                $("#success-alert").alert('close');
-            });
+            onSuccess();
         },
         error: function (xhr, textStatus, errorThrown) {
-            waitDialog.dialog("close");
             var jsonResponse = JSON.parse(xhr.responseText);
-            display_error_message('Failed to set the selected aggregation type', jsonResponse.message);
-            $(".file-browser-container, #fb-files-container").css("cursor", "auto");
+            onError(jsonResponse.message);
+        }
+    });
+}
+
+function check_set_file_type_task_status(task_id, fileTypeSet) {
+    $.ajax({
+        dataType: "json",
+        cache: false,
+        type: "POST",
+        url: '/django_irods/check_task_status/',
+        data: {
+            task_id: task_id
+        },
+        success: function (data) {
+            if (data.status == 'true') {
+                var jsonResponse = JSON.parse(data.payload);
+                if (jsonResponse.status === 'success') {
+                    fileTypeSet.resolve(data.payload);
+                }
+                else {
+                    fileTypeSet.reject(jsonResponse.message);
+                }
+            }
+            else {
+                setTimeout(function () {
+                    check_set_file_type_task_status(task_id, fileTypeSet);
+                }, 2000);
+            }
+        },
+        error: function (xhr, errmsg, err) {
+            fileTypeSet.reject("Creating the aggregation failed.");
         }
     });
 }
@@ -832,20 +895,55 @@ function zip_irods_folder_ajax_submit(res_id, input_coll_path, fileName) {
 
 function unzip_irods_file_ajax_submit(res_id, zip_with_rel_path) {
     $("#fb-files-container, #fb-files-container").css("cursor", "progress");
-    return $.ajax({
+    // the zip file is unzipped by a celery task; the returned promise is resolved when it is done
+    var unzipped = $.Deferred();
+    $.ajax({
         type: "POST",
         url: '/hsapi/_internal/data-store-folder-unzip/',
         async: true,
         data: {
             res_id: res_id,
             zip_with_rel_path: zip_with_rel_path,
-            remove_original_zip: "false"
+            remove_original_zip: "false",
+            async: "true"
         },
         success: function (result) {
             // TODO: handle "File already exists" errors
+            check_unzip_task_status(result.task_id, unzipped);
         },
         error: function (xhr, errmsg, err) {
             display_error_message('File Unzipping Failed', xhr.responseText);
+            unzipped.reject();
+        }
+    });
+    return unzipped.promise();
+}
+
+function check_unzip_task_status(task_id, unzipped) {
+    $.ajax({
+        dataType: "json",
+        cache: false,
+        type: "POST",
+        url: '/django_irods/check_task_status/',
+        data: {
+            task_id: task_id
+        },
+        success: function (data) {
+            if (data.status == 'true') {
+                unzipped.resolve();
+            }
+            else {
+                setTimeout(function () {
+                    check_unzip_task_status(task_id, unzipped);
+                }, 2000);
+            }
+        },
+        error: function (xhr, errmsg, err) {
+            display_error_message('File Unzipping Failed', "iRODS error resulted in unzip being " +
+                "cancelled. This may be due to protection from overwriting existing files. Unzip " +
+                "in a different location (e.g., folder) or move or rename the file being " +
+                "overwritten.");
+            unzipped.reject();
         }
     });
 }